@@ -90,6 +90,17 @@ export class SSEService {
       });
     });
 
+    // 3.5. 思考过程增量（模型流式输出时逐段追加，步骤结束后由 thinking 事件覆盖为完整内容）
+    this.eventSource.addEventListener('thinking_delta', (e) => {
+      const data = JSON.parse(e.data);
+      const step = useAppStore.getState().currentTask?.steps.find(
+        (s) => s.stepNumber === data.stepNumber
+      );
+      store.updateStep(data.stepNumber, {
+        thinking: (step?.thinking || '') + data.delta,
+      });
+    });
+
     // 4. 执行动作
     this.eventSource.addEventListener('action', (e) => {
       console.log('SSE: Action', e.data);
@@ -202,6 +213,12 @@ export class SSEService {
       // 防止重复处理
       if (this.errorHandled) return;
 
+      // 浏览器正在自动重连（带 Last-Event-ID，后端从断点继续发送事件，任务不会重新执行）
+      if (this.eventSource?.readyState === EventSource.CONNECTING) {
+        console.warn('SSE connection lost, reconnecting...', error);
+        return;
+      }
+
       console.error('SSE connection error:', error);
       this.errorHandled = true;
       store.failTask('连接中断');
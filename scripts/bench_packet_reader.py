@@ -0,0 +1,176 @@
+"""
+scrcpy packet 读取器微基准
+
+启动一个本地伪 scrcpy-server（TCP socket），发送元数据头 + 模拟的
+IDR / P 帧 packet 流，分别用以下三种方式读取并统计吞吐：
+
+- legacy：旧版 read_nal_unit 的 ``data += chunk`` 实现
+- recv_into：SocketPacketReader（可复用 bytearray + recv_into）
+- asyncio：ScrcpyVideoProtocol（BufferedProtocol + PacketBuffer）
+
+用法：
+    python scripts/bench_packet_reader.py --frames 2000 --idr-size 300000
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import struct
+import threading
+import time
+
+from autolife.scrcpy.packet_reader import METADATA_HEADER_SIZE, SocketPacketReader
+from autolife.scrcpy.transport import ScrcpyVideoProtocol
+
+
+def build_stream(frames: int, gop: int, idr_size: int, p_size: int) -> bytes:
+    """构造元数据头 + packet 流"""
+    header = b'\x00' + b'bench'.ljust(64, b'\x00') + b'h264' + struct.pack('>II', 720, 1280)
+
+    idr = b'\x00\x00\x00\x01\x65' + os.urandom(idr_size - 5)
+    p_frame = b'\x00\x00\x00\x01\x41' + os.urandom(p_size - 5)
+
+    parts = [header]
+    for i in range(frames):
+        data = idr if i % gop == 0 else p_frame
+        parts.append(struct.pack('>QI', i * 50_000, len(data)))
+        parts.append(data)
+
+    return b''.join(parts)
+
+
+class FakeScrcpyServer:
+    """本地伪 scrcpy-server：每个连接发送一次完整的 packet 流后关闭"""
+
+    def __init__(self, stream: bytes):
+        self.stream = stream
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            conn, _ = self.listener.accept()
+            with conn:
+                conn.sendall(self.stream)
+
+
+def read_legacy(sock: socket.socket) -> int:
+    """旧实现：header 和 packet 都用不可变 bytes 拼接"""
+    header = b''
+    while len(header) < METADATA_HEADER_SIZE:
+        chunk = sock.recv(METADATA_HEADER_SIZE - len(header))
+        if not chunk:
+            return 0
+        header += chunk
+
+    count = 0
+    while True:
+        header = b''
+        while len(header) < 12:
+            chunk = sock.recv(12 - len(header))
+            if not chunk:
+                return count
+            header += chunk
+
+        packet_size = struct.unpack('>I', header[8:12])[0]
+
+        data = b''
+        while len(data) < packet_size:
+            chunk = sock.recv(min(65536, packet_size - len(data)))
+            if not chunk:
+                return count
+            data += chunk
+
+        count += 1
+
+
+def read_recv_into(sock: socket.socket) -> int:
+    """新实现：SocketPacketReader"""
+    header = b''
+    while len(header) < METADATA_HEADER_SIZE:
+        header += sock.recv(METADATA_HEADER_SIZE - len(header))
+
+    reader = SocketPacketReader(sock)
+    count = 0
+    while reader.read_packet() is not None:
+        count += 1
+
+    return count
+
+
+def bench_blocking(name: str, port: int, reader, total_bytes: int):
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
+
+    start = time.perf_counter()
+    count = reader(sock)
+    elapsed = time.perf_counter() - start
+    sock.close()
+
+    report(name, count, total_bytes, elapsed)
+    return count
+
+
+async def bench_asyncio(port: int, total_bytes: int):
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    count = 0
+
+    def on_packet(data: bytes, pts_flags: int):
+        nonlocal count
+        count += 1
+
+    def on_close(exc):
+        if not done.done():
+            done.set_result(None)
+
+    start = time.perf_counter()
+    protocol = ScrcpyVideoProtocol(on_packet=on_packet, on_close=on_close)
+    await loop.create_connection(lambda: protocol, "127.0.0.1", port)
+    await done
+    elapsed = time.perf_counter() - start
+
+    report("asyncio", count, total_bytes, elapsed)
+    return count
+
+
+def report(name: str, count: int, total_bytes: int, elapsed: float):
+    print(
+        f"{name:<10} {count:>6} packets  {elapsed * 1000:>8.1f} ms  "
+        f"{total_bytes / elapsed / 1024 / 1024:>8.1f} MB/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="scrcpy packet 读取器微基准")
+    parser.add_argument("--frames", type=int, default=2000, help="packet 数量")
+    parser.add_argument("--gop", type=int, default=20, help="IDR 间隔（帧）")
+    parser.add_argument("--idr-size", type=int, default=300_000, help="IDR 大小（字节）")
+    parser.add_argument("--p-size", type=int, default=8_000, help="P 帧大小（字节）")
+    parser.add_argument("--rounds", type=int, default=3, help="每种实现的轮数")
+    args = parser.parse_args()
+
+    stream = build_stream(args.frames, args.gop, args.idr_size, args.p_size)
+    server = FakeScrcpyServer(stream)
+
+    print(f"stream: {len(stream) / 1024 / 1024:.1f} MB, {args.frames} packets")
+
+    for _ in range(args.rounds):
+        counts = [
+            bench_blocking("legacy", server.port, read_legacy, len(stream)),
+            bench_blocking("recv_into", server.port, read_recv_into, len(stream)),
+            asyncio.run(bench_asyncio(server.port, len(stream))),
+        ]
+        # 每种实现都应读到全部 packet，否则吞吐数据没有意义
+        if any(count != args.frames for count in counts):
+            raise SystemExit(f"packet count mismatch: expected {args.frames}, got {counts}")
+
+
+if __name__ == "__main__":
+    main()
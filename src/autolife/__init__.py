@@ -7,5 +7,6 @@ AutoLife 是一个智能手机助手,通过自然语言指令控制手机完成
 __version__ = "0.1.0"
 
 from autolife.agent import AutoLifeAgent
+from autolife.agent_pool import AgentPool
 
-__all__ = ["AutoLifeAgent", "__version__"]
+__all__ = ["AutoLifeAgent", "AgentPool", "__version__"]
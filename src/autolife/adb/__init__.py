@@ -0,0 +1,33 @@
+"""
+ADB 客户端模块
+
+直接与 adb server（localhost:5037）通信，替代逐条命令启动 adb 进程。
+"""
+
+from .client import (
+    AdbClient,
+    AdbDevice,
+    AdbError,
+    FileStat,
+    ShellResult,
+    get_adb_client,
+    parse_devices,
+)
+from .display import DisplayMetrics, DisplayMetricsCache, get_display_cache
+from .fake_server import FakeAdbServer
+from .registry import DeviceRegistry
+
+__all__ = [
+    "AdbClient",
+    "AdbDevice",
+    "AdbError",
+    "FileStat",
+    "ShellResult",
+    "get_adb_client",
+    "parse_devices",
+    "DisplayMetrics",
+    "DisplayMetricsCache",
+    "get_display_cache",
+    "FakeAdbServer",
+    "DeviceRegistry",
+]
@@ -0,0 +1,608 @@
+"""
+AdbClient - 异步 ADB 客户端
+
+直接使用 adb server 的 wire 协议（默认 localhost:5037），不再为每个命令 fork/exec adb 进程：
+- host:devices / host:devices-l：设备列表
+- host:transport:<serial> + shell:：执行 shell 命令
+- host-serial:<serial>:forward / killforward：端口转发
+- sync: STAT / SEND：查询文件、推送文件
+
+shell 命令默认复用每台设备上常驻的 shell 会话（连接池），
+省去每次新建 adb 连接和设备端 sh 进程的开销。
+
+协议格式：
+- 请求：4 位十六进制长度 + 服务名
+- 响应：OKAY 或 FAIL + 4 位十六进制长度 + 错误信息
+"""
+
+import asyncio
+import itertools
+import os
+import socket
+import struct
+import subprocess
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# sync 协议单个 DATA 块的最大长度
+SYNC_DATA_MAX = 64 * 1024
+
+# 常驻 shell 会话单条命令输出的上限（StreamReader.readuntil 的缓冲上限）
+STREAM_LIMIT = 4 * 1024 * 1024
+
+
+class AdbError(RuntimeError):
+    """adb server 返回 FAIL 或协议错误"""
+
+
+@dataclass
+class AdbDevice:
+    """adb 设备信息"""
+    serial: str
+    state: str
+    # devices-l 附加属性（product / model / device / transport_id）
+    properties: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def model(self) -> Optional[str]:
+        return self.properties.get("model")
+
+
+@dataclass
+class FileStat:
+    """设备文件信息（sync STAT）"""
+    mode: int
+    size: int
+    mtime: int
+
+    @property
+    def exists(self) -> bool:
+        return self.mode != 0
+
+
+def parse_devices(text: str) -> List[AdbDevice]:
+    """
+    解析 host:devices / host:devices-l 的输出
+
+    Args:
+        text: 每行 "serial<TAB>state" 或 "serial  state key:value ..."
+
+    Returns:
+        List[AdbDevice]: 设备列表
+    """
+    devices = []
+
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) < 2:
+            continue
+
+        properties = {}
+        for item in parts[2:]:
+            key, sep, value = item.partition(":")
+            if sep:
+                properties[key] = value
+
+        devices.append(AdbDevice(serial=parts[0], state=parts[1], properties=properties))
+
+    return devices
+
+
+class AdbConnection:
+    """到 adb server 的单个连接"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, service: str):
+        """发送服务请求并检查 OKAY"""
+        data = service.encode("utf-8")
+        self.writer.write(b"%04x" % len(data) + data)
+        await self.writer.drain()
+        await self.check_status()
+
+    async def check_status(self):
+        status = await self.reader.readexactly(4)
+
+        if status == b"OKAY":
+            return
+
+        if status == b"FAIL":
+            raise AdbError(await self.read_string())
+
+        raise AdbError(f"Unexpected adb response: {status!r}")
+
+    async def read_string(self) -> str:
+        """读取 4 位十六进制长度前缀的字符串"""
+        length = int(await self.reader.readexactly(4), 16)
+        return (await self.reader.readexactly(length)).decode("utf-8", errors="replace")
+
+    async def read_all(self) -> bytes:
+        """读取直到连接关闭"""
+        return await self.reader.read()
+
+    def close(self):
+        self.writer.close()
+
+
+class ShellSession:
+    """
+    设备上常驻的 shell 会话（shell,raw:，无 pty）
+
+    每条命令后追加带序号的结束标记，读到标记即表示命令结束并拿到退出码。
+    """
+
+    _counter = itertools.count()
+
+    def __init__(self, connection: AdbConnection):
+        self.connection = connection
+        self.lock = asyncio.Lock()
+        self.is_broken = False
+
+    @property
+    def is_alive(self) -> bool:
+        """会话可以复用（没有出错，对端也没有关闭连接）"""
+        return (
+            not self.is_broken
+            and not self.connection.reader.at_eof()
+            and not self.connection.writer.is_closing()
+        )
+
+    async def run(self, command: str) -> "ShellResult":
+        """
+        执行一条命令
+
+        Raises:
+            AdbError: 命令已发送后会话断开（命令可能已经执行，不能重试）
+        """
+        marker = f"__AUTOLIFE_{os.getpid()}_{next(self._counter)}__"
+        line = f"{{ {command}; }} 2>&1; echo {marker}$?\n"
+
+        async with self.lock:
+            try:
+                self.connection.writer.write(line.encode("utf-8"))
+                await self.connection.writer.drain()
+
+                output = await self.connection.reader.readuntil(marker.encode())
+                status = await self.connection.reader.readline()
+            except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError) as e:
+                self.is_broken = True
+                raise AdbError(f"Shell session lost after sending command: {e!r}") from e
+            except BaseException:
+                # 会话状态未知（超时/取消），不再复用
+                self.is_broken = True
+                raise
+
+        text = output[:-len(marker)].decode("utf-8", errors="replace")
+
+        try:
+            exit_code = int(status.strip() or b"0")
+        except ValueError:
+            exit_code = -1
+
+        return ShellResult(output=text, exit_code=exit_code)
+
+    def close(self):
+        self.is_broken = True
+        self.connection.close()
+
+
+@dataclass
+class ShellResult:
+    """shell 命令执行结果"""
+    output: str
+    exit_code: int = 0
+
+
+class AdbClient:
+    """
+    异步 ADB 客户端
+
+    示例：
+        >>> adb = AdbClient()
+        >>> devices = await adb.devices()
+        >>> await adb.shell(devices[0].serial, "input tap 100 200")
+        >>> await adb.forward("emulator-5554", "tcp:27183", "localabstract:scrcpy")
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        max_sessions: int = 2,
+        timeout: float = 10.0,
+    ):
+        """
+        初始化客户端
+
+        Args:
+            host: adb server 地址，默认 127.0.0.1
+            port: adb server 端口，默认读取 ANDROID_ADB_SERVER_PORT（默认 5037）
+            max_sessions: 每台设备最多保持的常驻 shell 会话数
+            timeout: 单个请求的默认超时（秒）
+        """
+        self.host = host or "127.0.0.1"
+        self.port = port or int(os.getenv("ANDROID_ADB_SERVER_PORT", "5037"))
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+
+        # 设备 → 空闲的常驻 shell 会话
+        self._idle_sessions: Dict[str, List[ShellSession]] = {}
+        # 设备 → 会话数量限制
+        self._session_slots: Dict[str, asyncio.Semaphore] = {}
+
+        self._server_started = False
+
+    # ------------------------------------------------------------------
+    # 连接
+    # ------------------------------------------------------------------
+
+    async def connect(self) -> AdbConnection:
+        """
+        建立到 adb server 的连接
+
+        adb server 未运行时尝试执行一次 adb start-server。
+        """
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+        except ConnectionRefusedError:
+            if self._server_started:
+                raise
+
+            self._server_started = True
+            await self._start_server()
+            reader, writer = await asyncio.open_connection(self.host, self.port, limit=STREAM_LIMIT)
+
+        return AdbConnection(reader, writer)
+
+    async def _start_server(self):
+        print("[AdbClient] adb server not running, starting it...")
+
+        process = await asyncio.create_subprocess_exec(
+            "adb", "start-server",
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        await process.wait()
+
+    async def _transport(self, serial: Optional[str]) -> AdbConnection:
+        """建立连接并切换到指定设备的 transport"""
+        connection = await self.connect()
+
+        try:
+            if serial:
+                await connection.send(f"host:transport:{serial}")
+            else:
+                await connection.send("host:transport-any")
+        except BaseException:
+            connection.close()
+            raise
+
+        return connection
+
+    # ------------------------------------------------------------------
+    # host 服务
+    # ------------------------------------------------------------------
+
+    async def host_request(self, service: str) -> str:
+        """
+        执行返回单个字符串的 host 服务（如 host:devices、host:version）
+
+        Args:
+            service: 服务名
+
+        Returns:
+            str: 响应内容
+        """
+        connection = await self.connect()
+
+        try:
+            return await asyncio.wait_for(self._host_request(connection, service), self.timeout)
+        finally:
+            connection.close()
+
+    async def _host_request(self, connection: AdbConnection, service: str) -> str:
+        await connection.send(service)
+        return await connection.read_string()
+
+    async def devices(self, long: bool = False) -> List[AdbDevice]:
+        """
+        获取设备列表
+
+        Args:
+            long: 是否使用 devices-l（附带 model 等属性）
+
+        Returns:
+            List[AdbDevice]: 所有设备（包含 offline / unauthorized）
+        """
+        text = await self.host_request("host:devices-l" if long else "host:devices")
+        return parse_devices(text)
+
+    async def online_devices(self) -> List[str]:
+        """获取所有在线（state=device）设备的序列号"""
+        return [device.serial for device in await self.devices() if device.state == "device"]
+
+    async def forward(self, serial: str, local: str, remote: str, norebind: bool = False):
+        """
+        设置端口转发
+
+        Args:
+            serial: 设备序列号
+            local: 本地端点，如 tcp:27183
+            remote: 设备端点，如 localabstract:scrcpy
+            norebind: 本地端点已存在时是否报错
+        """
+        mode = "forward:norebind:" if norebind else "forward:"
+        await self._host_command(f"host-serial:{serial}:{mode}{local};{remote}")
+
+    async def killforward(self, serial: str, local: str):
+        """移除端口转发"""
+        await self._host_command(f"host-serial:{serial}:killforward:{local}")
+
+    async def _host_command(self, service: str):
+        connection = await self.connect()
+
+        try:
+            await asyncio.wait_for(connection.send(service), self.timeout)
+        finally:
+            connection.close()
+
+    # ------------------------------------------------------------------
+    # shell
+    # ------------------------------------------------------------------
+
+    async def shell(
+        self,
+        serial: Optional[str],
+        command: str,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        执行 shell 命令并返回输出
+
+        优先复用设备上常驻的 shell 会话；会话不可用时退回一次性 shell: 服务。
+
+        Args:
+            serial: 设备序列号，None 表示唯一的设备
+            command: shell 命令
+            timeout: 超时（秒），默认使用客户端超时
+
+        Returns:
+            str: 命令输出（stdout + stderr）
+        """
+        result = await self.shell_result(serial, command, timeout=timeout)
+        return result.output
+
+    async def shell_result(
+        self,
+        serial: Optional[str],
+        command: str,
+        timeout: Optional[float] = None,
+    ) -> ShellResult:
+        """
+        执行 shell 命令，返回输出和退出码
+
+        只有常驻会话无法打开（命令尚未发送）时才退回一次性 shell，
+        命令发送后会话断开直接报错，避免点击、输入等命令执行两次。
+        整个调用（包括退回）共用一个超时。
+
+        Raises:
+            AdbError: adb server 返回错误，或命令发送后会话断开
+            asyncio.TimeoutError: 超时
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.timeout)
+
+        if serial:
+            result = await asyncio.wait_for(self._pooled_shell(serial, command), deadline - loop.time())
+            if result is not None:
+                return result
+
+        output = await asyncio.wait_for(self.exec_shell(serial, command), deadline - loop.time())
+        return ShellResult(output=output)
+
+    async def exec_shell(self, serial: Optional[str], command: str) -> str:
+        """一次性 shell: 服务（每次新建连接）"""
+        connection = await self._transport(serial)
+
+        try:
+            await connection.send(f"shell:{command}")
+            data = await connection.read_all()
+        finally:
+            connection.close()
+
+        return data.decode("utf-8", errors="replace")
+
+    async def open_stream(self, serial: Optional[str], service: str) -> AdbConnection:
+        """
+        打开设备上的长连接服务（如 shell:<长时间运行的命令>）
+
+        调用方负责读取和关闭返回的连接。
+        """
+        connection = await self._transport(serial)
+
+        try:
+            await connection.send(service)
+        except BaseException:
+            connection.close()
+            raise
+
+        return connection
+
+    async def _pooled_shell(self, serial: str, command: str) -> Optional[ShellResult]:
+        """在常驻会话中执行命令，会话无法打开时返回 None"""
+        slots = self._session_slots.setdefault(serial, asyncio.Semaphore(self.max_sessions))
+
+        async with slots:
+            idle = self._idle_sessions.setdefault(serial, [])
+            session = None
+
+            while idle and session is None:
+                session = idle.pop()
+                if not session.is_alive:
+                    # 空闲期间被对端关闭（设备重连等），命令还没有发送
+                    session.close()
+                    session = None
+
+            if session is None:
+                try:
+                    connection = await self.open_stream(serial, "shell,raw:")
+                except (AdbError, ConnectionError, asyncio.IncompleteReadError):
+                    # 设备不支持 shell,raw: 或连接失败，由调用方退回一次性 shell
+                    return None
+                session = ShellSession(connection)
+
+            try:
+                return await session.run(command)
+            finally:
+                if session.is_broken:
+                    session.close()
+                else:
+                    idle.append(session)
+
+    def close_sessions(self, serial: Optional[str] = None):
+        """关闭常驻 shell 会话（设备断开时调用）"""
+        serials = [serial] if serial else list(self._idle_sessions)
+
+        for key in serials:
+            for session in self._idle_sessions.pop(key, []):
+                session.close()
+
+    # ------------------------------------------------------------------
+    # sync（文件）
+    # ------------------------------------------------------------------
+
+    async def stat(self, serial: Optional[str], path: str) -> FileStat:
+        """查询设备文件信息（文件不存在时 mode 为 0）"""
+        connection = await self._transport(serial)
+
+        try:
+            await connection.send("sync:")
+            await self._sync_request(connection, b"STAT", path.encode("utf-8"))
+
+            response = await connection.reader.readexactly(16)
+            if response[:4] != b"STAT":
+                raise AdbError(f"Unexpected sync response: {response[:4]!r}")
+
+            mode, size, mtime = struct.unpack("<III", response[4:])
+            await self._sync_request(connection, b"QUIT", b"")
+        finally:
+            connection.close()
+
+        return FileStat(mode=mode, size=size, mtime=mtime)
+
+    async def push(
+        self,
+        serial: Optional[str],
+        local_path: str,
+        remote_path: str,
+        mode: int = 0o644,
+    ):
+        """
+        推送文件到设备
+
+        Args:
+            serial: 设备序列号
+            local_path: 本地文件路径
+            remote_path: 设备路径
+            mode: 文件权限
+        """
+        data = await asyncio.to_thread(Path(local_path).read_bytes)
+
+        connection = await self._transport(serial)
+
+        try:
+            await connection.send("sync:")
+            await self._sync_request(connection, b"SEND", f"{remote_path},{mode}".encode("utf-8"))
+
+            view = memoryview(data)
+            for offset in range(0, len(data), SYNC_DATA_MAX):
+                chunk = view[offset:offset + SYNC_DATA_MAX]
+                connection.writer.write(b"DATA" + struct.pack("<I", len(chunk)))
+                connection.writer.write(chunk)
+                await connection.writer.drain()
+
+            connection.writer.write(b"DONE" + struct.pack("<I", int(time.time())))
+            await connection.writer.drain()
+
+            response = await connection.reader.readexactly(8)
+            if response[:4] == b"FAIL":
+                length = struct.unpack("<I", response[4:])[0]
+                message = await connection.reader.readexactly(length)
+                raise AdbError(message.decode("utf-8", errors="replace"))
+            if response[:4] != b"OKAY":
+                raise AdbError(f"Unexpected sync response: {response[:4]!r}")
+
+            await self._sync_request(connection, b"QUIT", b"")
+        finally:
+            connection.close()
+
+    async def _sync_request(self, connection: AdbConnection, command: bytes, payload: bytes):
+        connection.writer.write(command + struct.pack("<I", len(payload)) + payload)
+        await connection.writer.drain()
+
+    # ------------------------------------------------------------------
+    # 同步接口（供线程中的旧代码使用）
+    # ------------------------------------------------------------------
+
+    def shell_blocking(self, serial: Optional[str], command: str, timeout: float = 5.0) -> str:
+        """
+        阻塞式一次性 shell 命令（不依赖事件循环）
+
+        Args:
+            serial: 设备序列号
+            command: shell 命令
+            timeout: 超时（秒）
+
+        Returns:
+            str: 命令输出
+        """
+        with socket.create_connection((self.host, self.port), timeout=timeout) as sock:
+            transport = f"host:transport:{serial}" if serial else "host:transport-any"
+
+            for service in (transport, f"shell:{command}"):
+                data = service.encode("utf-8")
+                sock.sendall(b"%04x" % len(data) + data)
+
+                status = _recv_exactly(sock, 4)
+                if status == b"FAIL":
+                    length = int(_recv_exactly(sock, 4), 16)
+                    raise AdbError(_recv_exactly(sock, length).decode("utf-8", errors="replace"))
+                if status != b"OKAY":
+                    raise AdbError(f"Unexpected adb response: {status!r}")
+
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+
+        return b"".join(chunks).decode("utf-8", errors="replace")
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise AdbError("adb server closed connection")
+        data += chunk
+    return bytes(data)
+
+
+_default_client: Optional[AdbClient] = None
+
+
+def get_adb_client() -> AdbClient:
+    """获取进程内共享的 AdbClient"""
+    global _default_client
+
+    if _default_client is None:
+        _default_client = AdbClient()
+
+    return _default_client
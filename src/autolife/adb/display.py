@@ -0,0 +1,289 @@
+"""
+DisplayMetricsCache - 设备显示参数缓存
+
+按（设备, 方向）缓存显示参数，避免每次坐标映射都执行 adb shell wm size：
+- wm size / wm density：自然方向的分辨率和密度（一次 shell 调用同时查询）
+- 视频流尺寸：scrcpy 元数据头和 SPS，反映当前方向（旋转后宽高互换）
+
+同一方向上视频流报告了新的尺寸（例如修改了分辨率）时，
+该设备的缓存失效，下一次查询重新读取 wm size。
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .client import AdbClient, AdbError, get_adb_client
+
+
+PORTRAIT = "portrait"
+LANDSCAPE = "landscape"
+
+
+def orientation_of(width: int, height: int) -> str:
+    """根据宽高判断方向"""
+    return LANDSCAPE if width > height else PORTRAIT
+
+
+@dataclass
+class DisplayMetrics:
+    """设备在某个方向上的显示参数"""
+    device_id: str
+    orientation: str
+    # 当前方向上的分辨率（设备像素，与 adb shell input 坐标一致）
+    width: int
+    height: int
+    density: int = 0
+    # 当前方向上的视频尺寸（没有投屏时为 0）
+    video_width: int = 0
+    video_height: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "orientation": self.orientation,
+            "width": self.width,
+            "height": self.height,
+            "density": self.density,
+            "video_width": self.video_width,
+            "video_height": self.video_height,
+            "updated_at": self.updated_at,
+        }
+
+
+def parse_wm_output(output: str) -> Tuple[Optional[Tuple[int, int]], int]:
+    """
+    解析 wm size / wm density 输出（Override 优先于 Physical）
+
+    Returns:
+        ((width, height) 或 None, density 或 0)
+    """
+    sizes: Dict[str, Tuple[int, int]] = {}
+    densities: Dict[str, int] = {}
+
+    for line in output.splitlines():
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+
+        key = key.strip()
+        value = value.strip()
+
+        if key.endswith("size"):
+            width, _, height = value.partition("x")
+            if width.isdigit() and height.isdigit():
+                sizes[key] = (int(width), int(height))
+        elif key.endswith("density") and value.isdigit():
+            densities[key] = int(value)
+
+    size = sizes.get("Override size") or sizes.get("Physical size")
+    density = densities.get("Override density") or densities.get("Physical density") or 0
+
+    return size, density
+
+
+class DisplayMetricsCache:
+    """
+    显示参数缓存
+
+    示例：
+        >>> cache = DisplayMetricsCache()
+        >>> metrics = await cache.resolve("emulator-5554")
+        >>> metrics.width, metrics.height
+        (1080, 2400)
+        >>> cache.update_from_stream("emulator-5554", 1280, 576)   # 旋转为横屏
+        >>> cache.get("emulator-5554").orientation
+        'landscape'
+    """
+
+    def __init__(self, adb: Optional[AdbClient] = None):
+        """
+        Args:
+            adb: ADB 客户端，默认使用进程内共享的 AdbClient
+        """
+        self.adb = adb or get_adb_client()
+
+        # 设备 → 自然方向的分辨率和密度（wm size / wm density）
+        self._natural: Dict[str, Tuple[int, int, int]] = {}
+
+        # （设备, 方向）→ 显示参数
+        self._entries: Dict[Tuple[str, str], DisplayMetrics] = {}
+
+        # 设备 → 当前方向（来自视频流）
+        self._orientation: Dict[str, str] = {}
+
+        # 设备 → 正在进行的 wm 查询（并发请求共享同一次查询）
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def get(self, device_id: str) -> Optional[DisplayMetrics]:
+        """获取当前方向的显示参数（仅内存，未缓存时返回 None）"""
+        orientation = self._orientation.get(device_id)
+
+        if orientation is None:
+            natural = self._natural.get(device_id)
+            if natural is None:
+                return None
+            orientation = orientation_of(natural[0], natural[1])
+
+        entry = self._entries.get((device_id, orientation))
+        if entry is None or not entry.width:
+            # 只有视频尺寸的占位条目需要 wm size 补全
+            entry = self._build_entry(device_id, orientation)
+
+        return entry
+
+    def natural_size(self, device_id: str) -> Optional[Tuple[int, int]]:
+        """自然方向的分辨率（wm size），未缓存时返回 None"""
+        natural = self._natural.get(device_id)
+        return (natural[0], natural[1]) if natural else None
+
+    async def resolve(self, device_id: str, refresh: bool = False) -> DisplayMetrics:
+        """
+        获取当前方向的显示参数，未缓存时查询 wm size / wm density
+
+        Args:
+            device_id: 设备 ID
+            refresh: 忽略缓存重新查询
+
+        Raises:
+            AdbError: adb 查询失败或输出无法解析
+        """
+        if refresh:
+            self.invalidate(device_id)
+
+        metrics = self.get(device_id)
+        if metrics is not None:
+            return metrics
+
+        pending = self._pending.get(device_id)
+        if pending is None:
+            pending = asyncio.ensure_future(self._query(device_id))
+            self._pending[device_id] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(device_id, None))
+
+        await asyncio.shield(pending)
+
+        metrics = self.get(device_id)
+        if metrics is None:
+            raise AdbError(f"Failed to resolve display metrics for {device_id}")
+
+        return metrics
+
+    async def _query(self, device_id: str):
+        output = await self.adb.shell(device_id, "wm size; wm density")
+        size, density = parse_wm_output(output)
+
+        if size is None:
+            raise AdbError(f"Failed to parse wm size output: {output.strip()}")
+
+        self._natural[device_id] = (size[0], size[1], density)
+
+        # 已有的方向条目用新的分辨率重建（保留视频尺寸）
+        for key in [key for key in self._entries if key[0] == device_id]:
+            self._build_entry(device_id, key[1])
+
+    def _build_entry(self, device_id: str, orientation: str) -> Optional[DisplayMetrics]:
+        natural = self._natural.get(device_id)
+        if natural is None:
+            return None
+
+        width, height, density = natural
+        if orientation_of(width, height) != orientation:
+            width, height = height, width
+
+        entry = DisplayMetrics(
+            device_id=device_id,
+            orientation=orientation,
+            width=width,
+            height=height,
+            density=density,
+        )
+
+        existing = self._entries.get((device_id, orientation))
+        if existing is not None:
+            entry.video_width = existing.video_width
+            entry.video_height = existing.video_height
+
+        self._entries[(device_id, orientation)] = entry
+
+        return entry
+
+    def update_from_stream(self, device_id: str, video_width: int, video_height: int):
+        """
+        视频流报告了尺寸（元数据头或新的 SPS）
+
+        方向变化时切换当前方向；同一方向上尺寸变化说明显示设置变了，缓存失效。
+        """
+        if video_width <= 0 or video_height <= 0:
+            return
+
+        orientation = orientation_of(video_width, video_height)
+        entry = self._entries.get((device_id, orientation))
+
+        if entry and entry.video_width and (entry.video_width, entry.video_height) != (video_width, video_height):
+            print(
+                f"[DisplayMetricsCache] {device_id}: video size changed to "
+                f"{video_width}x{video_height}, invalidating"
+            )
+            self.invalidate(device_id)
+            entry = None
+
+        self._orientation[device_id] = orientation
+
+        if entry is None:
+            entry = self._build_entry(device_id, orientation)
+
+        if entry is not None:
+            entry.video_width = video_width
+            entry.video_height = video_height
+            entry.updated_at = time.time()
+        else:
+            # wm size 尚未查询：先记录视频尺寸，查询后补全
+            self._entries[(device_id, orientation)] = DisplayMetrics(
+                device_id=device_id,
+                orientation=orientation,
+                width=0,
+                height=0,
+                video_width=video_width,
+                video_height=video_height,
+            )
+
+    def invalidate(self, device_id: str):
+        """清除设备的所有缓存"""
+        self._natural.pop(device_id, None)
+
+        for key in [key for key in self._entries if key[0] == device_id]:
+            del self._entries[key]
+
+    def handle_device_change(
+        self, device_id: str, old_state: Optional[str], new_state: Optional[str]
+    ):
+        """设备断开时清除缓存（DeviceRegistry 监听者）"""
+        if new_state != "device":
+            self.invalidate(device_id)
+            self._orientation.pop(device_id, None)
+
+    def describe(self) -> List[dict]:
+        """所有已缓存设备的当前显示参数"""
+        devices = dict.fromkeys([key[0] for key in self._entries] + list(self._natural))
+
+        return [
+            metrics.to_dict()
+            for metrics in (self.get(device_id) for device_id in devices)
+            if metrics is not None
+        ]
+
+
+_default_cache: Optional[DisplayMetricsCache] = None
+
+
+def get_display_cache() -> DisplayMetricsCache:
+    """获取进程内共享的显示参数缓存"""
+    global _default_cache
+
+    if _default_cache is None:
+        _default_cache = DisplayMetricsCache()
+
+    return _default_cache
@@ -0,0 +1,317 @@
+"""
+FakeAdbServer - 本地伪 adb server
+
+实现 AdbClient 使用到的 adb server 协议子集，用于在没有真机 / adb 的环境下测试：
+- host:version / host:devices / host:devices-l / host:track-devices(-l)
+- host:transport:<serial> / host:transport-any
+- host-serial:<serial>:forward / killforward
+- shell:<command>（一次性）与 shell,raw:（常驻会话）
+- sync: STAT / SEND / QUIT
+
+shell 命令交给 shell_handler(serial, command) 处理，返回输出文本，
+或 (输出文本, 退出码)（只有常驻会话能拿到退出码）。
+
+模拟故障：
+- raw_shell=False：不支持 shell,raw:（AdbClient 退回一次性 shell）
+- drop_sessions_on：执行这些命令后、写出结束标记前断开常驻会话（模拟连接不稳定）
+
+示例：
+    >>> server = FakeAdbServer(devices={"emulator-5554": "device"})
+    >>> await server.start()
+    >>> adb = AdbClient(port=server.port)
+    >>> await adb.shell("emulator-5554", "wm size")
+    >>> server.commands
+    [('emulator-5554', 'wm size')]
+"""
+
+import asyncio
+import re
+import struct
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+
+ShellHandler = Callable[[str, str], Union[str, Tuple[str, int]]]
+
+# AdbClient 常驻会话的命令格式：{ <command>; } 2>&1; echo <marker>$?
+_SESSION_LINE = re.compile(r"^\{ (?P<command>.*); \} 2>&1; echo (?P<marker>\S+)\$\?$")
+
+
+def _default_shell_handler(serial: str, command: str) -> Union[str, Tuple[str, int]]:
+    if ";" in command:
+        return "".join(_output(_default_shell_handler(serial, part.strip()))[0] for part in command.split(";"))
+    if command == "false":
+        return "", 1
+    if command.startswith("echo "):
+        return command[5:] + "\n"
+    if command == "wm size":
+        return "Physical size: 1080x2400\n"
+    if command == "wm density":
+        return "Physical density: 420\n"
+    return ""
+
+
+def _output(result: Union[str, Tuple[str, int]]) -> Tuple[str, int]:
+    """shell_handler 的返回值 → (输出文本, 退出码)"""
+    if isinstance(result, tuple):
+        return result
+    return result, 0
+
+
+class FakeAdbServer:
+    """本地伪 adb server（asyncio）"""
+
+    def __init__(
+        self,
+        devices: Optional[Dict[str, str]] = None,
+        shell_handler: Optional[ShellHandler] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        raw_shell: bool = True,
+    ):
+        """
+        初始化伪 server
+
+        Args:
+            devices: 设备序列号 → 状态（device / offline / unauthorized）
+            shell_handler: shell 命令处理函数，返回命令输出或 (输出, 退出码)
+            host: 监听地址
+            port: 监听端口，0 表示随机分配
+            raw_shell: 是否支持 shell,raw: 常驻会话
+        """
+        self.devices: Dict[str, str] = dict(devices or {"emulator-5554": "device"})
+        self.shell_handler = shell_handler or _default_shell_handler
+        self.host = host
+        self.port = port
+        self.raw_shell = raw_shell
+
+        # 执行后断开常驻会话（不写结束标记）的命令
+        self.drop_sessions_on: Set[str] = set()
+
+        # 记录收到的请求，便于断言
+        self.commands: List[Tuple[str, str]] = []
+        self.forwards: Dict[str, Tuple[str, str]] = {}
+        self.files: Dict[Tuple[str, str], bytes] = {}
+        self.connection_count = 0
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._trackers: Set[asyncio.StreamWriter] = set()
+        self._handlers: Set[asyncio.Task] = set()
+
+    async def start(self) -> "FakeAdbServer":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+
+        # 断开仍在进行的连接（常驻 shell 会话、track-devices）
+        for task in list(self._handlers):
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+        if self._server:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "FakeAdbServer":
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    def set_device(self, serial: str, state: Optional[str]):
+        """
+        修改设备状态并通知 track-devices 连接
+
+        Args:
+            serial: 设备序列号
+            state: 新状态，None 表示断开
+        """
+        if state is None:
+            self.devices.pop(serial, None)
+        else:
+            self.devices[serial] = state
+
+        for writer in list(self._trackers):
+            self._write_string(writer, self._device_list(long=getattr(writer, "_long", False)))
+
+    # ------------------------------------------------------------------
+    # 协议处理
+    # ------------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connection_count += 1
+        serial: Optional[str] = None
+
+        task = asyncio.current_task()
+        if task:
+            self._handlers.add(task)
+
+        try:
+            while True:
+                length = int(await reader.readexactly(4), 16)
+                service = (await reader.readexactly(length)).decode("utf-8")
+
+                if service.startswith("host:transport"):
+                    serial = self._select_device(service)
+                    if serial is None:
+                        self._fail(writer, "device not found")
+                        return
+                    writer.write(b"OKAY")
+                    continue
+
+                if serial is not None:
+                    await self._handle_local(serial, service, reader, writer)
+                else:
+                    await self._handle_host(service, reader, writer)
+                return
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError, asyncio.CancelledError):
+            pass
+        finally:
+            if task:
+                self._handlers.discard(task)
+            self._trackers.discard(writer)
+            writer.close()
+
+    def _select_device(self, service: str) -> Optional[str]:
+        online = [serial for serial, state in self.devices.items() if state == "device"]
+
+        if service == "host:transport-any":
+            return online[0] if len(online) == 1 else None
+
+        serial = service.split(":", 2)[2]
+        return serial if serial in online else None
+
+    async def _handle_host(self, service: str, reader, writer):
+        if service == "host:version":
+            writer.write(b"OKAY")
+            self._write_string(writer, "0029")
+        elif service in ("host:devices", "host:devices-l"):
+            writer.write(b"OKAY")
+            self._write_string(writer, self._device_list(long=service.endswith("-l")))
+        elif service in ("host:track-devices", "host:track-devices-l"):
+            writer.write(b"OKAY")
+            writer._long = service.endswith("-l")  # type: ignore[attr-defined]
+            self._trackers.add(writer)
+            self._write_string(writer, self._device_list(long=writer._long))  # type: ignore[attr-defined]
+            # 保持连接直到客户端断开
+            await reader.read()
+        elif service.startswith("host-serial:"):
+            _, serial, command = service.split(":", 2)
+            if self.devices.get(serial) != "device":
+                self._fail(writer, f"device '{serial}' not found")
+            elif command.startswith("forward:"):
+                spec = command[len("forward:"):]
+                if spec.startswith("norebind:"):
+                    spec = spec[len("norebind:"):]
+                local, remote = spec.split(";", 1)
+                self.forwards[local] = (serial, remote)
+                writer.write(b"OKAYOKAY")
+            elif command.startswith("killforward:"):
+                local = command[len("killforward:"):]
+                if self.forwards.pop(local, None) is None:
+                    self._fail(writer, f"listener '{local}' not found")
+                else:
+                    writer.write(b"OKAYOKAY")
+            else:
+                self._fail(writer, f"unknown host service: {command}")
+        else:
+            self._fail(writer, f"unknown host service: {service}")
+
+        await writer.drain()
+
+    async def _handle_local(self, serial: str, service: str, reader, writer):
+        if service == "shell,raw:" and self.raw_shell:
+            writer.write(b"OKAY")
+            await self._interactive_shell(serial, reader, writer)
+        elif service.startswith("shell:"):
+            writer.write(b"OKAY")
+            output, _ = self._run(serial, service[len("shell:"):])
+            writer.write(output.encode("utf-8"))
+        elif service == "sync:":
+            writer.write(b"OKAY")
+            await self._sync(serial, reader, writer)
+        else:
+            self._fail(writer, f"unknown local service: {service}")
+
+        await writer.drain()
+
+    async def _interactive_shell(self, serial: str, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+
+            match = _SESSION_LINE.match(line.decode("utf-8").rstrip("\n"))
+            if not match:
+                continue
+
+            command = match.group("command")
+            output, exit_code = self._run(serial, command)
+
+            if command in self.drop_sessions_on:
+                # 命令已执行，结束标记还没有写出
+                writer.write(output.encode("utf-8"))
+                await writer.drain()
+                return
+
+            writer.write(f"{output}{match.group('marker')}{exit_code}\n".encode("utf-8"))
+            await writer.drain()
+
+    async def _sync(self, serial: str, reader, writer):
+        while True:
+            command = await reader.readexactly(4)
+            length = struct.unpack("<I", await reader.readexactly(4))[0]
+
+            if command == b"QUIT":
+                return
+
+            payload = (await reader.readexactly(length)).decode("utf-8")
+
+            if command == b"STAT":
+                data = self.files.get((serial, payload))
+                if data is None:
+                    writer.write(b"STAT" + struct.pack("<III", 0, 0, 0))
+                else:
+                    writer.write(b"STAT" + struct.pack("<III", 0o100644, len(data), 0))
+            elif command == b"SEND":
+                path = payload.rsplit(",", 1)[0]
+                chunks = []
+                while True:
+                    kind = await reader.readexactly(4)
+                    size = struct.unpack("<I", await reader.readexactly(4))[0]
+                    if kind == b"DONE":
+                        break
+                    chunks.append(await reader.readexactly(size))
+                self.files[(serial, path)] = b"".join(chunks)
+                writer.write(b"OKAY" + struct.pack("<I", 0))
+            else:
+                message = f"unknown sync command: {command!r}".encode("utf-8")
+                writer.write(b"FAIL" + struct.pack("<I", len(message)) + message)
+                return
+
+            await writer.drain()
+
+    def _run(self, serial: str, command: str) -> Tuple[str, int]:
+        self.commands.append((serial, command))
+        return _output(self.shell_handler(serial, command))
+
+    def _device_list(self, long: bool = False) -> str:
+        lines = []
+        for serial, state in self.devices.items():
+            if long:
+                lines.append(f"{serial}  {state} product:fake model:Fake_Phone device:fake")
+            else:
+                lines.append(f"{serial}\t{state}")
+        return "".join(line + "\n" for line in lines)
+
+    @staticmethod
+    def _write_string(writer: asyncio.StreamWriter, text: str):
+        data = text.encode("utf-8")
+        writer.write(b"%04x" % len(data) + data)
+
+    def _fail(self, writer: asyncio.StreamWriter, message: str):
+        writer.write(b"FAIL")
+        self._write_string(writer, message)
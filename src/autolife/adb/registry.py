@@ -0,0 +1,206 @@
+"""
+DeviceRegistry - 进程内设备注册表
+
+订阅一次 adb server 的 host:track-devices-l 流，在内存中维护
+serial → 设备信息（状态、型号）的实时映射：
+- 接口直接从内存查询设备，不再每次请求都访问 adb
+- 设备断开 / 状态变化时通知监听者（例如停止该设备的 streamer）
+- 跟踪连接断开时按退避重连，期间查询退回 host:devices
+"""
+
+import asyncio
+import inspect
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .client import AdbClient, AdbDevice, AdbError, get_adb_client, parse_devices
+
+
+# 监听者：(serial, 旧状态, 新状态)，状态为 None 表示设备不存在；可以是协程函数
+DeviceListener = Callable[[str, Optional[str], Optional[str]], object]
+
+
+class DeviceRegistry:
+    """
+    设备注册表
+
+    示例：
+        >>> registry = DeviceRegistry()
+        >>> await registry.start()
+        >>> registry.online()
+        ['emulator-5554']
+        >>> registry.add_listener(on_device_change)
+        >>> await registry.stop()
+    """
+
+    def __init__(
+        self,
+        adb: Optional[AdbClient] = None,
+        max_backoff: float = 10.0,
+    ):
+        """
+        初始化注册表
+
+        Args:
+            adb: ADB 客户端，默认使用进程内共享的 AdbClient
+            max_backoff: 跟踪连接断开后重连的最大间隔（秒）
+        """
+        self.adb = adb or get_adb_client()
+        self.max_backoff = max_backoff
+
+        # serial → 设备信息（按首次出现的顺序）
+        self.devices: Dict[str, AdbDevice] = {}
+
+        self._listeners: List[DeviceListener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    @property
+    def is_ready(self) -> bool:
+        """是否已收到 track-devices 的设备列表（且跟踪连接正常）"""
+        return self._ready.is_set()
+
+    async def start(self, timeout: float = 2.0):
+        """
+        开始跟踪设备，等待第一份设备列表
+
+        Args:
+            timeout: 等待第一份列表的最长秒数（adb server 不可用时不阻塞启动）
+        """
+        if self._task and not self._task.done():
+            return
+
+        self._task = asyncio.create_task(self._track())
+
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print("[DeviceRegistry] adb server not ready, will keep retrying in background")
+
+    async def stop(self):
+        """停止跟踪"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        self._ready.clear()
+
+    def add_listener(self, listener: DeviceListener):
+        """注册设备状态变化监听者"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: DeviceListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    # ------------------------------------------------------------------
+    # 查询（内存，O(1)）
+    # ------------------------------------------------------------------
+
+    def get(self, serial: str) -> Optional[AdbDevice]:
+        """获取设备信息，不存在时返回 None"""
+        return self.devices.get(serial)
+
+    def is_online(self, serial: str) -> bool:
+        device = self.devices.get(serial)
+        return device is not None and device.state == "device"
+
+    def online(self) -> List[str]:
+        """所有在线设备（按连接顺序）"""
+        return [serial for serial, device in self.devices.items() if device.state == "device"]
+
+    async def list_online(self) -> List[str]:
+        """
+        所有在线设备
+
+        注册表就绪时直接返回内存数据，否则退回一次 host:devices 查询。
+        """
+        if self.is_ready:
+            return self.online()
+
+        return await self.adb.online_devices()
+
+    def describe(self) -> List[dict]:
+        """所有设备的状态"""
+        return [
+            {
+                "serial": device.serial,
+                "state": device.state,
+                "model": device.model,
+            }
+            for device in self.devices.values()
+        ]
+
+    # ------------------------------------------------------------------
+    # 跟踪
+    # ------------------------------------------------------------------
+
+    async def _track(self):
+        """保持 track-devices 连接，断开后退避重连"""
+        delay = 0.5
+
+        while True:
+            try:
+                connection = await self.adb.connect()
+            except OSError as e:
+                print(f"[DeviceRegistry] Failed to connect to adb server: {e}")
+            else:
+                try:
+                    await connection.send("host:track-devices-l")
+                    print("[DeviceRegistry] Tracking devices")
+                    delay = 0.5
+
+                    while True:
+                        self._apply(parse_devices(await connection.read_string()))
+                        self._ready.set()
+                except (AdbError, ConnectionError, asyncio.IncompleteReadError) as e:
+                    print(f"[DeviceRegistry] Tracking interrupted: {e}")
+                finally:
+                    connection.close()
+
+            # 跟踪中断期间数据可能过期，查询退回 adb
+            self._ready.clear()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    def _apply(self, devices: List[AdbDevice]):
+        """用新的设备列表更新注册表，并通知变化"""
+        current = {device.serial: device for device in devices}
+        changes: List[Tuple[str, Optional[str], Optional[str]]] = []
+
+        for serial, device in current.items():
+            old = self.devices.get(serial)
+            old_state = old.state if old else None
+            if old_state != device.state:
+                changes.append((serial, old_state, device.state))
+
+        for serial, old in self.devices.items():
+            if serial not in current:
+                changes.append((serial, old.state, None))
+
+        # 保持首次出现的顺序
+        merged = {serial: current[serial] for serial in self.devices if serial in current}
+        merged.update(current)
+        self.devices = merged
+
+        for serial, old_state, new_state in changes:
+            print(f"[DeviceRegistry] {serial}: {old_state} → {new_state}")
+
+            # 设备离线后常驻 shell 会话已失效
+            if new_state != "device":
+                self.adb.close_sessions(serial)
+
+            self._notify(serial, old_state, new_state)
+
+    def _notify(self, serial: str, old_state: Optional[str], new_state: Optional[str]):
+        for listener in list(self._listeners):
+            try:
+                result = listener(serial, old_state, new_state)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                print(f"[DeviceRegistry] Listener error: {e}")
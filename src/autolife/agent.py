@@ -5,7 +5,7 @@ AutoLife Agent - 整合 AutoGLM 的智能助手
 import os
 import sys
 from pathlib import Path
-from typing import Callable, Generator
+from typing import TYPE_CHECKING, Callable, Generator, Optional
 
 from openai import OpenAI
 
@@ -17,6 +17,12 @@ from phone_agent import PhoneAgent
 from phone_agent.agent import AgentConfig, StepResult
 from phone_agent.model import ModelConfig
 
+from autolife.cancel import CancellableStream, CancelToken, TaskCancelled
+from autolife.streaming import ActionStream
+
+if TYPE_CHECKING:
+    from autolife.scrcpy.screenshot import ScreenshotProvider
+
 
 class AutoLifeAgent:
     """
@@ -77,6 +83,12 @@ class AutoLifeAgent:
         # 会话状态
         self.conversation_history = []
 
+        # 当前任务的取消令牌（见 use_cancel_token）
+        self.cancel_token: Optional[CancelToken] = None
+        # 思考过程增量回调（见 use_thinking_callback）
+        self.thinking_callback: Optional[Callable[[str], None]] = None
+        self._hooks_installed = False
+
     def run(self, task: str) -> str:
         """
         执行任务
@@ -150,6 +162,112 @@ class AutoLifeAgent:
         print(f"[助手] {final_message}")
         return final_message
 
+    def use_screenshot_provider(self, provider: "ScreenshotProvider") -> bool:
+        """
+        让 PhoneAgent 的截图优先取自实时视频流（设备没有在投屏时仍使用 screencap）
+
+        替换 phone_agent 的截图函数，原函数作为 provider 的 fallback；重复调用无副作用。
+
+        Args:
+            provider: 基于视频流的截图提供者
+
+        Returns:
+            bool: 是否找到可替换的截图函数
+        """
+        import phone_agent.agent as phone_agent_module
+
+        try:
+            from phone_agent.adb.screenshot import Screenshot
+            provider.screenshot_factory = Screenshot
+        except ImportError:
+            pass
+
+        if hasattr(phone_agent_module, "get_screenshot"):
+            # 旧版本：agent 模块直接导入 adb 的 get_screenshot
+            provider.install(phone_agent_module)
+            return True
+
+        if hasattr(phone_agent_module, "get_device_factory"):
+            # 新版本：通过设备工厂截图（替换工厂实例上的方法）
+            provider.install(phone_agent_module.get_device_factory())
+            return True
+
+        print("[AutoLifeAgent] PhoneAgent screenshot hook not found, keeping screencap")
+        return False
+
+    def use_cancel_token(self, token: Optional[CancelToken]) -> None:
+        """
+        设置当前任务的取消令牌
+
+        令牌被取消后：进行中的模型流式请求立即关闭（step 在下一个 chunk 之前退出），
+        尚未执行的设备动作直接跳过（finish 动作不操作设备，照常执行）。
+
+        Args:
+            token: 取消令牌，None 表示不可取消
+        """
+        self.cancel_token = token
+        self._install_hooks()
+
+    def use_thinking_callback(self, callback: Optional[Callable[[str], None]]) -> None:
+        """
+        设置思考过程的增量回调
+
+        模型流式输出时，思考部分的每段新文本都会传给回调（在执行 step 的线程中调用）；
+        动作块（do(...) / finish(...)）闭合后不再等待剩余的 token，PhoneAgent 随即解析并执行动作
+        （AUTOLIFE_STREAM_EARLY_ACTION=false 时关闭）。
+
+        Args:
+            callback: 回调函数，None 表示不转发
+        """
+        self.thinking_callback = callback
+        self._install_hooks()
+
+    def _install_hooks(self) -> None:
+        """包装 PhoneAgent 的模型请求和动作执行（每个实例只包装一次）"""
+        if self._hooks_installed:
+            return
+        self._hooks_installed = True
+
+        model_client = getattr(self.phone_agent, "model_client", None)
+        client = getattr(model_client, "client", None)
+
+        if client is not None:
+            completions = client.chat.completions
+            create = completions.create
+
+            def hooked_create(*args, **kwargs):
+                token = self.cancel_token
+                if token is not None:
+                    token.raise_if_cancelled()
+
+                response = create(*args, **kwargs)
+                if not kwargs.get("stream"):
+                    return response
+
+                response = ActionStream(response, on_thinking=self.thinking_callback)
+                if token is not None:
+                    response = CancellableStream(response, token)
+                return response
+
+            completions.create = hooked_create
+        else:
+            print("[AutoLifeAgent] PhoneAgent model client not found, model output is not streamed or cancellable")
+
+        action_handler = getattr(self.phone_agent, "action_handler", None)
+
+        if action_handler is not None:
+            execute = action_handler.execute
+
+            def cancellable_execute(action, *args, **kwargs):
+                token = self.cancel_token
+                if token is not None and token.cancelled and action.get("_metadata") != "finish":
+                    raise TaskCancelled(token.task_id)
+                return execute(action, *args, **kwargs)
+
+            action_handler.execute = cancellable_execute
+        else:
+            print("[AutoLifeAgent] PhoneAgent action handler not found, device actions are not cancellable")
+
     def clear_history(self) -> None:
         """清空对话历史"""
         self.conversation_history = []
@@ -0,0 +1,314 @@
+"""
+AgentPool - 按设备管理 AutoLifeAgent
+
+每台设备一个 AutoLifeAgent（各自的 PhoneAgent 和上下文），不同设备的任务并发执行，
+同一设备的任务按提交顺序排队；每个任务都有独立的状态（排队 / 执行中 / 结束）和取消令牌。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from phone_agent.agent import AgentConfig
+
+from autolife.agent import AutoLifeAgent
+from autolife.cancel import CancelToken, TaskCancelled
+
+
+# 任务状态
+TASK_QUEUED = "queued"
+TASK_RUNNING = "running"
+TASK_COMPLETED = "completed"
+TASK_CANCELLED = "cancelled"
+TASK_ERROR = "error"
+# 客户端断开等原因中止
+TASK_INTERRUPTED = "interrupted"
+
+FINISHED_STATUSES = (TASK_COMPLETED, TASK_CANCELLED, TASK_ERROR, TASK_INTERRUPTED)
+
+
+@dataclass
+class TaskState:
+    """一个任务的执行状态"""
+    task_id: str
+    device_id: str
+    text: str
+    status: str = TASK_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    # 当前（最后）步骤编号
+    step: int = 0
+    result: Optional[str] = None
+    error: Optional[str] = None
+
+    # 取消令牌（排队中的任务立即退出等待，执行中的任务中断模型请求和设备动作）
+    token: CancelToken = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.token = CancelToken(self.task_id)
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self.token.cancelled
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "task_id": self.task_id,
+            "device_id": self.device_id,
+            "text": self.text,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "step": self.step,
+            "result": self.result,
+            "error": self.error,
+            "cancel_requested": self.cancel_requested,
+        }
+
+
+def default_agent_factory(device_id: str) -> AutoLifeAgent:
+    """为设备创建 AutoLifeAgent（模型配置读取环境变量）"""
+    return AutoLifeAgent(agent_config=AgentConfig(device_id=device_id))
+
+
+class AgentPool:
+    """
+    设备 → AutoLifeAgent 池
+
+    示例：
+        >>> pool = AgentPool()
+        >>> state = await pool.acquire("task-1", "emulator-5554", "打开设置")
+        >>> agent = pool.get_agent(state.device_id)
+        >>> try:
+        ...     result = await loop.run_in_executor(None, agent.run, state.text)
+        ... finally:
+        ...     pool.release(state, TASK_COMPLETED, result=result)
+    """
+
+    def __init__(
+        self,
+        agent_factory: Callable[[str], AutoLifeAgent] = default_agent_factory,
+        max_finished: int = 200,
+        max_pending_cancels: int = 100,
+        pending_cancel_ttl: float = 600,
+    ):
+        """
+        Args:
+            agent_factory: 为设备创建 agent 的函数
+            max_finished: 保留多少个已结束任务的状态
+            max_pending_cancels: 记住多少个尚未开始的任务的取消请求
+            pending_cancel_ttl: 尚未开始的任务的取消请求保留多久（秒）
+        """
+        self.agent_factory = agent_factory
+        self.max_finished = max_finished
+        self.max_pending_cancels = max_pending_cancels
+        self.pending_cancel_ttl = pending_cancel_ttl
+
+        # 设备 ID → agent
+        self.agents: Dict[str, AutoLifeAgent] = {}
+
+        # 任务 ID → 状态（按提交顺序）
+        self.tasks: "OrderedDict[str, TaskState]" = OrderedDict()
+
+        # 设备 ID → 锁（asyncio.Lock 按等待顺序唤醒，即同一设备 FIFO）
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        # 任务开始前就收到的取消请求：任务 ID → 请求时间（有数量上限和有效期）
+        self._pending_cancels: "OrderedDict[str, float]" = OrderedDict()
+
+        # 设备让出后的回调（例如唤醒调度器）
+        self._release_listeners: List[Callable[[TaskState], None]] = []
+
+    def add_release_listener(self, listener: Callable[[TaskState], None]):
+        """
+        注册设备让出回调
+
+        任务被取消时步骤可能仍在线程中执行，设备要等步骤结束才让出（稍后在事件循环中调用 release），
+        等待设备的调度器需要在这时被唤醒。
+        """
+        self._release_listeners.append(listener)
+
+    def remove_release_listener(self, listener: Callable[[TaskState], None]):
+        if listener in self._release_listeners:
+            self._release_listeners.remove(listener)
+
+    def get_agent(self, device_id: str) -> AutoLifeAgent:
+        """设备的 agent，不存在时创建"""
+        agent = self.agents.get(device_id)
+        if agent is None:
+            agent = self.agent_factory(device_id)
+            self.agents[device_id] = agent
+        return agent
+
+    def get_task(self, task_id: str) -> Optional[TaskState]:
+        return self.tasks.get(task_id)
+
+    def list_tasks(self, device_id: Optional[str] = None) -> List[TaskState]:
+        return [
+            state for state in self.tasks.values()
+            if device_id is None or state.device_id == device_id
+        ]
+
+    def running_task(self, device_id: str) -> Optional[TaskState]:
+        """设备上正在执行的任务"""
+        for state in self.tasks.values():
+            if state.device_id == device_id and state.status == TASK_RUNNING:
+                return state
+        return None
+
+    def queue_position(self, task_id: str) -> int:
+        """任务前面还有几个任务（执行中的任务计入），不在排队时返回 0"""
+        state = self.tasks.get(task_id)
+        if state is None or state.status != TASK_QUEUED:
+            return 0
+
+        position = 0
+        for other in self.tasks.values():
+            if other is state:
+                break
+            if other.device_id == state.device_id and other.status in (TASK_QUEUED, TASK_RUNNING):
+                position += 1
+        return position
+
+    def is_cancelled(self, task_id: str) -> bool:
+        state = self.tasks.get(task_id)
+        return state is not None and state.cancel_requested
+
+    def get_token(self, task_id: str) -> Optional[CancelToken]:
+        state = self.tasks.get(task_id)
+        return state.token if state else None
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        请求取消任务：排队中的任务立即结束；执行中的任务中断进行中的模型流式请求，
+        跳过尚未执行的设备动作（由 agent 在工作线程中检查令牌）
+
+        Returns:
+            bool: 任务是否存在（不存在时记住请求，任务随后开始时直接取消）
+        """
+        state = self.tasks.get(task_id)
+        if state is None:
+            self._remember_cancel(task_id)
+            return False
+
+        if not state.is_finished:
+            state.token.cancel()
+        return True
+
+    async def acquire(self, task_id: str, device_id: str, text: str) -> TaskState:
+        """
+        登记任务并等待设备空闲（同一设备按提交顺序）
+
+        Returns:
+            TaskState: 状态为 running，结束后必须调用 release()
+
+        Raises:
+            ValueError: 同一任务 ID 正在排队或执行
+            TaskCancelled: 排队期间被取消
+        """
+        existing = self.tasks.get(task_id)
+        if existing and not existing.is_finished:
+            raise ValueError(f"Task {task_id} is already {existing.status}")
+
+        state = TaskState(task_id=task_id, device_id=device_id, text=text)
+        self.tasks.pop(task_id, None)
+        self.tasks[task_id] = state
+        self._prune()
+
+        requested_at = self._pending_cancels.pop(task_id, None)
+        if requested_at is not None and time.time() - requested_at <= self.pending_cancel_ttl:
+            state.token.cancel()
+
+        lock = self._locks.setdefault(device_id, asyncio.Lock())
+
+        if not state.cancel_requested:
+            acquiring = asyncio.ensure_future(lock.acquire())
+            cancelled = asyncio.ensure_future(state.token.wait())
+
+            try:
+                await asyncio.wait({acquiring, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+            except BaseException:
+                # 等待者自身被取消（例如客户端断开）
+                cancelled.cancel()
+                if acquiring.done() and not acquiring.cancelled():
+                    lock.release()
+                else:
+                    acquiring.cancel()
+                state.status = TASK_INTERRUPTED
+                state.ended_at = time.time()
+                raise
+
+            cancelled.cancel()
+            acquired = acquiring.done() and not acquiring.cancelled()
+            if not acquired:
+                acquiring.cancel()
+            elif not state.cancel_requested:
+                state.status = TASK_RUNNING
+                state.started_at = time.time()
+                return state
+            else:
+                # 拿到锁的同时被取消：交还设备
+                lock.release()
+
+        state.status = TASK_CANCELLED
+        state.ended_at = time.time()
+        raise TaskCancelled(task_id)
+
+    def release(
+        self,
+        state: TaskState,
+        status: str,
+        result: Optional[str] = None,
+        error: Optional[str] = None,
+    ):
+        """记录任务结果并让出设备（同步，可在回调中调用）"""
+        if state.status != TASK_RUNNING:
+            return
+
+        state.status = status
+        state.result = result
+        state.error = error
+        state.ended_at = time.time()
+        state.token.clear_callbacks()
+
+        lock = self._locks.get(state.device_id)
+        if lock and lock.locked():
+            lock.release()
+
+        for listener in list(self._release_listeners):
+            try:
+                listener(state)
+            except Exception as e:
+                print(f"[AgentPool] Release listener error: {e}")
+
+    def describe(self) -> dict:
+        return {
+            "agents": list(self.agents),
+            "tasks": [state.to_dict() for state in self.tasks.values() if not state.is_finished],
+        }
+
+    def _remember_cancel(self, task_id: str):
+        """记住尚未开始的任务的取消请求（丢弃过期和最早的请求）"""
+        now = time.time()
+        self._pending_cancels.pop(task_id, None)
+        self._pending_cancels[task_id] = now
+
+        while self._pending_cancels:
+            oldest_id, requested_at = next(iter(self._pending_cancels.items()))
+            if len(self._pending_cancels) <= self.max_pending_cancels and now - requested_at <= self.pending_cancel_ttl:
+                break
+            del self._pending_cancels[oldest_id]
+
+    def _prune(self):
+        """只保留最近 max_finished 个已结束任务"""
+        finished = [task_id for task_id, state in self.tasks.items() if state.is_finished]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.tasks[task_id]
@@ -1,22 +1,30 @@
 """
 FastAPI 依赖注入
-提供 AutoLifeAgent 单例实例
+提供按设备管理 AutoLifeAgent 的 AgentPool
 """
 import sys
 from pathlib import Path
-from functools import lru_cache
+
+from fastapi import Request
 
 # 添加 AutoGLM 到 sys.path
 AUTOGLM_PATH = Path(__file__).parent.parent.parent.parent / "Open-AutoGLM"
 sys.path.insert(0, str(AUTOGLM_PATH))
 
-from autolife.agent import AutoLifeAgent
+from autolife.agent_pool import AgentPool
 
 
-@lru_cache()
-def get_agent() -> AutoLifeAgent:
+def get_agent_pool(request: Request) -> AgentPool:
     """
-    获取 AutoLifeAgent 单例
-    使用 lru_cache 确保整个应用生命周期中只创建一个实例
+    获取全局 AgentPool
+
+    每台设备一个 AutoLifeAgent，不同设备的任务并发执行，同一设备的任务排队
     """
-    return AutoLifeAgent()
+    return agent_pool_for(request.app)
+
+
+def agent_pool_for(app) -> AgentPool:
+    """获取应用的 AgentPool（不在请求中时使用，例如任务调度器）"""
+    if not hasattr(app.state, 'agent_pool'):
+        app.state.agent_pool = AgentPool()
+    return app.state.agent_pool
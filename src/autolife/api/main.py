@@ -8,15 +8,47 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent.parent.parent / ".env"
 load_dotenv(env_path)
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import health, agent, scrcpy
+from autolife.adb.display import get_display_cache
+from .routes import health, agent, scrcpy, recordings, tasks
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    应用生命周期
+
+    启动时开始跟踪 adb 设备，设备断开时停止对应的 streamer 并清除显示参数缓存和缩略图，
+    然后启动任务调度器（继续执行上次排队和中断的任务）；
+    关闭时停止任务调度器、缩略图服务、截图解码器和所有 streamer。
+    """
+    registry = scrcpy.get_registry(app)
+    pool = scrcpy.get_pool(app)
+
+    registry.add_listener(pool.handle_device_change)
+    registry.add_listener(get_display_cache().handle_device_change)
+    registry.add_listener(scrcpy.get_thumbnail_service(app).handle_device_change)
+    await registry.start()
+    await tasks.get_scheduler(app).start()
+
+    yield
+
+    await tasks.get_scheduler(app).stop()
+    await scrcpy.get_thumbnail_service(app).stop()
+    await scrcpy.get_screenshot_provider(app).stop()
+    await pool.stop_all()
+    await registry.stop()
+
 
 # 创建 FastAPI 应用
 app = FastAPI(
     title="AutoLife API",
     description="AutoLife 智能助手 REST API",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
 # 配置 CORS
@@ -37,6 +69,8 @@ app.add_middleware(
 app.include_router(health.router)
 app.include_router(agent.router)
 app.include_router(scrcpy.router)
+app.include_router(recordings.router)
+app.include_router(tasks.router)
 
 
 @app.get("/")
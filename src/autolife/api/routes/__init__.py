@@ -2,6 +2,6 @@
 路由模块
 导出所有可用的路由
 """
-from . import health, agent, scrcpy
+from . import health, agent, scrcpy, recordings, tasks
 
-__all__ = ["health", "agent", "scrcpy"]
+__all__ = ["health", "agent", "scrcpy", "recordings", "tasks"]
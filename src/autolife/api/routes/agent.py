@@ -1,47 +1,22 @@
 """
 Agent 路由
-处理任务执行请求
+处理任务执行请求（任务由任务调度器执行，SSE 只是任务事件日志的视图）
 """
-import os
-import json
-import asyncio
-from typing import Dict, Set
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
 from pydantic import BaseModel
 
-from autolife.agent import AutoLifeAgent
-from autolife.api.dependencies import get_agent
+from autolife.agent_pool import TASK_COMPLETED, AgentPool
+from autolife.api.dependencies import get_agent_pool
 from autolife.api.models import ApiResponse
+from autolife.api.routes.tasks import event_stream, get_scheduler, resume_after, submit_task
 
 router = APIRouter(prefix="/api/agent", tags=["agent"])
 
-# 是否启用模拟模式（用于测试）
-MOCK_MODE = os.getenv("AUTOLIFE_MOCK_MODE", "false").lower() == "true"
-
-# 任务取消管理
-_cancelled_tasks: Set[str] = set()  # 已取消的任务ID集合
-_current_task_id: str | None = None  # 当前正在执行的任务ID
-
-
-def is_task_cancelled(task_id: str) -> bool:
-    """检查任务是否已被取消"""
-    return task_id in _cancelled_tasks
-
-
-def cancel_task(task_id: str) -> bool:
-    """取消指定任务"""
-    _cancelled_tasks.add(task_id)
-    return True
-
-
-def clear_cancelled_task(task_id: str):
-    """清理已取消的任务记录"""
-    _cancelled_tasks.discard(task_id)
-
 
 class RunRequest(BaseModel):
     task: str
+    deviceId: Optional[str] = None
 
 
 class RunResult(BaseModel):
@@ -53,218 +28,98 @@ class CancelRequest(BaseModel):
 
 
 @router.post("/cancel", response_model=ApiResponse)
-async def cancel_running_task(request: CancelRequest):
+async def cancel_running_task(
+    request: CancelRequest,
+    http_request: Request,
+    agent_pool: AgentPool = Depends(get_agent_pool),
+):
     """
-    取消正在执行的任务
+    取消任务：排队中的任务立即结束，执行中的任务立即中断模型请求并跳过尚未执行的设备动作
     """
-    global _current_task_id
-
     task_id = request.taskId
+    if not get_scheduler(http_request.app).cancel(task_id):
+        agent_pool.cancel(task_id)
 
-    # 标记任务为已取消
-    cancel_task(task_id)
+    return ApiResponse(success=True, data={"message": f"任务 {task_id} 已标记为取消"})
 
-    # 如果是当前任务，也标记
-    if _current_task_id == task_id:
-        _current_task_id = None
 
-    return ApiResponse(success=True, data={"message": f"任务 {task_id} 已标记为取消"})
+@router.get("/tasks", response_model=ApiResponse)
+async def list_tasks(
+    device_id: Optional[str] = Query(None, description="设备 ID，默认返回所有设备"),
+    agent_pool: AgentPool = Depends(get_agent_pool),
+):
+    """列出任务状态（排队中、执行中和最近结束的任务）"""
+    return ApiResponse(success=True, data={
+        "tasks": [
+            {**state.to_dict(), "queue_position": agent_pool.queue_position(state.task_id)}
+            for state in agent_pool.list_tasks(device_id)
+        ]
+    })
+
+
+@router.get("/tasks/{task_id}", response_model=ApiResponse)
+async def get_task(task_id: str, agent_pool: AgentPool = Depends(get_agent_pool)):
+    """
+    单个任务的状态
+
+    Raises:
+        HTTPException: 任务不存在（404）
+    """
+    state = agent_pool.get_task(task_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+
+    return ApiResponse(success=True, data={
+        **state.to_dict(), "queue_position": agent_pool.queue_position(task_id)
+    })
 
 
 @router.post("/run", response_model=ApiResponse[RunResult])
-async def run_task(
-    request: RunRequest,
-    agent: AutoLifeAgent = Depends(get_agent)
-):
+async def run_task(request: RunRequest, http_request: Request):
     """
-    执行任务
+    执行任务并等待结果（经任务队列执行，同一设备上已有任务时排队等待）
     """
-    try:
-        if MOCK_MODE:
-            result = f"[模拟模式] 已收到任务：{request.task}"
-        else:
-            result = agent.run(request.task)
-        return ApiResponse(success=True, data=RunResult(result=result))
-    except Exception as e:
-        return ApiResponse(success=False, error=str(e))
+    scheduler = get_scheduler(http_request.app)
+    submitted = submit_task(scheduler, request.task, device_id=request.deviceId)
+    record = await scheduler.wait(submitted.task_id)
+
+    if record is None:
+        return ApiResponse(success=False, error=f"任务 {submitted.task_id} 不存在")
+    if record.status != TASK_COMPLETED:
+        return ApiResponse(success=False, error=record.error or f"任务已{record.status}")
+    return ApiResponse(success=True, data=RunResult(result=record.result or ""))
 
 
 @router.get("/stream")
 async def stream_task(
+    request: Request,
     taskId: str,
     text: str,
-    agent: AutoLifeAgent = Depends(get_agent)
+    device_id: Optional[str] = Query(None, description="设备 ID，默认为 PHONE_AGENT_DEVICE_ID 或任意空闲设备"),
+    record: Optional[bool] = Query(None, description="是否录制设备画面，默认读取 AUTOLIFE_RECORD_TASKS"),
+    priority: int = Query(0, description="优先级，数值越大越先执行"),
+    last_event_id: Optional[str] = Header(None),
+    lastEventId: Optional[int] = Query(None, ge=0, description="从该事件 ID 之后继续（优先于 Last-Event-ID 请求头）"),
 ):
     """
     流式执行任务
-    """
-    global _current_task_id
-
-    async def event_generator():
-        global _current_task_id
-
-        # 设置当前任务ID
-        _current_task_id = taskId
-
-        # 发送任务开始事件
-        yield f"event: task_start\ndata: {json.dumps({'taskId': taskId})}\n\n"
-
-        try:
-            # 检查任务是否在开始前就被取消了
-            if is_task_cancelled(taskId):
-                yield f"event: task_cancelled\ndata: {json.dumps({'taskId': taskId, 'message': '任务已取消'})}\n\n"
-                clear_cancelled_task(taskId)
-                return
 
-            if MOCK_MODE:
-                # 模拟模式：返回模拟响应
-                await asyncio.sleep(1)  # 模拟处理延迟
+    任务不存在时提交到任务队列，然后以 SSE 发送任务的事件日志：
+    断开连接不会中止任务，用同一个 taskId 重新连接不会重新执行，
+    带 Last-Event-ID（EventSource 自动重连时发送）只发送之后的事件，否则从头重放。
+    同一设备上已有任务时先收到 task_queued 事件（带排队位置）。
 
-                # 模拟步骤
-                yield f"event: step_start\ndata: {json.dumps({'taskId': taskId, 'stepNumber': 1})}\n\n"
-                await asyncio.sleep(0.5)
-
-                yield f"event: thinking\ndata: {json.dumps({'taskId': taskId, 'stepNumber': 1, 'thinking': f'正在分析任务：{text}'})}\n\n"
-                await asyncio.sleep(0.5)
-
-                yield f"event: action\ndata: {json.dumps({'taskId': taskId, 'stepNumber': 1, 'action': {'action': 'Launch', 'app': '小红书', 'description': '打开小红书应用'}})}\n\n"
-                await asyncio.sleep(0.5)
-
-                yield f"event: step_complete\ndata: {json.dumps({'taskId': taskId, 'stepNumber': 1, 'result': '已完成步骤 1', 'duration': 1500})}\n\n"
-
-                # 发送任务完成事件
-                result = f"[模拟模式] 任务「{text}」已完成！这是一个模拟响应，用于测试前后端通信。"
-                yield f"event: task_complete\ndata: {json.dumps({'taskId': taskId, 'message': result})}\n\n"
-            else:
-                # 真实模式：流式执行，逐步返回步骤信息
-                loop = asyncio.get_running_loop()
-                step_number = 0
-                final_message = "任务完成"
-
-                # 重置 agent 状态
-                agent.phone_agent.reset()
-
-                # 第一步（带任务描述）
-                step_number = 1
-
-                # 立即发送步骤开始事件（不带 action，让前端立即显示"处理中..."）
-                yield f"event: step_start\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number})}\n\n"
-
-                # 执行步骤（获取 AI 决策和执行结果）
-                result = await loop.run_in_executor(
-                    None, agent.phone_agent.step, text
-                )
-
-                # 构建 action 数据并发送
-                if result.action:
-                    action_data = {
-                        'action': result.action.get('action', 'Unknown'),
-                        'description': result.action.get('message', str(result.action)),
-                        **{k: v for k, v in result.action.items() if k not in ['_metadata', 'action', 'message']}
-                    }
-                    yield f"event: action\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number, 'action': action_data})}\n\n"
-
-                # 发送思考过程
-                if result.thinking:
-                    yield f"event: thinking\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number, 'thinking': result.thinking})}\n\n"
-
-                # 发送步骤完成
-                yield f"event: step_complete\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number, 'result': result.message or '步骤完成'})}\n\n"
-
-                # 检查任务是否被取消
-                if is_task_cancelled(taskId):
-                    yield f"event: task_cancelled\ndata: {json.dumps({'taskId': taskId, 'message': '任务已取消'})}\n\n"
-                    clear_cancelled_task(taskId)
-                    _current_task_id = None
-                    return
-
-                # Collect steps for report generation
-                steps_summary_list = []
-                if result.thinking:
-                    steps_summary_list.append(f"Step {step_number} Thinking: {result.thinking}")
-                if result.action:
-                    steps_summary_list.append(f"Step {step_number} Action: {result.action.get('message', str(result.action))}")
-
-                # 检查是否已完成
-                if result.finished:
-                    final_message = result.message or "任务完成"
-                    # 任务在第一步就完成，也需要生成报告
-                else:
-                    # 后续步骤循环
-                    max_steps = 100
-                    while not result.finished and agent.phone_agent.step_count < max_steps:
-                        # 检查任务是否被取消
-                        if is_task_cancelled(taskId):
-                            yield f"event: task_cancelled\ndata: {json.dumps({'taskId': taskId, 'message': '任务已取消'})}\n\n"
-                            clear_cancelled_task(taskId)
-                            _current_task_id = None
-                            return
-
-                        step_number += 1
-
-                        # 立即发送步骤开始事件（不带 action，让前端立即显示"处理中..."）
-                        yield f"event: step_start\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number})}\n\n"
-
-                        # 执行步骤（获取 AI 决策和执行结果）
-                        result = await loop.run_in_executor(
-                            None, agent.phone_agent.step, None
-                        )
-
-                        # 构建 action 数据并发送
-                        if result.action:
-                            action_data = {
-                                'action': result.action.get('action', 'Unknown'),
-                                'description': result.action.get('message', str(result.action)),
-                                **{k: v for k, v in result.action.items() if k not in ['_metadata', 'action', 'message']}
-                            }
-                            yield f"event: action\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number, 'action': action_data})}\n\n"
-
-                        # 发送思考过程
-                        if result.thinking:
-                            yield f"event: thinking\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number, 'thinking': result.thinking})}\n\n"
-
-                        # 发送步骤完成
-                        yield f"event: step_complete\ndata: {json.dumps({'taskId': taskId, 'stepNumber': step_number, 'result': result.message or '步骤完成'})}\n\n"
-
-                        # Collect step info for report (包含 thinking 和 action)
-                        if result.thinking:
-                            steps_summary_list.append(f"Step {step_number} Thinking: {result.thinking}")
-                        if result.action:
-                            steps_summary_list.append(f"Step {step_number} Action: {result.action.get('message', str(result.action))}")
-
-                        if result.finished:
-                            final_message = result.message or "任务完成"
-                            break
-
-                    if not result.finished and not is_task_cancelled(taskId):
-                        final_message = "已达到最大步数限制"
-
-                # Generate task report (无论是第一步完成还是多步完成)
-                try:
-                    # 添加最终结果消息到摘要
-                    if final_message:
-                        steps_summary_list.append(f"Final Result: {final_message}")
-
-                    steps_summary = "\n".join(steps_summary_list)  # 传递完整摘要
-                    report = await loop.run_in_executor(
-                        None, agent.generate_task_report, text, steps_summary
-                    )
-                    yield f"event: task_result\ndata: {json.dumps({'taskId': taskId, 'report': report}, ensure_ascii=False)}\n\n"
-                except Exception as e:
-                    print(f"Failed to generate task report: {e}")
-                    # Don't fail the task if report generation fails
+    step_start / step_complete 事件带有墙上时钟时间和视频 PTS；
+    录制时步骤时间线写入录制目录，可通过 /api/recordings/tasks/{taskId} 按步骤回放。
+    """
+    scheduler = get_scheduler(request.app)
 
-                # 发送任务完成事件
-                yield f"event: task_complete\ndata: {json.dumps({'taskId': taskId, 'message': final_message})}\n\n"
-        except Exception as e:
-            yield f"event: error\ndata: {json.dumps({'taskId': taskId, 'message': str(e)})}\n\n"
+    log = scheduler.events(taskId)
+    if log is None:
+        submit_task(scheduler, text, device_id=device_id, priority=priority, task_id=taskId, record=record)
+        log = scheduler.events(taskId)
+    if log is None:
+        # 提交后立即被清理（不应发生）
+        raise HTTPException(status_code=404, detail=f"Task {taskId} not found")
 
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # 禁用 nginx 缓冲
-        }
-    )
+    return event_stream(log, resume_after(last_event_id, lastEventId))
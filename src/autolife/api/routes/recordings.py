@@ -0,0 +1,179 @@
+"""
+录像回放路由
+列出录制分段和任务时间线，并按任务步骤定位到录像中的关键帧
+"""
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from autolife.scrcpy.recorder import (
+    RecordingSegment,
+    default_directory,
+    load_segments,
+    safe_path_component,
+)
+from autolife.scrcpy.timeline import TaskTimeline, find_seek_point, list_timelines, load_timeline
+
+router = APIRouter(prefix="/api/recordings", tags=["recordings"])
+
+# 分段文件的 Content-Type
+MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".h264": "video/h264",
+    ".h265": "video/h265",
+    ".obu": "video/av1",
+}
+
+
+def segment_url(segment: RecordingSegment) -> str:
+    """分段文件的下载地址"""
+    path = Path(segment.path)
+    return f"/api/recordings/files/{path.parent.name}/{path.name}"
+
+
+def describe_timeline(timeline: TaskTimeline) -> dict:
+    """时间线 + 每个步骤的回放定位"""
+    segments = load_segments(timeline.root or default_directory(), timeline.device_id)
+
+    steps = []
+    for mark in timeline.steps:
+        seek = find_seek_point(segments, mark.started_at)
+
+        step: Dict[str, Any] = {
+            "step": mark.step,
+            "started_at": mark.started_at,
+            "ended_at": mark.ended_at,
+            "start_pts": mark.start_pts,
+            "end_pts": mark.end_pts,
+            "duration": mark.duration_ms,
+            "action": mark.action,
+            "result": mark.result,
+            "seek": None,
+        }
+
+        if seek:
+            step["seek"] = {**seek.to_dict(), "url": segment_url(seek.segment)}
+
+        steps.append(step)
+
+    return {**timeline.to_dict(), "recorded": bool(segments), "steps": steps}
+
+
+def get_timeline(task_id: str) -> TaskTimeline:
+    timeline = load_timeline(default_directory(), task_id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail=f"No timeline for task {task_id}")
+    return timeline
+
+
+@router.get("/segments")
+async def list_segments(
+    device_id: Optional[str] = Query(None, description="设备 ID，默认返回所有设备"),
+):
+    """
+    列出录制分段（按开始时间排序）
+
+    每个分段包含起止时间、PTS 范围、大小、帧数、关键帧数和下载地址。
+    """
+    segments = load_segments(default_directory(), device_id)
+
+    return {
+        "segments": [
+            {
+                **{k: v for k, v in segment.to_dict().items() if k != "keyframes"},
+                "path": Path(segment.path).name,
+                "keyframes": len(segment.keyframes),
+                "url": segment_url(segment),
+            }
+            for segment in segments
+        ]
+    }
+
+
+@router.get("/tasks")
+async def list_task_timelines(
+    device_id: Optional[str] = Query(None, description="设备 ID，默认返回所有设备"),
+    limit: int = Query(50, ge=1, le=500, description="最多返回的任务数"),
+):
+    """列出有时间线的任务（最近的在前）"""
+    timelines = list_timelines(default_directory(), device_id)[:limit]
+
+    return {
+        "tasks": [
+            {
+                "task_id": timeline.task_id,
+                "device_id": timeline.device_id,
+                "text": timeline.text,
+                "status": timeline.status,
+                "started_at": timeline.started_at,
+                "ended_at": timeline.ended_at,
+                "steps": len(timeline.steps),
+            }
+            for timeline in timelines
+        ]
+    }
+
+
+@router.get("/tasks/{task_id}")
+async def get_task_timeline(task_id: str):
+    """
+    任务时间线和每个步骤的回放定位
+
+    每个步骤的 seek：
+    - url: 分段文件地址
+    - keyframe_offset: 步骤开始前最近的关键帧在分段中的秒数（mp4 直接设置 currentTime）
+    - target_offset: 步骤开始时刻在分段中的秒数
+    - byte_offset: 原始码流（annexb）中关键帧（含参数集）的字节偏移
+    没有覆盖该步骤的录像时 seek 为 null。
+    """
+    return describe_timeline(get_timeline(task_id))
+
+
+@router.get("/tasks/{task_id}/steps/{step}")
+async def seek_task_step(task_id: str, step: int):
+    """
+    单个步骤的回放定位（步骤开始前最近的关键帧）
+
+    Raises:
+        HTTPException: 任务或步骤不存在（404），或没有覆盖该步骤的录像（404）
+    """
+    timeline = get_timeline(task_id)
+
+    mark = timeline.get_step(step)
+    if mark is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} has no step {step}")
+
+    segments = load_segments(timeline.root or default_directory(), timeline.device_id)
+    seek = find_seek_point(segments, mark.started_at)
+
+    if seek is None:
+        raise HTTPException(status_code=404, detail=f"No recording covers step {step}")
+
+    return {
+        "task_id": task_id,
+        "step": step,
+        "started_at": mark.started_at,
+        "start_pts": mark.start_pts,
+        **seek.to_dict(),
+        "url": segment_url(seek.segment),
+    }
+
+
+@router.get("/files/{device_dir}/{filename}")
+async def download_segment(device_dir: str, filename: str):
+    """下载录制分段（支持 Range 请求，浏览器可以直接拖动播放 mp4）"""
+    root = default_directory().resolve()
+
+    # 只允许录制目录中的分段文件
+    if safe_path_component(device_dir) != device_dir or safe_path_component(filename) != filename:
+        raise HTTPException(status_code=400, detail="Invalid path")
+
+    path = (root / device_dir / filename).resolve()
+    media_type = MEDIA_TYPES.get(path.suffix)
+
+    if media_type is None or path.parent.parent != root or not path.is_file():
+        raise HTTPException(status_code=404, detail="Segment not found")
+
+    return FileResponse(path, media_type=media_type)
@@ -3,13 +3,24 @@ scrcpy WebSocket 路由
 提供 H.264 NAL 单元流式传输和设备控制
 """
 import os
+import json
+import time
 import asyncio
-import subprocess
-from typing import Optional, Dict
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Request, HTTPException
+import struct
+from typing import List, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, Request, HTTPException, Response
 from pydantic import BaseModel
 
+from autolife.adb import AdbError, DeviceRegistry, get_adb_client
+from autolife.adb.display import get_display_cache
+from autolife.scrcpy.broadcaster import NalSubscriber
+from autolife.scrcpy.control import ANDROID_KEYCODES, ScrcpyController
+from autolife.scrcpy.decoder import FRAME_FORMATS, FrameDecoder, is_available as decoder_available
+from autolife.scrcpy.input import InputDispatcher, parse_input_event
+from autolife.scrcpy.pool import StreamerPool, StreamerPoolFull
+from autolife.scrcpy.screenshot import ScreenshotProvider
 from autolife.scrcpy.streamer import ScrcpyStreamer
+from autolife.scrcpy.thumbnails import ThumbnailService, is_available as thumbnails_available
 
 router = APIRouter(prefix="/api/scrcpy", tags=["scrcpy"])
 
@@ -46,7 +57,34 @@ class ResetRequest(BaseModel):
     device_id: Optional[str] = None
 
 
-async def get_first_device() -> str:
+class RecordRequest(BaseModel):
+    """录制请求"""
+    device_id: Optional[str] = None
+    profile: Optional[str] = None  # None 表示默认 profile
+    format: Optional[str] = None  # mp4 / annexb，None 由 SCRCPY_RECORD_FORMAT 决定
+
+
+class StartRequest(BaseModel):
+    """批量启动流请求"""
+    device_ids: Optional[List[str]] = None  # None 表示所有已连接设备
+    profile: Optional[str] = None  # None 表示默认 profile
+
+
+async def list_devices(app) -> List[str]:
+    """
+    获取所有已连接的 ADB 设备（从设备注册表内存中读取）
+
+    Returns:
+        List[str]: 设备 ID 列表
+    """
+    try:
+        return await get_registry(app).list_online()
+    except (AdbError, OSError) as e:
+        print(f"[scrcpy] Failed to list devices: {e}")
+        return []
+
+
+async def get_first_device(app) -> str:
     """
     获取第一个连接的 ADB 设备
 
@@ -56,16 +94,7 @@ async def get_first_device() -> str:
     Raises:
         HTTPException: 无设备连接
     """
-    result = await asyncio.create_subprocess_exec(
-        "adb", "devices",
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
-
-    stdout, _ = await result.communicate()
-
-    devices = stdout.decode().strip().split('\n')[1:]  # 跳过标题行
-    devices = [line.split()[0] for line in devices if '\tdevice' in line]
+    devices = await list_devices(app)
 
     if not devices:
         raise HTTPException(status_code=404, detail="No device connected")
@@ -73,38 +102,127 @@ async def get_first_device() -> str:
     return devices[0]
 
 
-def get_streamers(app) -> Dict[str, ScrcpyStreamer]:
-    """获取全局 streamer 字典"""
-    if not hasattr(app.state, 'scrcpy_streamers'):
-        app.state.scrcpy_streamers = {}
-    return app.state.scrcpy_streamers
+async def run_input_command(device_id: str, command: str):
+    """
+    通过常驻 adb shell 会话执行 input 命令
 
+    Raises:
+        HTTPException: adb 执行失败
+    """
+    try:
+        await get_adb_client().shell(device_id, command)
+    except (AdbError, OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=500, detail=f"ADB command failed: {e}")
+
+
+def get_controller(app, device_id: str) -> Optional[ScrcpyController]:
+    """
+    获取设备的 scrcpy 控制通道
+
+    只有设备正在投屏且控制 socket 已连接时可用，否则返回 None（调用方退回 ADB）。
+    """
+    streamer = get_pool(app).get(device_id)
+
+    if not streamer or not streamer.is_running:
+        return None
 
-def get_locks(app) -> Dict[str, asyncio.Lock]:
-    """获取全局锁字典"""
-    if not hasattr(app.state, 'scrcpy_locks'):
-        app.state.scrcpy_locks = {}
-    return app.state.scrcpy_locks
+    controller = streamer.controller
+    if controller is None or controller.is_closed:
+        return None
 
+    return controller
 
-def get_or_create_lock(locks: Dict[str, asyncio.Lock], device_id: str) -> asyncio.Lock:
-    """获取或创建设备锁"""
-    if device_id not in locks:
-        locks[device_id] = asyncio.Lock()
-    return locks[device_id]
+
+def get_input_dispatcher(app, device_id: str) -> InputDispatcher:
+    """获取设备的输入分发器（每台设备一个，所有输入连接共享）"""
+    if not hasattr(app.state, 'input_dispatchers'):
+        app.state.input_dispatchers = {}
+
+    dispatchers = app.state.input_dispatchers
+
+    if device_id not in dispatchers:
+        # move 事件按投屏帧率合并
+        streamer = get_pool(app).get(device_id)
+        move_rate = streamer.max_fps if streamer else 60
+
+        dispatchers[device_id] = InputDispatcher(
+            device_id,
+            get_controller=lambda: get_controller(app, device_id),
+            adb=get_adb_client(),
+            move_rate=move_rate,
+        )
+
+    return dispatchers[device_id]
+
+
+def get_registry(app) -> DeviceRegistry:
+    """
+    获取全局设备注册表
+
+    正常情况下在应用启动时创建并开始跟踪；未启动时查询退回 host:devices。
+    """
+    if not hasattr(app.state, 'device_registry'):
+        app.state.device_registry = DeviceRegistry()
+    return app.state.device_registry
+
+
+def get_pool(app) -> StreamerPool:
+    """获取全局 streamer 池（每台设备独立端口和 scid）"""
+    if not hasattr(app.state, 'scrcpy_pool'):
+        app.state.scrcpy_pool = StreamerPool(registry=get_registry(app))
+    return app.state.scrcpy_pool
+
+
+def get_thumbnail_service(app) -> ThumbnailService:
+    """获取全局缩略图服务（关键帧订阅 + 线程池解码）"""
+    if not hasattr(app.state, 'thumbnail_service'):
+        app.state.thumbnail_service = ThumbnailService(get_pool(app))
+    return app.state.thumbnail_service
+
+
+def get_screenshot_provider(app) -> ScreenshotProvider:
+    """获取全局截图提供者（agent 截图优先取自实时视频流）"""
+    if not hasattr(app.state, 'screenshot_provider'):
+        app.state.screenshot_provider = ScreenshotProvider(get_pool(app))
+    return app.state.screenshot_provider
 
 
 @router.websocket("/ws")
 async def video_stream_websocket(
     websocket: WebSocket,
-    device_id: Optional[str] = Query(None, description="设备 ID，默认为第一个连接的设备")
+    device_id: Optional[str] = Query(None, description="设备 ID，默认为第一个连接的设备"),
+    latency_budget_ms: Optional[float] = Query(
+        None, gt=0, description="延迟预算（毫秒），落后超过预算时跳到最新关键帧"
+    ),
+    framed: bool = Query(False, description="每条消息前附加 9 字节帧头（flags + PTS）"),
+    profile: Optional[str] = Query(
+        None, description="视频流 profile（thumbnail / interactive / hifi 等），默认由 SCRCPY_PROFILE 决定"
+    ),
+    keyframes_only: bool = Query(False, description="只发送参数集 + 关键帧（缩略图墙等低帧率预览）"),
+    max_fps: Optional[float] = Query(None, gt=0, description="仅关键帧模式下的最大帧率"),
 ):
     """
-    H.264 NAL 单元流 WebSocket 端点
+    视频流 WebSocket 端点
 
     协议：
-    - 首包：二进制（SPS + PPS + IDR），供 jMuxer 初始化
+    - 首包：二进制（参数集 + 关键帧，H.264 为 SPS + PPS + IDR），供 jMuxer 初始化
     - 后续：逐个 NAL 单元（二进制）
+    - framed=true 时先发送一条文本消息
+      {"type": "meta", "codec", "profile", "width", "height"}，
+      之后每条二进制消息前附加 9 字节帧头：
+      flags（1 字节，0x01 参数集 / 0x02 关键帧）+ PTS（8 字节大端序，微秒，参数集为 0），
+      客户端可据此做音视频同步和端到端时延测量
+
+    keyframes_only=true 时只发送每组参数集 + 关键帧（每次都是最新的一组，
+    按 max_fps 限频），每个关键帧都可以独立解码，适合同时预览大量设备。
+
+    profile 决定编码格式、分辨率、帧率和码率（见 GET /api/scrcpy/profiles）。
+    H.265 / AV1 原样透传，浏览器端需用 WebCodecs 等按 meta 中的 codec 解码
+    （AV1 为 OBU 码流，必须使用 framed 模式）；设备不支持时自动退回 H.264。
+
+    同一设备的多个连接共享一个 streamer，每个连接是独立订阅者，
+    都能收到完整的 NAL 序列。连接落后超过 latency_budget_ms 时，
+    直接从最新的 SPS/PPS/IDR 继续，而不是在 GOP 中间丢帧。
 
     消息格式：
     - binaryType: 'arraybuffer'
@@ -125,62 +243,76 @@ async def video_stream_websocket(
     # 获取或创建 device_id
     if not device_id:
         try:
-            device_id = await get_first_device()
+            device_id = await get_first_device(websocket.app)
         except HTTPException as e:
             await websocket.close(code=1008, reason=e.detail)
             return
 
     print(f"[scrcpy] WebSocket connected: device={device_id}, client={websocket.client}")
 
-    # 获取全局状态
-    streamers = get_streamers(websocket.app)
-    locks = get_locks(websocket.app)
+    # 获取全局 streamer 池
+    pool = get_pool(websocket.app)
 
     streamer: Optional[ScrcpyStreamer] = None
-    is_new_streamer = False
+    subscriber: Optional[NalSubscriber] = None
 
     try:
-        # 获取设备锁
-        lock = get_or_create_lock(locks, device_id)
-
-        async with lock:
-            if device_id not in streamers:
-                # 创建新 streamer
-                print(f"[scrcpy] Creating new streamer for device: {device_id}")
-                streamer = ScrcpyStreamer(device_id=device_id)
-                await streamer.start()
-                streamers[device_id] = streamer
-                is_new_streamer = True
-            else:
-                # 复用已有 streamer
-                print(f"[scrcpy] Reusing existing streamer for device: {device_id}")
-                streamer = streamers[device_id]
-
-        # 发送初始化数据（首包）
-        init_data = streamer.get_initialization_data()
-
-        if init_data:
-            print(f"[scrcpy] Sending initialization data ({len(init_data)} bytes)")
-            await websocket.send_bytes(init_data)
-        else:
-            # 等待缓存就绪
-            print("[scrcpy] Waiting for SPS/PPS/IDR cache...")
-            await asyncio.sleep(1)
+        # 同一设备复用已有 streamer（含空闲宽限期内的），不存在时分配端口并启动
+        try:
+            streamer = await pool.acquire(device_id, profile)
+        except StreamerPoolFull as e:
+            await websocket.close(code=1013, reason=str(e))
+            return
+        except ValueError as e:
+            await websocket.close(code=1008, reason=str(e))
+            return
 
-            init_data = streamer.get_initialization_data()
-            if init_data:
-                await websocket.send_bytes(init_data)
+        # 先订阅再取初始化数据，保证两者之间不丢 NAL
+        subscriber = streamer.subscribe(
+            latency_budget_ms=latency_budget_ms,
+            keyframes_only=keyframes_only,
+            max_fps=max_fps,
+        )
+
+        # 发送初始化数据（首包），新启动的流等到 SPS/IDR 缓存就绪为止
+        if not await streamer.wait_for_initialization(timeout=5):
+            print("[scrcpy] Timed out waiting for SPS/PPS/IDR cache")
+
+        init_packet = streamer.get_initialization_packet()
+
+        if framed:
+            await websocket.send_json({
+                "type": "meta",
+                "codec": streamer.codec.name,
+                "profile": pool.resolve_profile(device_id, profile).name,
+                "width": streamer.device_width,
+                "height": streamer.device_height,
+            })
+
+        if init_packet:
+            print(f"[scrcpy] Sending initialization data ({len(init_packet.data)} bytes)")
+            if framed:
+                await websocket.send_bytes(init_packet.frame_header() + init_packet.data)
+            else:
+                await websocket.send_bytes(init_packet.data)
 
         # 持续发送 NAL 单元
         print("[scrcpy] Starting NAL unit streaming...")
 
-        async for nal in streamer.iter_nal_units():
+        stats = streamer.stats
+
+        while (packet := await subscriber.get_packet()) is not None:
             try:
-                await websocket.send_bytes(nal)
+                if framed:
+                    await websocket.send_bytes(packet.frame_header() + packet.data)
+                else:
+                    await websocket.send_bytes(packet.data)
             except WebSocketDisconnect:
                 print("[scrcpy] WebSocket disconnected")
                 break
 
+            stats.record_sent(packet, time.monotonic())
+
     except WebSocketDisconnect:
         print("[scrcpy] WebSocket disconnected (expected)")
 
@@ -195,10 +327,244 @@ async def video_stream_websocket(
             pass
 
     finally:
+        if subscriber:
+            subscriber.close()
+
+            if subscriber.dropped:
+                print(
+                    f"[scrcpy] Subscriber dropped {subscriber.dropped} NAL units "
+                    f"({subscriber.gop_skips} GOP skips)"
+                )
+
+        # 释放引用：最后一个连接离开后，空闲宽限期结束时停止 streamer
+        if streamer:
+            pool.release(device_id, profile)
+
         print(f"[scrcpy] Client disconnected from {device_id}")
 
-        # 注意：不要在这里停止 streamer，因为可能有其他连接
-        # 真实实现需要维护连接计数，最后一个断开时才停止
+
+@router.websocket("/frames/ws")
+async def frame_stream_websocket(
+    websocket: WebSocket,
+    device_id: Optional[str] = Query(None, description="设备 ID，默认为第一个连接的设备"),
+    format: str = Query("jpeg", description=f"输出格式：{' / '.join(FRAME_FORMATS)}"),
+    max_fps: float = Query(5, ge=0, description="最大帧率，0 表示不限制"),
+    max_width: Optional[int] = Query(None, gt=0, description="最大宽度（保持宽高比），默认原始尺寸"),
+    keyframes_only: bool = Query(False, description="只解码关键帧（约每秒一帧，CPU 占用最低）"),
+    encoding: str = Query("binary", description="binary（二进制帧）或 base64（JSON 文本）"),
+    profile: Optional[str] = Query(None, description="视频流 profile"),
+):
+    """
+    解码帧 WebSocket 端点（服务端进程内解码，需要 PyAV）
+
+    适合视觉模型等需要完整画面的客户端；同一设备相同参数的连接共享一个解码器，
+    慢客户端只会跳过中间帧，总是拿到最新画面。
+
+    协议：
+    - 首条消息：文本 {"type": "meta", "codec", "format", "encoding"}
+    - encoding=binary：每帧一条二进制消息，16 字节帧头
+      PTS（8 字节大端序，微秒，未知为 -1）+ 宽（4 字节）+ 高（4 字节），
+      之后是帧数据（JPEG 或紧凑排列的原始像素），消息长度即帧长度
+    - encoding=base64：每帧一条文本消息
+      {"type": "frame", "pts", "width", "height", "format", "data"}
+    """
+    await websocket.accept()
+
+    if not decoder_available():
+        await websocket.close(code=1011, reason="PyAV is not installed (pip install autolife[video])")
+        return
+
+    if encoding not in ("binary", "base64"):
+        await websocket.close(code=1008, reason=f"Unsupported encoding '{encoding}'")
+        return
+
+    if not device_id:
+        try:
+            device_id = await get_first_device(websocket.app)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=e.detail)
+            return
+
+    pool = get_pool(websocket.app)
+
+    streamer: Optional[ScrcpyStreamer] = None
+    decoder: Optional[FrameDecoder] = None
+
+    try:
+        try:
+            streamer = await pool.acquire(device_id, profile)
+            decoder = streamer.acquire_decoder(
+                format=format,
+                max_fps=max_fps,
+                max_width=max_width or 0,
+                keyframes_only=keyframes_only,
+            )
+        except StreamerPoolFull as e:
+            await websocket.close(code=1013, reason=str(e))
+            return
+        except ValueError as e:
+            await websocket.close(code=1008, reason=str(e))
+            return
+
+        await websocket.send_json({
+            "type": "meta",
+            "codec": streamer.codec.name,
+            "format": decoder.format,
+            "encoding": encoding,
+        })
+
+        async for frame in decoder.frames():
+            if encoding == "binary":
+                header = struct.pack(
+                    ">qII", frame.pts if frame.pts is not None else -1, frame.width, frame.height
+                )
+                await websocket.send_bytes(header + frame.data)
+            else:
+                await websocket.send_json({"type": "frame", **frame.to_dict(include_data=True)})
+
+    except WebSocketDisconnect:
+        print("[scrcpy] Frame WebSocket disconnected")
+
+    except Exception as e:
+        print(f"[scrcpy] Frame WebSocket error: {e}")
+
+        try:
+            await websocket.close(code=1011, reason=str(e))
+        except Exception:
+            pass
+
+    finally:
+        if streamer and decoder:
+            await streamer.release_decoder(decoder)
+
+        if streamer:
+            pool.release(device_id, profile)
+
+
+@router.get("/screenshot")
+async def get_stream_screenshot(
+    request: Request,
+    device_id: Optional[str] = Query(None, description="设备 ID，默认为第一个连接的设备"),
+):
+    """
+    从正在运行的视频流截图（与 agent 使用的截图相同）
+
+    设备没有在投屏或没有足够新的画面时返回 404，不会退回 screencap。
+    """
+    if not decoder_available():
+        raise HTTPException(
+            status_code=503, detail="PyAV is not installed (pip install autolife[video])"
+        )
+
+    device_id = device_id or await get_first_device(request.app)
+
+    try:
+        frame = await get_screenshot_provider(request.app).capture(device_id)
+    except (RuntimeError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if frame is None:
+        raise HTTPException(status_code=404, detail=f"No fresh stream frame for {device_id}")
+
+    return Response(
+        content=frame.data,
+        media_type=frame.media_type,
+        headers={"X-Frame-Pts": str(frame.pts), "Cache-Control": "no-store"},
+    )
+
+
+@router.get("/screenshot/stats")
+async def get_screenshot_stats(request: Request):
+    """截图来源统计（视频流命中 / 退回 screencap）和各设备的解码器状态"""
+    return get_screenshot_provider(request.app).describe()
+
+
+@router.websocket("/input/ws")
+async def input_websocket(
+    websocket: WebSocket,
+    device_id: Optional[str] = Query(None, description="设备 ID，默认为第一个连接的设备"),
+):
+    """
+    输入事件 WebSocket 端点
+
+    设备在连接时解析一次，之后每个事件不再单独发起 HTTP 请求。
+    同一设备的所有输入连接共享一个分发器：事件按顺序由单个写入者发送，
+    连续的 move 合并到投屏帧率。
+
+    客户端 → 服务端（文本消息，JSON）：
+    - 单个事件：{"type": "touch", "action": "move", "x": 100, "y": 200}
+    - 紧凑格式：["m", 100, 200]（d/m/u 触控，k 按键，t 文本，s 滚动）
+    - 批量：[["d", 100, 200], ["m", 110, 210]]
+    - {"type": "ping"}：服务端回复 pong（用于测量往返延迟）
+
+    服务端 → 客户端：
+    - {"type": "ready", "device_id", "channel", "width", "height"}：连接就绪
+      （channel 为 control 表示走 scrcpy 控制 socket，adb 表示退回 adb shell input）
+    - {"type": "pong", "t"}：原样返回 ping 中的 t
+    - {"type": "error", "message"}：事件格式错误
+    """
+    await websocket.accept()
+
+    if not device_id:
+        try:
+            device_id = await get_first_device(websocket.app)
+        except HTTPException as e:
+            await websocket.close(code=1008, reason=e.detail)
+            return
+
+    dispatcher = get_input_dispatcher(websocket.app, device_id)
+    dispatcher.attach()
+
+    print(f"[scrcpy] Input WebSocket connected: device={device_id}, client={websocket.client}")
+
+    try:
+        metrics = get_display_cache().get(device_id)
+
+        await websocket.send_json({
+            "type": "ready",
+            "device_id": device_id,
+            "channel": dispatcher.channel,
+            "width": metrics.width if metrics else 0,
+            "height": metrics.height if metrics else 0,
+        })
+
+        while True:
+            text = await websocket.receive_text()
+
+            try:
+                message = json.loads(text)
+            except ValueError:
+                await websocket.send_json({"type": "error", "message": "Invalid JSON"})
+                continue
+
+            if isinstance(message, dict) and message.get("type") == "ping":
+                await websocket.send_json({"type": "pong", "t": message.get("t")})
+                continue
+
+            # 批量：列表的元素本身是事件
+            if isinstance(message, list) and message and isinstance(message[0], (list, dict)):
+                events = message
+            else:
+                events = [message]
+
+            for raw in events:
+                try:
+                    dispatcher.submit(parse_input_event(raw))
+                except (ValueError, KeyError, TypeError) as e:
+                    await websocket.send_json({"type": "error", "message": str(e)})
+
+    except WebSocketDisconnect:
+        print("[scrcpy] Input WebSocket disconnected")
+
+    finally:
+        if await dispatcher.detach():
+            websocket.app.state.input_dispatchers.pop(device_id, None)
+
+        stats = dispatcher.describe()
+        print(
+            f"[scrcpy] Input closed for {device_id}: received {stats['received']}, "
+            f"coalesced {stats['coalesced']}, dispatched {stats['dispatched']}"
+        )
 
 
 @router.post("/reset")
@@ -216,16 +582,14 @@ async def reset_video_stream(
     - success: 是否成功
     - message: 消息
     """
-    streamers = get_streamers(request.app)
+    pool = get_pool(request.app)
 
     device_id = reset_req.device_id
 
     if device_id:
         # 重置单个设备
-        if device_id in streamers:
-            print(f"[scrcpy] Resetting stream for device: {device_id}")
-            await streamers[device_id].stop()
-            del streamers[device_id]
+        print(f"[scrcpy] Resetting stream for device: {device_id}")
+        if await pool.stop(device_id):
             return {"success": True, "message": f"Reset stream for {device_id}"}
         else:
             return {"success": False, "error": f"Device {device_id} not found"}
@@ -233,65 +597,338 @@ async def reset_video_stream(
         # 重置所有设备
         print("[scrcpy] Resetting all streams")
 
-        for dev_id, streamer in list(streamers.items()):
-            await streamer.stop()
-
-        streamers.clear()
+        await pool.stop_all()
 
         return {"success": True, "message": "Reset all streams"}
 
 
+@router.post("/start")
+async def start_video_streams(request: Request, start_req: StartRequest):
+    """
+    并行启动多台设备的视频流
+
+    参数：
+    - device_ids: 设备 ID 列表，None 表示所有已连接设备
+    - profile: 视频流 profile，None 表示默认 profile
+
+    返回：
+    - started: 启动成功的设备
+    - failed: 启动失败的设备及原因
+    """
+    pool = get_pool(request.app)
+
+    device_ids = start_req.device_ids
+    if device_ids is None:
+        device_ids = await list_devices(request.app)
+
+    try:
+        pool.profiles.get(start_req.profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = await pool.start_many(device_ids, start_req.profile)
+
+    started = [dev_id for dev_id, result in results.items() if isinstance(result, ScrcpyStreamer)]
+    failed = {
+        dev_id: str(result)
+        for dev_id, result in results.items()
+        if not isinstance(result, ScrcpyStreamer)
+    }
+
+    return {"success": not failed, "started": started, "failed": failed}
+
+
+@router.get("/streams")
+async def list_video_streams(request: Request):
+    """
+    列出所有正在运行的视频流
+
+    返回每个流的 profile、编码参数、端口、scid、订阅者数量和视频分辨率。
+    """
+    pool = get_pool(request.app)
+
+    return {"max_devices": pool.max_devices, "streams": pool.describe()}
+
+
+@router.get("/profiles")
+async def list_stream_profiles(request: Request):
+    """
+    列出可用的视频流 profile（编码格式 / 分辨率 / 帧率 / 码率）
+
+    WebSocket 通过 profile 参数选择，编码参数相同的 profile 共用一个编码器。
+    """
+    return get_pool(request.app).profiles.describe()
+
+
+@router.post("/record/start")
+async def start_recording(request: Request, record_req: RecordRequest):
+    """
+    开始录制设备的视频流（不重新编码，按时长 / 大小分段，后台线程写入）
+
+    录制文件位于 SCRCPY_RECORD_DIR/<设备>/，每段附带同名 .json 清单。
+    录制期间即使没有观看者，设备的流也保持运行。
+
+    返回：
+    - recording: 录制状态（格式、目录、当前分段、丢弃数）
+    """
+    device_id = record_req.device_id or await get_first_device(request.app)
+    pool = get_pool(request.app)
+
+    kwargs = {"format": record_req.format} if record_req.format else {}
+
+    try:
+        recorder = await pool.start_recording(device_id, record_req.profile, **kwargs)
+    except StreamerPoolFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=f"Failed to start recording: {e}")
+
+    return {"success": True, "recording": recorder.describe()}
+
+
+@router.post("/record/stop")
+async def stop_recording(request: Request, record_req: RecordRequest):
+    """
+    停止录制并写完当前分段
+
+    返回：
+    - segments: 本次录制的所有分段
+    """
+    device_id = record_req.device_id or await get_first_device(request.app)
+
+    recorder = await get_pool(request.app).stop_recording(device_id)
+    if recorder is None:
+        return {"success": False, "error": f"Device {device_id} is not recording"}
+
+    return {
+        "success": True,
+        "recording": recorder.describe(),
+        "segments": [segment.to_dict() for segment in recorder.segments],
+    }
+
+
+@router.get("/record")
+async def list_recordings(request: Request):
+    """列出正在录制的设备"""
+    pool = get_pool(request.app)
+
+    recordings = []
+    for streamer in list(pool.streamers.values()):
+        recorder = streamer.recorder
+        if recorder is not None and recorder.is_recording:
+            recordings.append(recorder.describe())
+
+    return {"recordings": recordings}
+
+
+@router.get("/stats")
+async def get_stream_stats(
+    request: Request,
+    device_id: Optional[str] = Query(None, description="设备 ID，默认返回所有正在投屏的设备"),
+    reset: bool = Query(False, description="返回后清空统计"),
+):
+    """
+    视频流时延统计（基于 scrcpy PTS）
+
+    每个流（设备 + profile）返回：
+    - frames / jitter_ms：帧数和帧间隔抖动（到达间隔与 PTS 间隔之差的平滑均值）
+    - frame_interval：帧到达间隔直方图
+    - queue_latency：服务端收到 packet → 发送给 WebSocket 的时延直方图
+    - encode_to_send：编码（PTS）→ 发送的时延直方图，设备时钟未同步，
+      以最快的 packet 为基线（即相对最小时延的额外时延）
+    """
+    pool = get_pool(request.app)
+
+    streams = [
+        (key, streamer)
+        for key, streamer in list(pool.streamers.items())
+        if not device_id or key[0] == device_id
+    ]
+
+    if device_id and not streams:
+        raise HTTPException(status_code=404, detail=f"No stream for device {device_id}")
+
+    result = []
+    for (dev_id, encoder_id), streamer in streams:
+        result.append({
+            "device_id": dev_id,
+            "encoder": encoder_id,
+            "codec": streamer.codec.name,
+            **streamer.stats.describe(),
+        })
+        if reset:
+            streamer.stats.reset()
+
+    return {"stats": result}
+
+
+@router.get("/thumbnails")
+async def list_thumbnails(
+    request: Request,
+    device_ids: Optional[List[str]] = Query(None, description="设备 ID，默认为所有已连接设备"),
+    include_data: bool = Query(True, description="是否附带 JPEG 数据（data URI）"),
+    wait: float = Query(0, ge=0, le=10, description="等待尚未生成的缩略图的最长秒数"),
+):
+    """
+    所有设备的最新缩略图（服务端解码关键帧为 JPEG，需要安装 autolife[video]）
+
+    首次请求时为设备以 thumbnail profile 开始投屏，之后按 SCRCPY_THUMBNAIL_INTERVAL
+    刷新；一段时间（SCRCPY_THUMBNAIL_IDLE）没有请求后自动停止。
+
+    返回：
+    - thumbnails: 每台设备的尺寸、PTS、更新时间和 JPEG 数据
+    - pending: 尚未生成缩略图的设备
+    - errors: 启动或解码失败的设备及原因
+    """
+    if not thumbnails_available():
+        raise HTTPException(
+            status_code=503, detail="PyAV is not installed (pip install autolife[video])"
+        )
+
+    service = get_thumbnail_service(request.app)
+
+    if device_ids is None:
+        device_ids = await list_devices(request.app)
+
+    service.watch(device_ids)
+
+    if wait:
+        await service.wait_for(device_ids, timeout=wait)
+
+    thumbnails = []
+    pending = []
+
+    for device_id in device_ids:
+        thumbnail = service.get(device_id)
+        if thumbnail:
+            thumbnails.append(thumbnail.to_dict(include_data=include_data))
+        elif device_id not in service.errors:
+            pending.append(device_id)
+
+    errors = {
+        device_id: error
+        for device_id, error in service.errors.items()
+        if device_id in device_ids
+    }
+
+    return {"thumbnails": thumbnails, "pending": pending, "errors": errors}
+
+
+@router.get("/thumbnails/{device_id}")
+async def get_thumbnail(request: Request, device_id: str):
+    """
+    单台设备的最新缩略图（image/jpeg）
+
+    尚未生成时返回 404，同时开始为该设备生成缩略图。
+    """
+    if not thumbnails_available():
+        raise HTTPException(
+            status_code=503, detail="PyAV is not installed (pip install autolife[video])"
+        )
+
+    service = get_thumbnail_service(request.app)
+    service.watch([device_id])
+
+    thumbnail = service.get(device_id)
+    if not thumbnail:
+        raise HTTPException(status_code=404, detail=f"No thumbnail yet for device {device_id}")
+
+    return Response(
+        content=thumbnail.jpeg,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@router.get("/devices")
+async def list_connected_devices(request: Request):
+    """
+    列出 adb 已知的所有设备（包括 offline / unauthorized）
+
+    数据来自设备注册表（track-devices），不访问 adb。
+    """
+    registry = get_registry(request.app)
+
+    if registry.is_ready:
+        devices = registry.describe()
+    else:
+        # 注册表尚未就绪（adb server 不可用等），退回一次查询
+        devices = [
+            {"serial": serial, "state": "device", "model": None}
+            for serial in await list_devices(request.app)
+        ]
+
+    return {"tracking": registry.is_ready, "devices": devices}
+
+
 @router.get("/resolution")
 async def get_device_resolution(
+    request: Request,
     device_id: Optional[str] = Query(None, description="设备 ID，默认为第一个连接的设备")
 ):
     """
     获取设备真实分辨率
 
-    用于前端触控坐标映射。
+    用于前端触控坐标映射。结果来自显示参数缓存（视频流元数据 + wm size），
+    只有首次查询或缓存失效时才访问 adb。
 
     返回：
-    - width: 宽度（像素）
-    - height: 高度（像素）
+    - width: 宽度（像素，当前方向）
+    - height: 高度（像素，当前方向）
+    - density: 屏幕密度
+    - orientation: portrait / landscape
     """
     if not device_id:
-        device_id = await get_first_device()
+        device_id = await get_first_device(request.app)
 
-    # 通过 ADB 获取分辨率
-    adb_cmd = ["adb", "-s", device_id, "shell", "wm", "size"]
+    try:
+        metrics = await get_display_cache().resolve(device_id)
+    except (AdbError, OSError, asyncio.TimeoutError) as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get resolution: {e}")
 
-    result = await asyncio.create_subprocess_exec(
-        *adb_cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
+    return metrics.to_dict()
 
-    stdout, stderr = await result.communicate()
 
-    if result.returncode != 0:
-        raise HTTPException(status_code=500, detail=f"Failed to get resolution: {stderr.decode()}")
+@router.get("/displays")
+async def list_displays(
+    request: Request,
+    refresh: bool = Query(False, description="忽略缓存重新查询 wm size / wm density"),
+):
+    """
+    批量获取所有在线设备的显示参数
+
+    未缓存的设备并行查询，单台设备失败不影响其他设备。
+    """
+    cache = get_display_cache()
+    device_ids = await list_devices(request.app)
 
-    # 解析输出：Physical size: 1080x2400
-    output = stdout.decode().strip()
+    results = await asyncio.gather(
+        *(cache.resolve(device_id, refresh=refresh) for device_id in device_ids),
+        return_exceptions=True,
+    )
 
-    if 'Physical size:' in output:
-        size_str = output.split('Physical size:')[1].strip()
-        width, height = map(int, size_str.split('x'))
+    displays = []
+    errors = {}
 
-        return {
-            "width": width,
-            "height": height,
-            "device_id": device_id
-        }
-    else:
-        raise HTTPException(status_code=500, detail=f"Failed to parse resolution: {output}")
+    for device_id, result in zip(device_ids, results):
+        if isinstance(result, BaseException):
+            errors[device_id] = str(result)
+        else:
+            displays.append(result.to_dict())
+
+    return {"displays": displays, "errors": errors}
 
 
 @router.post("/touch")
-async def send_touch(touch_req: TouchRequest):
+async def send_touch(touch_req: TouchRequest, request: Request):
     """
     发送触控事件
 
+    设备正在投屏时通过 scrcpy 控制 socket 注入真实的 down/move/up 事件
+    （支持拖拽），否则退回 adb shell input（down/move/up 简化为点击）。
+
     参数：
     - x: X 坐标
     - y: Y 坐标
@@ -304,28 +941,40 @@ async def send_touch(touch_req: TouchRequest):
     device_id = touch_req.device_id
 
     if not device_id:
-        device_id = await get_first_device()
+        device_id = await get_first_device(request.app)
+
+    if touch_req.action not in ("tap", "down", "move", "up"):
+        raise HTTPException(status_code=400, detail=f"Unknown action: {touch_req.action}")
 
-    adb_cmd = ["adb", "-s", device_id, "shell", "input"]
+    controller = get_controller(request.app, device_id)
+
+    if controller:
+        try:
+            if touch_req.action == "tap":
+                await controller.tap(touch_req.x, touch_req.y)
+            else:
+                await controller.touch(touch_req.action, touch_req.x, touch_req.y)
+            return {"success": True}
+        except ConnectionError as e:
+            print(f"[scrcpy] Control socket failed, falling back to ADB: {e}")
 
     if touch_req.action == "tap":
         # 点击: input tap x y
-        cmd = adb_cmd + ["tap", str(touch_req.x), str(touch_req.y)]
+        cmd = f"input tap {touch_req.x} {touch_req.y}"
     elif touch_req.action in ["down", "move", "up"]:
         # 触摸事件: input touchscreen {action} x y
         # 注意：这需要更复杂的实现，暂时简化为点击
-        cmd = adb_cmd + ["tap", str(touch_req.x), str(touch_req.y)]
+        cmd = f"input tap {touch_req.x} {touch_req.y}"
     else:
         raise HTTPException(status_code=400, detail=f"Unknown action: {touch_req.action}")
 
-    result = await asyncio.create_subprocess_exec(*cmd)
-    await result.wait()
+    await run_input_command(device_id, cmd)
 
     return {"success": True}
 
 
 @router.post("/swipe")
-async def send_swipe(swipe_req: SwipeRequest):
+async def send_swipe(swipe_req: SwipeRequest, request: Request):
     """
     发送滑动事件
 
@@ -341,24 +990,34 @@ async def send_swipe(swipe_req: SwipeRequest):
     device_id = swipe_req.device_id
 
     if not device_id:
-        device_id = await get_first_device()
+        device_id = await get_first_device(request.app)
+
+    controller = get_controller(request.app, device_id)
+
+    if controller:
+        try:
+            await controller.swipe(
+                swipe_req.x1, swipe_req.y1,
+                swipe_req.x2, swipe_req.y2,
+                swipe_req.duration,
+            )
+            return {"success": True}
+        except ConnectionError as e:
+            print(f"[scrcpy] Control socket failed, falling back to ADB: {e}")
 
     # input swipe x1 y1 x2 y2 duration
-    cmd = [
-        "adb", "-s", device_id, "shell", "input", "swipe",
-        str(swipe_req.x1), str(swipe_req.y1),
-        str(swipe_req.x2), str(swipe_req.y2),
-        str(swipe_req.duration)
-    ]
+    cmd = (
+        f"input swipe {swipe_req.x1} {swipe_req.y1} "
+        f"{swipe_req.x2} {swipe_req.y2} {swipe_req.duration}"
+    )
 
-    result = await asyncio.create_subprocess_exec(*cmd)
-    await result.wait()
+    await run_input_command(device_id, cmd)
 
     return {"success": True}
 
 
 @router.post("/keyevent")
-async def send_keyevent(keyevent_req: KeyEventRequest):
+async def send_keyevent(keyevent_req: KeyEventRequest, request: Request):
     """
     发送按键事件
 
@@ -372,7 +1031,7 @@ async def send_keyevent(keyevent_req: KeyEventRequest):
     device_id = keyevent_req.device_id
 
     if not device_id:
-        device_id = await get_first_device()
+        device_id = await get_first_device(request.app)
 
     keycode_map = {
         "HOME": "KEYCODE_HOME",
@@ -387,10 +1046,16 @@ async def send_keyevent(keyevent_req: KeyEventRequest):
     if not keycode:
         raise HTTPException(status_code=400, detail=f"Unknown key: {keyevent_req.key}")
 
-    # input keyevent KEYCODE
-    cmd = ["adb", "-s", device_id, "shell", "input", "keyevent", keycode]
+    controller = get_controller(request.app, device_id)
+
+    if controller:
+        try:
+            await controller.press_key(ANDROID_KEYCODES[keycode])
+            return {"success": True}
+        except ConnectionError as e:
+            print(f"[scrcpy] Control socket failed, falling back to ADB: {e}")
 
-    result = await asyncio.create_subprocess_exec(*cmd)
-    await result.wait()
+    # input keyevent KEYCODE
+    await run_input_command(device_id, f"input keyevent {keycode}")
 
     return {"success": True}
@@ -0,0 +1,221 @@
+"""
+任务队列路由
+提交、查询、取消任务，以及以 SSE 观看任务的事件日志
+"""
+import os
+from typing import List, Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from autolife.api.dependencies import agent_pool_for
+from autolife.api.models import ApiResponse
+from autolife.api.routes.scrcpy import get_pool, get_screenshot_provider, list_devices
+from autolife.tasks import TaskEventLog, TaskRecord, TaskRunner, TaskScheduler, TaskStore
+
+router = APIRouter(prefix="/api/tasks", tags=["tasks"])
+
+# agent 截图是否优先取自实时视频流（设备没有在投屏时仍使用 screencap）
+STREAM_SCREENSHOTS = os.getenv("AUTOLIFE_STREAM_SCREENSHOTS", "true").lower() == "true"
+
+# 模拟模式下没有在线设备时使用的设备 ID
+MOCK_DEVICE_ID = "mock"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",  # 禁用 nginx 缓冲
+}
+
+
+def get_scheduler(app) -> TaskScheduler:
+    """获取全局任务调度器（在应用启动时创建并启动）"""
+    if not hasattr(app.state, 'task_scheduler'):
+        runner = TaskRunner(
+            agent_pool_for(app),
+            get_pool(app),
+            screenshot_provider=get_screenshot_provider(app) if STREAM_SCREENSHOTS else None,
+        )
+
+        async def online_devices() -> List[str]:
+            devices = await list_devices(app)
+            if not devices and runner.mock:
+                return [MOCK_DEVICE_ID]
+            return devices
+
+        app.state.task_scheduler = TaskScheduler(TaskStore(), runner, device_lister=online_devices)
+    return app.state.task_scheduler
+
+
+def submit_task(
+    scheduler: TaskScheduler,
+    text: str,
+    device_id: Optional[str] = None,
+    priority: int = 0,
+    task_id: Optional[str] = None,
+    max_attempts: int = 1,
+    record: Optional[bool] = None,
+) -> TaskRecord:
+    """
+    提交任务（未指定设备时使用 PHONE_AGENT_DEVICE_ID，仍未设置则分配任意空闲设备）
+
+    Raises:
+        HTTPException: 任务 ID 已存在（409）
+    """
+    options = {} if record is None else {"record": record}
+    try:
+        return scheduler.submit(
+            text,
+            device_id=device_id or os.getenv("PHONE_AGENT_DEVICE_ID") or None,
+            priority=priority,
+            task_id=task_id,
+            max_attempts=max_attempts,
+            options=options,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+def resume_after(last_event_id: Optional[str], query_id: Optional[int] = None) -> int:
+    """
+    客户端已收到的最后一个事件 ID：EventSource 重连时自动发送 Last-Event-ID 请求头，
+    不能设置请求头的客户端使用 lastEventId 查询参数
+    """
+    if query_id is not None:
+        return query_id
+    try:
+        return max(0, int(last_event_id or 0))
+    except ValueError:
+        return 0
+
+
+def event_stream(log: TaskEventLog, after_id: int = 0) -> StreamingResponse:
+    """
+    以 SSE 发送任务的事件日志（断开连接不影响任务执行）
+
+    每个事件带 id 字段，从 after_id 之后的事件开始发送
+    """
+
+    async def event_generator():
+        # 断线后浏览器等待多久重连（毫秒）
+        yield "retry: 2000\n\n"
+        async for event in log.follow(after_id):
+            yield event.to_sse()
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def describe_task(scheduler: TaskScheduler, record: TaskRecord) -> dict:
+    return {**record.to_dict(), "queue_position": scheduler.queue_position(record.task_id)}
+
+
+class SubmitRequest(BaseModel):
+    text: str
+    deviceId: Optional[str] = None
+    priority: int = 0
+    taskId: Optional[str] = None
+    maxAttempts: int = Field(1, ge=1, le=10)
+    record: Optional[bool] = None
+
+
+class BatchSubmitRequest(BaseModel):
+    tasks: List[SubmitRequest]
+
+
+@router.post("", response_model=ApiResponse)
+async def submit(request: Request, body: SubmitRequest):
+    """
+    提交任务
+
+    任务写入任务队列，按优先级（数值大的在前）和提交顺序在设备空闲时执行，
+    通过 GET /api/tasks/{task_id}/events 观看执行过程。
+    """
+    scheduler = get_scheduler(request.app)
+    record = submit_task(
+        scheduler, body.text, body.deviceId, body.priority, body.taskId, body.maxAttempts, body.record
+    )
+    return ApiResponse(success=True, data=describe_task(scheduler, record))
+
+
+@router.post("/batch", response_model=ApiResponse)
+async def submit_batch(request: Request, body: BatchSubmitRequest):
+    """批量提交任务（ID 已存在的任务跳过并在 errors 中列出）"""
+    scheduler = get_scheduler(request.app)
+
+    submitted, errors = [], []
+    for item in body.tasks:
+        try:
+            record = submit_task(
+                scheduler, item.text, item.deviceId, item.priority, item.taskId, item.maxAttempts, item.record
+            )
+        except HTTPException as e:
+            errors.append({"taskId": item.taskId, "error": e.detail})
+            continue
+        submitted.append(record.task_id)
+
+    return ApiResponse(success=not errors, data={"submitted": submitted, "errors": errors})
+
+
+@router.get("", response_model=ApiResponse)
+async def list_tasks(
+    request: Request,
+    status: Optional[str] = Query(None, description="任务状态（queued / running / completed / cancelled / error）"),
+    device_id: Optional[str] = Query(None, description="设备 ID，默认返回所有设备"),
+    limit: int = Query(100, ge=1, le=1000, description="最多返回的任务数"),
+):
+    """列出任务（最近提交的在前）"""
+    scheduler = get_scheduler(request.app)
+    records = scheduler.list(status=status, device_id=device_id, limit=limit)
+    return ApiResponse(success=True, data={"tasks": [describe_task(scheduler, record) for record in records]})
+
+
+@router.get("/stats", response_model=ApiResponse)
+async def scheduler_stats(request: Request):
+    """调度器状态：并发上限、执行中的任务和各状态的任务数"""
+    return ApiResponse(success=True, data=get_scheduler(request.app).describe())
+
+
+@router.get("/{task_id}", response_model=ApiResponse)
+async def get_task(request: Request, task_id: str):
+    """
+    任务状态
+
+    Raises:
+        HTTPException: 任务不存在（404）
+    """
+    scheduler = get_scheduler(request.app)
+    record = scheduler.get(task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return ApiResponse(success=True, data=describe_task(scheduler, record))
+
+
+@router.post("/{task_id}/cancel", response_model=ApiResponse)
+async def cancel_task(request: Request, task_id: str):
+    """取消任务：排队中的任务立即结束，执行中的任务立即中断模型请求并跳过尚未执行的设备动作"""
+    cancelled = get_scheduler(request.app).cancel(task_id)
+    return ApiResponse(success=cancelled, data={"taskId": task_id, "cancelled": cancelled})
+
+
+@router.get("/{task_id}/events")
+async def task_events(
+    request: Request,
+    task_id: str,
+    last_event_id: Optional[str] = Header(None),
+    lastEventId: Optional[int] = Query(None, ge=0, description="从该事件 ID 之后继续（优先于 Last-Event-ID 请求头）"),
+):
+    """
+    以 SSE 观看任务的事件日志
+
+    发送任务已有的事件，之后实时发送新事件，任务结束后关闭连接；
+    多个客户端可以同时观看同一个任务。每个事件带单调递增的 id，
+    断线重连时带 Last-Event-ID 只发送之后的事件。
+
+    Raises:
+        HTTPException: 任务不存在（404）
+    """
+    log = get_scheduler(request.app).events(task_id)
+    if log is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return event_stream(log, resume_after(last_event_id, lastEventId))
@@ -0,0 +1,153 @@
+"""
+CancelToken - 任务取消令牌
+
+取消可能发生在任意线程（通常是事件循环），而步骤在工作线程中执行：
+- 工作线程在模型流式输出的每个 chunk 和设备动作之前检查令牌
+- 取消时立即调用已注册的回调（例如关闭进行中的模型流式响应）
+- 事件循环中可以 await token.wait()
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class TaskCancelled(Exception):
+    """任务已被取消"""
+
+
+class CancelToken:
+    """
+    一个任务的取消令牌（线程安全）
+
+    示例：
+        >>> token = CancelToken("task-1")
+        >>> remove = token.add_callback(stream.close)
+        >>> token.cancel()          # 其他线程
+        >>> token.raise_if_cancelled()
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.cancelled_at: Optional[float] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> bool:
+        """
+        取消并调用所有回调（回调中的异常只打印）
+
+        Returns:
+            bool: 是否是第一次取消
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.cancelled_at = time.time()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CancelToken] Cancel callback failed for {self.task_id}: {e}")
+        return True
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        注册取消回调（已取消时立即调用）
+
+        Returns:
+            Callable: 注销回调的函数
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+
+        callback()
+        return lambda: None
+
+    def clear_callbacks(self):
+        """任务结束后释放回调引用"""
+        with self._lock:
+            self._callbacks = []
+
+    def raise_if_cancelled(self):
+        """
+        Raises:
+            TaskCancelled: 已取消
+        """
+        if self._event.is_set():
+            raise TaskCancelled(self.task_id)
+
+    async def wait(self):
+        """在事件循环中等待取消"""
+        if self.cancelled:
+            return
+
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        remove = self.add_callback(lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            await event.wait()
+        finally:
+            remove()
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+
+class CancellableStream:
+    """
+    可取消的流式响应（例如 OpenAI 的 chat.completions 流）
+
+    迭代时每个 chunk 之前检查令牌；取消时关闭底层响应，
+    正在等待下一个 chunk 的工作线程随即退出并抛出 TaskCancelled。
+    """
+
+    def __init__(self, stream, token: CancelToken):
+        self.stream = stream
+        self.token = token
+        self._remove = token.add_callback(self.close)
+
+    def __iter__(self):
+        try:
+            for chunk in self.stream:
+                self.token.raise_if_cancelled()
+                yield chunk
+        except TaskCancelled:
+            raise
+        except Exception:
+            # 关闭响应导致的读取错误
+            self.token.raise_if_cancelled()
+            raise
+        finally:
+            self._remove()
+
+        self.token.raise_if_cancelled()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            close()
@@ -2,10 +2,58 @@
 scrcpy 管理模块
 提供设备投屏功能
 
-- ScrcpyStreamer: H.264 NAL 流式管理器（推荐）
-- ScrcpyManager: JPEG 流管理器（已废弃）
+- ScrcpyStreamer: H.264 / H.265 / AV1 视频流管理器（推荐）
+- StreamerPool: 多设备 streamer 池（动态端口 + scid，按 profile 区分编码参数）
+- StreamProfile / ProfileRegistry: 视频流配置（编码格式、分辨率、帧率、码率）
+- NalBroadcaster: NAL 单元广播中心（每个订阅者独立游标，支持仅关键帧订阅）
+- FrameDecoder / Frame: 进程内解码（真实尺寸的 JPEG / 原始像素帧，需要 PyAV）
+- ScreenshotProvider: agent 截图优先取自实时视频流，退回 screencap
+- ThumbnailService: 多设备缩略图（关键帧解码为 JPEG，需要 PyAV）
+- StreamRecorder: 视频流录制（分片 MP4 / 原始码流分段，后台线程写入）
+- TaskTimeline: 任务步骤时间线（墙上时钟 + PTS），按步骤定位录像关键帧
+- ScrcpyController: scrcpy 控制 socket（触控 / 按键 / 文本注入）
+- ScrcpyPacket / StreamStats: 带 PTS 的 packet 和时延统计
+- ScrcpyManager: JPEG 帧回调接口（已废弃，内部使用 ScrcpyStreamer + FrameDecoder）
 """
+from .broadcaster import NalBroadcaster, NalSubscriber
+from .codecs import VideoCodec, get_codec
+from .control import ScrcpyController
+from .decoder import Frame, FrameDecoder
 from .manager import ScrcpyManager
+from .packet_reader import ScrcpyPacket
+from .pool import StreamerPool, StreamerPoolFull
+from .profiles import ProfileRegistry, StreamProfile
+from .recorder import RecordingSegment, StreamRecorder
+from .screenshot import ScreenshotProvider, StreamScreenshot
+from .stats import StreamStats
 from .streamer import ScrcpyStreamer
+from .thumbnails import Thumbnail, ThumbnailService
+from .timeline import SeekPoint, StepMark, TaskTimeline, find_seek_point
 
-__all__ = ["ScrcpyStreamer", "ScrcpyManager"]
+__all__ = [
+    "ScrcpyStreamer",
+    "StreamerPool",
+    "StreamerPoolFull",
+    "StreamProfile",
+    "ProfileRegistry",
+    "VideoCodec",
+    "get_codec",
+    "NalBroadcaster",
+    "NalSubscriber",
+    "ScrcpyController",
+    "ScrcpyPacket",
+    "StreamStats",
+    "StreamRecorder",
+    "RecordingSegment",
+    "TaskTimeline",
+    "StepMark",
+    "SeekPoint",
+    "find_seek_point",
+    "FrameDecoder",
+    "Frame",
+    "ScreenshotProvider",
+    "StreamScreenshot",
+    "Thumbnail",
+    "ThumbnailService",
+    "ScrcpyManager",
+]
@@ -0,0 +1,478 @@
+"""
+NalBroadcaster - NAL 单元广播中心
+
+一个设备只有一个读取者（缓存线程）发布 NAL 单元，
+所有订阅者共享同一个有界环形缓冲区，各自维护读取游标：
+- 每个订阅者都能收到完整的 NAL 序列（互不争抢）
+- 订阅者之间共享同一个 bytes 对象，不做额外拷贝
+- 慢订阅者只会落后并被截断，永远不会阻塞读取者
+
+背压策略（按 GOP 边界丢帧）：
+- 订阅者落后超过延迟预算（以视频毫秒计，而不是 NAL 个数）时，
+  直接跳到最新的 SPS/PPS/IDR 重新开始，不会在 GOP 中间丢 P 帧
+- 视频时长按编码器 PTS 计算：网络抖动后成批到达的积压 packet 接收时间几乎相同，
+  只有 PTS 能反映真实落后了多少；参数集取相邻视频帧的 PTS，PTS 重置（重连）时使用接收时间
+- 落后超过环形缓冲区容量时，丢弃到下一个关键帧/参数集为止
+
+仅关键帧模式（缩略图墙等低帧率预览）：
+- 订阅者只收到参数集 + 关键帧组成的同步组，P 帧直接跳过
+- 每次都从最新的同步组开始，并按 max_fps 限制同步组的发送频率
+"""
+
+import asyncio
+import threading
+import time
+from typing import List, Optional, Set
+
+from .packet_reader import ScrcpyPacket
+
+# 参数集没有 PTS 时，最多向前/向后查找多少个 NAL 来取相邻视频帧的 PTS
+CONFIG_PTS_SCAN = 8
+
+
+class NalSubscriber:
+    """
+    NAL 广播订阅者
+
+    在广播中心的环形缓冲区上维护自己的游标，
+    支持 ``async for`` 逐个消费 NAL 单元。
+
+    示例：
+        >>> subscriber = broadcaster.subscribe()
+        >>> async for nal in subscriber:
+        ...     await websocket.send_bytes(nal)
+    """
+
+    def __init__(
+        self,
+        broadcaster: "NalBroadcaster",
+        cursor: int,
+        latency_budget_ms: Optional[float] = None,
+        keyframes_only: bool = False,
+        max_fps: Optional[float] = None,
+    ):
+        self._broadcaster = broadcaster
+
+        # 下一个要读取的序号
+        self.cursor = cursor
+
+        # 延迟预算（视频毫秒），None 表示不按延迟截断
+        self.latency_budget_ms = latency_budget_ms
+
+        # 因落后而跳过的 NAL 数量
+        self.dropped = 0
+
+        # 因超出延迟预算而跳到最新关键帧的次数
+        self.gop_skips = 0
+
+        # 缓冲区溢出后等待下一个关键帧/参数集
+        self.waiting_for_keyframe = False
+
+        # 仅关键帧模式：只发送参数集 + 关键帧，同步组之间至少间隔 1 / max_fps 秒
+        self.keyframes_only = keyframes_only
+        self.min_interval = 1 / max_fps if max_fps else 0.0
+
+        # 正在发送的同步组尚未结束（关键帧还没发出）
+        self.in_sync_group = False
+
+        # 从缓冲区中最新的同步组开始读取（参数集 + 关键帧 + 之后的 P 帧）
+        self.started_at_keyframe = False
+
+        # 下一个同步组最早的发送时间（单调时钟）
+        self.next_group_at = time.monotonic() + self.min_interval if keyframes_only else 0.0
+
+        self.is_closed = False
+
+    @property
+    def lag_ms(self) -> float:
+        """当前落后的视频时长（毫秒，游标处与最新 NAL 的 PTS 之差；PTS 重置时按接收时间）"""
+        return self._broadcaster._lag_ms(self.cursor)
+
+    def get_nowait(self) -> Optional[bytes]:
+        """
+        非阻塞读取下一个 NAL 单元
+
+        Returns:
+            bytes: NAL 单元，没有新数据时返回 None
+        """
+        if self.is_closed:
+            return None
+
+        packet = self._broadcaster._read(self)
+        return packet.data if packet else None
+
+    async def get(self) -> Optional[bytes]:
+        """
+        等待并读取下一个 NAL 单元
+
+        Returns:
+            bytes: NAL 单元，广播结束或订阅已关闭时返回 None
+        """
+        packet = await self.get_packet()
+        return packet.data if packet else None
+
+    async def get_packet(self) -> Optional[ScrcpyPacket]:
+        """
+        等待并读取下一个 packet（NAL 单元及其 PTS、标志位）
+
+        Returns:
+            ScrcpyPacket: packet，广播结束或订阅已关闭时返回 None
+        """
+        while not self.is_closed:
+            if self.keyframes_only and not self.in_sync_group:
+                # 限制同步组频率：等到允许发送时再取最新的同步组
+                delay = self.next_group_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+            packet = self._broadcaster._read(self)
+            if packet is not None:
+                return packet
+
+            if self._broadcaster.is_closed:
+                return None
+
+            await self._broadcaster._wait()
+
+        return None
+
+    def close(self):
+        """取消订阅"""
+        if self.is_closed:
+            return
+
+        self.is_closed = True
+        self._broadcaster._unsubscribe(self)
+
+    def __aiter__(self) -> "NalSubscriber":
+        return self
+
+    async def __anext__(self) -> bytes:
+        nal = await self.get()
+        if nal is None:
+            raise StopAsyncIteration
+        return nal
+
+
+class NalBroadcaster:
+    """
+    单生产者、多订阅者的 NAL 单元广播中心
+
+    - publish() 可在任意线程调用（缓存线程），只写环形缓冲区并唤醒事件循环
+    - 订阅者在事件循环中消费，所有等待者共享同一个唤醒 Future，
+      每个 NAL 只产生一次跨线程调度，与订阅者数量无关
+    """
+
+    def __init__(self, capacity: int = 256):
+        """
+        初始化广播中心
+
+        Args:
+            capacity: 环形缓冲区容量（NAL 单元个数），默认 256
+        """
+        self.capacity = capacity
+
+        # 环形缓冲区：序号 seq 存放在 seq % capacity
+        self._ring: List[Optional[ScrcpyPacket]] = [None] * capacity
+        self._timestamps: List[float] = [0.0] * capacity
+        self._sync_points: List[bool] = [False] * capacity
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+        # 最新的重新同步位置（SPS/PPS/IDR 组的起点），-1 表示尚未出现
+        self._resync_seq = -1
+        # 当前连续参数集（SPS/PPS）的起点
+        self._config_run_start: Optional[int] = None
+
+        self._subscribers: Set[NalSubscriber] = set()
+
+        # 事件循环唤醒
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._wake_pending = False
+
+        self.is_closed = False
+
+    @property
+    def subscriber_count(self) -> int:
+        """当前订阅者数量"""
+        return len(self._subscribers)
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """绑定订阅者所在的事件循环"""
+        self._loop = loop
+
+    def subscribe(
+        self,
+        latency_budget_ms: Optional[float] = None,
+        keyframes_only: bool = False,
+        max_fps: Optional[float] = None,
+        from_keyframe: bool = False,
+    ) -> NalSubscriber:
+        """
+        新建订阅者
+
+        订阅者从下一个发布的 NAL 开始读取；from_keyframe=True 时从缓冲区中
+        最新的 SPS/PPS/IDR 开始，连同其后已发布的 P 帧，解码器可以立即得到当前画面。
+
+        Args:
+            latency_budget_ms: 延迟预算（视频毫秒，按编码器 PTS 计算：游标处与最新 NAL 的
+                PTS 之差），落后超过预算时跳到最新的 SPS/PPS/IDR；None 表示不按延迟截断
+            keyframes_only: 只接收参数集 + 关键帧（每次都是最新的同步组）
+            max_fps: 仅关键帧模式下同步组的最大频率，None 表示不限制；
+                订阅者通常已从初始化数据拿到最新关键帧，第一组同样要等待一个间隔
+            from_keyframe: 从最新的同步组开始读取（缓冲区中没有同步组时从下一个 NAL 开始，
+                可通过 subscriber.started_at_keyframe 判断）
+
+        Returns:
+            NalSubscriber: 订阅者
+        """
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+        with self._lock:
+            oldest = max(0, self._next_seq - self.capacity)
+            started_at_keyframe = from_keyframe and self._resync_seq >= oldest
+            cursor = self._resync_seq if started_at_keyframe else self._next_seq
+
+            subscriber = NalSubscriber(
+                self, cursor, latency_budget_ms, keyframes_only, max_fps
+            )
+            subscriber.started_at_keyframe = started_at_keyframe
+            self._subscribers.add(subscriber)
+
+        return subscriber
+
+    def publish(
+        self,
+        nal: bytes,
+        timestamp: Optional[float] = None,
+        is_keyframe: bool = False,
+        is_config: bool = False,
+        pts: Optional[int] = None,
+    ):
+        """
+        发布一个 NAL 单元（线程安全）
+
+        Args:
+            nal: NAL 单元数据
+            timestamp: 接收时间（秒），默认使用当前单调时钟；没有 PTS 时用于计算延迟
+            is_keyframe: 是否为关键帧（IDR）
+            is_config: 是否为参数集（SPS/PPS）
+            pts: 编码器时间戳（微秒），随 packet 传给订阅者，并用于计算落后的视频时长
+        """
+        if self.is_closed:
+            return
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+
+        packet = ScrcpyPacket(nal, pts, is_config, is_keyframe, timestamp)
+
+        with self._lock:
+            seq = self._next_seq
+            index = seq % self.capacity
+
+            self._ring[index] = packet
+            self._timestamps[index] = timestamp
+            self._sync_points[index] = is_keyframe or is_config
+
+            # 记录重新同步位置：紧邻 IDR 之前的参数集连同 IDR 一起作为起点
+            if is_config:
+                if self._config_run_start is None:
+                    self._config_run_start = seq
+            elif is_keyframe:
+                if self._config_run_start is not None:
+                    self._resync_seq = self._config_run_start
+                else:
+                    self._resync_seq = seq
+                self._config_run_start = None
+            else:
+                self._config_run_start = None
+
+            self._next_seq = seq + 1
+
+        self._schedule_wake()
+
+    def close(self):
+        """关闭广播，订阅者读完剩余数据后结束（线程安全）"""
+        self.is_closed = True
+        self._schedule_wake()
+
+    def _unsubscribe(self, subscriber: NalSubscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _lag_ms(self, cursor: int) -> float:
+        """游标处 NAL 与最新 NAL 之间的视频时长（毫秒）"""
+        with self._lock:
+            oldest = max(0, self._next_seq - self.capacity)
+            if cursor >= self._next_seq:
+                return 0.0
+
+            return self._video_lag_ms(max(cursor, oldest), self._next_seq - 1)
+
+    def _video_lag_ms(self, seq: int, newest_seq: int) -> float:
+        """
+        两个 NAL 之间的视频时长（毫秒，调用方持有锁）
+
+        优先使用编码器 PTS（微秒，参数集取相邻视频帧的 PTS）；
+        找不到 PTS 或 PTS 倒退（编码器重启）时，退回主机接收时间。
+        """
+        current = self._nearest_pts(seq, 1)
+        newest = self._nearest_pts(newest_seq, -1)
+
+        if current is not None and newest is not None and newest >= current:
+            return (newest - current) / 1000
+
+        return (
+            self._timestamps[newest_seq % self.capacity] - self._timestamps[seq % self.capacity]
+        ) * 1000
+
+    def _nearest_pts(self, seq: int, step: int) -> Optional[int]:
+        """seq 处的 PTS；参数集没有 PTS，沿 step 方向取最近的视频帧（调用方持有锁）"""
+        oldest = max(0, self._next_seq - self.capacity)
+
+        for _ in range(CONFIG_PTS_SCAN):
+            if not oldest <= seq < self._next_seq:
+                return None
+
+            packet = self._ring[seq % self.capacity]
+            if packet is not None and packet.pts is not None:
+                return packet.pts
+            seq += step
+
+        return None
+
+    def _skip_to(self, subscriber: NalSubscriber, seq: int):
+        subscriber.dropped += seq - subscriber.cursor
+        subscriber.cursor = seq
+
+    def _read(self, subscriber: NalSubscriber) -> Optional[ScrcpyPacket]:
+        """
+        读取订阅者游标处的 packet，并应用 GOP 边界丢帧策略
+
+        - 被环形缓冲区覆盖：跳到最新的同步点，否则丢弃到下一个关键帧/参数集
+        - 超出延迟预算且存在更新的同步点：跳到最新的 SPS/PPS/IDR
+        - 超出预算但没有更新的关键帧：按顺序继续发送，避免 GOP 中间丢帧
+        """
+        with self._lock:
+            next_seq = self._next_seq
+            oldest = max(0, next_seq - self.capacity)
+            resync_seq = self._resync_seq if self._resync_seq >= oldest else -1
+
+            if subscriber.keyframes_only:
+                return self._read_sync_group(subscriber, next_seq, oldest, resync_seq)
+
+            if subscriber.cursor < oldest:
+                if resync_seq >= 0:
+                    self._skip_to(subscriber, resync_seq)
+                else:
+                    self._skip_to(subscriber, oldest)
+                    subscriber.waiting_for_keyframe = True
+
+            if subscriber.cursor >= next_seq:
+                return None
+
+            budget = subscriber.latency_budget_ms
+            if budget is not None and resync_seq > subscriber.cursor:
+                if self._video_lag_ms(subscriber.cursor, next_seq - 1) > budget:
+                    self._skip_to(subscriber, resync_seq)
+                    subscriber.gop_skips += 1
+                    subscriber.waiting_for_keyframe = False
+
+            if subscriber.waiting_for_keyframe:
+                # 丢弃到下一个关键帧/参数集为止
+                while (
+                    subscriber.cursor < next_seq
+                    and not self._sync_points[subscriber.cursor % self.capacity]
+                ):
+                    subscriber.cursor += 1
+                    subscriber.dropped += 1
+
+                if subscriber.cursor >= next_seq:
+                    return None
+
+                subscriber.waiting_for_keyframe = False
+
+            packet = self._ring[subscriber.cursor % self.capacity]
+            subscriber.cursor += 1
+
+            return packet
+
+    def _read_sync_group(
+        self, subscriber: NalSubscriber, next_seq: int, oldest: int, resync_seq: int
+    ) -> Optional[ScrcpyPacket]:
+        """
+        仅关键帧模式的读取（调用方持有锁）
+
+        不在同步组中时跳到最新的同步组（受 max_fps 限制），
+        然后依次发送其中的参数集，发出关键帧后同步组结束。
+        中间的 P 帧属于正常过滤，不计入 dropped。
+        """
+        if subscriber.in_sync_group and subscriber.cursor < oldest:
+            # 同步组还没发完就被覆盖，重新选择
+            subscriber.in_sync_group = False
+            subscriber.dropped += 1
+
+        if not subscriber.in_sync_group:
+            if resync_seq < subscriber.cursor:
+                return None
+
+            if time.monotonic() < subscriber.next_group_at:
+                return None
+
+            subscriber.cursor = resync_seq
+            subscriber.in_sync_group = True
+
+        if subscriber.cursor >= next_seq:
+            return None
+
+        index = subscriber.cursor % self.capacity
+        packet = self._ring[index]
+        subscriber.cursor += 1
+
+        if packet is not None and (packet.is_keyframe or not packet.is_config):
+            subscriber.in_sync_group = False
+            subscriber.next_group_at = time.monotonic() + subscriber.min_interval
+
+        return packet
+
+    def _schedule_wake(self):
+        """唤醒事件循环中等待的订阅者"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            self._wake()
+        elif not self._wake_pending:
+            self._wake_pending = True
+            try:
+                loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # 事件循环已关闭
+                self._wake_pending = False
+
+    def _wake(self):
+        self._wake_pending = False
+
+        waiter = self._waiter
+        self._waiter = None
+
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _wait(self):
+        """等待下一次发布或关闭"""
+        if self._waiter is None or self._waiter.done():
+            self._waiter = asyncio.get_running_loop().create_future()
+
+        # shield：单个订阅者被取消时不影响共享的 Future
+        await asyncio.shield(self._waiter)
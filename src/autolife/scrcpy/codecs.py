@@ -0,0 +1,342 @@
+"""
+视频编码格式
+
+scrcpy-server 支持 H.264 / H.265 / AV1（取决于设备编码器），
+streamer 通过这里的编码格式对象识别参数集、关键帧并解析视频尺寸：
+- H.264 / H.265：Annex-B 码流，按 NAL 类型识别
+- AV1：OBU 码流，没有起始码，按 scrcpy packet header 的标志位识别，
+  尺寸从序列头 OBU 中解析
+"""
+
+from typing import Dict, Optional, Tuple
+
+from .h264 import BitReader, nal_to_rbsp, parse_sps_resolution, split_nal_units, strip_start_code
+from .packet_reader import PACKET_FLAG_CONFIG, PACKET_FLAG_KEY_FRAME
+
+
+class VideoCodec:
+    """编码格式（H.264 默认实现由子类覆盖）"""
+
+    # scrcpy-server 的 video_codec 参数
+    name = ""
+
+    # 元数据头中的 codec 字段（4 字节）
+    header_id = b""
+
+    # 携带视频尺寸的参数集类型
+    resolution_key: Optional[int] = None
+
+    def config_key(self, data: bytes, pts_flags: int) -> Optional[int]:
+        """
+        参数集类型（用于分别缓存 SPS / PPS 等），不是参数集时返回 None
+        """
+        raise NotImplementedError
+
+    def is_keyframe(self, data: bytes, pts_flags: int) -> bool:
+        """是否为关键帧（可作为解码起点）"""
+        raise NotImplementedError
+
+    def parse_resolution(self, config: bytes) -> Optional[Tuple[int, int]]:
+        """从参数集中解析视频尺寸，失败时返回 None"""
+        return None
+
+
+class H264Codec(VideoCodec):
+    """H.264：SPS(7) / PPS(8) 为参数集，IDR(5) 为关键帧"""
+
+    name = "h264"
+    header_id = b"h264"
+
+    NAL_TYPE_IDR = 5
+    NAL_TYPE_SPS = 7
+    NAL_TYPE_PPS = 8
+
+    resolution_key = NAL_TYPE_SPS
+
+    @staticmethod
+    def nal_type(data: bytes) -> Optional[int]:
+        payload = strip_start_code(data[:5])
+        return payload[0] & 0x1F if payload else None
+
+    def config_key(self, data: bytes, pts_flags: int) -> Optional[int]:
+        nal_type = self.nal_type(data)
+        return nal_type if nal_type in (self.NAL_TYPE_SPS, self.NAL_TYPE_PPS) else None
+
+    def is_keyframe(self, data: bytes, pts_flags: int) -> bool:
+        return self.nal_type(data) == self.NAL_TYPE_IDR
+
+    def parse_resolution(self, config: bytes) -> Optional[Tuple[int, int]]:
+        return parse_sps_resolution(config)
+
+
+class H265Codec(VideoCodec):
+    """
+    H.265：VPS(32) / SPS(33) / PPS(34) 为参数集，IRAP(16-23) 为关键帧
+
+    scrcpy 把 VPS + SPS + PPS 放在同一个参数集 packet 中，整体缓存。
+    """
+
+    name = "h265"
+    header_id = b"h265"
+
+    NAL_TYPE_VPS = 32
+    NAL_TYPE_SPS = 33
+    NAL_TYPE_PPS = 34
+
+    resolution_key = NAL_TYPE_VPS
+
+    @staticmethod
+    def nal_type(data: bytes) -> Optional[int]:
+        payload = strip_start_code(data[:6])
+        return (payload[0] >> 1) & 0x3F if payload else None
+
+    def config_key(self, data: bytes, pts_flags: int) -> Optional[int]:
+        nal_type = self.nal_type(data)
+        if nal_type in (self.NAL_TYPE_VPS, self.NAL_TYPE_SPS, self.NAL_TYPE_PPS):
+            return nal_type
+        return None
+
+    def is_keyframe(self, data: bytes, pts_flags: int) -> bool:
+        nal_type = self.nal_type(data)
+        return nal_type is not None and 16 <= nal_type <= 23
+
+    def parse_resolution(self, config: bytes) -> Optional[Tuple[int, int]]:
+        for nal in split_nal_units(config):
+            if nal and (nal[0] >> 1) & 0x3F == self.NAL_TYPE_SPS:
+                return parse_hevc_sps_resolution(nal)
+        return None
+
+
+class AV1Codec(VideoCodec):
+    """
+    AV1：参数集 packet（编码器的 av1C / 序列头）按标志位识别
+
+    关键帧同样由 scrcpy packet header 标记。
+    """
+
+    name = "av1"
+    header_id = b"\x00av1"
+
+    CONFIG_KEY = 0
+    resolution_key = CONFIG_KEY
+
+    def config_key(self, data: bytes, pts_flags: int) -> Optional[int]:
+        return self.CONFIG_KEY if pts_flags & PACKET_FLAG_CONFIG else None
+
+    def is_keyframe(self, data: bytes, pts_flags: int) -> bool:
+        return bool(pts_flags & PACKET_FLAG_KEY_FRAME)
+
+    def parse_resolution(self, config: bytes) -> Optional[Tuple[int, int]]:
+        return parse_av1_resolution(config)
+
+
+CODECS: Dict[str, VideoCodec] = {
+    codec.name: codec for codec in (H264Codec(), H265Codec(), AV1Codec())
+}
+
+
+def get_codec(name: str) -> VideoCodec:
+    """
+    按 scrcpy 参数名获取编码格式
+
+    Raises:
+        ValueError: 不支持的编码格式
+    """
+    codec = CODECS.get(name.lower())
+    if codec is None:
+        raise ValueError(f"Unsupported video codec: {name} (supported: {', '.join(CODECS)})")
+    return codec
+
+
+def codec_from_header(header_id: bytes) -> Optional[VideoCodec]:
+    """按元数据头中的 codec 字段获取编码格式，未知时返回 None"""
+    for codec in CODECS.values():
+        if codec.header_id == header_id:
+            return codec
+    return None
+
+
+def _skip_profile_tier_level(reader: BitReader, max_sub_layers_minus1: int):
+    # general_profile_space ~ general_level_idc：共 96 位
+    reader.bits(96)
+
+    sub_layer_profile = []
+    sub_layer_level = []
+    for _ in range(max_sub_layers_minus1):
+        sub_layer_profile.append(reader.bit())
+        sub_layer_level.append(reader.bit())
+
+    if max_sub_layers_minus1 > 0:
+        reader.bits(2 * (8 - max_sub_layers_minus1))
+
+    for profile_present, level_present in zip(sub_layer_profile, sub_layer_level):
+        if profile_present:
+            reader.bits(88)
+        if level_present:
+            reader.bits(8)
+
+
+def parse_hevc_sps_resolution(nal: bytes) -> Optional[Tuple[int, int]]:
+    """
+    从 H.265 SPS NAL 单元解析视频尺寸（已应用裁剪窗口）
+
+    Args:
+        nal: SPS NAL 单元（可以包含起始码）
+
+    Returns:
+        (width, height)，解析失败时返回 None
+    """
+    payload = strip_start_code(nal)
+
+    if len(payload) < 3 or (payload[0] >> 1) & 0x3F != H265Codec.NAL_TYPE_SPS:
+        return None
+
+    # 2 字节 NAL header
+    reader = BitReader(nal_to_rbsp(payload[2:]))
+
+    try:
+        reader.bits(4)  # sps_video_parameter_set_id
+        max_sub_layers_minus1 = reader.bits(3)
+        reader.bit()  # sps_temporal_id_nesting_flag
+
+        _skip_profile_tier_level(reader, max_sub_layers_minus1)
+
+        reader.ue()  # sps_seq_parameter_set_id
+        chroma_format_idc = reader.ue()
+        separate_colour_plane = reader.bit() if chroma_format_idc == 3 else 0
+
+        width = reader.ue()
+        height = reader.ue()
+
+        crop_left = crop_right = crop_top = crop_bottom = 0
+        if reader.bit():  # conformance_window_flag
+            crop_left = reader.ue()
+            crop_right = reader.ue()
+            crop_top = reader.ue()
+            crop_bottom = reader.ue()
+    except (IndexError, ValueError):
+        return None
+
+    # 裁剪单位取决于色度格式
+    if chroma_format_idc in (1, 2) and not separate_colour_plane:
+        sub_width = 2
+        sub_height = 2 if chroma_format_idc == 1 else 1
+    else:
+        sub_width = sub_height = 1
+
+    width -= sub_width * (crop_left + crop_right)
+    height -= sub_height * (crop_top + crop_bottom)
+
+    if width <= 0 or height <= 0:
+        return None
+
+    return width, height
+
+
+# AV1 OBU 类型：序列头
+OBU_SEQUENCE_HEADER = 1
+
+
+def _read_leb128(data: bytes, pos: int) -> Tuple[int, int]:
+    value = 0
+    for i in range(8):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << (7 * i)
+        if not byte & 0x80:
+            break
+    return value, pos
+
+
+def parse_av1_resolution(config: bytes) -> Optional[Tuple[int, int]]:
+    """
+    从 AV1 参数集（av1C 或 OBU 序列）中的序列头解析最大帧尺寸
+
+    scrcpy 编码的每一帧都是完整画面，最大帧尺寸即视频尺寸。
+
+    Returns:
+        (width, height)，没有序列头或解析失败时返回 None
+    """
+    # av1C：marker(1) + version(7) 为 0x81，之后 3 字节配置，再之后是 OBU
+    pos = 4 if config[:1] == b"\x81" else 0
+
+    try:
+        while pos < len(config):
+            header = config[pos]
+            obu_type = (header >> 3) & 0x0F
+            has_extension = header & 0x04
+            has_size = header & 0x02
+            pos += 2 if has_extension else 1
+
+            if has_size:
+                size, pos = _read_leb128(config, pos)
+            else:
+                size = len(config) - pos
+
+            if obu_type == OBU_SEQUENCE_HEADER:
+                return _parse_av1_sequence_header(config[pos:pos + size])
+
+            pos += size
+    except (IndexError, ValueError):
+        return None
+
+    return None
+
+
+def _parse_av1_sequence_header(data: bytes) -> Optional[Tuple[int, int]]:
+    reader = BitReader(data)
+
+    reader.bits(3)  # seq_profile
+    reader.bit()  # still_picture
+    reduced_still_picture_header = reader.bit()
+
+    if reduced_still_picture_header:
+        reader.bits(5)  # seq_level_idx[0]
+    else:
+        decoder_model_info_present = 0
+        buffer_delay_length = 0
+
+        if reader.bit():  # timing_info_present_flag
+            reader.bits(32)  # num_units_in_display_tick
+            reader.bits(32)  # time_scale
+            if reader.bit():  # equal_picture_interval
+                _read_uvlc(reader)
+
+            decoder_model_info_present = reader.bit()
+            if decoder_model_info_present:
+                buffer_delay_length = reader.bits(5) + 1
+                reader.bits(32)  # num_units_in_decoding_tick
+                reader.bits(5)  # buffer_removal_time_length_minus_1
+                reader.bits(5)  # frame_presentation_time_length_minus_1
+
+        initial_display_delay_present = reader.bit()
+
+        for _ in range(reader.bits(5) + 1):  # operating_points_cnt_minus_1
+            reader.bits(12)  # operating_point_idc
+            if reader.bits(5) > 7:  # seq_level_idx
+                reader.bit()  # seq_tier
+
+            if decoder_model_info_present and reader.bit():
+                reader.bits(buffer_delay_length)  # decoder_buffer_delay
+                reader.bits(buffer_delay_length)  # encoder_buffer_delay
+                reader.bit()  # low_delay_mode_flag
+
+            if initial_display_delay_present and reader.bit():
+                reader.bits(4)  # initial_display_delay_minus_1
+
+    width_bits = reader.bits(4) + 1
+    height_bits = reader.bits(4) + 1
+
+    width = reader.bits(width_bits) + 1
+    height = reader.bits(height_bits) + 1
+
+    return width, height
+
+
+def _read_uvlc(reader: BitReader) -> int:
+    zeros = 0
+    while reader.bit() == 0:
+        zeros += 1
+        if zeros >= 32:
+            raise ValueError("invalid uvlc code")
+    return (1 << zeros) - 1 + reader.bits(zeros)
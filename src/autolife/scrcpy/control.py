@@ -0,0 +1,346 @@
+"""
+ScrcpyController - scrcpy 控制 socket
+
+scrcpy-server 以 control=true 启动时，视频 socket 之后的第二个连接是控制 socket。
+通过它发送二进制控制消息（触控 / 滚动 / 按键 / 文本），由 server 直接注入输入事件，
+不经过 adb shell input（每次都要启动一个 JVM，耗时 150-400ms）。
+
+消息格式（scrcpy v3.3.3，大端序）：
+- INJECT_KEYCODE (0)：type(1) action(1) keycode(4) repeat(4) metastate(4)
+- INJECT_TEXT (1)：type(1) length(4) text(UTF-8)
+- INJECT_TOUCH_EVENT (2)：type(1) action(1) pointer_id(8) x(4) y(4) w(2) h(2)
+  pressure(2, u16 定点数) action_button(4) buttons(4)
+- INJECT_SCROLL_EVENT (3)：type(1) x(4) y(4) w(2) h(2) hscroll(2) vscroll(2) buttons(4)
+
+坐标是视频帧坐标，并附带当前视频尺寸（w, h），尺寸与 server 当前画面不一致时事件被丢弃。
+"""
+
+import asyncio
+import struct
+from typing import Optional, Tuple
+
+
+# 控制消息类型
+TYPE_INJECT_KEYCODE = 0
+TYPE_INJECT_TEXT = 1
+TYPE_INJECT_TOUCH_EVENT = 2
+TYPE_INJECT_SCROLL_EVENT = 3
+
+# android.view.KeyEvent 动作
+KEY_ACTION_DOWN = 0
+KEY_ACTION_UP = 1
+
+# android.view.MotionEvent 动作
+MOTION_ACTION_DOWN = 0
+MOTION_ACTION_UP = 1
+MOTION_ACTION_MOVE = 2
+
+MOTION_ACTIONS = {
+    "down": MOTION_ACTION_DOWN,
+    "up": MOTION_ACTION_UP,
+    "move": MOTION_ACTION_MOVE,
+}
+
+# 指针 ID：-1 表示鼠标，-2 表示普通手指
+POINTER_ID_MOUSE = -1
+POINTER_ID_GENERIC_FINGER = -2
+
+# 文本注入的最大长度（字节），与 scrcpy 客户端一致
+TEXT_MAX_LENGTH = 300
+
+# 常用 Android 按键码
+ANDROID_KEYCODES = {
+    "KEYCODE_HOME": 3,
+    "KEYCODE_BACK": 4,
+    "KEYCODE_VOLUME_UP": 24,
+    "KEYCODE_VOLUME_DOWN": 25,
+    "KEYCODE_POWER": 26,
+    "KEYCODE_ENTER": 66,
+    "KEYCODE_DEL": 67,
+    "KEYCODE_MENU": 82,
+    "KEYCODE_APP_SWITCH": 187,
+}
+
+_KEYCODE = struct.Struct(">BBiii")
+_TOUCH = struct.Struct(">BBqiiHHHii")
+_SCROLL = struct.Struct(">BiiHHhhi")
+
+
+def encode_keycode(keycode: int, action: int, repeat: int = 0, metastate: int = 0) -> bytes:
+    """编码按键消息（14 字节）"""
+    return _KEYCODE.pack(TYPE_INJECT_KEYCODE, action, keycode, repeat, metastate)
+
+
+def encode_text(text: str) -> bytes:
+    """编码文本消息（超长时按 UTF-8 字符边界截断）"""
+    data = text.encode("utf-8")[:TEXT_MAX_LENGTH].decode("utf-8", errors="ignore").encode("utf-8")
+    return struct.pack(">BI", TYPE_INJECT_TEXT, len(data)) + data
+
+
+def encode_touch(
+    action: int,
+    x: int,
+    y: int,
+    screen_width: int,
+    screen_height: int,
+    pointer_id: int = POINTER_ID_GENERIC_FINGER,
+    pressure: float = 1.0,
+) -> bytes:
+    """
+    编码触控消息（32 字节）
+
+    Args:
+        action: MotionEvent 动作（DOWN / UP / MOVE）
+        x, y: 视频帧坐标
+        screen_width, screen_height: 当前视频尺寸
+        pointer_id: 指针 ID
+        pressure: 压力（0-1），UP 时为 0
+    """
+    return _TOUCH.pack(
+        TYPE_INJECT_TOUCH_EVENT,
+        action,
+        pointer_id,
+        x,
+        y,
+        screen_width,
+        screen_height,
+        _to_u16_fixed(pressure),
+        0,  # action_button（手指触控为 0）
+        0,  # buttons
+    )
+
+
+def encode_scroll(
+    x: int,
+    y: int,
+    screen_width: int,
+    screen_height: int,
+    hscroll: float,
+    vscroll: float,
+) -> bytes:
+    """
+    编码滚动消息（21 字节）
+
+    Args:
+        hscroll, vscroll: 滚动量（-1 到 1，映射为 i16 定点数）
+    """
+    return _SCROLL.pack(
+        TYPE_INJECT_SCROLL_EVENT,
+        x,
+        y,
+        screen_width,
+        screen_height,
+        _to_i16_fixed(hscroll),
+        _to_i16_fixed(vscroll),
+        0,  # buttons
+    )
+
+
+def _to_u16_fixed(value: float) -> int:
+    value = min(max(value, 0.0), 1.0)
+    return 0xFFFF if value == 1.0 else int(value * 0x10000)
+
+
+def _to_i16_fixed(value: float) -> int:
+    value = min(max(value, -1.0), 1.0)
+    return 0x7FFF if value == 1.0 else int(value * 0x8000)
+
+
+class ScrcpyController:
+    """
+    scrcpy 控制通道
+
+    输入坐标使用设备物理像素（与 /api/scrcpy/resolution 返回的分辨率一致），
+    发送前按当前视频尺寸缩放（自动处理横竖屏）。
+
+    示例：
+        >>> controller = await ScrcpyController.connect(27183)
+        >>> controller.set_screen_size(576, 1280)
+        >>> controller.set_device_size(1080, 2400)
+        >>> await controller.tap(540, 1200)
+        >>> await controller.press_key(ANDROID_KEYCODES["KEYCODE_HOME"])
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+        # 当前视频尺寸（来自视频流元数据头）
+        self.screen_width = 0
+        self.screen_height = 0
+
+        # 设备物理分辨率（wm size），未知时输入坐标视为视频坐标
+        self.device_width = 0
+        self.device_height = 0
+
+        self.is_closed = False
+
+        # 设备消息（剪贴板等）读取任务，避免 socket 接收缓冲区写满
+        self._drain_task = asyncio.create_task(self._drain_device_messages())
+
+    @classmethod
+    async def connect(cls, port: int, host: str = "127.0.0.1") -> "ScrcpyController":
+        """连接控制 socket（必须在视频 socket 收到 dummy 字节之后）"""
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    def set_screen_size(self, width: int, height: int):
+        """更新视频尺寸"""
+        self.screen_width = width
+        self.screen_height = height
+
+    def set_device_size(self, width: int, height: int):
+        """更新设备物理分辨率"""
+        self.device_width = width
+        self.device_height = height
+
+    def to_screen(self, x: float, y: float) -> Tuple[int, int]:
+        """
+        设备物理坐标 → 视频帧坐标
+
+        wm size 始终是自然方向（通常竖屏），视频随屏幕旋转，方向不一致时交换宽高。
+        """
+        sw, sh = self.screen_width, self.screen_height
+        dw, dh = self.device_width, self.device_height
+
+        if dw and dh and sw and sh:
+            if (dw > dh) != (sw > sh):
+                dw, dh = dh, dw
+            x = x * sw / dw
+            y = y * sh / dh
+
+        x = min(max(round(x), 0), max(sw - 1, 0))
+        y = min(max(round(y), 0), max(sh - 1, 0))
+
+        return x, y
+
+    async def send(self, message: bytes):
+        """
+        发送原始控制消息
+
+        Raises:
+            ConnectionError: 控制 socket 已关闭
+        """
+        if self.is_closed:
+            raise ConnectionError("scrcpy control socket closed")
+
+        self.writer.write(message)
+        await self.writer.drain()
+
+    async def touch(
+        self,
+        action: str,
+        x: float,
+        y: float,
+        pointer_id: int = POINTER_ID_GENERIC_FINGER,
+    ):
+        """
+        发送单个触控事件
+
+        Args:
+            action: down / move / up
+            x, y: 设备物理坐标
+            pointer_id: 指针 ID（多指时区分手指）
+        """
+        motion_action = MOTION_ACTIONS.get(action)
+        if motion_action is None:
+            raise ValueError(f"Unknown touch action: {action}")
+
+        sx, sy = self.to_screen(x, y)
+        pressure = 0.0 if motion_action == MOTION_ACTION_UP else 1.0
+
+        await self.send(encode_touch(
+            motion_action, sx, sy, self.screen_width, self.screen_height,
+            pointer_id=pointer_id, pressure=pressure,
+        ))
+
+    async def tap(self, x: float, y: float):
+        """点击（down + up）"""
+        await self.touch("down", x, y)
+        await self.touch("up", x, y)
+
+    async def swipe(
+        self,
+        x1: float,
+        y1: float,
+        x2: float,
+        y2: float,
+        duration_ms: int = 300,
+        interval_ms: int = 16,
+    ):
+        """
+        滑动：down → 按 interval_ms 插值的 move → up
+
+        Args:
+            x1, y1: 起点（设备物理坐标）
+            x2, y2: 终点
+            duration_ms: 持续时间（毫秒）
+            interval_ms: move 事件间隔（毫秒），默认约 60Hz
+        """
+        steps = max(int(duration_ms / interval_ms), 1)
+
+        await self.touch("down", x1, y1)
+
+        for i in range(1, steps + 1):
+            await asyncio.sleep(interval_ms / 1000)
+            t = i / steps
+            await self.touch("move", x1 + (x2 - x1) * t, y1 + (y2 - y1) * t)
+
+        await self.touch("up", x2, y2)
+
+    async def scroll(self, x: float, y: float, hscroll: float, vscroll: float):
+        """在 (x, y) 处滚动，滚动量范围 -1 到 1"""
+        sx, sy = self.to_screen(x, y)
+
+        await self.send(encode_scroll(
+            sx, sy, self.screen_width, self.screen_height, hscroll, vscroll,
+        ))
+
+    async def keycode(self, keycode: int, action: int, repeat: int = 0, metastate: int = 0):
+        """发送单个按键事件"""
+        await self.send(encode_keycode(keycode, action, repeat, metastate))
+
+    async def press_key(self, keycode: int):
+        """按下并抬起按键"""
+        await self.keycode(keycode, KEY_ACTION_DOWN)
+        await self.keycode(keycode, KEY_ACTION_UP)
+
+    async def text(self, text: str):
+        """注入文本（超长文本分段发送）"""
+        data = text.encode("utf-8")
+
+        while data:
+            chunk = data[:TEXT_MAX_LENGTH].decode("utf-8", errors="ignore")
+            await self.send(encode_text(chunk))
+            data = data[len(chunk.encode("utf-8")):]
+
+    async def _drain_device_messages(self):
+        """读取并丢弃设备消息，连接断开时标记关闭"""
+        try:
+            while await self.reader.read(4096):
+                pass
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            if not self.is_closed:
+                print("[ScrcpyController] Control socket closed")
+            self.is_closed = True
+
+    def close(self):
+        """关闭控制 socket"""
+        self.is_closed = True
+        self._drain_task.cancel()
+        self.writer.close()
+
+
+def parse_keycode(name: str) -> Optional[int]:
+    """按键名（HOME / KEYCODE_HOME / 3）→ Android 按键码"""
+    name = name.strip().upper()
+
+    if name.isdigit():
+        return int(name)
+
+    if not name.startswith("KEYCODE_"):
+        name = f"KEYCODE_{name}"
+
+    return ANDROID_KEYCODES.get(name)
@@ -0,0 +1,623 @@
+"""
+FrameDecoder - 进程内视频解码
+
+直接订阅 streamer 的 NAL 流，在后台线程中用 PyAV（可选依赖：pip install autolife[video]）
+解码，输出真实尺寸的 JPEG / PNG 或原始像素帧（rgb24 / yuv420p 等）：
+- 不再启动 scrcpy 命令行 + ffmpeg 进程，也不需要在 JPEG 字节流中查找 SOI/EOI 标记
+- 每帧是独立的 bytes 对象（长度即帧大小），只有客户端要求时才做 base64
+- 按 max_fps 限制输出（每个 packet 都要解码，但只有输出帧才做缩放和编码）
+- 消费者总是拿到最新帧，慢消费者不会积压
+- 从缓冲区中最新的 IDR 开始解码（连同其后的 P 帧），启动后立即得到当前画面
+- snapshot() 按需编码最近解码的一帧（format="none" 时只解码不输出，例如 agent 截图）
+"""
+
+import asyncio
+import base64
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from fractions import Fraction
+from typing import TYPE_CHECKING, AsyncIterator, List, Optional, Tuple, cast
+
+try:
+    import av
+except ImportError:
+    av = None  # type: ignore[assignment]
+
+from .broadcaster import NalSubscriber
+from .packet_reader import ScrcpyPacket
+
+if TYPE_CHECKING:
+    from .streamer import ScrcpyStreamer
+
+
+# 输出格式
+FORMAT_JPEG = "jpeg"
+FORMAT_PNG = "png"
+# 只解码不输出（配合 snapshot() 按需编码）
+FORMAT_NONE = "none"
+# 原始像素格式 → 每个像素（每个平面）的字节数
+RAW_FORMATS = {
+    "rgb24": 3,
+    "bgr24": 3,
+    "rgba": 4,
+    "gray": 1,
+    "yuv420p": 1,
+}
+FRAME_FORMATS = (FORMAT_JPEG, FORMAT_PNG, *RAW_FORMATS)
+
+MEDIA_TYPES = {
+    FORMAT_JPEG: "image/jpeg",
+    FORMAT_PNG: "image/png",
+}
+
+# scrcpy 编码格式 → FFmpeg 解码器（按优先级，FFmpeg 内置的 av1 解码器只支持硬件加速）
+DECODER_NAMES = {
+    "h264": ("h264",),
+    "h265": ("hevc",),
+    "av1": ("libdav1d", "libaom-av1", "av1"),
+}
+
+
+def is_available() -> bool:
+    """是否安装了 PyAV（服务端解码需要）"""
+    return av is not None
+
+
+def create_decoder(codec: str) -> "av.VideoCodecContext":
+    """
+    创建解码器
+
+    Raises:
+        RuntimeError: 未安装 PyAV
+        ValueError: PyAV 中没有该编码格式的解码器
+    """
+    if av is None:
+        raise RuntimeError("PyAV is not installed (pip install autolife[video])")
+
+    for name in DECODER_NAMES[codec]:
+        if name in av.codecs_available:
+            return cast("av.VideoCodecContext", av.CodecContext.create(name, "r"))
+
+    raise ValueError(f"No {codec} decoder available in PyAV")
+
+
+def scaled_size(width: int, height: int, max_width: Optional[int]) -> Tuple[int, int]:
+    """按最大宽度等比缩放（宽高取偶数，yuv420 要求）"""
+    if not max_width or width <= max_width:
+        return width // 2 * 2, height // 2 * 2
+
+    scaled_width = max_width // 2 * 2
+    return scaled_width, max(2, round(height * scaled_width / width) // 2 * 2)
+
+
+class ImageEncoder:
+    """
+    图片编码器（同一尺寸复用编码上下文，尺寸变化时重建）
+
+    非线程安全：每个线程使用自己的实例。
+    """
+
+    # FFmpeg 编码器和像素格式
+    codec_name = ""
+    pix_fmt = ""
+
+    def __init__(self, max_width: Optional[int] = None):
+        """
+        Args:
+            max_width: 最大宽度（保持宽高比），None 表示原始尺寸
+        """
+        self.max_width = max_width
+        self._context: Optional["av.VideoCodecContext"] = None
+        self._count = 0
+
+    def encode(self, frame: "av.VideoFrame") -> Tuple[bytes, int, int]:
+        """
+        Returns:
+            (图片数据, 宽度, 高度)
+        """
+        width, height = scaled_size(frame.width, frame.height, self.max_width)
+
+        if self._context is None or (self._context.width, self._context.height) != (width, height):
+            self._context = cast("av.VideoCodecContext", av.CodecContext.create(self.codec_name, "w"))
+            self._context.width = width
+            self._context.height = height
+            self._context.pix_fmt = self.pix_fmt
+            self._context.time_base = Fraction(1, 1)
+            self._configure(self._context)
+
+        scaled = frame.reformat(width=width, height=height, format=self.pix_fmt)
+        scaled.pts = self._count
+        self._count += 1
+
+        # 图片编码器没有编码延迟，每帧立即输出一个 packet
+        data = b"".join(bytes(packet) for packet in self._context.encode(scaled))
+        return data, width, height
+
+    def _configure(self, context):
+        pass
+
+
+class JpegEncoder(ImageEncoder):
+    """JPEG 编码器（mjpeg）"""
+
+    codec_name = "mjpeg"
+    pix_fmt = "yuvj420p"
+
+    def __init__(self, max_width: Optional[int] = None, qscale: int = 5):
+        """
+        Args:
+            max_width: 最大宽度（保持宽高比），None 表示原始尺寸
+            qscale: JPEG 量化参数，2（最好）- 31（最差）
+        """
+        super().__init__(max_width)
+        self.qscale = qscale
+
+    def _configure(self, context):
+        context.options = {"qmin": str(self.qscale), "qmax": str(self.qscale)}
+
+
+class PngEncoder(ImageEncoder):
+    """PNG 编码器（无损，比 JPEG 慢）"""
+
+    codec_name = "png"
+    pix_fmt = "rgb24"
+
+
+def frame_to_bytes(frame: "av.VideoFrame", format: str, max_width: Optional[int] = None) -> Tuple[bytes, int, int]:
+    """
+    转换为紧凑排列的原始像素（去掉每行末尾的对齐填充，多个平面依次拼接）
+
+    Returns:
+        (像素数据, 宽度, 高度)
+    """
+    width, height = scaled_size(frame.width, frame.height, max_width)
+    frame = frame.reformat(width=width, height=height, format=format)
+
+    bytes_per_pixel = RAW_FORMATS[format]
+    chunks = []
+
+    for plane in frame.planes:
+        row = plane.width * bytes_per_pixel
+        data = memoryview(plane)
+
+        if plane.line_size == row:
+            chunks.append(data[:row * plane.height])
+        else:
+            chunks.extend(
+                data[y * plane.line_size:y * plane.line_size + row] for y in range(plane.height)
+            )
+
+    return b"".join(chunks), width, height
+
+
+def encode_image(
+    frame: "av.VideoFrame", format: str, max_width: Optional[int] = None, qscale: int = 5
+) -> Tuple[bytes, int, int]:
+    """
+    把解码后的帧转换为输出格式（每次新建编码器，可在任意线程调用）
+
+    Returns:
+        (数据, 宽度, 高度)
+    """
+    if format == FORMAT_JPEG:
+        return JpegEncoder(max_width, qscale).encode(frame)
+    if format == FORMAT_PNG:
+        return PngEncoder(max_width).encode(frame)
+    return frame_to_bytes(frame, format, max_width)
+
+
+@dataclass
+class Frame:
+    """一帧解码后的画面"""
+    device_id: str
+    format: str
+    data: bytes
+    width: int
+    height: int
+    # 视频帧的 PTS（微秒）
+    pts: Optional[int] = None
+    # 解码完成时间（time.time）
+    decoded_at: float = field(default_factory=time.time)
+    # 对应 packet 的接收时间（单调时钟），用于判断画面是否足够新
+    received_at: Optional[float] = field(default=None, repr=False)
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES.get(self.format, "application/octet-stream")
+
+    def base64(self) -> str:
+        """base64 编码（图片格式为 data URL）"""
+        encoded = base64.b64encode(self.data).decode()
+        if self.format in MEDIA_TYPES:
+            return f"data:{self.media_type};base64," + encoded
+        return encoded
+
+    def to_dict(self, include_data: bool = False) -> dict:
+        result = {
+            "device_id": self.device_id,
+            "format": self.format,
+            "width": self.width,
+            "height": self.height,
+            "pts": self.pts,
+            "decoded_at": self.decoded_at,
+            "size": len(self.data),
+        }
+        if include_data:
+            result["data"] = self.base64()
+        return result
+
+
+class FrameDecoder:
+    """
+    streamer 的解码订阅者
+
+    示例：
+        >>> decoder = streamer.start_decoder(format="jpeg", max_fps=5)
+        >>> async for frame in decoder.frames():
+        ...     print(frame.width, frame.height, len(frame.data))
+    """
+
+    def __init__(
+        self,
+        streamer: "ScrcpyStreamer",
+        format: Optional[str] = None,
+        max_fps: Optional[float] = None,
+        max_width: Optional[int] = None,
+        qscale: int = 5,
+        keyframes_only: bool = False,
+        queue_size: int = 64,
+    ):
+        """
+        Args:
+            streamer: 视频流
+            format: 输出格式 jpeg / png / rgb24 / bgr24 / rgba / gray / yuv420p，
+                none 表示只解码不输出（用 snapshot() 按需编码），
+                默认读取 SCRCPY_DECODE_FORMAT（默认 jpeg）
+            max_fps: 最大输出帧率，默认读取 SCRCPY_DECODE_FPS（默认 5，0 表示不限制）
+            max_width: 最大宽度（保持宽高比），默认读取 SCRCPY_DECODE_WIDTH（默认 0，原始尺寸）
+            qscale: JPEG 量化参数，2（最好）- 31（最差）
+            keyframes_only: 只解码关键帧（每秒约一帧，CPU 占用最低）
+            queue_size: 待解码队列长度，满时丢弃到下一个关键帧
+
+        Raises:
+            RuntimeError: 未安装 PyAV
+            ValueError: 不支持的输出格式
+        """
+        if av is None:
+            raise RuntimeError("PyAV is not installed (pip install autolife[video])")
+
+        format = format or os.getenv("SCRCPY_DECODE_FORMAT", FORMAT_JPEG)
+        if format not in FRAME_FORMATS and format != FORMAT_NONE:
+            raise ValueError(f"Unsupported frame format '{format}', expected one of {FRAME_FORMATS}")
+
+        if max_fps is None:
+            max_fps = float(os.getenv("SCRCPY_DECODE_FPS", "5"))
+        if max_width is None:
+            max_width = int(os.getenv("SCRCPY_DECODE_WIDTH", "0"))
+
+        self.streamer = streamer
+        self.device_id = streamer.device_id or "default"
+        self.format = format
+        self.max_fps = max_fps
+        self.max_width = max_width or None
+        self.qscale = qscale
+        self.keyframes_only = keyframes_only
+
+        # 最新一帧
+        self.latest: Optional[Frame] = None
+
+        self.decoded = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.error: Optional[str] = None
+        self.is_running = False
+
+        self._subscriber: Optional[NalSubscriber] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: "queue.Queue[Optional[ScrcpyPacket]]" = queue.Queue(queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._waiting_for_keyframe = False
+        self._new_frame = asyncio.Event()
+
+        # 最近解码的一帧（解码线程写入）及其 packet 接收时间，供 snapshot() 使用
+        self._latest_decoded: Optional[Tuple["av.VideoFrame", float]] = None
+        self._decoded_event = asyncio.Event()
+        self._snapshot_waiters = 0
+
+        # 解码线程状态
+        self._decoder: Optional["av.VideoCodecContext"] = None
+        self._decoder_codec: Optional[str] = None
+        self._encoder = (
+            JpegEncoder(self.max_width, qscale) if format == FORMAT_JPEG
+            else PngEncoder(self.max_width) if format == FORMAT_PNG
+            else None
+        )
+        self._config_run: List[bytes] = []
+        self._last_packet_was_config = False
+        self._emitted_at = 0.0
+
+    def start(self):
+        """开始解码（在事件循环中调用）"""
+        if self.is_running:
+            return
+
+        self._loop = asyncio.get_running_loop()
+
+        # 从缓冲区中最新的 IDR 开始（连同其后的 P 帧），立即解码出当前画面
+        self._subscriber = self.streamer.subscribe(
+            keyframes_only=self.keyframes_only,
+            max_fps=self.max_fps if self.keyframes_only and self.max_fps else None,
+            from_keyframe=True,
+        )
+        self.is_running = True
+
+        self._thread = threading.Thread(
+            target=self._decode_loop, name=f"decoder-{self.device_id}", daemon=True
+        )
+        self._thread.start()
+
+        if not self._subscriber.started_at_keyframe and self.streamer.latest_keyframe:
+            # IDR 已被环形缓冲区覆盖：先解码缓存的参数集 + 关键帧
+            received_at = time.monotonic()
+            for data in self.streamer.config.values():
+                self._enqueue(ScrcpyPacket(data, None, True, False, received_at))
+            self._enqueue(ScrcpyPacket(
+                self.streamer.latest_keyframe,
+                self.streamer.latest_keyframe_pts,
+                False,
+                True,
+                received_at,
+            ))
+
+        self._task = asyncio.create_task(self._run())
+
+        print(f"[FrameDecoder] Decoding {self.device_id} to {self.format} (max {self.max_fps or '-'} fps)")
+
+    async def stop(self):
+        """停止解码并等待解码线程退出"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+
+        if self._subscriber:
+            self._subscriber.close()
+
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        await asyncio.to_thread(self._queue.put, None)
+        await asyncio.to_thread(self._thread.join)
+
+        # 唤醒等待中的消费者
+        self._new_frame.set()
+        self._decoded_event.set()
+
+        print(
+            f"[FrameDecoder] Stopped decoding {self.device_id}: "
+            f"{self.decoded} decoded, {self.emitted} emitted, dropped {self.dropped}"
+        )
+
+    def describe(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "running": self.is_running,
+            "format": self.format,
+            "max_fps": self.max_fps,
+            "max_width": self.max_width,
+            "keyframes_only": self.keyframes_only,
+            "decoded": self.decoded,
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+            "latest": self.latest.to_dict() if self.latest else None,
+            "error": self.error,
+        }
+
+    async def next_frame(self, after: Optional[Frame] = None, timeout: Optional[float] = None) -> Optional[Frame]:
+        """
+        等待比 after 更新的一帧
+
+        Args:
+            after: 已经拿到的帧，None 表示有最新帧时立即返回
+            timeout: 超时（秒），None 表示一直等待
+
+        Returns:
+            Frame: 超时或解码已停止时返回 None
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while self.latest is None or self.latest is after:
+            if not self.is_running:
+                return None
+
+            event = self._new_frame
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+        return self.latest
+
+    async def snapshot(
+        self,
+        format: str = FORMAT_JPEG,
+        max_width: Optional[int] = None,
+        newer_than: Optional[float] = None,
+        timeout: float = 1.0,
+    ) -> Optional[Frame]:
+        """
+        把最近解码的一帧编码为指定格式（与输出帧率无关，编码在线程中进行）
+
+        Args:
+            format: 输出格式（jpeg / png / 原始像素格式）
+            max_width: 最大宽度，None 表示原始尺寸
+            newer_than: 要求 packet 接收时间（单调时钟）不早于该时刻，None 表示不限制
+            timeout: 等待足够新的一帧的超时（秒）
+
+        Returns:
+            Frame: 超时或解码已停止时返回 None
+        """
+        deadline = time.monotonic() + timeout
+
+        self._snapshot_waiters += 1
+        try:
+            while True:
+                latest = self._latest_decoded
+                if latest and (newer_than is None or latest[1] >= newer_than):
+                    break
+
+                remaining = deadline - time.monotonic()
+                if not self.is_running or remaining <= 0:
+                    return None
+
+                event = self._decoded_event
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return None
+        finally:
+            self._snapshot_waiters -= 1
+
+        frame, received_at = latest
+        data, width, height = await asyncio.to_thread(
+            encode_image, frame, format, max_width, self.qscale
+        )
+
+        return Frame(
+            self.device_id, format, data, width, height, frame.pts, received_at=received_at
+        )
+
+    async def frames(self) -> AsyncIterator[Frame]:
+        """异步迭代最新帧（消费者慢时跳过中间帧）"""
+        frame = None
+        while (frame := await self.next_frame(after=frame)) is not None:
+            yield frame
+
+    async def _run(self):
+        """订阅 NAL 流并放入解码队列（流结束时解码随之结束）"""
+        try:
+            while (packet := await self._subscriber.get_packet()) is not None:
+                self._enqueue(packet)
+        finally:
+            if self.is_running:
+                self.is_running = False
+                self._subscriber.close()
+                await asyncio.to_thread(self._queue.put, None)
+                self._new_frame.set()
+
+    def _enqueue(self, packet: ScrcpyPacket):
+        """放入解码队列，永不阻塞事件循环（队列满时丢弃到下一个关键帧）"""
+        if self._waiting_for_keyframe and not (packet.is_config or packet.is_keyframe):
+            self.dropped += 1
+            return
+
+        try:
+            self._queue.put_nowait(packet)
+            self._waiting_for_keyframe = False
+        except queue.Full:
+            self.dropped += 1
+            self._waiting_for_keyframe = True
+
+    def _publish(self, frame: Frame):
+        """在事件循环中更新最新帧并唤醒等待者"""
+        self.latest = frame
+        event, self._new_frame = self._new_frame, asyncio.Event()
+        event.set()
+
+    def _notify_decoded(self):
+        """在事件循环中唤醒 snapshot() 的等待者"""
+        event, self._decoded_event = self._decoded_event, asyncio.Event()
+        event.set()
+
+    def _decode_loop(self):
+        """解码线程"""
+        while (packet := self._queue.get()) is not None:
+            try:
+                self._decode_packet(packet)
+            except Exception as e:
+                print(f"[FrameDecoder] Decode failed for {self.device_id}: {e}")
+                self.error = str(e)
+                # 丢弃解码器，从下一个关键帧重新开始
+                self._decoder = None
+
+    def _decode_packet(self, packet: ScrcpyPacket):
+        if packet.is_config:
+            # 连续的参数集（H.264 的 SPS + PPS）作为一组，与下一个关键帧一起送入解码器
+            if not self._last_packet_was_config:
+                self._config_run = []
+            self._config_run.append(self._config_prefix(packet.data))
+            self._last_packet_was_config = True
+            return
+
+        self._last_packet_was_config = False
+        codec = self.streamer.codec.name
+
+        if packet.is_keyframe and (self._decoder is None or self._decoder_codec != codec):
+            self._decoder = create_decoder(codec)
+            self._decoder_codec = codec
+
+        if self._decoder is None:
+            # 等待关键帧
+            return
+
+        data = packet.data
+        if packet.is_keyframe and self._config_run:
+            data = b"".join(self._config_run) + data
+            self._config_run = []
+
+        av_packet = av.Packet(data)
+        av_packet.pts = packet.pts
+
+        for frame in self._decoder.decode(av_packet):
+            self.decoded += 1
+            self._latest_decoded = (frame, packet.received_at)
+
+            if self._snapshot_waiters and self._loop is not None:
+                self._loop.call_soon_threadsafe(self._notify_decoded)
+
+            self._emit(frame, packet.received_at)
+
+    def _emit(self, frame: "av.VideoFrame", received_at: float):
+        if self.format == FORMAT_NONE:
+            return
+
+        now = time.monotonic()
+        if self.max_fps and now - self._emitted_at < 1 / self.max_fps:
+            return
+        self._emitted_at = now
+
+        if self._encoder:
+            data, width, height = self._encoder.encode(frame)
+        else:
+            data, width, height = frame_to_bytes(frame, self.format, self.max_width)
+
+        loop = self._loop
+        if loop is None:
+            return
+
+        self.emitted += 1
+        loop.call_soon_threadsafe(
+            self._publish,
+            Frame(
+                self.device_id, self.format, data, width, height, frame.pts,
+                received_at=received_at,
+            ),
+        )
+
+    def _config_prefix(self, config: bytes) -> bytes:
+        if self.streamer.codec.name == "av1" and config[:1] == b"\x81":
+            # av1C：4 字节头之后是序列头 OBU
+            return config[4:]
+        return config
@@ -0,0 +1,193 @@
+"""
+H.264 码流工具（Annex-B 通用部分也供 H.265 使用）
+
+目前只解析 SPS 中的视频尺寸：scrcpy v3 在屏幕旋转或分辨率变化时
+不会重新发送元数据头，只会发送新的 SPS/PPS，视频尺寸需要从 SPS 中读取。
+"""
+
+from typing import List, Optional, Tuple
+
+
+# 带有 chroma_format_idc 等扩展字段的 profile
+_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+
+
+class BitReader:
+    """按位读取 RBSP（已去除防竞争字节）"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def bit(self) -> int:
+        byte = self.data[self.pos >> 3]  # 越界时抛出 IndexError
+        value = (byte >> (7 - (self.pos & 7))) & 1
+        self.pos += 1
+        return value
+
+    def bits(self, count: int) -> int:
+        value = 0
+        for _ in range(count):
+            value = (value << 1) | self.bit()
+        return value
+
+    def ue(self) -> int:
+        """无符号指数哥伦布编码"""
+        zeros = 0
+        while self.bit() == 0:
+            zeros += 1
+            if zeros > 31:
+                raise ValueError("invalid exp-golomb code")
+        return (1 << zeros) - 1 + self.bits(zeros)
+
+    def se(self) -> int:
+        """有符号指数哥伦布编码"""
+        value = self.ue()
+        return (value + 1) // 2 if value & 1 else -(value // 2)
+
+
+def strip_start_code(nal: bytes) -> bytes:
+    """去掉 Annex-B 起始码"""
+    if nal.startswith(b'\x00\x00\x00\x01'):
+        return nal[4:]
+    if nal.startswith(b'\x00\x00\x01'):
+        return nal[3:]
+    return nal
+
+
+def split_nal_units(data: bytes) -> List[bytes]:
+    """
+    按起始码拆分 Annex-B 数据（scrcpy 的参数集 packet 可能包含多个 NAL 单元）
+
+    Returns:
+        不含起始码的 NAL 单元列表
+    """
+    units = []
+    start = data.find(b'\x00\x00\x01')
+
+    while start >= 0:
+        start += 3
+        end = data.find(b'\x00\x00\x01', start)
+
+        if end < 0:
+            units.append(data[start:])
+            break
+
+        # 4 字节起始码的前导 0 不属于上一个 NAL
+        units.append(data[start:end - 1] if data[end - 1] == 0 else data[start:end])
+        start = end
+
+    return units
+
+
+def nal_to_rbsp(payload: bytes) -> bytes:
+    """去除防竞争字节（00 00 03 → 00 00）"""
+    if b'\x00\x00\x03' not in payload:
+        return payload
+
+    out = bytearray()
+    zeros = 0
+
+    for byte in payload:
+        if zeros >= 2 and byte == 3:
+            zeros = 0
+            continue
+
+        out.append(byte)
+        zeros = zeros + 1 if byte == 0 else 0
+
+    return bytes(out)
+
+
+def _skip_scaling_list(reader: BitReader, size: int):
+    last = next_scale = 8
+    for _ in range(size):
+        if next_scale != 0:
+            next_scale = (last + reader.se() + 256) % 256
+        last = next_scale if next_scale != 0 else last
+
+
+def parse_sps_resolution(nal: bytes) -> Optional[Tuple[int, int]]:
+    """
+    从 SPS NAL 单元解析视频尺寸（已应用裁剪）
+
+    Args:
+        nal: SPS NAL 单元（可以包含起始码）
+
+    Returns:
+        (width, height)，解析失败时返回 None
+    """
+    payload = strip_start_code(nal)
+
+    if not payload or payload[0] & 0x1F != 7:
+        return None
+
+    reader = BitReader(nal_to_rbsp(payload[1:]))
+
+    try:
+        profile_idc = reader.bits(8)
+        reader.bits(16)  # constraint flags + level_idc
+        reader.ue()  # seq_parameter_set_id
+
+        chroma_format_idc = 1
+        separate_colour_plane = 0
+
+        if profile_idc in _HIGH_PROFILES:
+            chroma_format_idc = reader.ue()
+            if chroma_format_idc == 3:
+                separate_colour_plane = reader.bit()
+            reader.ue()  # bit_depth_luma_minus8
+            reader.ue()  # bit_depth_chroma_minus8
+            reader.bit()  # qpprime_y_zero_transform_bypass_flag
+            if reader.bit():  # seq_scaling_matrix_present_flag
+                for i in range(8 if chroma_format_idc != 3 else 12):
+                    if reader.bit():
+                        _skip_scaling_list(reader, 16 if i < 6 else 64)
+
+        reader.ue()  # log2_max_frame_num_minus4
+        pic_order_cnt_type = reader.ue()
+
+        if pic_order_cnt_type == 0:
+            reader.ue()  # log2_max_pic_order_cnt_lsb_minus4
+        elif pic_order_cnt_type == 1:
+            reader.bit()  # delta_pic_order_always_zero_flag
+            reader.se()  # offset_for_non_ref_pic
+            reader.se()  # offset_for_top_to_bottom_field
+            for _ in range(reader.ue()):
+                reader.se()
+
+        reader.ue()  # max_num_ref_frames
+        reader.bit()  # gaps_in_frame_num_value_allowed_flag
+
+        width_in_mbs = reader.ue() + 1
+        height_in_map_units = reader.ue() + 1
+        frame_mbs_only = reader.bit()
+
+        if not frame_mbs_only:
+            reader.bit()  # mb_adaptive_frame_field_flag
+        reader.bit()  # direct_8x8_inference_flag
+
+        crop_left = crop_right = crop_top = crop_bottom = 0
+        if reader.bit():  # frame_cropping_flag
+            crop_left = reader.ue()
+            crop_right = reader.ue()
+            crop_top = reader.ue()
+            crop_bottom = reader.ue()
+    except (IndexError, ValueError):
+        return None
+
+    # 裁剪单位取决于色度格式
+    if chroma_format_idc == 0 or separate_colour_plane:
+        crop_unit_x, crop_unit_y = 1, 2 - frame_mbs_only
+    else:
+        sub_width = 1 if chroma_format_idc == 3 else 2
+        sub_height = 2 if chroma_format_idc == 1 else 1
+        crop_unit_x, crop_unit_y = sub_width, sub_height * (2 - frame_mbs_only)
+
+    width = width_in_mbs * 16 - crop_unit_x * (crop_left + crop_right)
+    height = height_in_map_units * 16 * (2 - frame_mbs_only) - crop_unit_y * (crop_top + crop_bottom)
+
+    if width <= 0 or height <= 0:
+        return None
+
+    return width, height
@@ -0,0 +1,320 @@
+"""
+InputDispatcher - 每台设备一个的输入事件分发器
+
+WebSocket 输入通道收到的事件先进入分发器队列，由单个 worker 按顺序发送：
+- 同一设备只有一个写入者，多个连接的事件不会交错成半个手势
+- 连续的 move 事件合并（只保留最新位置），并按显示帧率限速
+- scrcpy 控制通道可用时直接注入，否则退回 adb shell input
+  （ADB 不支持逐个触摸事件，down → up 合并为点击或滑动）
+
+事件格式（dict）：
+    {"type": "touch", "action": "down" | "move" | "up", "x": 100, "y": 200, "pointer_id": -2}
+    {"type": "key", "key": "HOME"}
+    {"type": "text", "text": "hello"}
+    {"type": "scroll", "x": 100, "y": 200, "hscroll": 0, "vscroll": -1}
+
+紧凑格式（数组）：
+    ["d", x, y] / ["m", x, y] / ["u", x, y] / ["k", "HOME"] / ["t", "hello"] / ["s", x, y, h, v]
+"""
+
+import asyncio
+import collections
+import shlex
+import time
+from typing import Any, Callable, Deque, Dict, Optional
+
+from autolife.adb import AdbClient, AdbError
+
+from .control import POINTER_ID_GENERIC_FINGER, ScrcpyController, parse_keycode
+
+
+# 紧凑格式的动作缩写
+_COMPACT_TOUCH = {"d": "down", "m": "move", "u": "up"}
+
+# ADB 退回模式下，位移和时长都很小的 down → up 视为点击
+TAP_SLOP_PX = 16
+TAP_TIMEOUT_MS = 300
+
+
+def parse_input_event(message: Any) -> Dict[str, Any]:
+    """
+    解析输入事件（dict 或紧凑数组）
+
+    Returns:
+        Dict: 规范化后的事件（按键事件附带解析后的 keycode）
+
+    Raises:
+        ValueError: 格式错误
+    """
+    if isinstance(message, dict):
+        event = dict(message)
+    elif isinstance(message, list) and message:
+        kind = message[0]
+        if kind in _COMPACT_TOUCH and len(message) >= 3:
+            event = {"type": "touch", "action": _COMPACT_TOUCH[kind], "x": message[1], "y": message[2]}
+            if len(message) >= 4:
+                event["pointer_id"] = message[3]
+        elif kind == "k" and len(message) >= 2:
+            event = {"type": "key", "key": message[1]}
+        elif kind == "t" and len(message) >= 2:
+            event = {"type": "text", "text": message[1]}
+        elif kind == "s" and len(message) >= 5:
+            event = {"type": "scroll", "x": message[1], "y": message[2],
+                     "hscroll": message[3], "vscroll": message[4]}
+        else:
+            raise ValueError(f"Unknown compact event: {message!r}")
+    else:
+        raise ValueError(f"Invalid input event: {message!r}")
+
+    event_type = event.get("type")
+
+    if event_type == "touch":
+        if event.get("action") not in ("down", "move", "up"):
+            raise ValueError(f"Unknown touch action: {event.get('action')!r}")
+        event["x"] = float(event["x"])
+        event["y"] = float(event["y"])
+        event["pointer_id"] = int(event.get("pointer_id", POINTER_ID_GENERIC_FINGER))
+    elif event_type == "key":
+        keycode = parse_keycode(str(event.get("key", "")))
+        if keycode is None:
+            raise ValueError(f"Unknown key: {event.get('key')!r}")
+        event["keycode"] = keycode
+    elif event_type == "text":
+        event["text"] = str(event.get("text", ""))
+    elif event_type == "scroll":
+        for key in ("x", "y", "hscroll", "vscroll"):
+            event[key] = float(event.get(key, 0))
+    else:
+        raise ValueError(f"Unknown event type: {event_type!r}")
+
+    return event
+
+
+def _is_move(event: Dict[str, Any]) -> bool:
+    return bool(event["type"] == "touch" and event["action"] == "move")
+
+
+class InputDispatcher:
+    """
+    单设备输入分发器（单写入者）
+
+    示例：
+        >>> dispatcher = InputDispatcher("emulator-5554", get_controller, adb)
+        >>> dispatcher.attach()
+        >>> dispatcher.submit({"type": "touch", "action": "down", "x": 100, "y": 200})
+        >>> ...
+        >>> await dispatcher.detach()
+    """
+
+    def __init__(
+        self,
+        device_id: str,
+        get_controller: Callable[[], Optional[ScrcpyController]],
+        adb: AdbClient,
+        move_rate: float = 60.0,
+        max_pending: int = 1024,
+    ):
+        """
+        初始化分发器
+
+        Args:
+            device_id: 设备 ID
+            get_controller: 返回当前可用的 scrcpy 控制通道（不可用时返回 None）
+            adb: ADB 客户端（控制通道不可用时使用）
+            move_rate: move 事件的最高发送频率（Hz），通常等于显示帧率
+            max_pending: 队列上限，超出时丢弃最旧的 move 事件
+        """
+        self.device_id = device_id
+        self.get_controller = get_controller
+        self.adb = adb
+        self.move_interval = 1.0 / move_rate if move_rate > 0 else 0.0
+        self.max_pending = max_pending
+
+        self._queue: Deque[Dict[str, Any]] = collections.deque()
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._connections = 0
+        self._last_move_at = 0.0
+
+        # ADB 退回模式：pointer_id → 手势起点 / 最新位置
+        self._gestures: Dict[int, Dict[str, float]] = {}
+
+        # 统计
+        self.received = 0
+        self.coalesced = 0
+        self.dispatched = 0
+
+    @property
+    def channel(self) -> str:
+        """当前使用的输入通道（control / adb）"""
+        return "control" if self.get_controller() else "adb"
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def attach(self):
+        """新的连接开始使用分发器"""
+        self._connections += 1
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def detach(self) -> bool:
+        """
+        连接断开
+
+        Returns:
+            bool: 是否已没有连接（worker 在发送完剩余事件后停止）
+        """
+        self._connections = max(self._connections - 1, 0)
+
+        if self._connections > 0:
+            return False
+
+        # 先把剩余事件（例如最后的 up）发送完，避免设备上残留按下状态
+        self._wakeup.set()
+        if self._worker and not self._worker.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(self._worker), timeout=1)
+            except asyncio.TimeoutError:
+                self._worker.cancel()
+
+        # 等待期间可能有新连接加入
+        return self._connections == 0
+
+    def submit(self, event: Dict[str, Any]):
+        """
+        提交一个已解析的事件
+
+        连续的 move（同一指针）只保留最新的一个。
+        """
+        self.received += 1
+
+        if _is_move(event) and self._queue:
+            last = self._queue[-1]
+            if _is_move(last) and last["pointer_id"] == event["pointer_id"]:
+                self._queue[-1] = event
+                self.coalesced += 1
+                return
+
+        if len(self._queue) >= self.max_pending:
+            self._drop_oldest_move()
+
+        self._queue.append(event)
+        self._wakeup.set()
+
+    def _drop_oldest_move(self):
+        for i, queued in enumerate(self._queue):
+            if _is_move(queued):
+                del self._queue[i]
+                self.coalesced += 1
+                return
+
+    async def _run(self):
+        """worker：按顺序发送事件，move 按帧率限速"""
+        while True:
+            if not self._queue:
+                if self._connections == 0:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            head = self._queue[0]
+
+            if _is_move(head):
+                # 等待下一帧；期间新到的 move 会合并到队尾（可能就是 head）
+                delay = self._last_move_at + self.move_interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                self._last_move_at = time.monotonic()
+
+            event = self._queue.popleft()
+
+            try:
+                await self._dispatch(event)
+                self.dispatched += 1
+            except (AdbError, OSError, ValueError, asyncio.TimeoutError) as e:
+                print(f"[InputDispatcher] {self.device_id}: failed to dispatch {event['type']}: {e}")
+
+    async def _dispatch(self, event: Dict[str, Any]):
+        controller = self.get_controller()
+
+        if controller:
+            try:
+                await self._dispatch_control(controller, event)
+                return
+            except ConnectionError as e:
+                print(f"[InputDispatcher] Control socket failed, falling back to ADB: {e}")
+
+        await self._dispatch_adb(event)
+
+    async def _dispatch_control(self, controller: ScrcpyController, event: Dict[str, Any]):
+        event_type = event["type"]
+
+        if event_type == "touch":
+            await controller.touch(event["action"], event["x"], event["y"], event["pointer_id"])
+        elif event_type == "key":
+            await controller.press_key(event["keycode"])
+        elif event_type == "text":
+            await controller.text(event["text"])
+        elif event_type == "scroll":
+            await controller.scroll(event["x"], event["y"], event["hscroll"], event["vscroll"])
+
+    async def _dispatch_adb(self, event: Dict[str, Any]):
+        event_type = event["type"]
+
+        if event_type == "touch":
+            command = self._gesture_command(event)
+        elif event_type == "key":
+            command = f"input keyevent {event['keycode']}"
+        elif event_type == "text":
+            # input text 中空格需要写成 %s
+            command = f"input text {shlex.quote(event['text'].replace(' ', '%s'))}"
+        else:
+            # adb shell input 没有等价的滚轮事件
+            command = None
+
+        if command:
+            await self.adb.shell(self.device_id, command)
+
+    def _gesture_command(self, event: Dict[str, Any]) -> Optional[str]:
+        """ADB 退回模式：记录手势，在 up 时生成 tap 或 swipe 命令"""
+        pointer_id = event["pointer_id"]
+        now = time.monotonic()
+
+        if event["action"] == "down":
+            self._gestures[pointer_id] = {"x": event["x"], "y": event["y"], "t": now}
+            return None
+
+        gesture = self._gestures.get(pointer_id)
+        if gesture is None:
+            return None
+
+        if event["action"] == "move":
+            return None
+
+        del self._gestures[pointer_id]
+
+        x1, y1 = int(gesture["x"]), int(gesture["y"])
+        x2, y2 = int(event["x"]), int(event["y"])
+        duration_ms = int((now - gesture["t"]) * 1000)
+
+        if abs(x2 - x1) <= TAP_SLOP_PX and abs(y2 - y1) <= TAP_SLOP_PX and duration_ms < TAP_TIMEOUT_MS:
+            return f"input tap {x1} {y1}"
+
+        return f"input swipe {x1} {y1} {x2} {y2} {max(duration_ms, 50)}"
+
+    def describe(self) -> dict:
+        """分发器状态"""
+        return {
+            "device_id": self.device_id,
+            "channel": self.channel,
+            "connections": self._connections,
+            "pending": self.pending,
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "dispatched": self.dispatched,
+        }
@@ -0,0 +1,300 @@
+"""
+scrcpy packet 读取器
+
+基于可复用的 bytearray + memoryview：
+- socket 数据通过 recv_into 直接写入预分配缓冲区，不产生中间 bytes
+- 每个 packet 只做一次拷贝（单次分配的 bytes），或直接借出 memoryview
+- 读取状态可恢复：超时不会丢失已读到的半个 packet，不会失步
+
+thread 模式使用 SocketPacketReader，asyncio 模式（BufferedProtocol）直接使用 PacketBuffer。
+"""
+
+import socket
+import struct
+from typing import Literal, NamedTuple, Optional, Union, overload
+
+
+# scrcpy v3.x 元数据头：dummy(1) + 设备名(64) + codec(4) + 宽(4) + 高(4)
+METADATA_HEADER_SIZE = 77
+
+# packet header：PTS(8) + size(4)
+PACKET_HEADER_SIZE = 12
+
+# PTS 字段的标志位：最高位为参数集（config），次高位为关键帧，其余为 PTS（微秒）
+PACKET_FLAG_CONFIG = 1 << 63
+PACKET_FLAG_KEY_FRAME = 1 << 62
+PTS_MASK = PACKET_FLAG_KEY_FRAME - 1
+
+# WebSocket framed 模式的帧头：flags(1) + PTS(8)，之后是 NAL 数据
+FRAME_FLAG_CONFIG = 0x01
+FRAME_FLAG_KEY_FRAME = 0x02
+FRAME_HEADER_SIZE = 9
+
+# 单个 packet 的大小上限
+MAX_PACKET_SIZE = 10 * 1024 * 1024
+
+# 默认缓冲区大小（可容纳常见的 100-300 KB IDR 帧）
+DEFAULT_BUFFER_SIZE = 512 * 1024
+
+_PACKET_HEADER = struct.Struct('>QI')
+_FRAME_HEADER = struct.Struct('>BQ')
+
+
+def pts_from_flags(pts_flags: int) -> Optional[int]:
+    """从 PTS 字段中取出 PTS（微秒），参数集 packet 没有 PTS，返回 None"""
+    if pts_flags & PACKET_FLAG_CONFIG:
+        return None
+    return pts_flags & PTS_MASK
+
+
+class ScrcpyPacket(NamedTuple):
+    """带元数据的 packet：NAL 单元 + 编码器 PTS + 标志位 + 主机接收时间"""
+    data: bytes
+    # 编码器时间戳（微秒，设备时钟），参数集为 None
+    pts: Optional[int]
+    is_config: bool
+    is_keyframe: bool
+    # 主机收到 packet 的时间（time.monotonic）
+    received_at: float
+
+    def frame_header(self) -> bytes:
+        """framed 模式的帧头：flags(1) + PTS(8，大端序，参数集为 0)"""
+        flags = 0
+        if self.is_config:
+            flags |= FRAME_FLAG_CONFIG
+        if self.is_keyframe:
+            flags |= FRAME_FLAG_KEY_FRAME
+
+        return _FRAME_HEADER.pack(flags, self.pts or 0)
+
+
+class PacketTooLargeError(ValueError):
+    """packet 大小超过上限（通常意味着协议失步）"""
+
+
+class PacketBuffer:
+    """
+    可复用的 packet 解析缓冲区
+
+    使用方式：
+        >>> buf = PacketBuffer()
+        >>> n = sock.recv_into(buf.writable())
+        >>> buf.commit(n)
+        >>> while (packet := buf.next_packet()) is not None:
+        ...     handle(packet)
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_BUFFER_SIZE,
+        max_packet_size: int = MAX_PACKET_SIZE,
+    ):
+        """
+        初始化缓冲区
+
+        Args:
+            capacity: 初始容量（字节），遇到更大的 packet 时自动扩容
+            max_packet_size: 单个 packet 大小上限
+        """
+        self.max_packet_size = max_packet_size
+
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+
+        # 有效数据区间 [_start, _end)
+        self._start = 0
+        self._end = 0
+
+        # 当前 packet 的解析状态（已读 header、等待 body）
+        self._packet_size: Optional[int] = None
+        self._pts_flags = 0
+
+        # 最近一个完整 packet 的 PTS 及标志位（原始 8 字节字段）
+        self.last_pts_flags = 0
+
+    @property
+    def capacity(self) -> int:
+        """当前缓冲区容量"""
+        return len(self._buffer)
+
+    @property
+    def pending(self) -> int:
+        """已接收但尚未解析的字节数"""
+        return self._end - self._start
+
+    def writable(self) -> memoryview:
+        """
+        获取可写入区域（供 recv_into / BufferedProtocol.get_buffer 使用）
+
+        Returns:
+            memoryview: 缓冲区尾部的空闲区域
+        """
+        if self._end == len(self._buffer):
+            self._reserve(self.pending + 1)
+
+        return self._view[self._end:]
+
+    def commit(self, nbytes: int):
+        """确认写入了 nbytes 字节"""
+        self._end += nbytes
+
+    def read_exact(self, size: int) -> Optional[bytes]:
+        """
+        读取固定长度的数据（用于元数据头）
+
+        Returns:
+            bytes: 数据不足时返回 None
+        """
+        if self.pending < size:
+            self._reserve(size)
+            return None
+
+        data = bytes(self._view[self._start:self._start + size])
+        self._consume(size)
+
+        return data
+
+    @overload
+    def next_packet(self, copy: Literal[True] = ...) -> Optional[bytes]: ...
+
+    @overload
+    def next_packet(self, copy: bool) -> Optional[Union[bytes, memoryview]]: ...
+
+    def next_packet(self, copy: bool = True) -> Optional[Union[bytes, memoryview]]:
+        """
+        解析下一个完整的 packet
+
+        Args:
+            copy: True 返回独立的 bytes（单次分配）；False 借出 memoryview，
+                只在下一次 writable() 之前有效
+
+        Returns:
+            packet 数据，数据不足时返回 None
+
+        Raises:
+            PacketTooLargeError: packet 大小超过上限
+        """
+        while self._packet_size is None:
+            if self.pending < PACKET_HEADER_SIZE:
+                return None
+
+            pts_flags, packet_size = _PACKET_HEADER.unpack_from(self._buffer, self._start)
+            self._consume(PACKET_HEADER_SIZE)
+
+            if packet_size > self.max_packet_size:
+                raise PacketTooLargeError(f"packet size too large: {packet_size}")
+
+            if packet_size == 0:
+                continue
+
+            self._packet_size = packet_size
+            self._pts_flags = pts_flags
+
+        packet_size = self._packet_size
+
+        if self.pending < packet_size:
+            # 确保整个 packet 能连续放进缓冲区
+            self._reserve(packet_size)
+            return None
+
+        view = self._view[self._start:self._start + packet_size]
+        data = bytes(view) if copy else view
+
+        self._consume(packet_size)
+        self._packet_size = None
+        self.last_pts_flags = self._pts_flags
+
+        return data
+
+    def _consume(self, size: int):
+        self._start += size
+
+        # 数据读完时直接复位，避免搬移
+        if self._start == self._end:
+            self._start = 0
+            self._end = 0
+
+    def _reserve(self, size: int):
+        """保证从 _start 开始有 size 字节的连续空间"""
+        if self._start + size <= len(self._buffer):
+            return
+
+        pending = self.pending
+
+        if size <= len(self._buffer):
+            # 搬移未解析数据到开头（只搬移不足一个 packet 的尾部）
+            # 源和目标重叠时先拷贝出来，避免重叠 memcpy
+            if pending <= self._start:
+                self._buffer[:pending] = self._view[self._start:self._end]
+            else:
+                self._buffer[:pending] = bytes(self._view[self._start:self._end])
+        else:
+            # 扩容（只在遇到更大的 packet 时发生）
+            buffer = bytearray(max(size, len(self._buffer) * 2))
+            buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+
+        self._start = 0
+        self._end = pending
+
+
+class SocketPacketReader:
+    """
+    阻塞 socket 上的 packet 读取器（thread 模式）
+
+    超时返回 None，但保留已读取的部分数据，下一次调用继续读取。
+    """
+
+    def __init__(self, sock: socket.socket, capacity: int = DEFAULT_BUFFER_SIZE):
+        """
+        初始化读取器
+
+        Args:
+            sock: 已连接并读完元数据头的 socket
+            capacity: 缓冲区初始容量
+        """
+        self.sock = sock
+        self.buffer = PacketBuffer(capacity)
+
+        # 对端已关闭连接
+        self.eof = False
+
+    @overload
+    def read_packet(self, copy: Literal[True] = ...) -> Optional[bytes]: ...
+
+    @overload
+    def read_packet(self, copy: bool) -> Optional[Union[bytes, memoryview]]: ...
+
+    def read_packet(self, copy: bool = True) -> Optional[Union[bytes, memoryview]]:
+        """
+        读取一个完整的 packet
+
+        Args:
+            copy: False 时借出 memoryview（下一次读取前有效）
+
+        Returns:
+            packet 数据；超时或连接关闭时返回 None（连接关闭时 eof 为 True）
+
+        Raises:
+            PacketTooLargeError: packet 大小超过上限
+            OSError: socket 错误
+        """
+        while True:
+            packet = self.buffer.next_packet(copy=copy)
+            if packet is not None:
+                return packet
+
+            if self.eof:
+                return None
+
+            try:
+                nbytes = self.sock.recv_into(self.buffer.writable())
+            except socket.timeout:
+                return None
+
+            if nbytes == 0:
+                self.eof = True
+                return None
+
+            self.buffer.commit(nbytes)
@@ -0,0 +1,547 @@
+"""
+StreamerPool - 多设备 streamer 池
+
+为每台设备分配独立的本地转发端口和 scrcpy 会话 ID（scid），
+同一进程可以同时驱动多台设备而不会互相覆盖端口转发。
+
+同一设备可以同时以多个 profile 投屏（例如缩略图墙 + 交互窗口），
+每组编码参数一个 streamer；参数相同的 profile 共用同一个编码器。
+
+每个 streamer 按订阅者引用计数：最后一个订阅者离开后等待空闲宽限期，
+期间有新订阅者则直接复用，超时仍无人使用才停止 scrcpy-server。
+"""
+
+import asyncio
+import os
+import socket
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from .profiles import ProfileRegistry, StreamProfile
+from .recorder import StreamRecorder
+from .streamer import ScrcpyStreamer
+
+
+# (设备 ID, 编码参数标识)
+StreamKey = Tuple[str, str]
+
+# profile 名称或对象，None 表示默认 profile
+ProfileLike = Union[str, StreamProfile, None]
+
+
+class StreamerPoolFull(RuntimeError):
+    """已达到最大并发设备数"""
+
+
+class StreamerPool:
+    """
+    多设备 streamer 池
+
+    核心功能：
+    - 每台设备每组编码参数一个 ScrcpyStreamer，加锁避免重复启动
+    - 动态分配本地端口（base_port 起），scid 由端口推导，保证唯一
+    - 限制最大并发设备数
+    - 批量并行启动多台设备
+    - 订阅者引用计数，空闲超过宽限期自动停止
+    - 设备不支持 profile 的编码格式（H.265 / AV1）时退回 H.264 并记住
+
+    示例：
+        >>> pool = StreamerPool(max_devices=20)
+        >>> results = await pool.start_many(["serial-1", "serial-2"], profile="thumbnail")
+        >>> streamer = await pool.acquire("serial-1", "hifi")
+        >>> ...
+        >>> pool.release("serial-1", "hifi")
+        >>> await pool.stop_all()
+    """
+
+    def __init__(
+        self,
+        max_devices: Optional[int] = None,
+        base_port: Optional[int] = None,
+        idle_grace: Optional[float] = None,
+        profiles: Optional[ProfileRegistry] = None,
+        streamer_factory: Callable[..., ScrcpyStreamer] = ScrcpyStreamer,
+        **streamer_kwargs,
+    ):
+        """
+        初始化 streamer 池
+
+        Args:
+            max_devices: 最大并发设备数，默认读取 SCRCPY_MAX_DEVICES（默认 32）
+            base_port: 端口分配起点，默认读取 SCRCPY_BASE_PORT（默认 27183）
+            idle_grace: 最后一个订阅者离开后保留 streamer 的秒数，
+                默认读取 SCRCPY_IDLE_GRACE（默认 30）
+            profiles: 可用的 profile，默认为内置 profile 加 SCRCPY_PROFILES
+            streamer_factory: 创建 streamer 的函数（参数与 ScrcpyStreamer 相同）
+            **streamer_kwargs: 传给 ScrcpyStreamer 的其他参数（读取模式、控制通道等，
+                编码参数由 profile 决定）
+        """
+        self.max_devices = max_devices or int(os.getenv("SCRCPY_MAX_DEVICES", "32"))
+        self.base_port = base_port or int(os.getenv("SCRCPY_BASE_PORT", "27183"))
+        if idle_grace is None:
+            idle_grace = float(os.getenv("SCRCPY_IDLE_GRACE", "30"))
+        self.idle_grace = idle_grace
+        self.profiles = profiles or ProfileRegistry()
+        self.streamer_factory = streamer_factory
+        self.streamer_kwargs = streamer_kwargs
+
+        # (设备 ID, 编码参数) → streamer
+        self.streamers: Dict[StreamKey, ScrcpyStreamer] = {}
+
+        # streamer 对应的 profile（参数相同的 profile 共用时记录第一个）
+        self._profiles: Dict[StreamKey, StreamProfile] = {}
+
+        # 锁（保证同一设备同一编码参数只启动一次）
+        self._locks: Dict[StreamKey, asyncio.Lock] = {}
+
+        # 正在启动中（尚未放入池）的 streamer → 端口
+        self._starting: Dict[StreamKey, int] = {}
+
+        # 订阅者引用计数
+        self._refcounts: Dict[StreamKey, int] = {}
+
+        # 空闲停止任务（宽限期内有新订阅者时取消）
+        self._idle_tasks: Dict[StreamKey, asyncio.Task] = {}
+
+        # 设备 ID → 编码器不支持的编码格式
+        self._unsupported_codecs: Dict[str, Set[str]] = {}
+
+        # 设备 ID → 正在录制的 profile（录制持有一个引用，streamer 不会因空闲停止）
+        self._recordings: Dict[str, ProfileLike] = {}
+
+    def resolve_profile(self, device_id: str, profile: ProfileLike = None) -> StreamProfile:
+        """
+        设备实际使用的 profile（设备不支持该编码格式时换成 H.264）
+
+        Raises:
+            ValueError: 未知的 profile
+        """
+        resolved = self.profiles.get(profile)
+
+        if resolved.codec in self._unsupported_codecs.get(device_id, ()):
+            return resolved.with_codec("h264")
+
+        return resolved
+
+    def _key(self, device_id: str, profile: ProfileLike = None) -> StreamKey:
+        return device_id, self.resolve_profile(device_id, profile).encoder_id
+
+    def get(self, device_id: str, profile: ProfileLike = None) -> Optional[ScrcpyStreamer]:
+        """
+        获取已启动的 streamer，不存在时返回 None
+
+        未指定 profile 时返回该设备任意一个 streamer（优先带控制通道的）。
+        """
+        if profile is not None:
+            return self.streamers.get(self._key(device_id, profile))
+
+        candidates = self.streamers_for(device_id)
+
+        for streamer in candidates:
+            if streamer.controller and not streamer.controller.is_closed:
+                return streamer
+
+        return candidates[0] if candidates else None
+
+    def streamers_for(self, device_id: str) -> List[ScrcpyStreamer]:
+        """设备的所有 streamer"""
+        return [streamer for key, streamer in self.streamers.items() if key[0] == device_id]
+
+    def __contains__(self, device_id: str) -> bool:
+        return any(key[0] == device_id for key in self.streamers)
+
+    def __len__(self) -> int:
+        return len(self.streamers)
+
+    def _get_lock(self, key: StreamKey) -> asyncio.Lock:
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def _allocate_port(self, device_id: str) -> int:
+        """
+        分配一个空闲的本地端口
+
+        跳过池内已使用的端口，以及本机已被占用（例如残留的 adb forward）的端口。
+
+        Raises:
+            StreamerPoolFull: 已达到最大并发设备数
+        """
+        used = {streamer.port for streamer in self.streamers.values()}
+        used.update(self._starting.values())
+
+        devices = {key[0] for key in self.streamers} | {key[0] for key in self._starting}
+        if device_id not in devices and len(devices) >= self.max_devices:
+            raise StreamerPoolFull(
+                f"Too many devices streaming (max {self.max_devices})"
+            )
+
+        # 端口范围留出余量（每台设备可能有多个 profile），跳过被其他程序占用的端口
+        for port in range(self.base_port, self.base_port + self.max_devices * 4):
+            if port in used:
+                continue
+
+            if _is_port_free(port):
+                return port
+
+        raise StreamerPoolFull("No free local port for scrcpy forwarding")
+
+    async def get_or_start(self, device_id: str, profile: ProfileLike = None) -> ScrcpyStreamer:
+        """
+        获取设备的 streamer，不存在时创建并启动
+
+        profile 使用 H.265 / AV1 而设备启动失败时，退回 H.264 重试，
+        成功后记住该设备不支持此编码格式。
+
+        Args:
+            device_id: 设备 ID
+            profile: profile 名称或对象，None 为默认 profile
+
+        Returns:
+            ScrcpyStreamer: 已启动的 streamer
+
+        Raises:
+            StreamerPoolFull: 已达到最大并发设备数
+            RuntimeError: 启动失败
+            ValueError: 未知的 profile
+        """
+        resolved = self.resolve_profile(device_id, profile)
+
+        try:
+            return await self._get_or_start(device_id, resolved)
+        except RuntimeError as e:
+            if resolved.codec == "h264" or isinstance(e, StreamerPoolFull):
+                raise
+
+            print(
+                f"[StreamerPool] {device_id}: failed to start {resolved.codec} "
+                f"({e}), falling back to h264"
+            )
+
+        streamer = await self._get_or_start(device_id, resolved.with_codec("h264"))
+
+        # H.264 可以启动，说明是设备编码器不支持该格式
+        self._unsupported_codecs.setdefault(device_id, set()).add(resolved.codec)
+
+        return streamer
+
+    async def _get_or_start(self, device_id: str, profile: StreamProfile) -> ScrcpyStreamer:
+        key = (device_id, profile.encoder_id)
+
+        async with self._get_lock(key):
+            streamer = self.streamers.get(key)
+            if streamer and streamer.is_running:
+                return streamer
+
+            if streamer:
+                # 流已结束（重连失败等），移除后重新启动
+                await self._stop_streamer(key, streamer)
+
+            port = self._allocate_port(device_id)
+            self._starting[key] = port
+
+            try:
+                streamer = self.streamer_factory(
+                    device_id=device_id,
+                    port=port,
+                    scid=f"{port:08x}",
+                    **profile.streamer_kwargs(),
+                    **self.streamer_kwargs,
+                )
+
+                print(
+                    f"[StreamerPool] Starting streamer for {device_id} on port {port} "
+                    f"(profile {profile.name}, {profile.encoder_id})"
+                )
+                await streamer.start()
+
+                self.streamers[key] = streamer
+                self._profiles[key] = profile
+            finally:
+                self._starting.pop(key, None)
+
+            return streamer
+
+    async def acquire(self, device_id: str, profile: ProfileLike = None) -> ScrcpyStreamer:
+        """
+        获取设备的 streamer 并增加引用计数
+
+        宽限期内重新订阅时直接复用正在运行的 streamer，不会重启。
+        使用完毕后必须以相同的 profile 调用 release()。
+
+        Args:
+            device_id: 设备 ID
+            profile: profile 名称或对象，None 为默认 profile
+
+        Returns:
+            ScrcpyStreamer: 已启动的 streamer
+        """
+        key = self._key(device_id, profile)
+
+        self._cancel_idle_stop(key)
+
+        # 启动期间也计入引用，避免并发的空闲检查误停
+        self._refcounts[key] = self._refcounts.get(key, 0) + 1
+
+        try:
+            streamer = await self.get_or_start(device_id, profile)
+        except BaseException:
+            self._release_key(key)
+            raise
+
+        # 编码格式退回 H.264 后，引用计数转移到实际使用的 streamer
+        actual = self._key(device_id, profile)
+        if actual != key:
+            self._cancel_idle_stop(actual)
+            self._refcounts[actual] = self._refcounts.get(actual, 0) + 1
+            self._release_key(key)
+
+        return streamer
+
+    def release(self, device_id: str, profile: ProfileLike = None):
+        """
+        减少引用计数，归零后开始空闲宽限期计时
+
+        Args:
+            device_id: 设备 ID
+            profile: acquire() 时使用的 profile
+        """
+        self._release_key(self._key(device_id, profile))
+
+    def _release_key(self, key: StreamKey):
+        count = self._refcounts.get(key, 0) - 1
+
+        if count > 0:
+            self._refcounts[key] = count
+            return
+
+        self._refcounts.pop(key, None)
+
+        if key in self.streamers:
+            self._schedule_idle_stop(key)
+
+    def refcount(self, device_id: str, profile: ProfileLike = None) -> int:
+        """streamer 当前的订阅者引用计数"""
+        return self._refcounts.get(self._key(device_id, profile), 0)
+
+    def _schedule_idle_stop(self, key: StreamKey):
+        self._cancel_idle_stop(key)
+
+        print(f"[StreamerPool] {key[0]} ({key[1]}) idle, stopping in {self.idle_grace:.0f}s")
+        self._idle_tasks[key] = asyncio.create_task(self._stop_when_idle(key))
+
+    def _cancel_idle_stop(self, key: StreamKey):
+        task = self._idle_tasks.pop(key, None)
+        if task and not task.done():
+            task.cancel()
+
+    async def _stop_when_idle(self, key: StreamKey):
+        """宽限期结束后仍无订阅者则停止 streamer"""
+        await asyncio.sleep(self.idle_grace)
+
+        async with self._get_lock(key):
+            if self._refcounts.get(key, 0) > 0:
+                return
+
+            # 任务即将结束，从表中移除自身，避免 _stop_streamer 取消自己
+            self._idle_tasks.pop(key, None)
+
+            streamer = self.streamers.get(key)
+            if streamer:
+                print(f"[StreamerPool] Stopping idle streamer for {key[0]} ({key[1]})")
+                await self._stop_streamer(key, streamer)
+
+    async def start_recording(
+        self, device_id: str, profile: ProfileLike = None, **recorder_kwargs
+    ) -> StreamRecorder:
+        """
+        开始录制设备的视频流（已在录制时返回当前的 recorder）
+
+        录制期间持有 streamer 的一个引用，没有观看者时也不会停止。
+
+        Args:
+            device_id: 设备 ID
+            profile: 录制使用的 profile，None 为默认 profile
+            **recorder_kwargs: 传给 StreamRecorder 的参数
+
+        Returns:
+            StreamRecorder: 录制订阅者
+        """
+        if device_id in self._recordings:
+            streamer = self.get(device_id, self._recordings[device_id])
+            recorder = streamer.recorder if streamer else None
+            if recorder is not None and recorder.is_recording:
+                return recorder
+
+            # streamer 已停止（设备断开等），释放旧的引用后重新开始
+            self.release(device_id, self._recordings.pop(device_id))
+
+        streamer = await self.acquire(device_id, profile)
+
+        try:
+            recorder = streamer.start_recording(**recorder_kwargs)
+        except BaseException:
+            self.release(device_id, profile)
+            raise
+
+        self._recordings[device_id] = profile
+        return recorder
+
+    async def stop_recording(self, device_id: str) -> Optional[StreamRecorder]:
+        """
+        停止录制并释放引用
+
+        Returns:
+            StreamRecorder: 已停止的 recorder，没有在录制时返回 None
+        """
+        if device_id not in self._recordings:
+            return None
+
+        profile = self._recordings.pop(device_id)
+        streamer = self.get(device_id, profile)
+
+        try:
+            if streamer:
+                return await streamer.stop_recording()
+            return None
+        finally:
+            self.release(device_id, profile)
+
+    def recording(self, device_id: str) -> Optional[StreamRecorder]:
+        """设备当前的 recorder（包括流结束后已停止的），没有录制时返回 None"""
+        if device_id not in self._recordings:
+            return None
+
+        streamer = self.get(device_id, self._recordings[device_id])
+        return streamer.recorder if streamer else None
+
+    async def start_many(
+        self, device_ids: Iterable[str], profile: ProfileLike = None
+    ) -> Dict[str, Union[ScrcpyStreamer, BaseException]]:
+        """
+        并行启动多台设备
+
+        Args:
+            device_ids: 设备 ID 列表
+            profile: profile 名称或对象，None 为默认 profile
+
+        Returns:
+            Dict: 设备 ID → streamer 或启动失败的异常
+        """
+        device_ids = list(dict.fromkeys(device_ids))
+
+        results = await asyncio.gather(
+            *(self.get_or_start(device_id, profile) for device_id in device_ids),
+            return_exceptions=True,
+        )
+
+        # 预热的设备没有订阅者时同样适用空闲宽限期
+        for device_id in device_ids:
+            key = self._key(device_id, profile)
+            if (
+                key in self.streamers
+                and self._refcounts.get(key, 0) == 0
+                and key not in self._idle_tasks
+            ):
+                self._schedule_idle_stop(key)
+
+        return dict(zip(device_ids, results))
+
+    async def stop(self, device_id: str, profile: ProfileLike = None) -> bool:
+        """
+        停止并移除设备的 streamer
+
+        Args:
+            device_id: 设备 ID
+            profile: 只停止该 profile 的 streamer，None 停止设备的所有 streamer
+
+        Returns:
+            bool: 是否存在被停止的 streamer
+        """
+        if profile is not None:
+            keys = [self._key(device_id, profile)]
+        else:
+            keys = [key for key in self.streamers if key[0] == device_id]
+
+        stopped = False
+
+        for key in keys:
+            async with self._get_lock(key):
+                streamer = self.streamers.get(key)
+                if not streamer:
+                    continue
+
+                await self._stop_streamer(key, streamer)
+                stopped = True
+
+        return stopped
+
+    async def handle_device_change(
+        self, device_id: str, old_state: Optional[str], new_state: Optional[str]
+    ):
+        """
+        设备状态变化回调（DeviceRegistry 监听者）
+
+        设备断开或离线时停止其所有 streamer，订阅者随之收到流结束；
+        重新连接后由下一个订阅者重新启动。
+        """
+        if new_state == "device" or device_id not in self:
+            return
+
+        print(f"[StreamerPool] {device_id} is {new_state or 'disconnected'}, stopping streamer")
+        await self.stop(device_id)
+
+    async def stop_all(self):
+        """并行停止所有 streamer"""
+        device_ids = {key[0] for key in self.streamers}
+
+        await asyncio.gather(
+            *(self.stop(device_id) for device_id in device_ids),
+            return_exceptions=True,
+        )
+
+    async def _stop_streamer(self, key: StreamKey, streamer: ScrcpyStreamer):
+        self.streamers.pop(key, None)
+        self._profiles.pop(key, None)
+        self._cancel_idle_stop(key)
+
+        try:
+            await streamer.stop()
+        except Exception as e:
+            print(f"[StreamerPool] Failed to stop streamer for {key[0]}: {e}")
+
+    def describe(self) -> List[dict]:
+        """池内所有 streamer 的状态"""
+        return [
+            {
+                "device_id": key[0],
+                "profile": self._profiles[key].name if key in self._profiles else None,
+                "codec": streamer.codec.name,
+                "max_size": streamer.max_size,
+                "max_fps": streamer.max_fps,
+                "video_bit_rate": streamer.video_bit_rate,
+                "port": streamer.port,
+                "scid": streamer.scid,
+                "running": streamer.is_running,
+                "state": streamer.state,
+                "reconnects": streamer.reconnects,
+                "last_disconnect_reason": streamer.last_disconnect_reason,
+                "control": bool(streamer.controller and not streamer.controller.is_closed),
+                "subscribers": streamer.subscriber_count,
+                "recording": streamer.is_recording,
+                "refcount": self._refcounts.get(key, 0),
+                "idle": key in self._idle_tasks,
+                "width": streamer.device_width,
+                "height": streamer.device_height,
+            }
+            for key, streamer in self.streamers.items()
+        ]
+
+
+def _is_port_free(port: int) -> bool:
+    """检查本地端口是否可以绑定"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        try:
+            sock.bind(("127.0.0.1", port))
+        except OSError:
+            return False
+    return True
@@ -0,0 +1,146 @@
+"""
+视频流配置（profile）
+
+每个 WebSocket 连接按名称选择一个 profile（编码格式、分辨率、帧率、码率）。
+编码参数相同的 profile 共用同一个 scrcpy-server / 编码器。
+
+内置 profile（码率阶梯）：
+- thumbnail：缩略图墙，480p / 5fps / 250 kbps
+- interactive：交互操作（默认），1280p / 20fps / 1 Mbps
+- hifi：高清观看，H.265 1920p / 30fps / 4 Mbps（设备不支持 H.265 时退回 H.264）
+
+可以通过 SCRCPY_PROFILES 环境变量（JSON）覆盖或新增 profile：
+    SCRCPY_PROFILES='{"hifi": {"codec": "av1", "video_bit_rate": 3000000}}'
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, Optional, Union
+
+from .codecs import get_codec
+
+
+@dataclass(frozen=True)
+class StreamProfile:
+    """视频流配置"""
+    name: str
+    codec: str = "h264"
+    max_size: int = 1280
+    max_fps: int = 20
+    video_bit_rate: int = 1_000_000
+
+    @property
+    def encoder_id(self) -> str:
+        """编码参数标识（参数相同的 profile 共用编码器）"""
+        return f"{self.codec}-{self.max_size}-{self.max_fps}-{self.video_bit_rate}"
+
+    def with_codec(self, codec: str) -> "StreamProfile":
+        """同样的分辨率 / 帧率 / 码率，换一种编码格式"""
+        return replace(self, codec=codec)
+
+    def streamer_kwargs(self) -> dict:
+        """传给 ScrcpyStreamer 的参数"""
+        return {
+            "video_codec": self.codec,
+            "max_size": self.max_size,
+            "max_fps": self.max_fps,
+            "video_bit_rate": self.video_bit_rate,
+        }
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+BUILTIN_PROFILES: Dict[str, StreamProfile] = {
+    profile.name: profile
+    for profile in (
+        StreamProfile("thumbnail", "h264", max_size=480, max_fps=5, video_bit_rate=250_000),
+        StreamProfile("interactive", "h264", max_size=1280, max_fps=20, video_bit_rate=1_000_000),
+        StreamProfile("hifi", "h265", max_size=1920, max_fps=30, video_bit_rate=4_000_000),
+    )
+}
+
+DEFAULT_PROFILE = "interactive"
+
+
+def load_profiles() -> Dict[str, StreamProfile]:
+    """
+    内置 profile 加上 SCRCPY_PROFILES 环境变量中的覆盖 / 新增项
+
+    Raises:
+        ValueError: SCRCPY_PROFILES 格式错误或编码格式不支持
+    """
+    profiles = dict(BUILTIN_PROFILES)
+
+    raw = os.getenv("SCRCPY_PROFILES", "").strip()
+    if not raw:
+        return profiles
+
+    try:
+        overrides = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid SCRCPY_PROFILES: {e}")
+
+    for name, fields in overrides.items():
+        base = profiles.get(name, StreamProfile(name))
+        try:
+            profile = replace(base, **fields)
+        except TypeError as e:
+            raise ValueError(f"Invalid SCRCPY_PROFILES entry {name!r}: {e}")
+
+        get_codec(profile.codec)
+        profiles[name] = profile
+
+    return profiles
+
+
+class ProfileRegistry:
+    """
+    profile 查找
+
+    示例：
+        >>> profiles = ProfileRegistry()
+        >>> profiles.get("thumbnail").max_fps
+        5
+        >>> profiles.get(None).name
+        'interactive'
+    """
+
+    def __init__(
+        self,
+        profiles: Optional[Dict[str, StreamProfile]] = None,
+        default: Optional[str] = None,
+    ):
+        """
+        Args:
+            profiles: 可用的 profile，默认为内置 profile 加 SCRCPY_PROFILES
+            default: 默认 profile 名称，默认读取 SCRCPY_PROFILE（默认 interactive）
+        """
+        self.profiles = profiles if profiles is not None else load_profiles()
+        self.default = default or os.getenv("SCRCPY_PROFILE", DEFAULT_PROFILE)
+
+        if self.default not in self.profiles:
+            raise ValueError(f"Unknown default profile: {self.default}")
+
+    def get(self, profile: Union[str, StreamProfile, None] = None) -> StreamProfile:
+        """
+        按名称获取 profile（None 为默认 profile，已是 StreamProfile 时原样返回）
+
+        Raises:
+            ValueError: 未知的 profile
+        """
+        if isinstance(profile, StreamProfile):
+            return profile
+
+        name = profile or self.default
+        if name not in self.profiles:
+            raise ValueError(f"Unknown profile: {name} (available: {', '.join(self.profiles)})")
+
+        return self.profiles[name]
+
+    def describe(self) -> dict:
+        return {
+            "default": self.default,
+            "profiles": [profile.to_dict() for profile in self.profiles.values()],
+        }
@@ -0,0 +1,597 @@
+"""
+StreamRecorder - 视频流录制
+
+作为 streamer 的一个普通订阅者，把 NAL 流按 PTS 原样写入分段文件，不重新编码：
+- mp4：分片 MP4（frag_keyframe，每个关键帧一个分片，写到一半也能播放），需要 PyAV
+- annexb：原始码流（H.264 / H.265 为 Annex-B，AV1 为 OBU 序列），不需要额外依赖
+
+分段：每段从参数集 + 关键帧开始，时长或大小超过上限后在下一个关键帧切换；
+参数集变化（分辨率变化）或 PTS 回退（重连）时也会切换。
+每段旁边有一个同名 .json 清单（起止时间、PTS、关键帧索引），供回放定位；
+录制中的分段每隔几秒更新一次清单。
+
+录制不影响实时观看：
+- 订阅者不设延迟预算，落后时只会被环形缓冲区截断，永远不会阻塞读取者
+- 文件写入在后台线程中进行，写入队列满时丢弃到下一个关键帧
+
+保留策略：每关闭一个分段检查一次录制目录，超过总大小或保留时长的最旧分段被删除。
+"""
+
+import asyncio
+import json
+import os
+import queue
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from fractions import Fraction
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+
+try:
+    import av
+except ImportError:
+    av = None  # type: ignore[assignment]
+
+from .broadcaster import NalSubscriber
+from .packet_reader import ScrcpyPacket
+
+if TYPE_CHECKING:
+    from .streamer import ScrcpyStreamer
+
+
+FORMAT_MP4 = "mp4"
+FORMAT_ANNEXB = "annexb"
+
+# 原始码流的文件扩展名
+RAW_EXTENSIONS = {"h264": ".h264", "h265": ".h265", "av1": ".obu"}
+
+# scrcpy 编码格式 → FFmpeg 编码格式名
+MUX_CODEC_NAMES = {"h264": "h264", "h265": "hevc", "av1": "av1"}
+
+# PTS 单位：微秒
+PTS_TIME_BASE = Fraction(1, 1_000_000)
+
+
+def default_format() -> str:
+    """默认录制格式：安装了 PyAV 时为 mp4，否则为 annexb"""
+    return os.getenv("SCRCPY_RECORD_FORMAT", FORMAT_MP4 if av is not None else FORMAT_ANNEXB)
+
+
+def default_directory() -> Path:
+    """录制根目录，默认读取 SCRCPY_RECORD_DIR（默认 ./recordings）"""
+    return Path(os.getenv("SCRCPY_RECORD_DIR", "recordings"))
+
+
+def safe_path_component(name: str) -> str:
+    """设备 ID / 任务 ID 转为文件名（无线调试的 ip:port 含冒号）"""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
+
+
+@dataclass
+class RecordingSegment:
+    """一个录制分段（同名 .json 清单的内容）"""
+    device_id: str
+    path: str
+    codec: str
+    format: str
+    started_at: float
+    start_pts: Optional[int] = None
+    ended_at: Optional[float] = None
+    end_pts: Optional[int] = None
+    width: int = 0
+    height: int = 0
+    bytes: int = 0
+    frames: int = 0
+    # 关键帧索引：[PTS（微秒）, 字节偏移（annexb，mp4 为 -1）, 接收时间（time.time）]
+    keyframes: List[Tuple[int, int, float]] = field(default_factory=list)
+
+    @property
+    def manifest_path(self) -> Path:
+        return Path(self.path).with_suffix(".json")
+
+    @property
+    def is_complete(self) -> bool:
+        return self.ended_at is not None
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RecordingSegment":
+        data = dict(data)
+        data["keyframes"] = [tuple(item) for item in data.get("keyframes", [])]
+        return cls(**data)
+
+    def save_manifest(self):
+        """原子写入清单文件"""
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.to_dict(), ensure_ascii=False))
+        os.replace(tmp, self.manifest_path)
+
+
+def load_segments(root: Path, device_id: Optional[str] = None) -> List[RecordingSegment]:
+    """
+    读取录制目录中的分段清单（按开始时间排序）
+
+    Args:
+        root: 录制根目录
+        device_id: 只读取该设备的分段，None 表示所有设备
+    """
+    root = Path(root)
+    pattern = f"{safe_path_component(device_id)}/*.json" if device_id else "*/*.json"
+
+    segments = []
+    for manifest in root.glob(pattern):
+        try:
+            segments.append(RecordingSegment.from_dict(json.loads(manifest.read_text())))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[StreamRecorder] Skipping invalid manifest {manifest}: {e}")
+
+    segments.sort(key=lambda segment: segment.started_at)
+    return segments
+
+
+def enforce_retention(
+    root: Path,
+    max_bytes: Optional[int] = None,
+    max_age: Optional[float] = None,
+    active_window: float = 300.0,
+) -> List[str]:
+    """
+    删除超出保留策略的最旧分段（视频文件和清单）
+
+    未结束且最近仍在写入的分段（其他设备正在录制）不会被删除；
+    进程崩溃遗留的未结束分段超过 active_window 没有写入后按普通分段处理。
+
+    Args:
+        root: 录制根目录（所有设备共享配额）
+        max_bytes: 总大小上限，None 表示不限制
+        max_age: 最长保留秒数，None 表示不限制
+        active_window: 未结束分段多少秒内有写入视为正在录制
+
+    Returns:
+        List[str]: 被删除的分段路径
+    """
+    now = time.time()
+    total = 0
+    candidates: List[Tuple[RecordingSegment, int]] = []
+
+    for segment in load_segments(root):
+        try:
+            stat = Path(segment.path).stat()
+            size, modified = stat.st_size, stat.st_mtime
+        except FileNotFoundError:
+            size, modified = 0, 0.0
+
+        total += size
+
+        if segment.is_complete or now - modified > active_window:
+            candidates.append((segment, size))
+
+    removed = []
+
+    for segment, size in candidates:
+        expired = max_age is not None and now - segment.started_at > max_age
+        over_quota = max_bytes is not None and total > max_bytes
+
+        if not expired and not over_quota:
+            break
+
+        for path in (Path(segment.path), segment.manifest_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+        total -= size
+        removed.append(segment.path)
+
+    if removed:
+        print(f"[StreamRecorder] Retention removed {len(removed)} segment(s)")
+
+    return removed
+
+
+class _AnnexBWriter:
+    """原始码流写入（参数集随关键帧一起写入，每段都能独立播放）"""
+
+    def __init__(self, path: Path):
+        self.file = open(path, "wb")
+
+    @property
+    def offset(self) -> int:
+        return self.file.tell()
+
+    def write(self, data: bytes, pts: Optional[int], is_keyframe: bool):
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+
+class _Mp4Writer:
+    """分片 MP4 写入（PyAV 转封装，不重新编码）"""
+
+    def __init__(self, path: Path, codec: str, width: int, height: int):
+        self.container = av.open(
+            str(path),
+            "w",
+            format="mp4",
+            options={"movflags": "frag_keyframe+empty_moov+default_base_moof"},
+        )
+        self.stream = self.container.add_mux_stream(
+            MUX_CODEC_NAMES[codec], width=width, height=height
+        )
+        self.stream.time_base = PTS_TIME_BASE
+
+        self._first_pts: Optional[int] = None
+        self._last_pts = -1
+
+    @property
+    def offset(self) -> int:
+        return -1
+
+    def write(self, data: bytes, pts: Optional[int], is_keyframe: bool):
+        if self._first_pts is None:
+            self._first_pts = pts or 0
+
+        # 分段内时间戳从 0 开始并严格递增（scrcpy 没有 B 帧，DTS = PTS）
+        relative = max((pts or 0) - self._first_pts, self._last_pts + 1)
+        self._last_pts = relative
+
+        packet = av.Packet(data)
+        packet.stream = self.stream
+        packet.pts = packet.dts = relative
+        packet.time_base = PTS_TIME_BASE
+        packet.is_keyframe = is_keyframe
+
+        self.container.mux(packet)
+
+    def close(self):
+        self.container.close()
+
+
+class StreamRecorder:
+    """
+    streamer 的录制订阅者
+
+    示例：
+        >>> recorder = streamer.start_recording()
+        >>> ...
+        >>> await streamer.stop_recording()
+        >>> recorder.segments[-1].path
+    """
+
+    # 录制中的分段更新清单的间隔（秒）
+    MANIFEST_INTERVAL = 5.0
+
+    def __init__(
+        self,
+        streamer: "ScrcpyStreamer",
+        directory: Optional[Path] = None,
+        format: Optional[str] = None,
+        segment_duration: Optional[float] = None,
+        segment_max_bytes: Optional[int] = None,
+        max_total_bytes: Optional[int] = None,
+        max_age: Optional[float] = None,
+        queue_size: int = 512,
+    ):
+        """
+        Args:
+            streamer: 录制的 streamer
+            directory: 录制根目录（每台设备一个子目录），默认读取 SCRCPY_RECORD_DIR
+            format: mp4 或 annexb，默认读取 SCRCPY_RECORD_FORMAT（安装了 PyAV 时为 mp4）
+            segment_duration: 分段时长（秒），默认读取 SCRCPY_RECORD_SEGMENT（默认 60）
+            segment_max_bytes: 分段大小上限，默认读取 SCRCPY_RECORD_SEGMENT_MB（默认 64 MB）
+            max_total_bytes: 录制目录总大小上限，默认读取 SCRCPY_RECORD_MAX_MB（默认 2048 MB）
+            max_age: 分段保留时长（秒），默认读取 SCRCPY_RECORD_RETENTION_HOURS（默认 72 小时）
+            queue_size: 写入队列长度（packet 个数），满时丢弃到下一个关键帧
+
+        Raises:
+            ValueError: 不支持的格式
+            RuntimeError: mp4 格式但未安装 PyAV
+        """
+        self.streamer = streamer
+        self.device_id = streamer.device_id or "default"
+        self.root = Path(directory) if directory else default_directory()
+        self.directory = self.root / safe_path_component(self.device_id)
+
+        self.format = format or default_format()
+        if self.format not in (FORMAT_MP4, FORMAT_ANNEXB):
+            raise ValueError(f"Unsupported recording format: {self.format}")
+        if self.format == FORMAT_MP4 and av is None:
+            raise RuntimeError("PyAV is not installed (pip install autolife[video])")
+
+        self.segment_duration = segment_duration or float(
+            os.getenv("SCRCPY_RECORD_SEGMENT", "60")
+        )
+        self.segment_max_bytes = segment_max_bytes or int(
+            float(os.getenv("SCRCPY_RECORD_SEGMENT_MB", "64")) * 1024 * 1024
+        )
+        self.max_total_bytes = max_total_bytes or int(
+            float(os.getenv("SCRCPY_RECORD_MAX_MB", "2048")) * 1024 * 1024
+        )
+        self.max_age = max_age or float(os.getenv("SCRCPY_RECORD_RETENTION_HOURS", "72")) * 3600
+
+        # 已完成的分段（本次录制）
+        self.segments: List[RecordingSegment] = []
+
+        # 正在写入的分段
+        self.current: Optional[RecordingSegment] = None
+
+        # 写入队列满或缓冲区溢出而丢弃的 packet 数量
+        self.dropped = 0
+
+        # 最近一次写入错误
+        self.error: Optional[str] = None
+
+        self.is_recording = False
+
+        self._subscriber: Optional[NalSubscriber] = None
+        self._task: Optional[asyncio.Task] = None
+        self._queue: "queue.Queue[Optional[Tuple[ScrcpyPacket, float]]]" = queue.Queue(queue_size)
+        self._writer_thread: Optional[threading.Thread] = None
+        self._waiting_for_keyframe = False
+
+        # 写入线程状态
+        self._writer: Optional[Union[_AnnexBWriter, _Mp4Writer]] = None
+        self._config_run: List[bytes] = []
+        self._last_packet_was_config = False
+        self._config = b""
+        self._last_pts: Optional[int] = None
+        self._manifest_saved_at = 0.0
+
+    def start(self):
+        """开始录制（在事件循环中调用）"""
+        if self.is_recording:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        # 不设延迟预算：录制要完整的序列，落后时只会被缓冲区截断
+        self._subscriber = self.streamer._broadcaster.subscribe(latency_budget_ms=None)
+        self.is_recording = True
+
+        self._writer_thread = threading.Thread(
+            target=self._write_loop, name=f"recorder-{self.device_id}", daemon=True
+        )
+        self._writer_thread.start()
+
+        # 先写入缓存的参数集 + 关键帧，录制立即开始，不必等下一个关键帧
+        received_at = time.monotonic()
+        for data in self.streamer.config.values():
+            self._enqueue(ScrcpyPacket(data, None, True, False, received_at))
+        if self.streamer.latest_keyframe:
+            self._enqueue(ScrcpyPacket(
+                self.streamer.latest_keyframe,
+                self.streamer.latest_keyframe_pts,
+                False,
+                True,
+                received_at,
+            ))
+
+        self._task = asyncio.create_task(self._run())
+
+        print(f"[StreamRecorder] Recording {self.device_id} to {self.directory} ({self.format})")
+
+    async def stop(self):
+        """停止录制并等待当前分段写完"""
+        if not self.is_recording:
+            return
+
+        self.is_recording = False
+
+        if self._subscriber:
+            self._subscriber.close()
+
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        # 通知写入线程结束（队列满时等待写入线程腾出空间）
+        await asyncio.to_thread(self._queue.put, None)
+        await asyncio.to_thread(self._writer_thread.join)
+
+        print(
+            f"[StreamRecorder] Stopped recording {self.device_id}: "
+            f"{len(self.segments)} segment(s), dropped {self.dropped}"
+        )
+
+    def describe(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "recording": self.is_recording,
+            "format": self.format,
+            "directory": str(self.directory),
+            "segments": len(self.segments),
+            "current": self.current.path if self.current else None,
+            "dropped": self.dropped,
+            "error": self.error,
+        }
+
+    async def _run(self):
+        """订阅 NAL 流并放入写入队列（流结束时录制随之结束）"""
+        try:
+            while (packet := await self._subscriber.get_packet()) is not None:
+                self._enqueue(packet)
+        finally:
+            if self.is_recording:
+                # 流已结束（streamer 停止），写完当前分段
+                self.is_recording = False
+                self._subscriber.close()
+                await asyncio.to_thread(self._queue.put, None)
+
+    def _enqueue(self, packet: ScrcpyPacket):
+        """放入写入队列，永不阻塞事件循环"""
+        sync_point = packet.is_config or packet.is_keyframe
+
+        if self._waiting_for_keyframe and not sync_point:
+            self.dropped += 1
+            return
+
+        # 单调时钟 → 墙上时钟（与任务日志对齐）
+        wall_time = time.time() - (time.monotonic() - packet.received_at)
+
+        try:
+            self._queue.put_nowait((packet, wall_time))
+            self._waiting_for_keyframe = False
+        except queue.Full:
+            self.dropped += 1
+            self._waiting_for_keyframe = True
+
+    def _write_loop(self):
+        """写入线程：从队列取出 packet 写入分段文件"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            packet, wall_time = item
+
+            try:
+                self._write_packet(packet, wall_time)
+            except Exception as e:
+                print(f"[StreamRecorder] Write failed for {self.device_id}: {e}")
+                self.error = str(e)
+                self._close_segment()
+
+        self._close_segment()
+
+    def _write_packet(self, packet: ScrcpyPacket, wall_time: float):
+        if packet.is_config:
+            # 连续的参数集（H.264 的 SPS + PPS）作为一组，与下一个关键帧一起写入
+            if not self._last_packet_was_config:
+                self._config_run = []
+            self._config_run.append(packet.data)
+            self._last_packet_was_config = True
+            return
+
+        self._last_packet_was_config = False
+        data = packet.data
+
+        if not packet.is_keyframe:
+            self._config_run = []
+        else:
+            config = b"".join(self._config_run) or self._config
+
+            if self._should_rotate(config, packet.pts, wall_time):
+                self._close_segment()
+                self._open_segment(config, packet.pts, wall_time)
+
+                # 每段以参数集开头，可以独立播放（mp4 由此生成 avcC / hvcC / av1C）
+                data = self._config_prefix(config) + data
+            elif self._config_run and self.format == FORMAT_ANNEXB:
+                # 原始码流保留流中的参数集，从任意关键帧索引处都能开始解码
+                data = self._config_prefix(config) + data
+
+            self._config_run = []
+
+        writer = self._writer
+        segment = self.current
+        if writer is None or segment is None:
+            # 还没有关键帧，无法开始分段
+            return
+
+        if packet.is_keyframe:
+            segment.keyframes.append((packet.pts or 0, writer.offset, wall_time))
+
+            # 录制中的分段定期更新清单，回放可以定位到正在录制的内容
+            if wall_time - self._manifest_saved_at >= self.MANIFEST_INTERVAL:
+                segment.save_manifest()
+                self._manifest_saved_at = wall_time
+
+        writer.write(data, packet.pts, packet.is_keyframe)
+        segment.bytes += len(data)
+
+        if packet.pts is not None:
+            self._last_pts = packet.pts
+            segment.end_pts = packet.pts
+        segment.frames += 1
+
+    def _should_rotate(self, config: bytes, pts: Optional[int], wall_time: float) -> bool:
+        segment = self.current
+
+        if segment is None:
+            return True
+
+        if config != self._config:
+            # 参数集变化（分辨率变化或重连后编码器重新初始化）
+            return True
+
+        if pts is not None and self._last_pts is not None and pts < self._last_pts:
+            # PTS 回退：scrcpy-server 重启
+            return True
+
+        return (
+            wall_time - segment.started_at >= self.segment_duration
+            or segment.bytes >= self.segment_max_bytes
+        )
+
+    def _open_segment(self, config: bytes, pts: Optional[int], wall_time: float):
+        codec = self.streamer.codec.name
+        stamp = datetime.fromtimestamp(wall_time).strftime("%Y%m%d-%H%M%S-%f")
+
+        if self.format == FORMAT_MP4:
+            path = self.directory / f"{stamp}.mp4"
+        else:
+            path = self.directory / f"{stamp}{RAW_EXTENSIONS[codec]}"
+
+        width = self.streamer.device_width or 0
+        height = self.streamer.device_height or 0
+
+        if self.format == FORMAT_MP4:
+            self._writer = _Mp4Writer(path, codec, width, height)
+        else:
+            self._writer = _AnnexBWriter(path)
+
+        self._config = config
+        self._last_pts = None
+
+        self.current = RecordingSegment(
+            device_id=self.device_id,
+            path=str(path),
+            codec=codec,
+            format=self.format,
+            started_at=wall_time,
+            start_pts=pts,
+            width=width,
+            height=height,
+        )
+        self.current.save_manifest()
+        self._manifest_saved_at = wall_time
+
+    def _config_prefix(self, config: bytes) -> bytes:
+        if self.streamer.codec.name == "av1" and config[:1] == b"\x81":
+            # av1C：4 字节头之后是序列头 OBU
+            return config[4:]
+        return config
+
+    def _close_segment(self):
+        segment = self.current
+        if self._writer is None or segment is None:
+            return
+
+        try:
+            self._writer.close()
+        except Exception as e:
+            print(f"[StreamRecorder] Failed to close {segment.path}: {e}")
+            self.error = str(e)
+
+        self._writer = None
+        self.current = None
+
+        path = Path(segment.path)
+        if path.exists():
+            segment.bytes = path.stat().st_size
+        segment.ended_at = time.time()
+        segment.save_manifest()
+
+        self.segments.append(segment)
+
+        enforce_retention(self.root, self.max_total_bytes, self.max_age)
@@ -0,0 +1,276 @@
+"""
+ScreenshotProvider - 从实时视频流截图
+
+agent 每一步都要截图，adb screencap + pull 每次需要 0.5 - 1.5 秒。
+设备正在投屏时，直接使用视频流中最近解码的一帧：
+- 每台设备一个只解码不输出的 FrameDecoder（从缓存的 IDR 及其后的 P 帧开始解码）
+- 截图时取接收时间在 max_age 之内的最新一帧，按需编码为 PNG / JPEG
+- 设备没有在投屏、画面不够新或解码失败时，退回 screencap
+- 超过 idle_timeout 秒没有截图时释放解码器
+"""
+
+import asyncio
+import base64
+import os
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from autolife.adb import AdbError
+
+from .decoder import FORMAT_NONE, FORMAT_PNG, Frame, FrameDecoder, is_available
+from .pool import StreamerPool
+from .streamer import ScrcpyStreamer
+
+
+@dataclass
+class StreamScreenshot:
+    """截图（字段与 phone_agent 的 Screenshot 一致）"""
+    base64_data: str
+    width: int
+    height: int
+    is_sensitive: bool = False
+
+
+class ScreenshotProvider:
+    """
+    基于视频流的截图提供者（同步接口，在 agent 的工作线程中调用）
+
+    示例：
+        >>> provider = ScreenshotProvider(pool, fallback=adb_get_screenshot)
+        >>> screenshot = provider.get_screenshot("emulator-5554")
+        >>> screenshot.width, screenshot.height
+    """
+
+    def __init__(
+        self,
+        pool: StreamerPool,
+        fallback: Optional[Callable[..., Any]] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        format: Optional[str] = None,
+        max_age: Optional[float] = None,
+        wait_timeout: Optional[float] = None,
+        idle_timeout: Optional[float] = None,
+        screenshot_factory: Callable[..., Any] = StreamScreenshot,
+    ):
+        """
+        Args:
+            pool: streamer 池（只使用正在运行的流，不会为截图启动投屏）
+            fallback: 退回的截图函数 (device_id, timeout) → Screenshot，通常是 adb screencap
+            loop: streamer 所在的事件循环，默认为当前运行的事件循环
+            format: 图片格式 png / jpeg，默认读取 SCRCPY_SCREENSHOT_FORMAT（默认 png，
+                与 screencap 一致；jpeg 编码更快，但要求模型服务按内容识别图片格式）
+            max_age: 画面最多落后多少秒，默认读取 SCRCPY_SCREENSHOT_MAX_AGE（默认 0.3）
+            wait_timeout: 等待足够新的一帧的超时（秒），默认读取 SCRCPY_SCREENSHOT_WAIT（默认 1）
+            idle_timeout: 多少秒没有截图后释放解码器，默认读取 SCRCPY_SCREENSHOT_IDLE（默认 60）
+            screenshot_factory: 截图对象的构造函数 (base64_data, width, height, is_sensitive)
+        """
+        self.pool = pool
+        self.fallback = fallback
+        self.loop = loop or asyncio.get_running_loop()
+        self.format = format or os.getenv("SCRCPY_SCREENSHOT_FORMAT") or FORMAT_PNG
+        self.max_age = max_age if max_age is not None else float(
+            os.getenv("SCRCPY_SCREENSHOT_MAX_AGE", "0.3")
+        )
+        self.wait_timeout = wait_timeout or float(os.getenv("SCRCPY_SCREENSHOT_WAIT", "1"))
+        self.idle_timeout = idle_timeout or float(os.getenv("SCRCPY_SCREENSHOT_IDLE", "60"))
+        self.screenshot_factory = screenshot_factory
+
+        # 截图来源统计
+        self.stream_hits = 0
+        self.fallbacks = 0
+
+        # 设备 ID → (streamer, 解码器)
+        self._decoders: Dict[str, Tuple[ScrcpyStreamer, FrameDecoder]] = {}
+        # 设备 ID → 空闲释放定时器
+        self._idle_handles: Dict[str, asyncio.TimerHandle] = {}
+
+    def describe(self) -> dict:
+        return {
+            "format": self.format,
+            "max_age": self.max_age,
+            "stream_hits": self.stream_hits,
+            "fallbacks": self.fallbacks,
+            "decoders": {
+                device_id: decoder.describe()
+                for device_id, (_, decoder) in self._decoders.items()
+            },
+        }
+
+    def install(self, target: Any, name: str = "get_screenshot"):
+        """
+        替换 target 上的截图函数，原函数作为 fallback（重复调用无副作用）
+
+        Args:
+            target: 模块或对象（例如 phone_agent.agent 模块、设备工厂实例）
+            name: 截图函数名
+        """
+        current = getattr(target, name)
+        if getattr(current, "__self__", None) is self:
+            return
+
+        self.fallback = current
+        setattr(target, name, self.get_screenshot)
+
+    def get_screenshot(self, device_id: Optional[str] = None, timeout: int = 10) -> Any:
+        """
+        截图（同步，不能在事件循环线程中调用）
+
+        Args:
+            device_id: 设备 ID，None 表示默认设备（PHONE_AGENT_DEVICE_ID 或唯一在投屏的设备）
+            timeout: 退回 screencap 时的超时（秒）
+
+        Returns:
+            Screenshot: 由 screenshot_factory 或 fallback 构造
+        """
+        frame = None
+
+        if is_available() and not self._in_loop():
+            future = asyncio.run_coroutine_threadsafe(self.capture(device_id), self.loop)
+            try:
+                frame = future.result(timeout=self.wait_timeout + 5)
+            except (FutureTimeoutError, RuntimeError, ValueError) as e:
+                future.cancel()
+                print(f"[ScreenshotProvider] Stream capture failed: {e}")
+
+        if frame is None:
+            if self.fallback is None:
+                raise RuntimeError(f"No fresh stream frame for {device_id or 'default device'}")
+
+            self.fallbacks += 1
+            return self.fallback(device_id, timeout)
+
+        self.stream_hits += 1
+        width, height = self._screen_size(frame)
+
+        return self.screenshot_factory(
+            base64.b64encode(frame.data).decode(), width, height, False
+        )
+
+    async def capture(self, device_id: Optional[str] = None) -> Optional[Frame]:
+        """
+        从视频流取一帧（在事件循环中调用）
+
+        Returns:
+            Frame: 设备没有在投屏或没有足够新的画面时返回 None
+        """
+        requested_at = time.monotonic()
+
+        device_id = device_id or self._default_device()
+        if not device_id:
+            return None
+
+        decoder = self._get_decoder(device_id)
+        if decoder is None:
+            return None
+
+        self._schedule_release(device_id)
+        await self._resolve_display(device_id)
+
+        return await decoder.snapshot(
+            format=self.format,
+            newer_than=requested_at - self.max_age,
+            timeout=self.wait_timeout,
+        )
+
+    async def stop(self):
+        """释放所有解码器"""
+        for handle in self._idle_handles.values():
+            handle.cancel()
+        self._idle_handles.clear()
+
+        for device_id in list(self._decoders):
+            await self._release(device_id)
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _default_device(self) -> Optional[str]:
+        device_id = os.getenv("PHONE_AGENT_DEVICE_ID")
+        if device_id:
+            return device_id
+
+        # 只有一台设备在投屏时默认使用它
+        devices = {key[0] for key in self.pool.streamers}
+        return devices.pop() if len(devices) == 1 else None
+
+    def _get_decoder(self, device_id: str) -> Optional[FrameDecoder]:
+        """设备的解码器（复用已有的，流重启后重新获取）"""
+        entry = self._decoders.get(device_id)
+        if entry:
+            decoder = entry[1]
+            if decoder.is_running:
+                return decoder
+            self._decoders.pop(device_id)
+
+        streamer = self._pick_streamer(device_id)
+        if streamer is None:
+            return None
+
+        decoder = streamer.acquire_decoder(format=FORMAT_NONE, max_fps=0, max_width=0)
+        self._decoders[device_id] = (streamer, decoder)
+        return decoder
+
+    def _pick_streamer(self, device_id: str) -> Optional[ScrcpyStreamer]:
+        """设备正在运行的流中分辨率最高的一个"""
+        streamers = [
+            streamer for streamer in self.pool.streamers_for(device_id) if streamer.is_running
+        ]
+        if not streamers:
+            return None
+
+        return max(streamers, key=lambda streamer: streamer.device_width * streamer.device_height)
+
+    def _screen_size(self, frame: Frame) -> tuple:
+        """
+        截图尺寸：设备物理分辨率（按当前方向），agent 按它换算点击坐标；
+        物理分辨率未知时使用视频尺寸
+        """
+        entry = self._decoders.get(frame.device_id)
+        streamer = entry[0] if entry else None
+        if not streamer:
+            return frame.width, frame.height
+
+        # 开启控制时 streamer 已查询物理分辨率，否则使用显示参数缓存（capture 时补全）
+        size = (streamer.physical_width, streamer.physical_height)
+        if not all(size):
+            size = streamer.displays.natural_size(frame.device_id) or (0, 0)
+        if not all(size):
+            return frame.width, frame.height
+
+        width, height = size
+        if (width > height) != (frame.width > frame.height):
+            width, height = height, width
+        return width, height
+
+    async def _resolve_display(self, device_id: str):
+        """未开启控制的流不会查询物理分辨率：截图前查询一次（之后使用缓存）"""
+        streamer = self._decoders[device_id][0]
+        if streamer.physical_width or streamer.displays.natural_size(device_id):
+            return
+
+        try:
+            await streamer.displays.resolve(device_id)
+        except (AdbError, OSError, asyncio.TimeoutError) as e:
+            print(f"[ScreenshotProvider] Failed to query physical size: {e}")
+
+    def _schedule_release(self, device_id: str):
+        handle = self._idle_handles.pop(device_id, None)
+        if handle:
+            handle.cancel()
+
+        self._idle_handles[device_id] = self.loop.call_later(
+            self.idle_timeout, lambda: asyncio.ensure_future(self._release(device_id))
+        )
+
+    async def _release(self, device_id: str):
+        self._idle_handles.pop(device_id, None)
+
+        entry = self._decoders.pop(device_id, None)
+        if entry:
+            streamer, decoder = entry
+            await streamer.release_decoder(decoder)
@@ -0,0 +1,180 @@
+"""
+StreamStats - 视频流时延统计
+
+基于 scrcpy packet header 中的 PTS（编码器时间戳，设备时钟）统计：
+- 排队时延：主机收到 packet → 发送给 WebSocket（主机时钟，绝对值）
+- 编码到发送时延：PTS → 发送。设备与主机时钟没有同步，以观察到的
+  最小 (接收时间 - PTS) 作为基线，即相对于最快 packet 的额外时延
+- 帧间隔抖动：到达间隔与 PTS 间隔之差的平滑均值（RFC 3550 算法）
+
+重连后 PTS 从头开始，检测到 PTS 回退时重置基线。
+"""
+
+import threading
+from bisect import bisect_left
+from typing import List, Optional
+
+from .packet_reader import ScrcpyPacket
+
+
+class LatencyHistogram:
+    """
+    固定分桶的时延直方图（毫秒）
+
+    示例：
+        >>> histogram = LatencyHistogram()
+        >>> histogram.record(12.5)
+        >>> histogram.record(30.0)
+        >>> histogram.percentile(0.5)
+        20
+    """
+
+    # 桶上界（毫秒），最后一个桶为超过 1000ms
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        self.counts: List[int] = [0] * (len(self.BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms: float = 0.0
+
+    def record(self, value_ms: float):
+        value_ms = max(value_ms, 0.0)
+
+        self.counts[bisect_left(self.BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        分位数（所在桶的上界，不超过最大值）
+
+        Args:
+            q: 0-1 之间的分位
+
+        Returns:
+            毫秒，没有样本时返回 None
+        """
+        if not self.count:
+            return None
+
+        target = q * self.count
+        seen = 0
+
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                if i < len(self.BUCKETS_MS):
+                    return min(self.BUCKETS_MS[i], round(self.max_ms, 2))
+                return round(self.max_ms, 2)
+
+        return round(self.max_ms, 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 2) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {
+                f"le_{bound}": count for bound, count in zip(self.BUCKETS_MS, self.counts)
+            } | {"gt_1000": self.counts[-1]},
+        }
+
+
+class StreamStats:
+    """
+    单设备视频流统计（接收在缓存线程或事件循环中记录，发送在事件循环中记录）
+
+    示例：
+        >>> stats = StreamStats()
+        >>> stats.record_received(pts=33_000, received_at=time.monotonic())
+        >>> stats.record_sent(packet, sent_at=time.monotonic())
+        >>> stats.describe()["jitter_ms"]
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queue_latency = LatencyHistogram()
+            self.encode_to_send = LatencyHistogram()
+            self.frame_interval = LatencyHistogram()
+
+            self.frames = 0
+            self.jitter_ms = 0.0
+
+            # 上一帧的 PTS（微秒）和到达时间
+            self._last_pts: Optional[int] = None
+            self._last_arrival = 0.0
+
+            # 基线：观察到的最小 (到达时间 - PTS)，秒
+            self._min_offset: Optional[float] = None
+
+    def record_received(self, pts: Optional[int], received_at: float):
+        """
+        记录收到的 packet（参数集没有 PTS，不计入）
+
+        Args:
+            pts: 编码器时间戳（微秒）
+            received_at: 主机接收时间（time.monotonic）
+        """
+        if pts is None:
+            return
+
+        with self._lock:
+            last_pts = self._last_pts
+
+            if last_pts is not None and pts < last_pts:
+                # 重连后 PTS 从头开始，设备时钟基线失效
+                self._min_offset = None
+                last_pts = None
+
+            if last_pts is not None and pts > last_pts:
+                arrival_delta = received_at - self._last_arrival
+                pts_delta = (pts - last_pts) / 1_000_000
+
+                self.frame_interval.record(arrival_delta * 1000)
+
+                # RFC 3550：J += (|D| - J) / 16
+                deviation = abs(arrival_delta - pts_delta) * 1000
+                self.jitter_ms += (deviation - self.jitter_ms) / 16
+
+            if last_pts is None or pts > last_pts:
+                self.frames += 1
+                self._last_pts = pts
+                self._last_arrival = received_at
+
+            offset = received_at - pts / 1_000_000
+            if self._min_offset is None or offset < self._min_offset:
+                self._min_offset = offset
+
+    def record_sent(self, packet: ScrcpyPacket, sent_at: float):
+        """
+        记录发送给客户端的 packet
+
+        Args:
+            packet: 已发送的 packet
+            sent_at: 发送完成时间（time.monotonic）
+        """
+        with self._lock:
+            self.queue_latency.record((sent_at - packet.received_at) * 1000)
+
+            if packet.pts is not None and self._min_offset is not None:
+                baseline = packet.pts / 1_000_000 + self._min_offset
+                self.encode_to_send.record((sent_at - baseline) * 1000)
+
+    def describe(self) -> dict:
+        with self._lock:
+            return {
+                "frames": self.frames,
+                "jitter_ms": round(self.jitter_ms, 2),
+                "frame_interval": self.frame_interval.to_dict(),
+                "queue_latency": self.queue_latency.to_dict(),
+                "encode_to_send": self.encode_to_send.to_dict(),
+            }
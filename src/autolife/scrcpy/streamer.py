@@ -1,48 +1,70 @@
 """
-ScrcpyStreamer - H.264 NAL 单元流式管理器
+ScrcpyStreamer - H.264 / H.265 / AV1 视频流管理器
 
-直接操作 scrcpy-server，提供原生 H.264 NAL 单元流，
+直接操作 scrcpy-server，提供原生编码的 NAL 单元（AV1 为 OBU）流，
 相比 JPEG 方案带宽降低 70%，延迟降低 60%。
 """
 
+import hashlib
 import os
 import socket
 import subprocess
 import threading
+import time
 import asyncio
-import queue
 from pathlib import Path
-from typing import Optional, AsyncIterator
+from typing import Dict, Optional, AsyncIterator, Tuple
+
+from autolife.adb import AdbClient, AdbError, DeviceRegistry, get_adb_client
+from autolife.adb.display import DisplayMetricsCache, get_display_cache
+
+from .broadcaster import NalBroadcaster, NalSubscriber
+from .control import ScrcpyController
+from .decoder import FrameDecoder
+from .codecs import codec_from_header, get_codec
+from .packet_reader import (
+    METADATA_HEADER_SIZE,
+    PacketTooLargeError,
+    ScrcpyPacket,
+    SocketPacketReader,
+    pts_from_flags,
+)
+from .recorder import StreamRecorder
+from .stats import StreamStats
+from .transport import ScrcpyVideoProtocol
 
 
 class ScrcpyStreamer:
     """
-    scrcpy H.264 NAL 单元流管理器
+    scrcpy 视频流管理器
 
     核心功能：
     - 管理 scrcpy-server 生命周期（push → forward → 启动）
-    - 建立 TCP socket 连接到 localhost:27183
-    - 读取并解析 H.264 NAL 单元流
-    - 缓存 SPS/PPS/IDR 供新连接快速初始化
-    - 提供异步迭代器供 WebSocket 消费
+    - 建立 TCP socket 连接到 localhost:<port>（默认 27183）
+    - 读取并解析视频 packet 流（asyncio 协议或后台线程两种读取模式）
+    - 缓存参数集（SPS/PPS 等）和最新关键帧供新连接快速初始化
+    - 通过广播中心向多个订阅者分发 NAL 单元（每个订阅者独立游标）
+    - 可选的控制 socket（controller），直接注入触控 / 按键 / 文本
+    - 断流自动重连：socket 断开或 PTS 停止前进时按指数退避重启 scrcpy-server，
+      订阅者保持连接，重连后从新的 SPS/PPS/IDR 继续
+    - 可选录制（start_recording），作为独立订阅者写入分段文件，不影响实时观看
+    - 可选进程内解码（acquire_decoder），输出真实尺寸的 JPEG / 原始像素帧
 
     示例：
         >>> streamer = ScrcpyStreamer(device_id='emulator-5554')
         >>> await streamer.start()
+        >>> subscriber = streamer.subscribe()
         >>> init_data = streamer.get_initialization_data()
-        >>> async for nal in streamer.iter_nal_units():
+        >>> async for nal in subscriber:
         ...     # 发送到 WebSocket
         ...     await websocket.send_bytes(nal)
     """
 
-    # NAL 单元类型常量
-    NAL_TYPE_SPS = 7  # Sequence Parameter Set
-    NAL_TYPE_PPS = 8  # Picture Parameter Set
-    NAL_TYPE_IDR = 5  # Instantaneous Decoder Refresh (关键帧)
+    # 设备上的 scrcpy-server 路径
+    DEVICE_SERVER_PATH = "/data/local/tmp/scrcpy-server"
 
-    # 起始码
-    START_CODE_4 = b'\x00\x00\x00\x01'
-    START_CODE_3 = b'\x00\x00\x01'
+    # 本地 scrcpy-server 文件的 SHA-256（按路径缓存）
+    _local_server_hashes: Dict[str, str] = {}
 
     def __init__(
         self,
@@ -50,6 +72,20 @@ class ScrcpyStreamer:
         max_size: int = 1280,
         max_fps: int = 20,
         video_bit_rate: int = 1_000_000,  # 1 Mbps
+        video_codec: str = "h264",
+        buffer_capacity: int = 256,
+        latency_budget_ms: Optional[float] = 500,
+        reader_mode: Optional[str] = None,
+        port: int = 27183,
+        scid: Optional[str] = None,
+        adb: Optional[AdbClient] = None,
+        control: Optional[bool] = None,
+        registry: Optional[DeviceRegistry] = None,
+        display_cache: Optional[DisplayMetricsCache] = None,
+        reconnect: Optional[bool] = None,
+        stall_timeout: Optional[float] = None,
+        max_reconnect_attempts: Optional[int] = None,
+        max_reconnect_backoff: float = 10.0,
     ):
         """
         初始化流管理器
@@ -59,40 +95,133 @@ class ScrcpyStreamer:
             max_size: 最大分辨率（短边），默认 1280
             max_fps: 最大帧率，默认 20
             video_bit_rate: 视频码率，默认 1 Mbps
+            video_codec: 编码格式 h264 / h265 / av1（需要设备编码器支持），默认 h264
+            buffer_capacity: 广播环形缓冲区容量（NAL 个数），默认 256
+            latency_budget_ms: 订阅者默认延迟预算（视频毫秒），落后超过预算时
+                跳到最新关键帧，默认 500；None 表示不截断
+            reader_mode: 读取模式，"asyncio"（在事件循环中解析，默认）或
+                "thread"（阻塞 socket + 后台线程），默认读取 SCRCPY_READER_MODE 环境变量
+            port: 本地转发端口，默认 27183；同一进程内多个 streamer 必须各不相同
+            scid: scrcpy 会话 ID（8 位十六进制，31 位），设置后 socket 名为
+                scrcpy_<scid>，避免同一设备上多个 server 冲突；None 使用默认名 scrcpy
+            adb: ADB 客户端，默认使用进程内共享的 AdbClient
+            control: 是否打开 scrcpy 控制 socket（低延迟输入注入），
+                默认读取 SCRCPY_CONTROL 环境变量（默认 true）
+            registry: 设备注册表，设置后从内存查询设备，不再访问 adb
+            display_cache: 显示参数缓存，默认使用进程内共享的缓存
+            reconnect: 断流后是否自动重连，默认读取 SCRCPY_RECONNECT 环境变量（默认 true）
+            stall_timeout: PTS 停止前进多少秒视为卡死，默认读取 SCRCPY_STALL_TIMEOUT（默认 5）
+            max_reconnect_attempts: 单次断流的最大重连次数，超过后停止流，
+                默认读取 SCRCPY_RECONNECT_ATTEMPTS（默认 10）
+            max_reconnect_backoff: 重连退避的最大间隔（秒）
         """
         self.device_id = device_id
         self.max_size = max_size
         self.max_fps = max_fps
         self.video_bit_rate = video_bit_rate
+        self.codec = get_codec(video_codec)
+
+        # ADB 客户端（直接与 adb server 通信，不再逐条命令启动 adb 进程）
+        self.adb = adb or get_adb_client()
+        self.registry = registry
+        if display_cache is None:
+            # 指定了独立的 adb 客户端时不共用默认缓存
+            display_cache = get_display_cache() if adb is None else DisplayMetricsCache(adb)
+        self.displays = display_cache
+
+        # 端口转发和 scrcpy 会话
+        self.port = port
+        self.scid = scid
+        self.socket_name = f"scrcpy_{scid}" if scid else "scrcpy"
+
+        # 控制通道（control=true 时 server 接受第二个连接作为控制 socket）
+        if control is None:
+            control = os.getenv("SCRCPY_CONTROL", "true").lower() == "true"
+        self.control = control
+        self.controller: Optional[ScrcpyController] = None
+
+        # 设备物理分辨率（wm size 自然方向，用于输入坐标缩放）
+        self.physical_width: int = 0
+        self.physical_height: int = 0
+
+        # 断流重连（scrcpy 在画面静止时也会重复发送上一帧，PTS 长时间不变说明流已卡死）
+        if reconnect is None:
+            reconnect = os.getenv("SCRCPY_RECONNECT", "true").lower() == "true"
+        self.reconnect = reconnect
+        self.stall_timeout = stall_timeout or float(os.getenv("SCRCPY_STALL_TIMEOUT", "5"))
+        self.max_reconnect_attempts = max_reconnect_attempts or int(
+            os.getenv("SCRCPY_RECONNECT_ATTEMPTS", "10")
+        )
+        self.max_reconnect_backoff = max_reconnect_backoff
+
+        # 监督任务：检测断流 / 卡死并重连
+        self._supervisor: Optional[asyncio.Task] = None
+        self._stream_lost = asyncio.Event()
+        self.is_reconnecting = False
+        self.reconnects = 0
+        self.last_disconnect_reason: Optional[str] = None
+
+        # 最近一次前进的 PTS 及其时间（单调时钟，缓存线程中也会更新）
+        self._last_pts = -1
+        self._last_progress_at = 0.0
+
+        # 读取模式
+        self.reader_mode = reader_mode or os.getenv("SCRCPY_READER_MODE", "asyncio")
+        if self.reader_mode not in ("asyncio", "thread"):
+            raise ValueError(f"Unknown reader mode: {self.reader_mode}")
 
         # 运行状态
         self.is_running = False
 
         # socket 和进程句柄
         self.socket: Optional[socket.socket] = None
-        self.server_process: Optional[subprocess.Popen] = None
+        self._packet_reader: Optional[SocketPacketReader] = None
+        self._protocol: Optional[ScrcpyVideoProtocol] = None
+        self.server_process: Optional[asyncio.subprocess.Process] = None
+
+        # scrcpy-server 输出读取任务（同时用于检测就绪）
+        self._server_output_task: Optional[asyncio.Task] = None
+        self._server_ready = asyncio.Event()
+        self._server_output: list = []
+
+        # 参数集 + 关键帧已缓存（新连接可以立即初始化解码器）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._initialized = asyncio.Event()
 
         # 设备分辨率（从 scrcpy 元数据获取）
         self.device_width: int = 0
         self.device_height: int = 0
 
-        # NAL 缓存
-        self.sps: Optional[bytes] = None
-        self.pps: Optional[bytes] = None
-        self.latest_idr: Optional[bytes] = None
+        # 参数集缓存（参数集类型 → 数据，H.264 为 SPS / PPS）和最新关键帧
+        self.config: Dict[int, bytes] = {}
+        self.latest_keyframe: Optional[bytes] = None
+        self.latest_keyframe_pts: Optional[int] = None
         self._cache_lock = threading.Lock()
 
-        # 后台缓存线程
+        # 时延统计（PTS → 接收 → 发送）
+        self.stats = StreamStats()
+
+        # 录制订阅者（start_recording 后存在）
+        self.recorder: Optional[StreamRecorder] = None
+
+        # 解码订阅者（相同参数的使用者共享一个解码器）→ 引用计数
+        self.decoders: Dict[Tuple, FrameDecoder] = {}
+        self._decoder_refs: Dict[Tuple, int] = {}
+
+        # 后台缓存线程（每个连接一个，重连时通过停止标志让旧线程退出）
         self._cache_thread: Optional[threading.Thread] = None
+        self._cache_stop = threading.Event()
 
-        # NAL 单元队列（缓存线程生产，迭代器消费）
-        self._nal_queue: queue.Queue = queue.Queue(maxsize=100)
+        # NAL 广播中心（缓存线程发布，每个订阅者独立消费）
+        self.buffer_capacity = buffer_capacity
+        self.latency_budget_ms = latency_budget_ms
+        self._broadcaster = NalBroadcaster(capacity=buffer_capacity)
 
         # scrcpy-server 路径
         self.server_path = self._locate_scrcpy_server()
 
-        # NAL 读取缓冲区
-        self._read_buffer = b''
+        # thread 模式下已读取的 dummy 字节（元数据头第 1 字节）
+        self._dummy_byte = b''
 
     def _locate_scrcpy_server(self) -> Path:
         """
@@ -135,62 +264,169 @@ class ScrcpyStreamer:
 
         完整流程：
         1. 检查设备连接
-        2. 杀掉旧的 scrcpy-server 进程
-        3. Push scrcpy-server 到设备
-        4. 设置端口转发
-        5. 启动 scrcpy-server 进程
-        6. 连接 socket
-        7. 启动 NAL 缓存线程
+        2. 并行执行：杀掉旧的 scrcpy-server 进程 / Push scrcpy-server（哈希一致时跳过）/ 设置端口转发
+        3. 启动 scrcpy-server 进程，根据其输出判断就绪（不再固定等待）
+        4. 连接视频 socket（及控制 socket），连接失败或对端尚未监听时快速重试
+        5. 开始读取 NAL（asyncio 模式由协议直接推送，thread 模式启动缓存线程）
+        6. 启动监督任务（reconnect=True 时），断流或卡死时自动重连
         """
         if self.is_running:
             print("[ScrcpyStreamer] Already running")
             return
 
         print("[ScrcpyStreamer] Starting...")
+        started_at = asyncio.get_running_loop().time()
+
+        self._loop = asyncio.get_running_loop()
+        self._initialized.clear()
 
-        # 1. 检查设备连接
+        # 重启后需要新的广播中心，订阅者在当前事件循环中消费
+        # （asyncio 模式下连接建立后立即开始推送，必须先准备好）
+        if self._broadcaster.is_closed:
+            self._broadcaster = NalBroadcaster(capacity=self.buffer_capacity)
+        self._broadcaster.bind_loop(self._loop)
+
+        # 1-4. 准备设备、启动 server 并连接
+        await self._launch()
+
+        # 5. 设置运行状态（必须在启动缓存线程之前）
+        self.is_running = True
+        self._start_reading()
+
+        # 6. 监督任务
+        if self.reconnect:
+            self._supervisor = asyncio.create_task(self._supervise())
+
+        elapsed = asyncio.get_running_loop().time() - started_at
+        print(f"[ScrcpyStreamer] Started successfully in {elapsed:.2f}s")
+
+    async def _launch(self):
+        """准备设备、启动 scrcpy-server 并连接 socket（启动和重连共用）"""
+        # 1. 检查设备连接（未指定设备时确定 device_id）
         await self._check_device_available()
 
-        # 2. 杀掉旧进程
-        await self._kill_existing_servers()
+        # 2. 互不依赖的准备步骤并行执行
+        steps = [
+            self._kill_existing_servers(),
+            self._push_server(),
+            self._setup_port_forward(),
+        ]
+        if self.control:
+            steps.append(self._query_physical_size())
 
-        # 3. Push server
-        await self._push_server()
+        try:
+            # 等所有步骤结束再报告错误：清理时端口转发不会仍在建立中
+            for result in await asyncio.gather(*steps, return_exceptions=True):
+                if isinstance(result, BaseException):
+                    raise result
+
+            # 3. 启动 server 进程
+            await self._start_server_process()
+
+            # 4. 连接 socket
+            await self._connect_with_retry()
+        except BaseException:
+            # 启动失败时不留下残留的 server 进程和端口转发
+            await self._release_resources()
+            raise
+
+    def _start_reading(self):
+        """连接建立后开始读取（重置卡死检测，thread 模式启动缓存线程）"""
+        self._last_pts = -1
+        self._last_progress_at = time.monotonic()
+        self._stream_lost.clear()
+
+        if self.reader_mode == "thread":
+            self._start_cache_thread()
+
+    @property
+    def state(self) -> str:
+        """流状态：running / reconnecting / stopped"""
+        if not self.is_running:
+            return "stopped"
+        return "reconnecting" if self.is_reconnecting else "running"
 
-        # 4. 端口转发
-        await self._setup_port_forward()
+    async def _supervise(self):
+        """
+        监督任务：socket 断开或 PTS 超过 stall_timeout 未前进时重连
 
-        # 5. 启动 server 进程
-        await self._start_server_process()
+        重连期间广播中心保持打开，订阅者只是暂时收不到数据；
+        重连次数用尽后才关闭广播、停止流。
+        """
+        interval = min(1.0, self.stall_timeout / 2)
 
-        # 6. 连接 socket
-        await self._connect_socket()
+        while self.is_running:
+            try:
+                await asyncio.wait_for(self._stream_lost.wait(), timeout=interval)
+                reason = "stream closed"
+            except asyncio.TimeoutError:
+                idle = time.monotonic() - self._last_progress_at
+                if idle < self.stall_timeout:
+                    continue
+                reason = f"no PTS progress for {idle:.1f}s"
+
+            if not await self._reconnect(reason):
+                print(
+                    f"[ScrcpyStreamer] {self.device_id}: giving up after "
+                    f"{self.max_reconnect_attempts} reconnect attempts"
+                )
+                self.is_running = False
+                self._broadcaster.close()
+                self._supervisor = None
+                return
+
+    async def _reconnect(self, reason: str) -> bool:
+        """
+        重启 scrcpy-server 和端口转发并重新连接（指数退避）
 
-        # 7. 设置运行状态（必须在启动缓存线程之前）
-        self.is_running = True
+        缓存的参数集和关键帧保留到新连接发来新的参数集为止，
+        期间加入的订阅者仍能先显示最后一帧。
+
+        Returns:
+            bool: 是否重连成功
+        """
+        print(f"[ScrcpyStreamer] {self.device_id}: {reason}, reconnecting...")
+        self.last_disconnect_reason = reason
+        self.is_reconnecting = True
 
-        # 8. 启动缓存线程
-        self._start_cache_thread()
+        delay = 0.5
 
-        print("[ScrcpyStreamer] Started successfully")
+        try:
+            for attempt in range(1, self.max_reconnect_attempts + 1):
+                if attempt > 1:
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.max_reconnect_backoff)
 
-    async def _check_device_available(self):
-        """检查设备是否连接"""
-        adb_cmd = ["adb", "devices"]
+                await self._release_resources()
 
-        result = await asyncio.create_subprocess_exec(
-            *adb_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
+                try:
+                    await self._launch()
+                except (RuntimeError, AdbError, OSError, asyncio.TimeoutError) as e:
+                    print(
+                        f"[ScrcpyStreamer] Reconnect attempt {attempt}/"
+                        f"{self.max_reconnect_attempts} failed: {e}"
+                    )
+                    continue
 
-        stdout, stderr = await result.communicate()
+                self.reconnects += 1
+                self._start_reading()
 
-        if result.returncode != 0:
-            raise RuntimeError(f"ADB command failed: {stderr.decode()}")
+                print(f"[ScrcpyStreamer] {self.device_id}: reconnected after {attempt} attempt(s)")
+                return True
+        finally:
+            self.is_reconnecting = False
 
-        devices = stdout.decode().strip().split('\n')[1:]  # 跳过标题行
-        devices = [line.split()[0] for line in devices if '\tdevice' in line]
+        return False
+
+    async def _check_device_available(self):
+        """检查设备是否连接"""
+        try:
+            if self.registry:
+                devices = await self.registry.list_online()
+            else:
+                devices = await self.adb.online_devices()
+        except (AdbError, OSError) as e:
+            raise RuntimeError(f"ADB command failed: {e}")
 
         if not devices:
             raise RuntimeError("No device connected")
@@ -204,68 +440,77 @@ class ScrcpyStreamer:
 
     async def _kill_existing_servers(self):
         """杀掉设备上已有的 scrcpy-server 进程"""
-        adb_cmd = ["adb"]
-        if self.device_id:
-            adb_cmd.extend(["-s", self.device_id])
-
         # 查找并杀掉 scrcpy-server 进程
-        kill_cmd = adb_cmd + [
-            "shell",
-            "pkill", "-f", "com.genymobile.scrcpy.Server"
-        ]
+        # 指定 scid 时只杀掉同一会话的旧进程，不影响该设备上的其他 server
+        pattern = f"scid={self.scid}" if self.scid else "com.genymobile.scrcpy.Server"
 
-        result = await asyncio.create_subprocess_exec(*kill_cmd)
-        await result.wait()
+        await self.adb.shell(self.device_id, f"pkill -f {pattern}")
 
         print("[ScrcpyStreamer] Killed existing scrcpy-server processes")
 
     async def _push_server(self):
-        """Push scrcpy-server 到设备"""
-        adb_cmd = ["adb"]
-        if self.device_id:
-            adb_cmd.extend(["-s", self.device_id])
-
-        push_cmd = adb_cmd + [
-            "push",
-            str(self.server_path),
-            "/data/local/tmp/scrcpy-server"
-        ]
+        """Push scrcpy-server 到设备（设备上文件哈希一致时跳过）"""
+        local_hash = self._get_local_server_hash()
 
-        result = await asyncio.create_subprocess_exec(
-            *push_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+        # 检查设备上已有文件的哈希
+        result = await self.adb.shell_result(
+            self.device_id, f"sha256sum {self.DEVICE_SERVER_PATH}"
         )
 
-        stdout, stderr = await result.communicate()
+        if result.exit_code == 0 and result.output.split()[:1] == [local_hash]:
+            print("[ScrcpyStreamer] scrcpy-server already up to date on device")
+            return
 
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to push scrcpy-server: {stderr.decode()}")
+        try:
+            await self.adb.push(self.device_id, str(self.server_path), self.DEVICE_SERVER_PATH)
+        except (AdbError, OSError) as e:
+            raise RuntimeError(f"Failed to push scrcpy-server: {e}")
 
         print("[ScrcpyStreamer] Pushed scrcpy-server to device")
 
-    async def _setup_port_forward(self):
-        """设置 ADB 端口转发"""
-        adb_cmd = ["adb"]
-        if self.device_id:
-            adb_cmd.extend(["-s", self.device_id])
+    def _get_local_server_hash(self) -> str:
+        """计算本地 scrcpy-server 的 SHA-256（按路径缓存）"""
+        key = str(self.server_path)
 
-        forward_cmd = adb_cmd + [
-            "forward",
-            "tcp:27183",
-            "localabstract:scrcpy"
-        ]
+        if key not in self._local_server_hashes:
+            digest = hashlib.sha256(Path(key).read_bytes()).hexdigest()
+            ScrcpyStreamer._local_server_hashes[key] = digest
 
-        result = await asyncio.create_subprocess_exec(*forward_cmd)
-        await result.wait()
+        return self._local_server_hashes[key]
+
+    async def _setup_port_forward(self):
+        """设置 ADB 端口转发"""
+        try:
+            await self.adb.forward(
+                self.device_id, f"tcp:{self.port}", f"localabstract:{self.socket_name}"
+            )
+        except (AdbError, OSError) as e:
+            raise RuntimeError(f"Failed to setup port forwarding: {e}")
+
+        print(
+            f"[ScrcpyStreamer] Port forwarding set up: "
+            f"tcp:{self.port} → localabstract:{self.socket_name}"
+        )
 
-        if result.returncode != 0:
-            raise RuntimeError("Failed to setup port forwarding")
+    async def _query_physical_size(self):
+        """查询设备物理分辨率（显示参数缓存），失败时输入坐标按视频坐标处理"""
+        try:
+            await self.displays.resolve(self.device_id)
+        except (AdbError, OSError, asyncio.TimeoutError) as e:
+            print(f"[ScrcpyStreamer] Failed to query physical size: {e}")
+            return
 
-        print("[ScrcpyStreamer] Port forwarding set up: tcp:27183 → localabstract:scrcpy")
+        size = self.displays.natural_size(self.device_id)
+        if size:
+            self.physical_width, self.physical_height = size
 
     async def _start_server_process(self):
-        """启动 scrcpy-server Java 进程"""
+        """
+        启动 scrcpy-server Java 进程
+
+        不再固定等待：server 打印第一行日志（Device: ...）即视为就绪，
+        进程提前退出时立即报错。
+        """
         adb_cmd = ["adb"]
         if self.device_id:
             adb_cmd.extend(["-s", self.device_id])
@@ -273,7 +518,7 @@ class ScrcpyStreamer:
         # 完整命令（参考 docs/scrcpy-t.md）
         cmd = adb_cmd + [
             "shell",
-            "CLASSPATH=/data/local/tmp/scrcpy-server",
+            f"CLASSPATH={self.DEVICE_SERVER_PATH}",
             "app_process",
             "/",
             "com.genymobile.scrcpy.Server",
@@ -283,79 +528,258 @@ class ScrcpyStreamer:
             f"max_fps={self.max_fps}",                  # 帧率
             "tunnel_forward=true",                       # 使用 ADB forward
             "audio=false",                               # 禁用音频
-            "control=false",                             # 禁用控制（我们用 ADB 发送）
+            f"video_codec={self.codec.name}",           # 编码格式
+            f"control={str(self.control).lower()}",      # 控制 socket（关闭时通过 ADB 发送输入）
             "cleanup=false",                             # 禁用清理
             "video_codec_options=i-frame-interval=1"    # I 帧间隔 1 秒
         ]
 
-        self.server_process = subprocess.Popen(
-            cmd,
+        if self.scid:
+            cmd.append(f"scid={self.scid}")             # 会话 ID（决定 socket 名）
+
+        print("[ScrcpyStreamer] Starting scrcpy-server process...")
+
+        self._server_ready.clear()
+        self._server_output = []
+
+        self.server_process = await asyncio.create_subprocess_exec(
+            *cmd,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
         )
 
-        # 等待 server 启动（socket 就绪）
-        print("[ScrcpyStreamer] Starting scrcpy-server process...")
-        await asyncio.sleep(2)
+        # 持续读取输出（避免管道写满阻塞 server），第一行输出即表示 server 已启动
+        self._server_output_task = asyncio.create_task(self._read_server_output())
+
+        ready = asyncio.create_task(self._server_ready.wait())
+        exited = asyncio.create_task(self.server_process.wait())
+
+        try:
+            await asyncio.wait({ready, exited}, timeout=5, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            ready.cancel()
+            exited.cancel()
 
         # 检查进程是否存活
-        if self.server_process.poll() is not None:
-            stderr = self.server_process.stderr.read().decode()
-            raise RuntimeError(f"scrcpy-server process exited: {stderr}")
+        if self.server_process.returncode is not None:
+            # 等输出读完再报错
+            await asyncio.wait({self._server_output_task}, timeout=1)
+            output = "\n".join(self._server_output)
+            raise RuntimeError(f"scrcpy-server process exited: {output}")
 
         print("[ScrcpyStreamer] scrcpy-server process started")
 
-    async def _connect_socket(self):
-        """连接到 scrcpy-server socket"""
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    async def _read_server_output(self):
+        """读取 scrcpy-server 输出，第一行出现时标记就绪"""
+        stdout = self.server_process.stdout
+
+        while True:
+            line = await stdout.readline()
+            if not line:
+                break
+
+            text = line.decode("utf-8", errors="replace").rstrip()
+            if not text:
+                continue
+
+            # 只保留最近的输出用于报错
+            self._server_output = self._server_output[-19:] + [text]
+            print(f"[scrcpy-server] {text}")
+
+            self._server_ready.set()
+
+    async def _connect_with_retry(self, timeout: float = 10.0):
+        """
+        连接 scrcpy-server socket，直到读到元数据头
+
+        adb forward 在设备端 socket 尚未监听时也会接受连接，随后立即关闭，
+        因此以"读到元数据头"作为就绪标准；失败时以 50ms 起步的退避快速重试。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = 0.05
+        attempts = 0
+
+        while True:
+            attempts += 1
+
+            try:
+                await self._connect_once()
+
+                print(f"[ScrcpyStreamer] Connected after {attempts} attempt(s)")
+                return
+
+            except (ConnectionError, RuntimeError, asyncio.TimeoutError, socket.timeout) as e:
+                if self.server_process and self.server_process.returncode is not None:
+                    output = "\n".join(self._server_output)
+                    raise RuntimeError(f"scrcpy-server process exited: {output}") from e
+
+                if loop.time() + delay > deadline:
+                    raise RuntimeError(
+                        f"Failed to connect to scrcpy-server socket after {attempts} attempts: {e}"
+                    ) from e
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, 0.25)
+
+    async def _connect_once(self):
+        """
+        单次连接尝试：视频 socket → （控制 socket）→ 元数据头
+
+        server 接受视频连接后先发送 1 个 dummy 字节，等所有 socket 都连接后
+        才发送设备名和视频尺寸，因此控制 socket 必须在 dummy 字节之后、
+        元数据头之前连接。
+        """
+        protocol = None
+
+        try:
+            if self.reader_mode == "asyncio":
+                protocol = await self._open_transport()
+            else:
+                await asyncio.to_thread(self._connect_socket_blocking)
+
+            if self.control:
+                self.controller = await ScrcpyController.connect(self.port)
+                self.controller.set_device_size(self.physical_width, self.physical_height)
+
+            if protocol:
+                await self._finish_transport(protocol)
+            else:
+                await asyncio.to_thread(self._skip_metadata_header)
+        except BaseException:
+            if protocol:
+                protocol.close()
+            if self.socket:
+                self.socket.close()
+                self.socket = None
+            if self.controller:
+                self.controller.close()
+                self.controller = None
+            raise
+
+        if self.socket:
+            # 之后的 packet 通过 recv_into 读入可复用缓冲区
+            self._packet_reader = SocketPacketReader(self.socket)
+
+    def _connect_socket_blocking(self):
+        """
+        连接到 scrcpy-server socket 并读取 dummy 字节（thread 模式）
+
+        在线程中执行，失败时关闭 socket 并抛出异常，由调用方重试。
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
         # 设置 2MB 接收缓冲区
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
 
         # 设置读取超时（5 秒）
-        self.socket.settimeout(5)
+        sock.settimeout(5)
 
-        # 重试连接（最多 10 次，每次间隔 0.5 秒）
-        for i in range(10):
-            try:
-                self.socket.connect(("127.0.0.1", 27183))
-                print("[ScrcpyStreamer] Connected to scrcpy-server socket")
-                break
-            except ConnectionRefusedError:
-                if i < 9:
-                    await asyncio.sleep(0.5)
-                else:
-                    raise RuntimeError("Failed to connect to scrcpy-server socket after 10 retries")
+        try:
+            sock.connect(("127.0.0.1", self.port))
+
+            # 对端未监听时 adb forward 会直接关闭连接
+            self._dummy_byte = self._recv_exactly(sock, 1)
+        except BaseException:
+            sock.close()
+            raise
 
-        # 跳过 scrcpy 协议元数据头
-        # scrcpy v3.x 协议：设备名（64 字节） + 分辨率（8 字节）= 72 字节
-        await self._skip_metadata_header()
+        self.socket = sock
 
-    async def _skip_metadata_header(self):
+        print("[ScrcpyStreamer] Connected to scrcpy-server socket")
+
+    async def _open_transport(self) -> ScrcpyVideoProtocol:
+        """
+        以 asyncio 协议连接到 scrcpy-server socket 并等待 dummy 字节
+
+        packet 在事件循环中解析并直接发布给订阅者，不经过线程和队列。
+        """
+        loop = asyncio.get_running_loop()
+
+        protocol = ScrcpyVideoProtocol(on_packet=self._handle_nal)
+
+        transport, _ = await loop.create_connection(
+            lambda: protocol, "127.0.0.1", self.port
+        )
+
+        # 设置 2MB 接收缓冲区
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 2 * 1024 * 1024)
+
+        try:
+            await asyncio.wait_for(protocol.first_byte_ready, timeout=5)
+        except BaseException:
+            protocol.close()
+            raise
+
+        return protocol
+
+    async def _finish_transport(self, protocol: ScrcpyVideoProtocol):
+        """等待元数据头，之后接管 asyncio 协议"""
+        header = await asyncio.wait_for(protocol.header_ready, timeout=5)
+
+        # 头部读取成功后才接管断开通知（重试中的失败连接不影响订阅者）
+        protocol.on_close = lambda exc: self._on_transport_closed(protocol, exc)
+        self._protocol = protocol
+
+        print("[ScrcpyStreamer] Connected to scrcpy-server socket (asyncio)")
+
+        self._parse_metadata_header(header)
+
+    def _on_transport_closed(self, protocol: ScrcpyVideoProtocol, exc: Optional[Exception]):
+        """asyncio 模式：socket 断开（停止 / 重连时主动关闭的旧连接忽略）"""
+        if protocol is not self._protocol:
+            return
+
+        if self.is_running and exc:
+            print(f"[ScrcpyStreamer] Socket error: {exc}")
+
+        print("[ScrcpyStreamer] Video transport closed")
+        self._on_stream_lost()
+
+    def _on_stream_lost(self):
+        """视频流意外结束：交给监督任务重连，未启用重连时通知所有订阅者"""
+        if self.is_running and self._supervisor:
+            self._stream_lost.set()
+        else:
+            self._broadcaster.close()
+
+    def _skip_metadata_header(self):
         """
-        跳过 scrcpy 协议元数据头
+        读取 scrcpy 协议元数据头（thread 模式，阻塞读取，dummy 字节已读取）
 
         scrcpy v3.x 协议格式（共 77 字节）：
         - 1 字节: dummy (0x00)
         - 64 字节: 设备名（固定长度，不足用 null 填充）
-        - 4 字节: codec ("h264")
+        - 4 字节: codec ("h264" / "h265" / "\\0av1")
         - 4 字节: 视频宽度（大端序）
         - 4 字节: 视频高度（大端序）
 
         之后每个 packet：
         - 8 字节: PTS（演示时间戳）
         - 4 字节: packet size
-        - N 字节: H.264 NAL 数据
+        - N 字节: 编码数据（H.264 / H.265 NAL 或 AV1 OBU）
         """
-        import struct
+        # dummy 字节 + 剩余 76 字节
+        header = self._dummy_byte + self._recv_exactly(self.socket, METADATA_HEADER_SIZE - 1)
 
-        # 读取完整的 77 字节头
-        header = b''
-        while len(header) < 77:
-            chunk = self.socket.recv(77 - len(header))
+        self._parse_metadata_header(header)
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+        """从阻塞 socket 读取固定长度的数据"""
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
             if not chunk:
-                raise RuntimeError("Socket closed while reading metadata header")
-            header += chunk
+                raise ConnectionError("Socket closed while reading metadata header")
+            data += chunk
+        return data
+
+    def _parse_metadata_header(self, header: bytes):
+        """解析 77 字节元数据头，记录视频分辨率"""
+        import struct
 
         # 解析头部
         # 字节 0: dummy
@@ -364,8 +788,13 @@ class ScrcpyStreamer:
         print(f"[ScrcpyStreamer] Device name: {device_name}")
 
         # 字节 65-68: codec
-        codec = header[65:69].decode('ascii', errors='replace')
-        print(f"[ScrcpyStreamer] Codec: {codec}")
+        codec = codec_from_header(header[65:69])
+        print(f"[ScrcpyStreamer] Codec: {codec.name if codec else header[65:69]!r}")
+
+        if codec and codec is not self.codec:
+            # 以 server 实际使用的编码格式为准
+            print(f"[ScrcpyStreamer] Warning: requested {self.codec.name}, server sent {codec.name}")
+            self.codec = codec
 
         # 字节 69-72: width, 字节 73-76: height
         width = struct.unpack('>I', header[69:73])[0]
@@ -376,6 +805,21 @@ class ScrcpyStreamer:
         self.device_width = width
         self.device_height = height
 
+        # thread 模式下在线程中解析，转交给事件循环
+        self._call_in_loop(self._on_video_size, width, height)
+
+    def _on_video_size(self, width: int, height: int):
+        """视频尺寸已知或变化（元数据头 / 新的 SPS），在事件循环中调用"""
+        self.device_width = width
+        self.device_height = height
+
+        # 控制消息中的坐标以视频尺寸为准
+        if self.controller:
+            self.controller.set_screen_size(width, height)
+
+        if self.device_id:
+            self.displays.update_from_stream(self.device_id, width, height)
+
     def read_nal_unit(self) -> Optional[bytes]:
         """
         从 socket 读取一个完整的 NAL 单元
@@ -383,55 +827,25 @@ class ScrcpyStreamer:
         scrcpy v3.x packet 格式：
         - 8 字节: PTS（演示时间戳，大端序）
         - 4 字节: packet size（大端序）
-        - N 字节: H.264 NAL 数据（包含起始码）
+        - N 字节: 编码数据（H.264 / H.265 NAL 包含起始码，AV1 为 OBU）
+
+        数据通过 recv_into 直接写入预分配缓冲区，每个 packet 只拷贝一次。
 
         Returns:
             bytes: 完整的 NAL 单元（包含起始码），如果 socket 关闭或超时返回 None
         """
-        import struct
-
-        if not self.socket or not self.is_running:
+        if not self._packet_reader or not self.is_running:
             return None
 
         try:
-            # 1. 读取 packet header（12 字节：8 字节 PTS + 4 字节 size）
-            header = b''
-            while len(header) < 12:
-                try:
-                    chunk = self.socket.recv(12 - len(header))
-                    if not chunk:
-                        return None
-                    header += chunk
-                except socket.timeout:
-                    # 超时时返回 None，让调用者决定是否重试
-                    return None
-
-            # 解析 packet header
-            # pts = struct.unpack('>Q', header[:8])[0]  # 暂时不使用 PTS
-            packet_size = struct.unpack('>I', header[8:12])[0]
-
-            if packet_size == 0:
-                return None
-
-            if packet_size > 10 * 1024 * 1024:  # 10MB 限制
-                print(f"[ScrcpyStreamer] Warning: packet size too large: {packet_size}")
-                return None
-
-            # 2. 读取 packet 数据
-            data = b''
-            while len(data) < packet_size:
-                try:
-                    chunk = self.socket.recv(min(65536, packet_size - len(data)))
-                    if not chunk:
-                        return None
-                    data += chunk
-                except socket.timeout:
-                    # 数据不完整，丢弃
-                    print(f"[ScrcpyStreamer] Timeout reading packet data ({len(data)}/{packet_size})")
-                    return None
-
-            return data
+            # 读取状态可恢复：超时返回 None，已读到的部分数据保留到下一次调用
+            return self._packet_reader.read_packet()
 
+        except PacketTooLargeError as e:
+            # packet 大小异常说明协议已失步，无法继续解析
+            print(f"[ScrcpyStreamer] Warning: {e}")
+            self._packet_reader.eof = True
+            return None
         except OSError as e:
             # socket 已关闭
             if self.is_running:
@@ -441,45 +855,31 @@ class ScrcpyStreamer:
             print(f"[ScrcpyStreamer] Error reading NAL unit: {e}")
             return None
 
-    def _get_nal_type(self, nal: bytes) -> Optional[int]:
+    def _cache_nal_units(self, stop: threading.Event):
         """
-        解析 NAL 单元类型
+        后台线程：持续读取 NAL 单元，缓存重要的并发布给订阅者
 
         Args:
-            nal: NAL 单元数据（包含起始码）
-
-        Returns:
-            int: NAL type (0-31)，如果解析失败返回 None
-        """
-        # 跳过起始码
-        start_code_len = 4 if nal.startswith(self.START_CODE_4) else 3
-
-        if len(nal) <= start_code_len:
-            return None
-
-        # NAL header: 第一个字节的低 5 位是 NAL type
-        nal_type = nal[start_code_len] & 0x1F
-
-        return nal_type
-
-    def _cache_nal_units(self):
-        """
-        后台线程：持续读取 NAL 单元，缓存重要的并放入队列
+            stop: 停止标志（停止或重连时设置，旧线程退出后不再通知断流）
 
         缓存策略：
-        - SPS/PPS：锁定第一个（整个视频流不变）
-        - IDR：持续更新（关键帧，用于快速初始化）
+        - 参数集（SPS/PPS 等）：保留最新的（屏幕旋转等配置变化时更新，并丢弃旧的关键帧）
+        - 关键帧：持续更新（用于快速初始化）
 
-        所有 NAL 单元都会放入队列供 iter_nal_units() 消费。
+        所有 NAL 单元都会发布到广播中心，每个订阅者都能收到完整序列。
         """
         print("[ScrcpyStreamer] NAL caching thread started")
         consecutive_timeouts = 0
 
-        while self.is_running:
+        while self.is_running and not stop.is_set():
             try:
                 nal = self.read_nal_unit()
 
                 if not nal:
+                    if self._packet_reader is None or self._packet_reader.eof:
+                        print("[ScrcpyStreamer] Socket closed by server")
+                        break
+
                     consecutive_timeouts += 1
                     # 连续超时 60 次（约 5 分钟）才停止
                     if consecutive_timeouts >= 60:
@@ -491,87 +891,326 @@ class ScrcpyStreamer:
                 # 成功读取，重置计数
                 consecutive_timeouts = 0
 
-                nal_type = self._get_nal_type(nal)
-
-                if nal_type is None:
-                    continue
-
-                # 缓存 SPS/PPS/IDR
-                with self._cache_lock:
-                    if nal_type == self.NAL_TYPE_SPS and not self.sps:
-                        self.sps = nal
-                        print(f"[ScrcpyStreamer] Cached SPS ({len(nal)} bytes)")
-
-                    elif nal_type == self.NAL_TYPE_PPS and not self.pps:
-                        self.pps = nal
-                        print(f"[ScrcpyStreamer] Cached PPS ({len(nal)} bytes)")
-
-                    elif nal_type == self.NAL_TYPE_IDR:
-                        self.latest_idr = nal
-                        # IDR 比较大，不打印日志（避免刷屏）
+                # 停止时 _packet_reader 可能已在事件循环中被置空
+                reader = self._packet_reader
+                if reader is None:
+                    break
 
-                # 把 NAL 单元放入队列供消费者使用
-                try:
-                    self._nal_queue.put(nal, timeout=1)
-                except queue.Full:
-                    # 队列满了，丢弃旧数据避免积压
-                    try:
-                        self._nal_queue.get_nowait()
-                        self._nal_queue.put(nal, timeout=0.1)
-                    except (queue.Empty, queue.Full):
-                        pass
+                self._handle_nal(nal, reader.buffer.last_pts_flags)
 
             except Exception as e:
                 print(f"[ScrcpyStreamer] Error in cache thread: {e}")
                 if self.is_running:
                     break
 
-        # 流结束，放入 None 作为结束信号
-        try:
-            self._nal_queue.put(None, timeout=1)
-        except queue.Full:
-            pass
+        # 流意外结束：重连或通知所有订阅者
+        if not stop.is_set():
+            self._call_in_loop(self._on_stream_lost)
 
         print("[ScrcpyStreamer] NAL caching thread stopped")
 
+    def _handle_nal(self, nal: bytes, pts_flags: int = 0):
+        """
+        处理一个 packet：缓存参数集和关键帧并发布给订阅者
+
+        thread 模式在缓存线程中调用，asyncio 模式在事件循环中调用。
+
+        Args:
+            nal: NAL 单元（包含起始码，AV1 为 OBU）
+            pts_flags: packet header 中的 PTS 字段（含标志位），用于卡死检测
+        """
+        received_at = time.monotonic()
+
+        # 参数集 packet 没有 PTS
+        pts = pts_from_flags(pts_flags)
+        if pts is not None:
+            if pts > self._last_pts:
+                self._last_pts = pts
+                self._last_progress_at = received_at
+
+            self.stats.record_received(pts, received_at)
+
+        if not nal:
+            return
+
+        codec = self.codec
+        config_key = codec.config_key(nal, pts_flags)
+        is_keyframe = config_key is None and codec.is_keyframe(nal, pts_flags)
+
+        new_size = None
+
+        # 缓存参数集 / 关键帧
+        with self._cache_lock:
+            if config_key is not None and nal != self.config.get(config_key):
+                if config_key == codec.resolution_key and config_key in self.config:
+                    # 新的编码配置（屏幕旋转等）：旧的关键帧不能再用于初始化
+                    self.latest_keyframe = None
+                    new_size = codec.parse_resolution(nal)
+
+                self.config[config_key] = nal
+                print(f"[ScrcpyStreamer] Cached {codec.name} parameter set {config_key} ({len(nal)} bytes)")
+
+            elif is_keyframe:
+                self.latest_keyframe = nal
+                self.latest_keyframe_pts = pts
+                # 关键帧比较大，不打印日志（避免刷屏）
+
+            initialized = bool(self.config and self.latest_keyframe)
+
+        if initialized and not self._initialized.is_set():
+            self._signal_initialized()
+
+        if new_size and new_size != (self.device_width, self.device_height):
+            print(f"[ScrcpyStreamer] Video resolution changed: {new_size[0]}x{new_size[1]}")
+            self._call_in_loop(self._on_video_size, *new_size)
+
+        # 发布给所有订阅者（慢订阅者只会落后，不会阻塞读取）；
+        # 订阅者的延迟按 PTS 计算，接收时间只用于没有 PTS 的参数集和 PTS 重置之后
+        self._broadcaster.publish(
+            nal,
+            timestamp=received_at,
+            is_keyframe=is_keyframe,
+            is_config=config_key is not None,
+            pts=pts,
+        )
+
+    def _signal_initialized(self):
+        """标记初始化数据就绪（可在缓存线程中调用）"""
+        self._call_in_loop(self._initialized.set)
+
+    def _call_in_loop(self, callback, *args):
+        """在 streamer 的事件循环中执行回调（缓存线程中调用时转交给事件循环）"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is loop:
+            callback(*args)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+
+    async def wait_for_initialization(self, timeout: float = 5.0) -> bool:
+        """
+        等待参数集 + 关键帧缓存就绪
+
+        Args:
+            timeout: 最长等待秒数
+
+        Returns:
+            bool: 是否已就绪
+        """
+        if self._initialized.is_set():
+            return True
+
+        try:
+            await asyncio.wait_for(self._initialized.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+
+        return True
+
     def _start_cache_thread(self):
         """启动后台缓存线程"""
+        self._cache_stop = threading.Event()
         self._cache_thread = threading.Thread(
             target=self._cache_nal_units,
+            args=(self._cache_stop,),
             daemon=True
         )
         self._cache_thread.start()
 
     def get_initialization_data(self) -> bytes:
         """
-        获取初始化数据（SPS + PPS + IDR）
+        获取初始化数据（参数集 + 最新关键帧，H.264 为 SPS + PPS + IDR）
 
         用于新连接快速初始化 jMuxer 解码器。
 
         Returns:
-            bytes: 初始化数据（SPS + PPS + IDR 拼接）
+            bytes: 初始化数据（按顺序拼接）
         """
         with self._cache_lock:
-            parts = []
+            parts = list(self.config.values())
 
-            if self.sps:
-                parts.append(self.sps)
+            if self.latest_keyframe:
+                parts.append(self.latest_keyframe)
 
-            if self.pps:
-                parts.append(self.pps)
+            return b''.join(parts)
 
-            if self.latest_idr:
-                parts.append(self.latest_idr)
+    def get_initialization_packet(self) -> Optional[ScrcpyPacket]:
+        """
+        获取初始化数据及其元数据（framed 模式首包，PTS 为缓存的关键帧的 PTS）
 
-            return b''.join(parts)
+        Returns:
+            ScrcpyPacket: 尚未缓存任何数据时返回 None
+        """
+        data = self.get_initialization_data()
+        if not data:
+            return None
+
+        return ScrcpyPacket(
+            data=data,
+            pts=self.latest_keyframe_pts,
+            is_config=bool(self.config),
+            is_keyframe=self.latest_keyframe is not None,
+            received_at=time.monotonic(),
+        )
+
+    @property
+    def subscriber_count(self) -> int:
+        """当前订阅者数量"""
+        return self._broadcaster.subscriber_count
+
+    def subscribe(
+        self,
+        latency_budget_ms: Optional[float] = None,
+        keyframes_only: bool = False,
+        max_fps: Optional[float] = None,
+        from_keyframe: bool = False,
+    ) -> NalSubscriber:
+        """
+        订阅 NAL 单元流
+
+        每个订阅者独立维护游标，能收到订阅之后的全部 NAL 单元；
+        落后超过延迟预算时跳到最新的 SPS/PPS/IDR，而不是在 GOP 中间丢帧。
+        应在发送初始化数据之前订阅，避免两者之间出现空档。
+        使用完毕后必须调用 subscriber.close()。
+
+        Args:
+            latency_budget_ms: 延迟预算（视频毫秒），None 使用 streamer 默认值
+            keyframes_only: 只接收参数集 + 关键帧（低帧率预览，每次都是最新关键帧）
+            max_fps: 仅关键帧模式下的最大帧率，None 表示每个关键帧都发送
+            from_keyframe: 从缓冲区中最新的参数集 + 关键帧开始（含之后的 P 帧），
+                适合需要立即解码出当前画面的订阅者
+
+        Returns:
+            NalSubscriber: 订阅者（支持 async for）
+        """
+        if latency_budget_ms is None:
+            latency_budget_ms = self.latency_budget_ms
+
+        return self._broadcaster.subscribe(
+            latency_budget_ms=latency_budget_ms,
+            keyframes_only=keyframes_only,
+            max_fps=max_fps,
+            from_keyframe=from_keyframe,
+        )
+
+    @property
+    def last_pts(self) -> Optional[int]:
+        """最近收到的 PTS（微秒，设备编码器时钟），尚未收到视频帧时为 None"""
+        return self._last_pts if self._last_pts >= 0 else None
+
+    @property
+    def is_recording(self) -> bool:
+        return self.recorder is not None and self.recorder.is_recording
+
+    def start_recording(self, **kwargs) -> StreamRecorder:
+        """
+        开始录制（已在录制时返回当前的 recorder）
+
+        Args:
+            **kwargs: 传给 StreamRecorder 的参数（目录、格式、分段和保留策略）
+
+        Returns:
+            StreamRecorder: 录制订阅者
+
+        Raises:
+            RuntimeError: 流未运行，或 mp4 格式但未安装 PyAV
+            ValueError: 不支持的录制格式
+        """
+        if not self.is_running:
+            raise RuntimeError("Stream is not running")
+
+        if self.recorder is not None and self.recorder.is_recording:
+            return self.recorder
+
+        self.recorder = StreamRecorder(self, **kwargs)
+        self.recorder.start()
+
+        return self.recorder
+
+    async def stop_recording(self) -> Optional[StreamRecorder]:
+        """
+        停止录制并等待当前分段写完
+
+        Returns:
+            StreamRecorder: 已停止的 recorder，没有录制时返回 None
+        """
+        recorder = self.recorder
+        if recorder is None:
+            return None
+
+        await recorder.stop()
+        return recorder
+
+    def acquire_decoder(
+        self,
+        format: Optional[str] = None,
+        max_fps: Optional[float] = None,
+        max_width: Optional[int] = None,
+        keyframes_only: bool = False,
+    ) -> FrameDecoder:
+        """
+        获取进程内解码器（相同参数的使用者共享，引用计数）
+
+        使用完毕后必须调用 release_decoder()。
+
+        Args:
+            format: 输出格式 jpeg / rgb24 / yuv420p 等，None 读取 SCRCPY_DECODE_FORMAT
+            max_fps: 最大输出帧率，None 读取 SCRCPY_DECODE_FPS
+            max_width: 最大宽度，None 读取 SCRCPY_DECODE_WIDTH
+            keyframes_only: 只解码关键帧
+
+        Returns:
+            FrameDecoder: 已启动的解码器
+
+        Raises:
+            RuntimeError: 流未运行，或未安装 PyAV
+            ValueError: 不支持的输出格式
+        """
+        if not self.is_running:
+            raise RuntimeError("Stream is not running")
+
+        decoder = FrameDecoder(
+            self, format=format, max_fps=max_fps, max_width=max_width, keyframes_only=keyframes_only
+        )
+        key = (decoder.format, decoder.max_fps, decoder.max_width, decoder.keyframes_only)
+
+        existing = self.decoders.get(key)
+        if existing and existing.is_running:
+            decoder = existing
+        else:
+            self.decoders[key] = decoder
+            self._decoder_refs[key] = 0
+            decoder.start()
+
+        self._decoder_refs[key] += 1
+        return decoder
+
+    async def release_decoder(self, decoder: FrameDecoder):
+        """释放解码器引用，最后一个使用者释放后停止解码"""
+        key = (decoder.format, decoder.max_fps, decoder.max_width, decoder.keyframes_only)
+        if self.decoders.get(key) is not decoder:
+            # 已被替换（流结束后重新获取）或已停止
+            await decoder.stop()
+            return
+
+        self._decoder_refs[key] -= 1
+        if self._decoder_refs[key] <= 0:
+            del self.decoders[key]
+            del self._decoder_refs[key]
+            await decoder.stop()
 
     async def iter_nal_units(self) -> AsyncIterator[bytes]:
         """
         异步迭代器：逐个产出 NAL 单元
 
-        从内部队列读取 NAL 单元（由缓存线程生产）。
-
-        用于 WebSocket 消费：
+        内部创建独立订阅者，多个迭代器之间互不争抢数据。
 
             async for nal in streamer.iter_nal_units():
                 await websocket.send_bytes(nal)
@@ -579,29 +1218,22 @@ class ScrcpyStreamer:
         Yields:
             bytes: NAL 单元（包含起始码）
         """
-        while self.is_running:
-            try:
-                # 从队列获取 NAL 单元（阻塞等待）
-                nal = await asyncio.to_thread(self._nal_queue.get, timeout=5)
-
-                if nal is None:
-                    # None 是结束信号
-                    print("[ScrcpyStreamer] NAL iterator: received end signal")
-                    break
+        subscriber = self.subscribe()
 
+        try:
+            async for nal in subscriber:
                 yield nal
+        finally:
+            subscriber.close()
 
-            except Exception:
-                # 超时或其他错误，继续等待
-                if not self.is_running:
-                    break
+        print("[ScrcpyStreamer] NAL iterator: received end signal")
 
     async def stop(self):
         """
         停止流式传输
 
         清理流程：
-        1. 停止运行标志
+        1. 停止运行标志和监督任务（包括进行中的重连）
         2. 关闭 socket
         3. 杀掉 server 进程
         4. 移除端口转发
@@ -613,40 +1245,77 @@ class ScrcpyStreamer:
 
         self.is_running = False
 
-        # 等待缓存线程结束
-        if self._cache_thread and self._cache_thread.is_alive():
-            self._cache_thread.join(timeout=2)
+        # 先写完录制的当前分段
+        await self.stop_recording()
+
+        for decoder in list(self.decoders.values()):
+            await decoder.stop()
+        self.decoders.clear()
+        self._decoder_refs.clear()
+
+        if self._supervisor:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+
+        # 通知所有订阅者流已结束
+        self._broadcaster.close()
+
+        await self._release_resources()
+
+        print("[ScrcpyStreamer] Stopped")
+
+    async def _release_resources(self):
+        """关闭 socket、杀掉 server 进程并移除端口转发（停止、重连或启动失败时调用）"""
+        # 关闭 socket（同时让阻塞在 recv 上的缓存线程退出）
+        self._cache_stop.set()
 
-        # 关闭 socket
         if self.socket:
             self.socket.close()
-            self.socket = None
+
+        if self._protocol:
+            self._protocol.close()
+            self._protocol = None
+
+        if self.controller:
+            self.controller.close()
+            self.controller = None
+
+        # 等待缓存线程结束（不阻塞事件循环）
+        if self._cache_thread and self._cache_thread.is_alive():
+            await asyncio.to_thread(self._cache_thread.join, 2)
+
+        self.socket = None
+        self._packet_reader = None
 
         # 杀掉 server 进程
         if self.server_process:
-            self.server_process.terminate()
+            if self.server_process.returncode is None:
+                self.server_process.terminate()
 
-            try:
-                self.server_process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self.server_process.kill()
+                try:
+                    await asyncio.wait_for(self.server_process.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    self.server_process.kill()
 
             self.server_process = None
 
+        if self._server_output_task:
+            self._server_output_task.cancel()
+            self._server_output_task = None
+
         # 移除端口转发
         await self._remove_port_forward()
 
-        print("[ScrcpyStreamer] Stopped")
-
     async def _remove_port_forward(self):
         """移除 ADB 端口转发"""
-        adb_cmd = ["adb"]
-        if self.device_id:
-            adb_cmd.extend(["-s", self.device_id])
-
-        remove_cmd = adb_cmd + ["forward", "--remove", "tcp:27183"]
-
-        result = await asyncio.create_subprocess_exec(*remove_cmd)
-        await result.wait()
+        try:
+            await self.adb.killforward(self.device_id, f"tcp:{self.port}")
+        except (AdbError, OSError) as e:
+            print(f"[ScrcpyStreamer] Failed to remove port forwarding: {e}")
+            return
 
         print("[ScrcpyStreamer] Removed port forwarding")
@@ -0,0 +1,291 @@
+"""
+ThumbnailService - 多设备缩略图
+
+设备墙总览只需要每台设备一秒左右一张静态画面，不需要完整视频流：
+- 每台设备以 thumbnail profile 投屏，仅关键帧订阅（参数集 + IDR），按间隔限频
+- 关键帧在线程池中解码、缩放并编码为 JPEG（PyAV，可选依赖：pip install autolife[video]）
+- 结果缓存在内存中，一个接口即可取得所有设备的最新缩略图
+
+按需投屏：超过 idle_timeout 秒没有人读取缩略图时，设备的订阅自动结束，
+streamer 由 StreamerPool 按空闲宽限期回收。
+"""
+
+import asyncio
+import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import av
+except ImportError:
+    av = None  # type: ignore[assignment]
+
+from .decoder import JpegEncoder, create_decoder, is_available
+from .pool import StreamerPool, StreamerPoolFull
+
+
+@dataclass
+class Thumbnail:
+    """设备的最新缩略图"""
+    device_id: str
+    jpeg: bytes
+    width: int
+    height: int
+    # 关键帧的 PTS（微秒）
+    pts: Optional[int] = None
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self, include_data: bool = True) -> dict:
+        result = {
+            "device_id": self.device_id,
+            "width": self.width,
+            "height": self.height,
+            "pts": self.pts,
+            "updated_at": self.updated_at,
+            "size": len(self.jpeg),
+        }
+        if include_data:
+            result["data"] = "data:image/jpeg;base64," + base64.b64encode(self.jpeg).decode()
+        return result
+
+
+def decode_keyframe_to_jpeg(
+    codec: str,
+    config: bytes,
+    keyframe: bytes,
+    max_width: int = 320,
+    qscale: int = 5,
+) -> Tuple[bytes, int, int]:
+    """
+    解码一个关键帧并缩放编码为 JPEG
+
+    每次使用新的解码器：关键帧可以独立解码，不需要保留上下文。
+
+    Args:
+        codec: 编码格式（h264 / h265 / av1）
+        config: 参数集（作为解码器 extradata）
+        keyframe: 关键帧数据
+        max_width: 缩略图最大宽度（保持宽高比）
+        qscale: JPEG 量化参数，2（最好）- 31（最差）
+
+    Returns:
+        (JPEG 数据, 宽度, 高度)
+
+    Raises:
+        RuntimeError: 未安装 PyAV
+        ValueError: 数据无法解码
+    """
+    decoder = create_decoder(codec)
+    if config:
+        decoder.extradata = config
+
+    try:
+        frames = decoder.decode(av.Packet(keyframe))
+        # 刷新解码器，拿到延迟输出的帧
+        frames.extend(decoder.decode(None))
+    except av.FFmpegError as e:
+        raise ValueError(f"Failed to decode {codec} keyframe: {e}")
+
+    if not frames:
+        raise ValueError(f"No frame decoded from {codec} keyframe")
+
+    return JpegEncoder(max_width, qscale).encode(frames[-1])
+
+
+class ThumbnailService:
+    """
+    多设备缩略图服务
+
+    示例：
+        >>> service = ThumbnailService(pool)
+        >>> service.watch(["serial-1", "serial-2"])
+        >>> await asyncio.sleep(2)
+        >>> service.get("serial-1").jpeg
+    """
+
+    def __init__(
+        self,
+        pool: StreamerPool,
+        profile: Optional[str] = None,
+        interval: Optional[float] = None,
+        max_width: Optional[int] = None,
+        qscale: int = 5,
+        workers: Optional[int] = None,
+        idle_timeout: Optional[float] = None,
+    ):
+        """
+        Args:
+            pool: streamer 池
+            profile: 投屏使用的 profile，默认读取 SCRCPY_THUMBNAIL_PROFILE（默认 thumbnail）
+            interval: 每台设备的刷新间隔（秒），默认读取 SCRCPY_THUMBNAIL_INTERVAL（默认 1）
+            max_width: 缩略图最大宽度，默认读取 SCRCPY_THUMBNAIL_WIDTH（默认 320）
+            qscale: JPEG 量化参数，2（最好）- 31（最差）
+            workers: 解码线程数，默认读取 SCRCPY_THUMBNAIL_WORKERS（默认 4）
+            idle_timeout: 多少秒没有读取后停止订阅，默认读取 SCRCPY_THUMBNAIL_IDLE（默认 60）
+        """
+        self.pool = pool
+        self.profile = profile or os.getenv("SCRCPY_THUMBNAIL_PROFILE", "thumbnail")
+        self.interval = interval or float(os.getenv("SCRCPY_THUMBNAIL_INTERVAL", "1"))
+        self.max_width = max_width or int(os.getenv("SCRCPY_THUMBNAIL_WIDTH", "320"))
+        self.qscale = qscale
+        self.idle_timeout = idle_timeout or float(os.getenv("SCRCPY_THUMBNAIL_IDLE", "60"))
+
+        workers = workers or int(os.getenv("SCRCPY_THUMBNAIL_WORKERS", "4"))
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+
+        # 设备 ID → 最新缩略图
+        self.thumbnails: Dict[str, Thumbnail] = {}
+
+        # 设备 ID → 最近一次失败原因
+        self.errors: Dict[str, str] = {}
+
+        # 设备 ID → 订阅任务
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        # 最近一次读取时间（单调时钟）
+        self._last_access = time.monotonic()
+
+    @property
+    def watching(self) -> List[str]:
+        """正在生成缩略图的设备"""
+        return [device_id for device_id, task in self._tasks.items() if not task.done()]
+
+    def touch(self):
+        """记录一次读取，推迟空闲停止"""
+        self._last_access = time.monotonic()
+
+    def watch(self, device_ids: Iterable[str]):
+        """
+        开始为设备生成缩略图（已在进行中的设备忽略）
+
+        Raises:
+            RuntimeError: 未安装 PyAV
+        """
+        if not is_available():
+            raise RuntimeError("PyAV is not installed (pip install autolife[video])")
+
+        self.touch()
+
+        for device_id in device_ids:
+            task = self._tasks.get(device_id)
+            if task and not task.done():
+                continue
+
+            self._tasks[device_id] = asyncio.create_task(self._watch(device_id))
+
+    def get(self, device_id: str) -> Optional[Thumbnail]:
+        """设备的最新缩略图，没有时返回 None"""
+        self.touch()
+        return self.thumbnails.get(device_id)
+
+    async def wait_for(self, device_ids: Iterable[str], timeout: float) -> bool:
+        """
+        等待设备都有缩略图
+
+        Returns:
+            bool: 超时前是否都已就绪
+        """
+        device_ids = list(device_ids)
+        deadline = time.monotonic() + timeout
+
+        while any(
+            device_id not in self.thumbnails and device_id in self.watching
+            for device_id in device_ids
+        ):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+
+        return True
+
+    def forget(self, device_id: str):
+        """移除设备的缩略图（设备断开时调用）"""
+        self.thumbnails.pop(device_id, None)
+        self.errors.pop(device_id, None)
+
+    async def handle_device_change(
+        self, device_id: str, old_state: Optional[str], new_state: Optional[str]
+    ):
+        """设备状态变化回调（DeviceRegistry 监听者）：设备断开后不再展示旧画面"""
+        if new_state != "device":
+            self.forget(device_id)
+
+    async def stop(self):
+        """停止所有订阅并关闭解码线程池"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _watch(self, device_id: str):
+        """订阅设备的关键帧并解码，空闲超时或流结束时退出"""
+        try:
+            streamer = await self.pool.acquire(device_id, self.profile)
+        except (RuntimeError, ValueError, StreamerPoolFull) as e:
+            print(f"[ThumbnailService] Failed to start stream for {device_id}: {e}")
+            self.errors[device_id] = str(e)
+            return
+
+        subscriber = streamer.subscribe(keyframes_only=True, max_fps=1 / self.interval)
+
+        try:
+            await streamer.wait_for_initialization(timeout=5)
+
+            # 先用缓存的关键帧生成第一张
+            if streamer.latest_keyframe:
+                await self._decode(
+                    device_id,
+                    streamer.codec.name,
+                    b"".join(streamer.config.values()),
+                    streamer.latest_keyframe,
+                    streamer.latest_keyframe_pts,
+                )
+
+            config: List[bytes] = []
+
+            while (packet := await subscriber.get_packet()) is not None:
+                if packet.is_config:
+                    config.append(packet.data)
+                    continue
+
+                if time.monotonic() - self._last_access > self.idle_timeout:
+                    print(f"[ThumbnailService] No readers, stopping thumbnails for {device_id}")
+                    break
+
+                await self._decode(
+                    device_id,
+                    streamer.codec.name,
+                    b"".join(config) or b"".join(streamer.config.values()),
+                    packet.data,
+                    packet.pts,
+                )
+                config = []
+        finally:
+            subscriber.close()
+            self.pool.release(device_id, self.profile)
+
+    async def _decode(
+        self, device_id: str, codec: str, config: bytes, keyframe: bytes, pts: Optional[int]
+    ):
+        """在线程池中解码（同一设备串行，慢设备只会降低自己的刷新率）"""
+        loop = asyncio.get_running_loop()
+
+        try:
+            jpeg, width, height = await loop.run_in_executor(
+                self._executor,
+                decode_keyframe_to_jpeg,
+                codec, config, keyframe, self.max_width, self.qscale,
+            )
+        except ValueError as e:
+            self.errors[device_id] = str(e)
+            return
+
+        self.thumbnails[device_id] = Thumbnail(device_id, jpeg, width, height, pts)
+        self.errors.pop(device_id, None)
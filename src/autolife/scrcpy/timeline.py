@@ -0,0 +1,248 @@
+"""
+TaskTimeline - 任务步骤与录像的对应关系
+
+Agent 执行任务时记录每一步的起止时间（墙上时钟）和当时的视频 PTS，
+保存在录制目录中设备子目录的 tasks/<任务 ID>.json，与录像分段清单放在一起。
+
+回放时按步骤开始时间在分段清单的关键帧索引中查找之前最近的关键帧，
+客户端直接从该关键帧开始播放，不需要手动拖动进度条。
+"""
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+
+from .recorder import RecordingSegment, default_directory, safe_path_component
+
+if TYPE_CHECKING:
+    from .streamer import ScrcpyStreamer
+
+
+@dataclass
+class StepMark:
+    """一个步骤的时间标记"""
+    step: int
+    started_at: float
+    start_pts: Optional[int] = None
+    ended_at: Optional[float] = None
+    end_pts: Optional[int] = None
+    action: Optional[str] = None
+    result: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> Optional[int]:
+        if self.ended_at is None:
+            return None
+        return int((self.ended_at - self.started_at) * 1000)
+
+
+@dataclass
+class SeekPoint:
+    """回放定位：步骤开始之前最近的关键帧"""
+    segment: RecordingSegment
+    # 关键帧的 PTS（微秒）、在原始码流中的字节偏移（mp4 为 -1）和接收时间
+    keyframe_pts: int
+    byte_offset: int
+    keyframe_time: float
+    # 关键帧 / 目标时刻相对分段开头的秒数
+    keyframe_offset: float
+    target_offset: float
+
+    def to_dict(self) -> dict:
+        return {
+            "segment": Path(self.segment.path).name,
+            "format": self.segment.format,
+            "codec": self.segment.codec,
+            "keyframe_pts": self.keyframe_pts,
+            "byte_offset": self.byte_offset,
+            "keyframe_time": self.keyframe_time,
+            "keyframe_offset": round(self.keyframe_offset, 3),
+            "target_offset": round(self.target_offset, 3),
+        }
+
+
+def find_seek_point(segments: List[RecordingSegment], wall_time: float) -> Optional[SeekPoint]:
+    """
+    查找某一时刻之前最近的关键帧
+
+    Args:
+        segments: 设备的分段清单（按开始时间排序）
+        wall_time: 目标时刻（time.time）
+
+    Returns:
+        SeekPoint: 没有覆盖该时刻的录像时返回 None
+    """
+    best = None
+
+    for segment in segments:
+        if segment.started_at > wall_time:
+            break
+
+        for keyframe in segment.keyframes:
+            if keyframe[2] > wall_time:
+                break
+            best = (segment, keyframe)
+
+    if best is None:
+        return None
+
+    segment, (pts, byte_offset, keyframe_time) = best
+
+    # 分段已结束且目标时刻在结束之后（录制中断）
+    if segment.ended_at is not None and wall_time > segment.ended_at:
+        return None
+
+    keyframe_offset = (pts - (segment.start_pts or 0)) / 1_000_000
+
+    return SeekPoint(
+        segment=segment,
+        keyframe_pts=pts,
+        byte_offset=byte_offset,
+        keyframe_time=keyframe_time,
+        keyframe_offset=keyframe_offset,
+        target_offset=keyframe_offset + (wall_time - keyframe_time),
+    )
+
+
+@dataclass
+class TaskTimeline:
+    """
+    一次任务执行的步骤时间线
+
+    示例：
+        >>> timeline = TaskTimeline("task-1", "emulator-5554", "打开设置", streamer=streamer)
+        >>> timeline.step_started(1)
+        >>> timeline.step_finished(1, action="Tap", result="已点击")
+        >>> timeline.finish("completed")
+    """
+    task_id: str
+    device_id: str
+    text: str = ""
+    started_at: float = field(default_factory=time.time)
+    ended_at: Optional[float] = None
+    status: str = "running"
+    steps: List[StepMark] = field(default_factory=list)
+
+    # 以下不写入文件
+    streamer: Optional["ScrcpyStreamer"] = field(default=None, repr=False, compare=False)
+    root: Optional[Path] = field(default=None, repr=False, compare=False)
+    persist: bool = field(default=True, repr=False, compare=False)
+
+    @property
+    def path(self) -> Path:
+        return timeline_path(self.root or default_directory(), self.device_id, self.task_id)
+
+    def _current_pts(self) -> Optional[int]:
+        return self.streamer.last_pts if self.streamer else None
+
+    def step_started(self, step: int) -> StepMark:
+        """记录步骤开始（当前时间和视频 PTS）"""
+        mark = StepMark(step=step, started_at=time.time(), start_pts=self._current_pts())
+        self.steps.append(mark)
+        self.save()
+        return mark
+
+    def step_finished(
+        self, step: int, action: Optional[str] = None, result: Optional[str] = None
+    ) -> Optional[StepMark]:
+        """记录步骤结束"""
+        mark = self.get_step(step)
+        if mark is None:
+            return None
+
+        mark.ended_at = time.time()
+        mark.end_pts = self._current_pts()
+        mark.action = action
+        mark.result = result
+        self.save()
+        return mark
+
+    def finish(self, status: str):
+        """记录任务结束（completed / cancelled / error 等）"""
+        self.ended_at = time.time()
+        self.status = status
+        self.save()
+
+    def get_step(self, step: int) -> Optional[StepMark]:
+        for mark in reversed(self.steps):
+            if mark.step == step:
+                return mark
+        return None
+
+    def to_dict(self) -> dict:
+        return {
+            "task_id": self.task_id,
+            "device_id": self.device_id,
+            "text": self.text,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "status": self.status,
+            "steps": [asdict(mark) for mark in self.steps],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TaskTimeline":
+        data = dict(data)
+        data["steps"] = [StepMark(**mark) for mark in data.get("steps", [])]
+        return cls(**data)
+
+    def save(self):
+        """原子写入时间线文件（persist=False 时只保存在内存中）"""
+        if not self.persist:
+            return
+
+        path = self.path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(self.to_dict(), ensure_ascii=False))
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[TaskTimeline] Failed to save {path}: {e}")
+
+
+def timeline_path(root: Path, device_id: str, task_id: str) -> Path:
+    """任务时间线文件路径：<录制目录>/<设备>/tasks/<任务 ID>.json"""
+    return (
+        Path(root)
+        / safe_path_component(device_id)
+        / "tasks"
+        / f"{safe_path_component(task_id)}.json"
+    )
+
+
+def load_timeline(root: Path, task_id: str) -> Optional[TaskTimeline]:
+    """按任务 ID 查找时间线（不需要知道设备）"""
+    for path in Path(root).glob(f"*/tasks/{safe_path_component(task_id)}.json"):
+        try:
+            timeline = TaskTimeline.from_dict(json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[TaskTimeline] Skipping invalid timeline {path}: {e}")
+            continue
+
+        timeline.root = Path(root)
+        return timeline
+
+    return None
+
+
+def list_timelines(root: Path, device_id: Optional[str] = None) -> List[TaskTimeline]:
+    """列出时间线（按开始时间倒序）"""
+    device_dir = safe_path_component(device_id) if device_id else "*"
+
+    timelines = []
+    for path in Path(root).glob(f"{device_dir}/tasks/*.json"):
+        try:
+            timeline = TaskTimeline.from_dict(json.loads(path.read_text()))
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[TaskTimeline] Skipping invalid timeline {path}: {e}")
+            continue
+
+        timeline.root = Path(root)
+        timelines.append(timeline)
+
+    timelines.sort(key=lambda timeline: timeline.started_at, reverse=True)
+    return timelines
@@ -0,0 +1,122 @@
+"""
+scrcpy 视频 socket 的 asyncio 传输层
+
+在事件循环中直接解析 scrcpy 协议（元数据头 + packet 流），
+每个 packet 解析完成后立即回调给 streamer，不经过线程和队列。
+
+使用 BufferedProtocol：内核数据直接写入预分配的 PacketBuffer，
+每个 packet 只拷贝一次。
+"""
+
+import asyncio
+from typing import Callable, Optional
+
+from .packet_reader import METADATA_HEADER_SIZE, PacketBuffer, PacketTooLargeError
+
+
+class ScrcpyVideoProtocol(asyncio.BufferedProtocol):
+    """
+    scrcpy 视频流协议解析器
+
+    - 收到第一个字节（dummy 字节）时通过 first_byte_ready 通知调用方
+      （此时 server 已接受视频连接，可以继续连接控制 socket）
+    - 读取 77 字节元数据头，通过 header_ready 通知调用方
+    - 之后逐个解析 packet，回调 on_packet(data, pts_flags)
+    - 连接断开时回调 on_close(exc)
+
+    示例：
+        >>> protocol = ScrcpyVideoProtocol(on_packet=handle_nal)
+        >>> await loop.create_connection(lambda: protocol, "127.0.0.1", 27183)
+        >>> header = await protocol.header_ready
+    """
+
+    def __init__(
+        self,
+        on_packet: Callable[[bytes, int], None],
+        on_close: Optional[Callable[[Optional[Exception]], None]] = None,
+    ):
+        """
+        初始化协议解析器
+
+        Args:
+            on_packet: packet 回调，参数为数据和 PTS 字段（含标志位），在事件循环中调用
+            on_close: 连接断开回调
+        """
+        self.on_packet = on_packet
+        self.on_close = on_close
+
+        self.transport: Optional[asyncio.Transport] = None
+
+        loop = asyncio.get_running_loop()
+
+        # dummy 字节已到达
+        self.first_byte_ready: asyncio.Future = loop.create_future()
+
+        # 元数据头（77 字节原始数据）
+        self.header_ready: asyncio.Future = loop.create_future()
+
+        # 接收缓冲区（recv_into 直接写入）
+        self.buffer = PacketBuffer()
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        self.transport = transport  # type: ignore[assignment]
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.buffer.writable()
+
+    def buffer_updated(self, nbytes: int):
+        self.buffer.commit(nbytes)
+
+        if not self.first_byte_ready.done() and self.buffer.pending:
+            self.first_byte_ready.set_result(None)
+
+        if not self.header_ready.done():
+            header = self.buffer.read_exact(METADATA_HEADER_SIZE)
+            if header is None:
+                return
+
+            self.header_ready.set_result(header)
+
+        self._parse_packets()
+
+    def _parse_packets(self):
+        """从缓冲区中解析所有完整的 packet"""
+        while True:
+            try:
+                data = self.buffer.next_packet()
+            except PacketTooLargeError as e:
+                # 协议失步，无法继续解析
+                print(f"[ScrcpyVideoProtocol] {e}")
+                self.close()
+                return
+
+            if data is None:
+                return
+
+            try:
+                self.on_packet(data, self.buffer.last_pts_flags)
+            except Exception as e:
+                print(f"[ScrcpyVideoProtocol] Error handling packet: {e}")
+
+    def connection_lost(self, exc: Optional[Exception]):
+        if not self.first_byte_ready.done():
+            self.first_byte_ready.set_exception(
+                exc or ConnectionError("Socket closed before dummy byte")
+            )
+            # 调用方只在等待 dummy 字节，没有人会读取元数据头的结果
+            self.header_ready.cancel()
+
+        if not self.header_ready.done():
+            self.header_ready.set_exception(
+                exc or ConnectionError("Socket closed while reading metadata header")
+            )
+
+        self.transport = None
+
+        if self.on_close:
+            self.on_close(exc)
+
+    def close(self):
+        """关闭连接"""
+        if self.transport:
+            self.transport.close()
@@ -0,0 +1,247 @@
+"""
+模型流式输出处理
+
+AutoGLM 每一步的输出是「思考过程 + 动作」，例如：
+    <think>需要先打开设置</think><answer>do(action="Launch", app="设置")</answer>
+    我看到了搜索结果。finish(message="已完成")
+
+- ActionStreamParser: 增量解析输出，分离出思考部分的增量文本，并检测动作块是否已闭合
+  （do( / finish( 的括号配对，忽略字符串中的括号；或 </answer>）
+- ActionStream: 包装模型的流式响应，转发思考增量；动作块闭合后立即结束迭代并关闭响应，
+  PhoneAgent 随即解析并执行动作，不再等待模型输出剩余的 token
+"""
+
+import os
+import re
+from typing import Callable, Iterator, Optional
+
+# 动作的开始标记（AutoGLM 输出格式）
+ACTION_MARKERS = ("do(action=", "finish(message=")
+ANSWER_OPEN = "<answer>"
+ANSWER_CLOSE = "</answer>"
+
+# 思考文本中要去掉的标签
+TAGS = ("<think>", "</think>", ANSWER_OPEN, ANSWER_CLOSE)
+TAG_PATTERN = re.compile(r"</?(?:think|answer)>")
+
+# 可能被 chunk 截断的标记（末尾是它们的前缀时暂不发送）
+PENDING_TOKENS = ACTION_MARKERS + TAGS
+
+# 动作块闭合后是否提前结束流式响应
+EARLY_ACTION = os.getenv("AUTOLIFE_STREAM_EARLY_ACTION", "true").lower() == "true"
+
+
+def chunk_text(chunk) -> str:
+    """OpenAI chat.completions 流式 chunk 的增量文本"""
+    choices = getattr(chunk, "choices", None)
+    if not choices:
+        return ""
+    delta = getattr(choices[0], "delta", None)
+    return getattr(delta, "content", None) or ""
+
+
+def find_call_end(text: str, start: int) -> int:
+    """
+    从 start 处的函数调用（例如 do(...)）开始查找与第一个 "(" 配对的 ")"
+
+    Returns:
+        int: ")" 之后的位置，尚未闭合时返回 -1
+    """
+    depth = 0
+    quote = None
+    escaped = False
+
+    for i in range(start, len(text)):
+        char = text[i]
+
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"'):
+            quote = char
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+            if depth == 0:
+                return i + 1
+
+    return -1
+
+
+class ActionStreamParser:
+    """
+    增量解析一步的模型输出
+
+    思考文本一到就返回，只有末尾可能是被截断的标签或动作标记（如 "</thi"、"do(act"）时暂不返回。
+
+    示例：
+        >>> parser = ActionStreamParser()
+        >>> parser.feed("<think>打开设置</thi")
+        '打开设置'
+        >>> parser.feed("nk>返回上一页 do(act")
+        '返回上一页 '
+        >>> parser.feed('ion="Back")')
+        ''
+        >>> parser.closed, parser.action
+        (True, 'do(action="Back")')
+    """
+
+    def __init__(self):
+        self.content: str = ""
+        # 已发送的思考文本位置
+        self._sent = 0
+        # 动作开始位置（标记或 <answer>）和闭合位置
+        self.action_start: Optional[int] = None
+        self.action_end: Optional[int] = None
+
+    @property
+    def closed(self) -> bool:
+        """动作块是否已闭合"""
+        return self.action_end is not None
+
+    @property
+    def action(self) -> Optional[str]:
+        """动作文本（闭合后）"""
+        if self.action_end is None:
+            return None
+        return self.content[self.action_start:self.action_end]
+
+    def feed(self, text: str) -> str:
+        """
+        追加一段输出
+
+        Returns:
+            str: 新的思考文本（去掉标签；动作开始后为空）
+        """
+        self.content += text
+
+        if self.action_start is None:
+            self.action_start = self._find_action_start()
+
+        if self.action_start is not None and self.action_end is None:
+            self.action_end = self._find_action_end()
+
+        if self.action_start is not None:
+            limit = self.action_start
+        else:
+            limit = len(self.content) - self._pending_length()
+
+        return self._take_thinking(limit)
+
+    def finish(self) -> str:
+        """输出结束：返回暂未发送的思考文本"""
+        limit = self.action_start if self.action_start is not None else len(self.content)
+        return self._take_thinking(limit)
+
+    def _take_thinking(self, limit: int) -> str:
+        if limit <= self._sent:
+            return ""
+        delta = self.content[self._sent:limit]
+        self._sent = limit
+        return TAG_PATTERN.sub("", delta)
+
+    def _find_action_start(self) -> Optional[int]:
+        positions = [
+            self.content.find(marker) for marker in ACTION_MARKERS + (ANSWER_OPEN,)
+        ]
+        positions = [position for position in positions if position >= 0]
+        return min(positions) if positions else None
+
+    def _find_action_end(self) -> Optional[int]:
+        # <answer> 中的动作以 </answer> 结束，其余以配对的括号结束
+        close = self.content.find(ANSWER_CLOSE, self.action_start)
+        if close >= 0:
+            return close + len(ANSWER_CLOSE)
+
+        markers = [
+            self.content.find(marker, self.action_start) for marker in ACTION_MARKERS
+        ]
+        markers = [position for position in markers if position >= 0]
+        if not markers:
+            return None
+
+        end = find_call_end(self.content, min(markers))
+        if end < 0:
+            return None
+
+        # <answer> 中的 do(...) 闭合后，</answer> 可能还没有输出
+        return end
+
+    def _pending_length(self) -> int:
+        """末尾可能是被截断的标记的字符数"""
+        for length in range(min(len(self.content), max(map(len, PENDING_TOKENS)) - 1), 0, -1):
+            tail = self.content[-length:]
+            if any(token.startswith(tail) for token in PENDING_TOKENS):
+                return length
+        return 0
+
+
+class ActionStream:
+    """
+    包装模型的流式响应
+
+    示例：
+        >>> stream = ActionStream(client.chat.completions.create(..., stream=True), on_thinking=print)
+        >>> for chunk in stream:
+        ...     ...
+    """
+
+    def __init__(
+        self,
+        stream,
+        on_thinking: Optional[Callable[[str], None]] = None,
+        early_action: Optional[bool] = None,
+    ):
+        """
+        Args:
+            stream: 流式响应（可迭代的 chunk，可选 close()）
+            on_thinking: 思考增量回调（在迭代所在的线程中调用）
+            early_action: 动作块闭合后是否提前结束，默认读取 AUTOLIFE_STREAM_EARLY_ACTION（默认 true）
+        """
+        self.stream = stream
+        self.on_thinking = on_thinking
+        self.early_action = EARLY_ACTION if early_action is None else early_action
+        self.parser = ActionStreamParser()
+
+    def __iter__(self) -> Iterator:
+        parser = self.parser
+
+        for chunk in self.stream:
+            text = chunk_text(chunk)
+            if text:
+                self._emit(parser.feed(text))
+
+            yield chunk
+
+            if self.early_action and parser.closed:
+                # 不再等待剩余的 token，同时让模型服务停止生成
+                self.close()
+                return
+
+        self._emit(parser.finish())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def close(self):
+        close = getattr(self.stream, "close", None)
+        if close:
+            close()
+
+    def _emit(self, delta: str):
+        if delta and self.on_thinking:
+            try:
+                self.on_thinking(delta)
+            except Exception as e:
+                print(f"[ActionStream] Thinking callback failed: {e}")
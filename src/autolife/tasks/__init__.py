@@ -0,0 +1,22 @@
+"""
+任务调度模块
+agent 任务的排队、持久化和执行，执行不依赖客户端连接
+
+- TaskScheduler: 按优先级 / 设备 FIFO 派发任务，限制并发数，失败重试，重启后恢复
+- TaskStore / TaskRecord: 任务队列的 SQLite 持久化
+- TaskRunner: 在设备上逐步执行任务，事件写入事件日志
+- TaskEventLog / TaskEvent: 任务事件日志（SSE 连接只是日志的读者）
+"""
+from .events import TaskEvent, TaskEventLog
+from .runner import TaskRunner
+from .scheduler import TaskScheduler
+from .store import TaskRecord, TaskStore
+
+__all__ = [
+    "TaskScheduler",
+    "TaskStore",
+    "TaskRecord",
+    "TaskRunner",
+    "TaskEventLog",
+    "TaskEvent",
+]
@@ -0,0 +1,188 @@
+"""
+TaskEventLog - 任务事件日志
+
+任务执行过程中的事件（task_start / step_start / action / task_complete 等）
+按顺序追加到任务的事件日志，SSE 连接只是日志的读者：
+任意多个客户端可以同时观看同一个任务，断开连接不影响任务执行。
+
+- 每个事件有单调递增的 ID（从 1 开始），作为 SSE 的 id 字段
+- 最近的事件保存在内存环形缓冲区中，所有事件追加写入 <事件目录>/<任务 ID>.jsonl
+- 客户端带 Last-Event-ID 重新连接时只发送之后的事件；已移出缓冲区的事件从文件读取
+- 服务重启后从文件恢复日志，事件 ID 继续递增
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import AsyncIterator, Deque, Iterator, Optional
+
+from autolife.scrcpy.recorder import safe_path_component
+
+# 日志文件中表示任务结束的行
+CLOSED_MARKER = {"closed": True}
+
+
+def default_directory() -> Path:
+    """事件日志目录，默认读取 AUTOLIFE_TASK_EVENT_DIR（默认 ./data/events）"""
+    return Path(os.getenv("AUTOLIFE_TASK_EVENT_DIR", "data/events"))
+
+
+def event_log_path(root: Path, task_id: str) -> Path:
+    """任务事件日志文件路径：<事件目录>/<任务 ID>.jsonl"""
+    return Path(root) / f"{safe_path_component(task_id)}.jsonl"
+
+
+@dataclass
+class TaskEvent:
+    """一个任务事件"""
+    id: int
+    event: str
+    data: dict
+    time: float = field(default_factory=time.time)
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.event}\ndata: {json.dumps(self.data, ensure_ascii=False)}\n\n"
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "event": self.event, "data": self.data, "time": self.time}
+
+
+class TaskEventLog:
+    """
+    一个任务的事件日志（在事件循环中使用）
+
+    示例：
+        >>> log = TaskEventLog("task-1", path=Path("data/events/task-1.jsonl"))
+        >>> log.append("task_start", {"taskId": "task-1"})
+        >>> async for event in log.follow(after_id=last_event_id):
+        ...     print(event.to_sse())
+    """
+
+    def __init__(self, task_id: str, path: Optional[Path] = None, capacity: int = 500):
+        """
+        Args:
+            task_id: 任务 ID
+            path: 追加写入的日志文件，None 表示只保存在内存中
+            capacity: 内存中最多保留多少个最近的事件
+        """
+        self.task_id = task_id
+        self.path = Path(path) if path else None
+        self.events: Deque[TaskEvent] = deque(maxlen=capacity)
+        self.last_id = 0
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    @classmethod
+    def load(cls, task_id: str, path: Path, capacity: int = 500) -> "TaskEventLog":
+        """从日志文件恢复（最近的事件进入缓冲区，事件 ID 从文件中的最大值继续）"""
+        log = cls(task_id, path=path, capacity=capacity)
+        for item in log._read_file():
+            if item is CLOSED_MARKER:
+                log.closed = True
+                continue
+            log.events.append(item)
+            log.last_id = max(log.last_id, item.id)
+            log.closed = False
+        return log
+
+    @property
+    def first_id(self) -> int:
+        """缓冲区中最早的事件 ID（缓冲区为空时为下一个事件的 ID）"""
+        return self.events[0].id if self.events else self.last_id + 1
+
+    def append(self, event: str, data: dict) -> Optional[TaskEvent]:
+        """追加事件并唤醒所有读者（日志关闭后忽略）"""
+        if self.closed:
+            return None
+
+        self.last_id += 1
+        item = TaskEvent(self.last_id, event, data)
+        self.events.append(item)
+        self._write(item.to_dict())
+        self._notify()
+        return item
+
+    def close(self):
+        """任务结束：读者读完已有事件后退出"""
+        if self.closed:
+            return
+
+        self.closed = True
+        self._write(CLOSED_MARKER)
+        self._notify()
+
+    async def follow(self, after_id: int = 0) -> AsyncIterator[TaskEvent]:
+        """
+        读取 ID 大于 after_id 的事件，直到日志关闭
+
+        Args:
+            after_id: 客户端已收到的最后一个事件 ID（Last-Event-ID），0 表示从头读取
+        """
+        position = after_id
+
+        while True:
+            if position + 1 < self.first_id:
+                # 读者落后于缓冲区：已移出缓冲区的事件从文件读取
+                until = self.first_id
+                for item in self._read_file():
+                    if item is CLOSED_MARKER or item.id <= position:
+                        continue
+                    if item.id >= until:
+                        break
+                    position = item.id
+                    yield item
+                # 文件中也没有的事件（未持久化或写入失败）只能跳过
+                position = max(position, until - 1)
+
+            for item in list(self.events):
+                if item.id <= position:
+                    continue
+                if item.id > position + 1:
+                    # 读取期间缓冲区已经前移
+                    break
+                position = item.id
+                yield item
+
+            if position + 1 < self.first_id:
+                continue
+
+            if position >= self.last_id:
+                if self.closed:
+                    return
+                await self._changed.wait()
+
+    def _write(self, line: dict):
+        if self.path is None:
+            return
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[TaskEventLog] Failed to write {self.path}: {e}")
+
+    def _read_file(self) -> Iterator:
+        """逐行读取日志文件（跳过损坏的行，例如写入时进程退出）"""
+        if self.path is None or not self.path.exists():
+            return
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        data = json.loads(line)
+                        yield CLOSED_MARKER if data == CLOSED_MARKER else TaskEvent(**data)
+                    except (ValueError, TypeError):
+                        continue
+        except OSError as e:
+            print(f"[TaskEventLog] Failed to read {self.path}: {e}")
+
+    def _notify(self):
+        # 唤醒当前的等待者，之后的等待者等待新的 Event
+        self._changed.set()
+        self._changed = asyncio.Event()
@@ -0,0 +1,410 @@
+"""
+TaskRunner - 在设备上执行一个任务
+
+逐步调用设备 agent 的 PhoneAgent.step，把步骤、思考过程、动作和结果写入任务的事件日志，
+同时记录步骤时间线（墙上时钟 + 视频 PTS）。执行不依赖任何客户端连接。
+
+模型流式输出的思考过程在步骤执行期间以 thinking_delta 事件转发（增量文本），
+步骤结束后仍发送完整的 thinking 事件。
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from autolife.agent_pool import (
+    TASK_CANCELLED,
+    TASK_COMPLETED,
+    TASK_ERROR,
+    TASK_INTERRUPTED,
+    AgentPool,
+    TaskCancelled,
+)
+from autolife.cancel import CancelToken
+from autolife.scrcpy import ScreenshotProvider, StreamerPool, StreamerPoolFull, TaskTimeline
+
+from .events import TaskEventLog
+from .store import TaskRecord
+
+# 取消后等待工作线程退出步骤的时间（秒）：模型流式请求在下一个 chunk 之前中断，
+# 超时（例如正在执行设备动作）则先结束任务，步骤结束后再让出设备
+CANCEL_GRACE = 0.1
+
+# 合并思考增量的时间窗口（秒）：避免每个 token 一个事件
+THINKING_DELTA_INTERVAL = 0.05
+
+
+def action_data(action: dict) -> dict:
+    """前端展示的动作数据"""
+    return {
+        'action': action.get('action', 'Unknown'),
+        'description': action.get('message', str(action)),
+        **{k: v for k, v in action.items() if k not in ['_metadata', 'action', 'message']}
+    }
+
+
+class ThinkingForwarder:
+    """
+    把工作线程中的思考增量合并后写入事件日志（thinking_delta 事件）
+
+    push 在执行步骤的线程中调用，flush 和 start_step 在事件循环中调用。
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        log: TaskEventLog,
+        task_id: str,
+        interval: float = THINKING_DELTA_INTERVAL,
+    ):
+        self.loop = loop
+        self.log = log
+        self.task_id = task_id
+        self.interval = interval
+        self.step_number = 0
+        self._buffer: List[str] = []
+        self._scheduled = False
+        self._lock = threading.Lock()
+
+    def start_step(self, step_number: int):
+        """开始新的步骤（之前步骤剩余的增量先发送）"""
+        self.flush()
+        self.step_number = step_number
+
+    def push(self, delta: str):
+        """追加增量，interval 秒后合并发送"""
+        with self._lock:
+            self._buffer.append(delta)
+            if self._scheduled:
+                return
+            self._scheduled = True
+
+        self.loop.call_soon_threadsafe(self.loop.call_later, self.interval, self.flush)
+
+    def flush(self):
+        """立即发送缓冲的增量"""
+        with self._lock:
+            delta = "".join(self._buffer)
+            self._buffer = []
+            self._scheduled = False
+
+        if delta:
+            self.log.append(
+                "thinking_delta", {'taskId': self.task_id, 'stepNumber': self.step_number, 'delta': delta}
+            )
+
+
+class TaskRunner:
+    """
+    任务执行器
+
+    示例：
+        >>> runner = TaskRunner(agent_pool, streamer_pool)
+        >>> status, result, error = await runner.run(record, log)
+    """
+
+    def __init__(
+        self,
+        agent_pool: AgentPool,
+        streamer_pool: StreamerPool,
+        screenshot_provider: Optional[ScreenshotProvider] = None,
+        mock: Optional[bool] = None,
+        record: Optional[bool] = None,
+        max_steps: Optional[int] = None,
+    ):
+        """
+        Args:
+            agent_pool: 设备 agent 池
+            streamer_pool: streamer 池（录制和步骤时间线的视频 PTS）
+            screenshot_provider: agent 截图优先取自实时视频流，None 表示始终使用 screencap
+            mock: 模拟模式（不调用模型和设备），默认读取 AUTOLIFE_MOCK_MODE
+            record: 是否默认录制任务执行过程，默认读取 AUTOLIFE_RECORD_TASKS
+                （任务选项 record 优先）
+            max_steps: 每个任务最多执行多少步，默认读取 MAX_STEPS（默认 100）
+        """
+        self.agent_pool = agent_pool
+        self.streamer_pool = streamer_pool
+        self.screenshot_provider = screenshot_provider
+        self.mock = mock if mock is not None else (
+            os.getenv("AUTOLIFE_MOCK_MODE", "false").lower() == "true"
+        )
+        self.record = record if record is not None else (
+            os.getenv("AUTOLIFE_RECORD_TASKS", "false").lower() == "true"
+        )
+        self.max_steps = max_steps or int(os.getenv("MAX_STEPS", "100"))
+
+        # 执行 agent 步骤的线程池（每台设备同时只有一个步骤在执行）
+        self._executor = ThreadPoolExecutor(thread_name_prefix="agent-step")
+
+    async def run(self, record: TaskRecord, log: TaskEventLog) -> Tuple[str, Optional[str], Optional[str]]:
+        """
+        在 record.device_id 上执行任务（设备忙时排队等待）
+
+        Returns:
+            (状态, 结果消息, 错误信息)
+        """
+        task_id, device_id, text = record.task_id, record.device_id, record.text
+        if device_id is None:
+            # 调度器在开始任务前分配设备
+            raise ValueError(f"Task {task_id} has no device assigned")
+
+        try:
+            state = await self.agent_pool.acquire(task_id, device_id, text)
+        except TaskCancelled:
+            log.append("task_cancelled", {'taskId': task_id, 'message': '任务已取消'})
+            return TASK_CANCELLED, None, None
+
+        log.append("task_start", {'taskId': task_id, 'deviceId': device_id, 'attempt': record.attempts})
+
+        timeline, started_recording = await self.start_timeline(
+            task_id, device_id, text, record.options.get("record", self.record)
+        )
+        # 被调度器取消（服务关闭）时保持 interrupted
+        status = TASK_INTERRUPTED
+        final_message = None
+        error = None
+        # 正在线程中执行的步骤
+        step_future = None
+
+        try:
+            if self.mock:
+                # 模拟模式：返回模拟响应
+                await asyncio.sleep(1)  # 模拟处理延迟
+
+                # 模拟步骤
+                state.step = 1
+                self.step_started(log, task_id, 1, timeline)
+                await asyncio.sleep(0.5)
+
+                for delta in ('正在分析任务：', text):
+                    log.append("thinking_delta", {'taskId': task_id, 'stepNumber': 1, 'delta': delta})
+                    await asyncio.sleep(0.2)
+
+                log.append("thinking", {'taskId': task_id, 'stepNumber': 1, 'thinking': f'正在分析任务：{text}'})
+                await asyncio.sleep(0.5)
+
+                log.append("action", {'taskId': task_id, 'stepNumber': 1, 'action': {'action': 'Launch', 'app': '小红书', 'description': '打开小红书应用'}})
+                await asyncio.sleep(0.5)
+
+                self.step_finished(log, task_id, 1, '已完成步骤 1', timeline, action='Launch')
+
+                # 发送任务完成事件
+                final_message = f"[模拟模式] 任务「{text}」已完成！这是一个模拟响应，用于测试前后端通信。"
+                log.append("task_complete", {'taskId': task_id, 'message': final_message})
+                status = TASK_COMPLETED
+            else:
+                loop = asyncio.get_running_loop()
+                agent = self.agent_pool.get_agent(device_id)
+                step_number = 0
+                result = None
+                steps_summary_list = []
+
+                if self.screenshot_provider:
+                    agent.use_screenshot_provider(self.screenshot_provider)
+
+                # 取消时中断进行中的模型请求，跳过尚未执行的设备动作
+                agent.use_cancel_token(state.token)
+
+                # 模型流式输出时转发思考增量
+                thinking = ThinkingForwarder(loop, log, task_id)
+                agent.use_thinking_callback(thinking.push)
+
+                # 重置 agent 状态
+                agent.phone_agent.reset()
+
+                # 第一步带任务描述，之后直到完成或达到最大步数
+                while result is None or (
+                    not result.finished and agent.phone_agent.step_count < self.max_steps
+                ):
+                    # 检查任务是否被取消
+                    if self.agent_pool.is_cancelled(task_id):
+                        log.append("task_cancelled", {'taskId': task_id, 'message': '任务已取消'})
+                        status = TASK_CANCELLED
+                        return status, None, None
+
+                    step_number += 1
+                    state.step = step_number
+
+                    # 立即发送步骤开始事件（不带 action，让前端立即显示"处理中..."）
+                    self.step_started(log, task_id, step_number, timeline)
+                    thinking.start_step(step_number)
+
+                    # 执行步骤（获取 AI 决策和执行结果）
+                    step_future = self._executor.submit(
+                        agent.phone_agent.step, text if step_number == 1 else None
+                    )
+                    try:
+                        result = await self._wait_step(step_future, state.token)
+                    except TaskCancelled:
+                        log.append("task_cancelled", {'taskId': task_id, 'message': '任务已取消'})
+                        status = TASK_CANCELLED
+                        return status, None, None
+                    step_future = None
+                    thinking.flush()
+
+                    if result.action:
+                        log.append("action", {'taskId': task_id, 'stepNumber': step_number, 'action': action_data(result.action)})
+
+                    # 发送思考过程
+                    if result.thinking:
+                        log.append("thinking", {'taskId': task_id, 'stepNumber': step_number, 'thinking': result.thinking})
+
+                    # 发送步骤完成
+                    self.step_finished(
+                        log, task_id, step_number, result.message or '步骤完成', timeline,
+                        action=result.action.get('action') if result.action else None,
+                    )
+
+                    # Collect step info for report (包含 thinking 和 action)
+                    if result.thinking:
+                        steps_summary_list.append(f"Step {step_number} Thinking: {result.thinking}")
+                    if result.action:
+                        steps_summary_list.append(f"Step {step_number} Action: {result.action.get('message', str(result.action))}")
+
+                if result.finished:
+                    final_message = result.message or "任务完成"
+                else:
+                    final_message = "已达到最大步数限制"
+
+                # Generate task report (无论是第一步完成还是多步完成)
+                try:
+                    # 添加最终结果消息到摘要
+                    steps_summary_list.append(f"Final Result: {final_message}")
+
+                    steps_summary = "\n".join(steps_summary_list)  # 传递完整摘要
+                    report = await loop.run_in_executor(
+                        None, agent.generate_task_report, text, steps_summary
+                    )
+                    log.append("task_result", {'taskId': task_id, 'report': report})
+                except Exception as e:
+                    print(f"[TaskRunner] Failed to generate task report: {e}")
+                    # Don't fail the task if report generation fails
+
+                # 发送任务完成事件
+                log.append("task_complete", {'taskId': task_id, 'message': final_message})
+                status = TASK_COMPLETED
+        except Exception as e:
+            # 错误事件由调度器发送（可能重试）
+            status = TASK_ERROR
+            error = str(e)
+            print(f"[TaskRunner] Task {task_id} failed: {e}")
+        finally:
+            if timeline:
+                timeline.finish(status)
+            if started_recording:
+                await self.streamer_pool.stop_recording(device_id)
+
+            if step_future is not None and not step_future.done():
+                # 步骤仍在线程中执行：等它结束再让出设备，
+                # 避免下一个任务与它同时操作同一台设备
+                loop = asyncio.get_running_loop()
+                step_future.add_done_callback(
+                    lambda _: loop.call_soon_threadsafe(
+                        self.agent_pool.release, state, status, final_message, error
+                    )
+                )
+            else:
+                self.agent_pool.release(state, status, result=final_message, error=error)
+
+        return status, final_message, error
+
+    @staticmethod
+    async def _wait_step(step_future, token: CancelToken):
+        """
+        等待工作线程中的步骤结束，取消时最多再等 CANCEL_GRACE 秒
+
+        Raises:
+            TaskCancelled: 步骤执行期间任务被取消（无论步骤是否已经退出）
+        """
+        step = asyncio.wrap_future(step_future)
+        # 提前返回时步骤的结果 / 异常不再需要
+        step.add_done_callback(lambda future: future.cancelled() or future.exception())
+
+        cancelled = asyncio.ensure_future(token.wait())
+        try:
+            await asyncio.wait({step, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            cancelled.cancel()
+
+        if token.cancelled:
+            if not step.done():
+                await asyncio.wait({step}, timeout=CANCEL_GRACE)
+            raise TaskCancelled(token.task_id)
+
+        return step.result()
+
+    async def start_timeline(
+        self, task_id: str, device_id: str, text: str, record: bool
+    ) -> Tuple[Optional[TaskTimeline], bool]:
+        """
+        创建任务时间线（步骤起止时间 + 视频 PTS）
+
+        record 为 True 时先开始录制设备画面；设备已在录制时直接使用现有录像。
+        只有在录制时才把时间线写入录制目录，否则只在内存中记录 PTS。
+
+        Returns:
+            (TaskTimeline, 是否由本任务开始录制)
+        """
+        pool = self.streamer_pool
+        started_recording = False
+
+        if record and pool.recording(device_id) is None:
+            try:
+                await pool.start_recording(device_id)
+                started_recording = True
+            except (RuntimeError, ValueError, OSError, StreamerPoolFull) as e:
+                print(f"[TaskRunner] Failed to start recording for task {task_id}: {e}")
+
+        recorder = pool.recording(device_id)
+        streamer = None
+        root = None
+
+        if recorder is not None and recorder.is_recording:
+            streamer = recorder.streamer
+            root = recorder.root
+        else:
+            # 没有录制时也尽量记录 PTS（例如前端正在观看）
+            streamers = pool.streamers_for(device_id)
+            streamer = streamers[0] if streamers else None
+
+        timeline = TaskTimeline(
+            task_id=task_id,
+            device_id=device_id,
+            text=text,
+            streamer=streamer,
+            root=root,
+            persist=root is not None,
+        )
+        return timeline, started_recording
+
+    @staticmethod
+    def step_started(log: TaskEventLog, task_id: str, step_number: int, timeline: Optional[TaskTimeline]):
+        """步骤开始事件（带开始时间和视频 PTS）"""
+        data = {'taskId': task_id, 'stepNumber': step_number}
+
+        if timeline:
+            mark = timeline.step_started(step_number)
+            data.update({'startedAt': mark.started_at, 'pts': mark.start_pts})
+
+        log.append("step_start", data)
+
+    @staticmethod
+    def step_finished(
+        log: TaskEventLog,
+        task_id: str,
+        step_number: int,
+        message: str,
+        timeline: Optional[TaskTimeline],
+        action: Optional[str] = None,
+    ):
+        """步骤完成事件（带结束时间、视频 PTS 和耗时）"""
+        data = {'taskId': task_id, 'stepNumber': step_number, 'result': message}
+
+        if timeline:
+            mark = timeline.step_finished(step_number, action=action, result=message)
+            if mark:
+                data.update({'endedAt': mark.ended_at, 'pts': mark.end_pts, 'duration': mark.duration_ms})
+
+        log.append("step_complete", data)
@@ -0,0 +1,440 @@
+"""
+TaskScheduler - 任务调度器
+
+提交的任务先写入 TaskStore（SQLite），调度循环按优先级和提交顺序派发：
+- 每台设备同时只执行一个任务，同一设备相同优先级的任务按提交顺序执行
+- 未指定设备的任务分配给任意空闲的在线设备
+- 同时执行的任务数不超过 max_workers
+- 失败的任务按 max_attempts 重试（退避 retry_delay × 已执行次数 秒）
+- 服务重启后排队中的任务继续执行，执行中断的任务重新排队
+
+任务事件写入 TaskEventLog（内存缓冲区 + 追加写入的日志文件），SSE 连接只是事件日志的读者，
+断开后可以按 Last-Event-ID 继续。超过保留期的已结束任务和事件日志在启动时删除。
+"""
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from autolife.agent_pool import (
+    TASK_CANCELLED,
+    TASK_COMPLETED,
+    TASK_ERROR,
+    TASK_QUEUED,
+    TASK_RUNNING,
+)
+
+from .events import TaskEventLog, default_directory, event_log_path
+from .runner import TaskRunner
+from .store import TaskRecord, TaskStore
+
+# 有未分配设备的任务在等待时，多久重新检查一次在线设备（秒）
+DEVICE_POLL_INTERVAL = 5.0
+
+
+class TaskScheduler:
+    """
+    任务调度器（在事件循环中使用）
+
+    示例：
+        >>> scheduler = TaskScheduler(TaskStore(), TaskRunner(agent_pool, streamer_pool))
+        >>> await scheduler.start()
+        >>> record = scheduler.submit("打开设置", device_id="emulator-5554", priority=10)
+        >>> async for event in scheduler.events(record.task_id).follow():
+        ...     print(event.event, event.data)
+    """
+
+    def __init__(
+        self,
+        store: TaskStore,
+        runner: TaskRunner,
+        device_lister: Optional[Callable[[], Awaitable[List[str]]]] = None,
+        max_workers: Optional[int] = None,
+        retry_delay: Optional[float] = None,
+        event_dir: Optional[Path] = None,
+        retention: Optional[float] = None,
+        max_logs: int = 200,
+    ):
+        """
+        Args:
+            store: 任务持久化
+            runner: 任务执行器
+            device_lister: 返回在线设备列表的协程函数（分配未指定设备的任务）
+            max_workers: 最多同时执行的任务数，默认读取 AUTOLIFE_MAX_WORKERS（默认 4）
+            retry_delay: 重试退避基数（秒），默认读取 AUTOLIFE_TASK_RETRY_DELAY（默认 10）
+            event_dir: 事件日志目录，默认读取 AUTOLIFE_TASK_EVENT_DIR
+            retention: 已结束任务的保留时长（小时），默认读取 AUTOLIFE_TASK_RETENTION_HOURS
+                （默认 168），0 表示不删除
+            max_logs: 内存中保留多少个已结束任务的事件日志
+        """
+        self.store = store
+        self.runner = runner
+        self.agent_pool = runner.agent_pool
+        self.device_lister = device_lister
+        self.max_workers = max_workers or int(os.getenv("AUTOLIFE_MAX_WORKERS", "4"))
+        self.retry_delay = retry_delay if retry_delay is not None else float(
+            os.getenv("AUTOLIFE_TASK_RETRY_DELAY", "10")
+        )
+        self.event_dir = Path(event_dir) if event_dir else default_directory()
+        self.retention = retention if retention is not None else float(
+            os.getenv("AUTOLIFE_TASK_RETENTION_HOURS", "168")
+        )
+        self.max_logs = max_logs
+
+        # 任务 ID → 执行中的任务记录 / 协程
+        self.running: Dict[str, TaskRecord] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+        # 任务 ID → 事件日志
+        self._logs: "OrderedDict[str, TaskEventLog]" = OrderedDict()
+
+        self._wakeup = asyncio.Event()
+        self._loop_task: Optional[asyncio.Task] = None
+
+        # 取消后步骤结束才让出设备（晚于 _run 结束），让出时重新派发该设备的任务
+        self.agent_pool.add_release_listener(lambda state: self._wakeup.set())
+
+    @property
+    def is_running(self) -> bool:
+        return self._loop_task is not None and not self._loop_task.done()
+
+    async def start(self):
+        """恢复中断的任务并开始调度"""
+        if self.is_running:
+            return
+
+        recovered = self.store.recover()
+        if recovered:
+            print(f"[TaskScheduler] Requeued {recovered} interrupted task(s)")
+
+        self.purge()
+
+        self._loop_task = asyncio.ensure_future(self._dispatch_loop())
+        self._wakeup.set()
+
+    async def stop(self):
+        """停止调度；执行中的任务保持 running，下次启动时重新排队"""
+        if self._loop_task:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def submit(
+        self,
+        text: str,
+        device_id: Optional[str] = None,
+        priority: int = 0,
+        task_id: Optional[str] = None,
+        max_attempts: int = 1,
+        options: Optional[dict] = None,
+    ) -> TaskRecord:
+        """
+        提交任务
+
+        Args:
+            text: 任务描述
+            device_id: 设备 ID，None 表示分配任意空闲的在线设备
+            priority: 优先级，数值越大越先执行
+            task_id: 任务 ID，默认自动生成
+            max_attempts: 最多执行次数（失败后重试）
+            options: 执行选项（例如 {"record": True}）
+
+        Raises:
+            ValueError: 任务 ID 已存在
+        """
+        record = self.store.add(TaskRecord(
+            task_id=task_id or uuid.uuid4().hex,
+            text=text,
+            device_id=device_id,
+            priority=priority,
+            max_attempts=max(1, max_attempts),
+            options=options or {},
+        ))
+
+        # 同名任务的旧日志（任务记录已删除）
+        self._logs.pop(record.task_id, None)
+        event_log_path(self.event_dir, record.task_id).unlink(missing_ok=True)
+
+        self._log(record.task_id).append("task_queued", {
+            'taskId': record.task_id,
+            'deviceId': record.device_id,
+            'priority': record.priority,
+            'position': self.queue_position(record.task_id),
+        })
+        self._wakeup.set()
+        return record
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        取消任务：排队中的任务立即结束，执行中的任务立即中断模型请求并跳过尚未执行的设备动作
+
+        Returns:
+            bool: 任务是否存在且尚未结束
+        """
+        if task_id in self.running:
+            return self.agent_pool.cancel(task_id)
+
+        record = self.store.get(task_id)
+        if record is None or record.status != TASK_QUEUED:
+            return False
+
+        record.status = TASK_CANCELLED
+        record.ended_at = time.time()
+        self.store.save(record)
+
+        log = self._log(task_id)
+        log.append("task_cancelled", {'taskId': task_id, 'message': '任务已取消'})
+        log.close()
+        return True
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        """任务记录（执行中的任务带当前步骤）"""
+        record = self.running.get(task_id) or self.store.get(task_id)
+        if record and record.status == TASK_RUNNING:
+            state = self.agent_pool.get_task(task_id)
+            if state:
+                record.step = state.step
+        return record
+
+    def list(
+        self,
+        status: Optional[str] = None,
+        device_id: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[TaskRecord]:
+        return [
+            self.running.get(record.task_id, record)
+            for record in self.store.list(status=status, device_id=device_id, limit=limit)
+        ]
+
+    def queue_position(self, task_id: str) -> int:
+        """
+        任务前面还有几个任务（同一设备上执行中和排在前面的任务；未指定设备时计算所有排在前面的任务），
+        不在排队时返回 0
+        """
+        queued = self.store.queued()
+        record = next((item for item in queued if item.task_id == task_id), None)
+        if record is None:
+            return 0
+
+        def same_device(other: TaskRecord) -> bool:
+            return record.device_id is None or other.device_id == record.device_id
+
+        position = sum(1 for other in self.running.values() if same_device(other))
+        for other in queued:
+            if other is record:
+                break
+            if same_device(other):
+                position += 1
+        return position
+
+    def purge(self) -> int:
+        """
+        删除超过保留期的已结束任务及其事件日志文件
+
+        Returns:
+            int: 删除的任务数
+        """
+        if not self.retention:
+            return 0
+
+        task_ids = self.store.purge(time.time() - self.retention * 3600)
+        for task_id in task_ids:
+            self._logs.pop(task_id, None)
+            try:
+                event_log_path(self.event_dir, task_id).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"[TaskScheduler] Failed to delete event log of {task_id}: {e}")
+
+        if task_ids:
+            print(f"[TaskScheduler] Purged {len(task_ids)} finished task(s)")
+        return len(task_ids)
+
+    def events(self, task_id: str) -> Optional[TaskEventLog]:
+        """
+        任务的事件日志（不在内存中时从日志文件恢复）；
+        没有日志文件的已结束任务只包含最终结果
+
+        Returns:
+            TaskEventLog: 任务不存在时返回 None
+        """
+        log = self._logs.get(task_id)
+        if log is not None:
+            return log
+
+        record = self.store.get(task_id)
+        if record is None:
+            return None
+
+        log = self._log(task_id)
+        if record.is_finished and not log.closed:
+            log.append(*self._final_event(record))
+            log.close()
+        return log
+
+    async def wait(self, task_id: str) -> Optional[TaskRecord]:
+        """等待任务结束，返回最终的任务记录"""
+        log = self.events(task_id)
+        if log is None:
+            return None
+
+        async for _ in log.follow():
+            pass
+        return self.store.get(task_id)
+
+    def describe(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "running": [record.task_id for record in self.running.values()],
+            "counts": self.store.counts(),
+        }
+
+    def _log(self, task_id: str) -> TaskEventLog:
+        log = self._logs.get(task_id)
+        if log is None:
+            log = TaskEventLog.load(task_id, event_log_path(self.event_dir, task_id))
+            self._logs[task_id] = log
+            self._prune_logs()
+        return log
+
+    def _prune_logs(self):
+        """只保留最近 max_logs 个已结束任务的事件日志"""
+        closed = [task_id for task_id, log in self._logs.items() if log.closed]
+        for task_id in closed[:max(0, len(closed) - self.max_logs)]:
+            del self._logs[task_id]
+
+    @staticmethod
+    def _final_event(record: TaskRecord) -> tuple:
+        if record.status == TASK_COMPLETED:
+            return "task_complete", {'taskId': record.task_id, 'message': record.result or '任务完成'}
+        if record.status == TASK_CANCELLED:
+            return "task_cancelled", {'taskId': record.task_id, 'message': '任务已取消'}
+        return "error", {'taskId': record.task_id, 'message': record.error or f'任务已{record.status}'}
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                timeout = await self._dispatch()
+            except Exception as e:
+                print(f"[TaskScheduler] Dispatch failed: {e}")
+                timeout = DEVICE_POLL_INTERVAL
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self) -> Optional[float]:
+        """
+        派发可以执行的任务
+
+        Returns:
+            float: 多少秒后需要再次检查（等待重试退避或空闲设备），None 表示等待唤醒
+        """
+        if len(self.running) >= self.max_workers:
+            return None
+
+        now = time.time()
+        timeout = None
+        busy = {record.device_id for record in self.running.values()}
+        online = None
+
+        for record in self.store.queued():
+            if len(self.running) >= self.max_workers:
+                break
+
+            if record.not_before > now:
+                delay = record.not_before - now
+                timeout = delay if timeout is None else min(timeout, delay)
+                continue
+
+            device_id = record.device_id
+            if device_id is None:
+                if online is None:
+                    online = await self.device_lister() if self.device_lister else []
+                device_id = next(
+                    (device for device in online if not self._device_busy(device, busy)), None
+                )
+                if device_id is None:
+                    timeout = min(timeout or DEVICE_POLL_INTERVAL, DEVICE_POLL_INTERVAL)
+                    continue
+                record.device_id = device_id
+            elif self._device_busy(device_id, busy):
+                continue
+
+            busy.add(device_id)
+            self._start(record)
+
+        return timeout
+
+    def _device_busy(self, device_id: str, busy: set) -> bool:
+        # 也检查 agent 池：被中断的步骤可能仍在设备上执行
+        return device_id in busy or self.agent_pool.running_task(device_id) is not None
+
+    def _start(self, record: TaskRecord):
+        record.status = TASK_RUNNING
+        record.attempts += 1
+        record.started_at = time.time()
+        self.store.save(record)
+
+        self.running[record.task_id] = record
+        self._workers[record.task_id] = asyncio.ensure_future(self._run(record))
+
+    async def _run(self, record: TaskRecord):
+        log = self._log(record.task_id)
+
+        try:
+            status, result, error = await self.runner.run(record, log)
+        except asyncio.CancelledError:
+            # 调度器停止：保持 running，下次启动时重新排队
+            raise
+        except Exception as e:
+            status, result, error = TASK_ERROR, None, str(e)
+        finally:
+            self.running.pop(record.task_id, None)
+            self._workers.pop(record.task_id, None)
+            self._wakeup.set()
+
+        state = self.agent_pool.get_task(record.task_id)
+        if state:
+            record.step = state.step
+
+        if (
+            status == TASK_ERROR
+            and record.attempts < record.max_attempts
+            and not self.agent_pool.is_cancelled(record.task_id)
+        ):
+            record.status = TASK_QUEUED
+            record.error = error
+            record.not_before = time.time() + self.retry_delay * record.attempts
+            self.store.save(record)
+
+            log.append("task_retry", {
+                'taskId': record.task_id,
+                'attempt': record.attempts,
+                'maxAttempts': record.max_attempts,
+                'retryAt': record.not_before,
+                'message': error,
+            })
+            return
+
+        record.status = status
+        record.result = result
+        record.error = error
+        record.ended_at = time.time()
+        self.store.save(record)
+
+        if status == TASK_ERROR:
+            log.append("error", {'taskId': record.task_id, 'message': error})
+        log.close()
+        self._prune_logs()
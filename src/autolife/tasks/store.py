@@ -0,0 +1,250 @@
+"""
+TaskStore - 任务队列的 SQLite 持久化
+
+每个任务一行（提交参数、状态、重试次数和结果），服务重启后排队中的任务继续执行，
+重启时仍处于执行中的任务重新排队。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from autolife.agent_pool import FINISHED_STATUSES, TASK_QUEUED, TASK_RUNNING
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL UNIQUE,
+    device_id TEXT,
+    text TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    ended_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 1,
+    not_before REAL NOT NULL DEFAULT 0,
+    step INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    options TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, priority, seq);
+"""
+
+COLUMNS = (
+    "seq", "task_id", "device_id", "text", "priority", "status", "created_at",
+    "started_at", "ended_at", "attempts", "max_attempts", "not_before", "step",
+    "result", "error", "options",
+)
+
+
+def default_path() -> Path:
+    """任务数据库路径，默认读取 AUTOLIFE_TASK_DB（默认 ./data/tasks.db）"""
+    return Path(os.getenv("AUTOLIFE_TASK_DB", "data/tasks.db"))
+
+
+@dataclass
+class TaskRecord:
+    """一个持久化的任务"""
+    task_id: str
+    text: str
+    # None 表示由调度器分配任意空闲设备
+    device_id: Optional[str] = None
+    # 数值越大越先执行，相同优先级按提交顺序
+    priority: int = 0
+    status: str = TASK_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    ended_at: Optional[float] = None
+    # 已执行次数和最多执行次数（失败后重试）
+    attempts: int = 0
+    max_attempts: int = 1
+    # 重试退避：此时间之前不会再次执行
+    not_before: float = 0
+    step: int = 0
+    result: Optional[str] = None
+    error: Optional[str] = None
+    # 执行选项（例如 record）
+    options: dict = field(default_factory=dict)
+    # 提交序号（数据库分配）
+    seq: int = 0
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "task_id": self.task_id,
+            "device_id": self.device_id,
+            "text": self.text,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "step": self.step,
+            "result": self.result,
+            "error": self.error,
+            "options": self.options,
+        }
+
+
+class TaskStore:
+    """
+    任务表（SQLite，线程安全）
+
+    示例：
+        >>> store = TaskStore("data/tasks.db")
+        >>> store.add(TaskRecord(task_id="task-1", text="打开设置"))
+        >>> store.queued()
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        """
+        Args:
+            path: 数据库文件，默认读取 AUTOLIFE_TASK_DB；":memory:" 表示不持久化
+        """
+        self.path = str(path or default_path())
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def add(self, record: TaskRecord) -> TaskRecord:
+        """
+        保存新任务
+
+        Raises:
+            ValueError: 任务 ID 已存在
+        """
+        values = self._values(record)
+        values.pop("seq")
+
+        try:
+            with self._lock, self._conn:
+                cursor = self._conn.execute(
+                    f"INSERT INTO tasks ({', '.join(values)}) VALUES ({', '.join('?' * len(values))})",
+                    list(values.values()),
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Task {record.task_id} already exists")
+
+        record.seq = cursor.lastrowid or 0
+        return record
+
+    def save(self, record: TaskRecord):
+        """更新任务的所有字段"""
+        values = self._values(record)
+        values.pop("seq")
+        task_id = values.pop("task_id")
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE tasks SET {', '.join(f'{name} = ?' for name in values)} WHERE task_id = ?",
+                [*values.values(), task_id],
+            )
+
+    def get(self, task_id: str) -> Optional[TaskRecord]:
+        rows = self._query("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
+        return rows[0] if rows else None
+
+    def list(
+        self,
+        status: Optional[str] = None,
+        device_id: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[TaskRecord]:
+        """最近提交的任务（最新的在前）"""
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if device_id:
+            conditions.append("device_id = ?")
+            params.append(device_id)
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self._query(
+            f"SELECT * FROM tasks {where} ORDER BY seq DESC LIMIT ?", (*params, limit)
+        )
+
+    def queued(self) -> List[TaskRecord]:
+        """排队中的任务，按执行顺序（优先级高的在前，相同优先级按提交顺序）"""
+        return self._query(
+            "SELECT * FROM tasks WHERE status = ? ORDER BY priority DESC, seq ASC", (TASK_QUEUED,)
+        )
+
+    def counts(self) -> dict:
+        """各状态的任务数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+    def recover(self) -> int:
+        """
+        服务重启后把仍处于执行中的任务重新排队
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET status = ?, started_at = NULL WHERE status = ?",
+                (TASK_QUEUED, TASK_RUNNING),
+            )
+        return cursor.rowcount
+
+    def purge(self, before: float) -> List[str]:
+        """
+        删除在某一时刻之前结束的任务
+
+        Returns:
+            List[str]: 删除的任务 ID
+        """
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        condition = f"status IN ({placeholders}) AND ended_at < ?"
+        params = (*FINISHED_STATUSES, before)
+
+        with self._lock, self._conn:
+            rows = self._conn.execute(f"SELECT task_id FROM tasks WHERE {condition}", params).fetchall()
+            self._conn.execute(f"DELETE FROM tasks WHERE {condition}", params)
+        return [row[0] for row in rows]
+
+    def _query(self, sql: str, params: tuple) -> List[TaskRecord]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._record(row) for row in rows]
+
+    @staticmethod
+    def _values(record: TaskRecord) -> dict:
+        values = {name: getattr(record, name) for name in COLUMNS}
+        values["options"] = json.dumps(record.options, ensure_ascii=False)
+        return values
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> TaskRecord:
+        data = {name: row[name] for name in COLUMNS}
+        data["options"] = json.loads(data["options"] or "{}")
+        return TaskRecord(**data)
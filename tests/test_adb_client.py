@@ -0,0 +1,218 @@
+"""
+AdbClient 单元测试
+
+在 FakeAdbServer（本地伪 adb server）上运行，不需要真机或 adb。
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.adb import AdbClient, AdbError, DeviceRegistry, FakeAdbServer
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def with_server(test, **kwargs):
+    """启动伪 server，用指向它的 AdbClient 执行 test(server, adb)"""
+    async with FakeAdbServer(**kwargs) as server:
+        adb = AdbClient(port=server.port, timeout=2.0)
+        try:
+            return await test(server, adb)
+        finally:
+            adb.close_sessions()
+
+
+@pytest.mark.unit
+class TestDevices:
+    """host:devices / host:track-devices"""
+
+    def test_devices(self):
+        async def test(server, adb):
+            devices = await adb.devices()
+            assert [(d.serial, d.state) for d in devices] == [
+                ("emu-1", "device"),
+                ("emu-2", "offline"),
+            ]
+            assert await adb.online_devices() == ["emu-1"]
+
+        run(with_server(test, devices={"emu-1": "device", "emu-2": "offline"}))
+
+    def test_devices_long(self):
+        async def test(server, adb):
+            devices = await adb.devices(long=True)
+            assert devices[0].model == "Fake_Phone"
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_track_devices(self):
+        async def test(server, adb):
+            changes = []
+            registry = DeviceRegistry(adb)
+            registry.add_listener(lambda *change: changes.append(change))
+
+            await registry.start(timeout=1.0)
+            try:
+                assert registry.is_ready
+                assert registry.online() == ["emu-1"]
+
+                server.set_device("emu-2", "device")
+                server.set_device("emu-1", None)
+                for _ in range(100):
+                    if len(changes) >= 3:
+                        break
+                    await asyncio.sleep(0.01)
+
+                assert registry.online() == ["emu-2"]
+                assert changes == [
+                    ("emu-1", None, "device"),
+                    ("emu-2", None, "device"),
+                    ("emu-1", "device", None),
+                ]
+            finally:
+                await registry.stop()
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+
+@pytest.mark.unit
+class TestShell:
+    """常驻 shell 会话和一次性 shell"""
+
+    def test_session_is_reused(self):
+        async def test(server, adb):
+            assert await adb.shell("emu-1", "echo hello") == "hello\n"
+            assert await adb.shell("emu-1", "wm size") == "Physical size: 1080x2400\n"
+
+            # 第一次建立 transport 连接，之后复用同一个会话
+            assert server.connection_count == 1
+            assert server.commands == [("emu-1", "echo hello"), ("emu-1", "wm size")]
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_exit_code(self):
+        async def test(server, adb):
+            assert (await adb.shell_result("emu-1", "true")).exit_code == 0
+            assert (await adb.shell_result("emu-1", "false")).exit_code == 1
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_custom_exit_code(self):
+        def handler(serial, command):
+            return "not found\n", 127
+
+        async def test(server, adb):
+            result = await adb.shell_result("emu-1", "missing")
+            assert result.output == "not found\n"
+            assert result.exit_code == 127
+
+        run(with_server(test, devices={"emu-1": "device"}, shell_handler=handler))
+
+    def test_fallback_without_raw_shell(self):
+        async def test(server, adb):
+            assert await adb.shell("emu-1", "echo hi") == "hi\n"
+            # 会话无法打开时命令还没有发送，退回一次性 shell 只执行一次
+            assert server.commands == [("emu-1", "echo hi")]
+
+        run(with_server(test, devices={"emu-1": "device"}, raw_shell=False))
+
+    def test_session_drop_does_not_rerun_command(self):
+        async def test(server, adb):
+            server.drop_sessions_on.add("input tap 540 1200")
+
+            with pytest.raises(AdbError):
+                await adb.shell_result("emu-1", "input tap 540 1200")
+
+            # 命令发送后会话断开：不能重试，否则点击会执行两次
+            assert server.commands == [("emu-1", "input tap 540 1200")]
+
+            # 断开的会话被丢弃，下一条命令使用新会话
+            assert await adb.shell("emu-1", "echo ok") == "ok\n"
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_idle_session_closed_by_peer(self):
+        async def test(server, adb):
+            await adb.shell("emu-1", "echo 1")
+
+            # 空闲会话被对端关闭（例如设备重连）
+            for session in adb._idle_sessions["emu-1"]:
+                session.connection.writer.transport.abort()
+            await asyncio.sleep(0.01)
+
+            assert await adb.shell("emu-1", "echo 2") == "2\n"
+            assert server.commands == [("emu-1", "echo 1"), ("emu-1", "echo 2")]
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_unknown_device(self):
+        async def test(server, adb):
+            with pytest.raises(AdbError):
+                await adb.exec_shell("emu-9", "echo hi")
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_timeout_covers_fallback(self):
+        async def slow_open(serial, service):
+            await asyncio.sleep(0.3)
+            raise AdbError("closed")
+
+        async def test(server, adb):
+            adb.open_stream = slow_open
+            adb.exec_shell = lambda serial, command: asyncio.sleep(0.3, "")
+
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with pytest.raises(asyncio.TimeoutError):
+                await adb.shell_result("emu-1", "echo hi", timeout=0.4)
+
+            # 常驻会话和退回共用一个超时
+            assert loop.time() - started < 0.55
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+
+@pytest.mark.unit
+class TestForward:
+    """host-serial:<serial>:forward / killforward"""
+
+    def test_forward_and_killforward(self):
+        async def test(server, adb):
+            await adb.forward("emu-1", "tcp:27183", "localabstract:scrcpy")
+            assert server.forwards == {"tcp:27183": ("emu-1", "localabstract:scrcpy")}
+
+            await adb.killforward("emu-1", "tcp:27183")
+            assert server.forwards == {}
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+    def test_killforward_unknown(self):
+        async def test(server, adb):
+            with pytest.raises(AdbError):
+                await adb.killforward("emu-1", "tcp:1")
+
+        run(with_server(test, devices={"emu-1": "device"}))
+
+
+@pytest.mark.unit
+class TestSync:
+    """sync: STAT / SEND"""
+
+    def test_push_and_stat(self, tmp_path):
+        local = tmp_path / "scrcpy-server"
+        local.write_bytes(b"x" * 200_000)
+
+        async def test(server, adb):
+            missing = await adb.stat("emu-1", "/data/local/tmp/scrcpy-server.jar")
+            assert not missing.exists
+
+            await adb.push("emu-1", str(local), "/data/local/tmp/scrcpy-server.jar")
+            assert server.files[("emu-1", "/data/local/tmp/scrcpy-server.jar")] == local.read_bytes()
+
+            stat = await adb.stat("emu-1", "/data/local/tmp/scrcpy-server.jar")
+            assert stat.exists
+            assert stat.size == 200_000
+
+        run(with_server(test, devices={"emu-1": "device"}))
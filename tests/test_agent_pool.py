@@ -0,0 +1,239 @@
+"""
+AgentPool 单元测试
+
+使用假的 agent 工厂，不需要模型服务或真机。
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from autolife.agent_pool import (
+    TASK_CANCELLED,
+    TASK_COMPLETED,
+    TASK_ERROR,
+    TASK_INTERRUPTED,
+    TASK_QUEUED,
+    TASK_RUNNING,
+    AgentPool,
+)
+from autolife.cancel import TaskCancelled
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeAgent:
+    def __init__(self, device_id):
+        self.device_id = device_id
+
+
+def make_pool(**kwargs):
+    return AgentPool(agent_factory=FakeAgent, **kwargs)
+
+
+@pytest.mark.unit
+class TestBusyDevice:
+    def test_same_device_queues_fifo(self):
+        async def test():
+            pool = make_pool()
+            first = await pool.acquire("t1", "d1", "a")
+            second = asyncio.ensure_future(pool.acquire("t2", "d1", "b"))
+            third = asyncio.ensure_future(pool.acquire("t3", "d1", "c"))
+            await asyncio.sleep(0.01)
+
+            assert not second.done() and not third.done()
+            assert pool.running_task("d1") is first
+            assert pool.get_task("t2").status == TASK_QUEUED
+            assert pool.queue_position("t2") == 1
+            assert pool.queue_position("t3") == 2
+
+            pool.release(first, TASK_COMPLETED, result="ok")
+            state = await asyncio.wait_for(second, 1)
+            assert state.status == TASK_RUNNING
+            assert not third.done()
+            assert pool.queue_position("t3") == 1
+
+            pool.release(state, TASK_COMPLETED)
+            pool.release(await asyncio.wait_for(third, 1), TASK_COMPLETED)
+            assert pool.running_task("d1") is None
+
+        run(test())
+
+    def test_duplicate_task_id(self):
+        async def test():
+            pool = make_pool()
+            state = await pool.acquire("t1", "d1", "a")
+            with pytest.raises(ValueError):
+                await pool.acquire("t1", "d2", "a")
+
+            # 结束后可以用同一 ID 重新提交
+            pool.release(state, TASK_COMPLETED)
+            pool.release(await pool.acquire("t1", "d1", "a"), TASK_COMPLETED)
+
+        run(test())
+
+    def test_one_agent_per_device(self):
+        pool = make_pool()
+        assert pool.get_agent("d1") is pool.get_agent("d1")
+        assert pool.get_agent("d2").device_id == "d2"
+        assert sorted(pool.describe()["agents"]) == ["d1", "d2"]
+
+
+@pytest.mark.unit
+class TestRelease:
+    def test_release_after_error_frees_device(self):
+        async def test():
+            pool = make_pool()
+            first = await pool.acquire("t1", "d1", "a")
+            waiting = asyncio.ensure_future(pool.acquire("t2", "d1", "b"))
+            await asyncio.sleep(0.01)
+
+            pool.release(first, TASK_ERROR, error="model timeout")
+            assert first.status == TASK_ERROR
+            assert first.error == "model timeout"
+            assert first.ended_at is not None
+
+            second = await asyncio.wait_for(waiting, 1)
+            assert second.status == TASK_RUNNING
+            pool.release(second, TASK_COMPLETED)
+
+        run(test())
+
+    def test_release_twice_is_ignored(self):
+        async def test():
+            pool = make_pool()
+            released = []
+            pool.add_release_listener(released.append)
+
+            state = await pool.acquire("t1", "d1", "a")
+            pool.release(state, TASK_CANCELLED)
+            pool.release(state, TASK_COMPLETED, result="late")
+
+            assert state.status == TASK_CANCELLED
+            assert state.result is None
+            assert released == [state]
+
+            # 锁只释放一次：下一个任务拿到设备后，重复的 release 不会让第三个任务同时执行
+            second = await pool.acquire("t2", "d1", "b")
+            pool.release(state, TASK_COMPLETED)
+            third = asyncio.ensure_future(pool.acquire("t3", "d1", "c"))
+            await asyncio.sleep(0.01)
+            assert not third.done()
+
+            pool.release(second, TASK_COMPLETED)
+            pool.release(await asyncio.wait_for(third, 1), TASK_COMPLETED)
+
+        run(test())
+
+    def test_listener_error_does_not_break_release(self):
+        async def test():
+            pool = make_pool()
+
+            def broken(state):
+                raise RuntimeError("boom")
+
+            pool.add_release_listener(broken)
+            state = await pool.acquire("t1", "d1", "a")
+            pool.release(state, TASK_COMPLETED)
+            pool.remove_release_listener(broken)
+
+            pool.release(await asyncio.wait_for(pool.acquire("t2", "d1", "b"), 1), TASK_COMPLETED)
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestConcurrentDevices:
+    def test_two_devices_run_at_the_same_time(self):
+        async def test():
+            pool = make_pool()
+            loop = asyncio.get_running_loop()
+            # 两台设备的步骤必须同时在执行，否则 barrier 超时
+            barrier = threading.Barrier(2, timeout=2)
+
+            async def task(task_id, device_id):
+                state = await pool.acquire(task_id, device_id, "run")
+                try:
+                    await loop.run_in_executor(None, barrier.wait)
+                    pool.release(state, TASK_COMPLETED)
+                except threading.BrokenBarrierError:
+                    pool.release(state, TASK_ERROR, error="not concurrent")
+                return state
+
+            states = await asyncio.gather(task("t1", "d1"), task("t2", "d2"))
+            assert [state.status for state in states] == [TASK_COMPLETED, TASK_COMPLETED]
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestCancel:
+    def test_cancel_queued_task(self):
+        async def test():
+            pool = make_pool()
+            first = await pool.acquire("t1", "d1", "a")
+            waiting = asyncio.ensure_future(pool.acquire("t2", "d1", "b"))
+            await asyncio.sleep(0.01)
+
+            assert pool.cancel("t2")
+            with pytest.raises(TaskCancelled):
+                await asyncio.wait_for(waiting, 1)
+            assert pool.get_task("t2").status == TASK_CANCELLED
+            assert first.status == TASK_RUNNING
+
+            pool.release(first, TASK_COMPLETED)
+            pool.release(await asyncio.wait_for(pool.acquire("t3", "d1", "c"), 1), TASK_COMPLETED)
+
+        run(test())
+
+    def test_cancel_before_submit(self):
+        async def test():
+            pool = make_pool()
+            assert not pool.cancel("t1")
+
+            with pytest.raises(TaskCancelled):
+                await pool.acquire("t1", "d1", "a")
+            assert pool.running_task("d1") is None
+
+        run(test())
+
+    def test_cancel_running_task_sets_token(self):
+        async def test():
+            pool = make_pool()
+            state = await pool.acquire("t1", "d1", "a")
+
+            assert pool.cancel("t1")
+            assert state.cancel_requested
+            # 执行中的任务由 runner 在步骤结束后 release
+            assert state.status == TASK_RUNNING
+            pool.release(state, TASK_CANCELLED)
+
+        run(test())
+
+    def test_waiter_interrupted_does_not_leak_lock(self):
+        async def test():
+            pool = make_pool()
+            first = await pool.acquire("t1", "d1", "a")
+            waiting = asyncio.ensure_future(pool.acquire("t2", "d1", "b"))
+            await asyncio.sleep(0.01)
+
+            # 客户端断开
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert pool.get_task("t2").status == TASK_INTERRUPTED
+
+            pool.release(first, TASK_COMPLETED)
+            pool.release(await asyncio.wait_for(pool.acquire("t3", "d1", "c"), 1), TASK_COMPLETED)
+
+        run(test())
+
+    def test_pending_cancels_bounded(self):
+        pool = make_pool(max_pending_cancels=2)
+        for task_id in ("t1", "t2", "t3"):
+            pool.cancel(task_id)
+
+        assert list(pool._pending_cancels) == ["t2", "t3"]
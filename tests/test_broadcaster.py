@@ -0,0 +1,215 @@
+"""
+NalBroadcaster 单元测试
+
+按 GOP 边界丢帧：落后超过延迟预算（按 PTS 计算的视频时长）时跳到最新的 SPS/PPS/IDR，
+被环形缓冲区覆盖时丢弃到下一个关键帧。
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.scrcpy.broadcaster import NalBroadcaster
+
+# 30 fps 的帧间隔（微秒）
+FRAME_US = 33_333
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def publish_gops(broadcaster, gops, gop_size=30, start_frame=0, timestamp=None):
+    """发布 gops 个 GOP（SPS + IDR + P 帧），返回下一帧的序号"""
+    frame = start_frame
+    for _ in range(gops):
+        for i in range(gop_size):
+            pts = frame * FRAME_US
+            if i == 0:
+                broadcaster.publish(b"sps%d" % frame, timestamp=timestamp, is_config=True)
+                broadcaster.publish(b"idr%d" % frame, timestamp=timestamp, is_keyframe=True, pts=pts)
+            else:
+                broadcaster.publish(b"p%d" % frame, timestamp=timestamp, pts=pts)
+            frame += 1
+    return frame
+
+
+def drain(subscriber):
+    packets = []
+    while (nal := subscriber.get_nowait()) is not None:
+        packets.append(nal)
+    return packets
+
+
+@pytest.mark.unit
+class TestFanOut:
+    def test_every_subscriber_gets_every_nal(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=64)
+            first, second = broadcaster.subscribe(), broadcaster.subscribe()
+
+            publish_gops(broadcaster, 1, gop_size=5)
+
+            expected = [b"sps0", b"idr0", b"p1", b"p2", b"p3", b"p4"]
+            assert drain(first) == expected
+            assert drain(second) == expected
+
+        run(test())
+
+    def test_subscribe_from_keyframe(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=64)
+            publish_gops(broadcaster, 2, gop_size=3)
+
+            subscriber = broadcaster.subscribe(from_keyframe=True)
+            assert subscriber.started_at_keyframe
+            assert drain(subscriber) == [b"sps3", b"idr3", b"p4", b"p5"]
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestLatencyBudget:
+    def test_burst_backlog_skips_to_newest_gop(self):
+        """积压成批到达（接收时间相同）时仍按 PTS 判断落后，跳到最新的 GOP"""
+        async def test():
+            broadcaster = NalBroadcaster(capacity=256)
+            subscriber = broadcaster.subscribe(latency_budget_ms=500)
+
+            publish_gops(broadcaster, 3, timestamp=100.0)
+
+            assert subscriber.lag_ms == pytest.approx(89 * FRAME_US / 1000)
+            assert subscriber.get_nowait() == b"sps60"
+            assert subscriber.get_nowait() == b"idr60"
+            assert subscriber.gop_skips == 1
+            assert subscriber.dropped == 62
+
+        run(test())
+
+    def test_within_budget_keeps_order(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=256)
+            subscriber = broadcaster.subscribe(latency_budget_ms=5000)
+
+            publish_gops(broadcaster, 3, timestamp=100.0)
+
+            assert len(drain(subscriber)) == 93
+            assert subscriber.gop_skips == 0
+
+        run(test())
+
+    def test_no_newer_keyframe_no_mid_gop_drop(self):
+        """超出预算但没有更新的关键帧时按顺序继续发送"""
+        async def test():
+            broadcaster = NalBroadcaster(capacity=256)
+            subscriber = broadcaster.subscribe(latency_budget_ms=100)
+
+            publish_gops(broadcaster, 1, gop_size=30)
+
+            packets = drain(subscriber)
+            assert packets[:2] == [b"sps0", b"idr0"]
+            assert len(packets) == 31
+            assert subscriber.dropped == 0
+
+        run(test())
+
+    def test_pts_reset_uses_arrival_time(self):
+        """PTS 倒退（编码器重启）时按接收时间计算落后"""
+        async def test():
+            broadcaster = NalBroadcaster(capacity=256)
+            subscriber = broadcaster.subscribe(latency_budget_ms=500)
+
+            publish_gops(broadcaster, 1, gop_size=10, start_frame=1000, timestamp=100.0)
+            publish_gops(broadcaster, 1, gop_size=10, timestamp=100.2)
+
+            assert subscriber.lag_ms == pytest.approx(200)
+            assert subscriber.get_nowait() == b"sps1000"
+            assert subscriber.gop_skips == 0
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestOverflow:
+    def test_overwritten_subscriber_resyncs_at_keyframe(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=16)
+            subscriber = broadcaster.subscribe()
+
+            # 3 个 GOP（33 个 NAL）超过容量，最新的同步点仍在缓冲区中
+            publish_gops(broadcaster, 3, gop_size=10)
+
+            assert subscriber.get_nowait() == b"sps20"
+            assert subscriber.get_nowait() == b"idr20"
+            assert subscriber.dropped == 22
+
+        run(test())
+
+    def test_overwritten_without_keyframe_waits_for_next(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=8)
+            subscriber = broadcaster.subscribe()
+
+            # 同步点已被覆盖：丢弃 P 帧，等待下一个关键帧
+            publish_gops(broadcaster, 1, gop_size=20)
+            assert subscriber.get_nowait() is None
+            assert subscriber.waiting_for_keyframe
+
+            publish_gops(broadcaster, 1, gop_size=2, start_frame=20)
+            assert drain(subscriber) == [b"sps20", b"idr20", b"p21"]
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestKeyframesOnly:
+    def test_only_newest_sync_group(self):
+        """只收到最新的参数集 + 关键帧，P 帧和旧的同步组被跳过"""
+        async def test():
+            broadcaster = NalBroadcaster(capacity=256)
+            subscriber = broadcaster.subscribe(keyframes_only=True)
+
+            publish_gops(broadcaster, 3, gop_size=5)
+            assert drain(subscriber) == [b"sps10", b"idr10"]
+
+            publish_gops(broadcaster, 1, gop_size=5, start_frame=15)
+            assert drain(subscriber) == [b"sps15", b"idr15"]
+
+            # P 帧属于正常过滤，不计入 dropped
+            assert subscriber.dropped == 0
+
+        run(test())
+
+    def test_max_fps_limits_groups(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=256)
+            subscriber = broadcaster.subscribe(keyframes_only=True, max_fps=20)
+
+            publish_gops(broadcaster, 1, gop_size=3)
+            # 第一组同样要等待一个间隔
+            assert subscriber.get_nowait() is None
+
+            packet = await asyncio.wait_for(subscriber.get_packet(), 1.0)
+            assert packet.data == b"sps0"
+            packet = await asyncio.wait_for(subscriber.get_packet(), 1.0)
+            assert packet.is_keyframe
+
+            publish_gops(broadcaster, 1, gop_size=3, start_frame=3)
+            assert subscriber.get_nowait() is None
+
+        run(test())
+
+    def test_overwritten_group_is_reselected(self):
+        async def test():
+            broadcaster = NalBroadcaster(capacity=8)
+            subscriber = broadcaster.subscribe(keyframes_only=True)
+
+            publish_gops(broadcaster, 1, gop_size=3)
+            assert subscriber.get_nowait() == b"sps0"
+
+            # 同步组还没发完就被覆盖，改发最新的同步组
+            publish_gops(broadcaster, 3, gop_size=3, start_frame=3)
+            assert drain(subscriber) == [b"sps9", b"idr9"]
+            assert subscriber.dropped == 1
+
+        run(test())
@@ -0,0 +1,183 @@
+"""
+任务取消单元测试（CancelToken / CancellableStream / 取消执行中的步骤）
+"""
+
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from autolife.agent_pool import TASK_CANCELLED, TASK_COMPLETED, AgentPool
+from autolife.cancel import CancellableStream, CancelToken, TaskCancelled
+from autolife.tasks import TaskRunner, TaskScheduler, TaskStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class BlockingStream:
+    """模型流式响应：close() 之前一直阻塞在下一个 chunk 上，关闭后读取报错"""
+
+    def __init__(self):
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield "first"
+        self.closed.wait(5)
+        raise ConnectionError("response closed")
+
+    def close(self):
+        self.closed.set()
+
+
+@pytest.mark.unit
+class TestCancelToken:
+    def test_cancel_runs_callbacks_once(self):
+        token = CancelToken("t1")
+        calls = []
+        token.add_callback(lambda: calls.append(1))
+
+        assert token.cancel()
+        assert not token.cancel()
+        assert calls == [1]
+        assert token.cancelled
+
+        with pytest.raises(TaskCancelled):
+            token.raise_if_cancelled()
+
+    def test_callback_added_after_cancel_runs_immediately(self):
+        token = CancelToken("t1")
+        token.cancel()
+
+        calls = []
+        token.add_callback(lambda: calls.append(1))
+        assert calls == [1]
+
+    def test_removed_callback_not_called(self):
+        token = CancelToken("t1")
+        calls = []
+        remove = token.add_callback(lambda: calls.append(1))
+        remove()
+
+        token.cancel()
+        assert calls == []
+
+    def test_wait_wakes_up_from_other_thread(self):
+        async def test():
+            token = CancelToken("t1")
+            waiter = asyncio.ensure_future(token.wait())
+
+            await asyncio.sleep(0.01)
+            assert not waiter.done()
+
+            threading.Timer(0.02, token.cancel).start()
+            await asyncio.wait_for(waiter, 1.0)
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestCancellableStream:
+    def test_cancel_closes_in_flight_stream(self):
+        token = CancelToken("t1")
+        stream = BlockingStream()
+        chunks = []
+        errors = []
+
+        def consume():
+            try:
+                for chunk in CancellableStream(stream, token):
+                    chunks.append(chunk)
+            except TaskCancelled as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=consume)
+        worker.start()
+        time.sleep(0.05)
+
+        # 工作线程正阻塞在下一个 chunk 上：取消时关闭响应，线程立即退出
+        token.cancel()
+        worker.join(1.0)
+
+        assert not worker.is_alive()
+        assert stream.closed.is_set()
+        assert chunks == ["first"]
+        assert len(errors) == 1
+
+    def test_read_error_without_cancel_propagates(self):
+        token = CancelToken("t1")
+        stream = BlockingStream()
+        stream.close()
+
+        with pytest.raises(ConnectionError):
+            list(CancellableStream(stream, token))
+
+
+class StepAgent:
+    """假 agent：step 在线程中执行，不检查取消令牌（模拟正在执行的设备动作）"""
+
+    def __init__(self, device_id):
+        self.step_seconds = 0.3
+        self.steps_finished = []
+        self.phone_agent = SimpleNamespace(reset=lambda: None, step=self._step, step_count=0)
+
+    def _step(self, text=None):
+        self.phone_agent.step_count += 1
+        time.sleep(self.step_seconds)
+        self.steps_finished.append(time.monotonic())
+        return SimpleNamespace(finished=True, message="完成", action=None, thinking="")
+
+    def use_cancel_token(self, token):
+        pass
+
+    def use_thinking_callback(self, callback):
+        pass
+
+    def generate_task_report(self, text, summary):
+        return "report"
+
+
+class NoStreamers:
+    def recording(self, device_id):
+        return None
+
+    def streamers_for(self, device_id):
+        return []
+
+
+@pytest.mark.unit
+class TestCancelDuringStep:
+    def test_queued_task_starts_after_cancelled_step_ends(self, tmp_path):
+        """取消执行中的任务后，设备在步骤结束时让出，同一设备排队的任务随即开始"""
+        async def test():
+            pool = AgentPool(agent_factory=StepAgent)
+            scheduler = TaskScheduler(
+                TaskStore(":memory:"),
+                TaskRunner(pool, NoStreamers(), mock=False),
+                event_dir=tmp_path,
+                retention=0,
+            )
+            await scheduler.start()
+            try:
+                first = scheduler.submit("a", device_id="d1")
+                second = scheduler.submit("b", device_id="d1")
+
+                await asyncio.sleep(0.1)
+                assert scheduler.cancel(first.task_id)
+                assert (await scheduler.wait(first.task_id)).status == TASK_CANCELLED
+
+                # 被取消的步骤仍在执行，设备尚未让出
+                assert scheduler.get(second.task_id).status == "queued"
+
+                record = await asyncio.wait_for(scheduler.wait(second.task_id), 2.0)
+                assert record.status == TASK_COMPLETED
+
+                agent = pool.get_agent("d1")
+                assert len(agent.steps_finished) == 2
+            finally:
+                await scheduler.stop()
+
+        run(test())
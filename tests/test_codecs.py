@@ -0,0 +1,222 @@
+"""
+视频编码格式单元测试
+
+参数集样本取自 libx265 / SVT-AV1 编码的真实码流。
+"""
+
+import pytest
+
+from autolife.scrcpy.codecs import (
+    AV1Codec,
+    H264Codec,
+    H265Codec,
+    _parse_av1_sequence_header,
+    _skip_profile_tier_level,
+    codec_from_header,
+    get_codec,
+    parse_av1_resolution,
+    parse_hevc_sps_resolution,
+)
+from autolife.scrcpy.h264 import BitReader
+from autolife.scrcpy.packet_reader import PACKET_FLAG_CONFIG, PACKET_FLAG_KEY_FRAME
+
+START_CODE = b"\x00\x00\x00\x01"
+
+# 1920x1080：编码尺寸 1920x1088，裁剪窗口去掉底部 8 行
+HEVC_VPS_1080 = bytes.fromhex("40010c01ffff016000000300900000030000030078959809")
+HEVC_SPS_1080 = bytes.fromhex(
+    "420101016000000300900000030000030078a003c08010e596566924cae68080000003008000000f04"
+)
+HEVC_PPS = bytes.fromhex("4401c172b46240")
+
+# 720x1280，3 个时间子层（sps_max_sub_layers_minus1 = 2）
+HEVC_SPS_SUB_LAYERS = bytes.fromhex(
+    "42010401600000030090000003000003005d0000a005a200501659594aca565924cae68080000003008000000f04"
+)
+
+# 640x360，没有裁剪窗口
+HEVC_SPS_640 = bytes.fromhex(
+    "42010101600000030090000003000003003fa00502016965959a4932b9a020000003002000000303c1"
+)
+
+# 1280x720 的 AV1 序列头 OBU（带 size 字段）
+AV1_SEQUENCE_HEADER = bytes.fromhex("0a0b0000002d4cffb3c02f8004")
+# 时间分隔符 OBU + 序列头（关键帧 packet 的开头）
+AV1_TEMPORAL_UNIT = bytes.fromhex("12000a0b0000002d4cffb3c6af9804")
+# av1C：marker + version、profile / level、色度等标志、保留字节，之后是 configOBUs
+AV1_AV1C = bytes.fromhex("81080c00") + AV1_SEQUENCE_HEADER
+
+
+def hevc_nal(nal_type: int) -> bytes:
+    return START_CODE + bytes([nal_type << 1, 0x01]) + b"\xaf\x00"
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = []
+
+    def write(self, value: int, count: int):
+        self.bits.extend((value >> (count - 1 - i)) & 1 for i in range(count))
+
+    def to_bytes(self) -> bytes:
+        bits = self.bits + [0] * (-len(self.bits) % 8)
+        return bytes(
+            int("".join(map(str, bits[i:i + 8])), 2) for i in range(0, len(bits), 8)
+        )
+
+
+@pytest.mark.unit
+class TestCodecLookup:
+    def test_get_codec(self):
+        assert isinstance(get_codec("H265"), H265Codec)
+        with pytest.raises(ValueError):
+            get_codec("vp9")
+
+    def test_codec_from_header(self):
+        assert isinstance(codec_from_header(b"\x00av1"), AV1Codec)
+        assert isinstance(codec_from_header(b"h264"), H264Codec)
+        assert codec_from_header(b"vp90") is None
+
+
+@pytest.mark.unit
+class TestH265Codec:
+    def test_config_key(self):
+        codec = H265Codec()
+        assert codec.config_key(START_CODE + HEVC_VPS_1080, 0) == H265Codec.NAL_TYPE_VPS
+        assert codec.config_key(b"\x00\x00\x01" + HEVC_SPS_1080, 0) == H265Codec.NAL_TYPE_SPS
+        assert codec.config_key(HEVC_PPS, 0) == H265Codec.NAL_TYPE_PPS
+        # SEI / 切片不是参数集
+        assert codec.config_key(hevc_nal(39), 0) is None
+        assert codec.config_key(hevc_nal(1), 0) is None
+
+    def test_is_keyframe(self):
+        codec = H265Codec()
+        # IRAP：BLA(16-18) / IDR(19, 20) / CRA(21)，22-23 为保留的 IRAP 类型
+        for nal_type in (16, 19, 20, 21, 23):
+            assert codec.is_keyframe(hevc_nal(nal_type), 0)
+        for nal_type in (0, 1, 9, 24, 32, 39):
+            assert not codec.is_keyframe(hevc_nal(nal_type), 0)
+        assert not codec.is_keyframe(START_CODE, 0)
+
+    def test_parse_resolution_from_config_packet(self):
+        config = b"".join(START_CODE + nal for nal in (HEVC_VPS_1080, HEVC_SPS_1080, HEVC_PPS))
+        assert H265Codec().parse_resolution(config) == (1920, 1080)
+
+    def test_parse_resolution_without_sps(self):
+        config = START_CODE + HEVC_VPS_1080 + START_CODE + HEVC_PPS
+        assert H265Codec().parse_resolution(config) is None
+
+
+@pytest.mark.unit
+class TestHevcSps:
+    def test_cropped(self):
+        assert parse_hevc_sps_resolution(START_CODE + HEVC_SPS_1080) == (1920, 1080)
+
+    def test_sub_layers(self):
+        assert parse_hevc_sps_resolution(HEVC_SPS_SUB_LAYERS) == (720, 1280)
+
+    def test_without_conformance_window(self):
+        assert parse_hevc_sps_resolution(HEVC_SPS_640) == (640, 360)
+
+    def test_not_sps(self):
+        assert parse_hevc_sps_resolution(HEVC_VPS_1080) is None
+        assert parse_hevc_sps_resolution(b"\x42") is None
+
+    def test_truncated(self):
+        for length in (3, 8, 16, 20):
+            assert parse_hevc_sps_resolution(HEVC_SPS_1080[:length]) is None
+
+    def test_skip_profile_tier_level_with_sub_layer_info(self):
+        writer = BitWriter()
+        writer.write(0, 96)  # general profile / tier / level
+        # 子层 0 带 profile 和 level，子层 1 只带 level
+        writer.write(0b11, 2)
+        writer.write(0b01, 2)
+        writer.write(0, 2 * (8 - 2))  # reserved
+        writer.write(0, 88)
+        writer.write(0, 8)
+        writer.write(0, 8)
+        writer.write(0b1011, 4)
+
+        reader = BitReader(writer.to_bytes())
+        _skip_profile_tier_level(reader, 2)
+        assert reader.bits(4) == 0b1011
+
+    def test_skip_profile_tier_level_single_layer(self):
+        reader = BitReader(bytes(12) + b"\xf0")
+        _skip_profile_tier_level(reader, 0)
+        assert reader.pos == 96
+        assert reader.bits(4) == 0b1111
+
+
+@pytest.mark.unit
+class TestAV1:
+    def test_codec_uses_packet_flags(self):
+        codec = AV1Codec()
+        assert codec.config_key(AV1_AV1C, PACKET_FLAG_CONFIG) == AV1Codec.CONFIG_KEY
+        assert codec.config_key(AV1_TEMPORAL_UNIT, PACKET_FLAG_KEY_FRAME) is None
+        assert codec.is_keyframe(b"", PACKET_FLAG_KEY_FRAME)
+        assert not codec.is_keyframe(AV1_TEMPORAL_UNIT, 0)
+
+    def test_sequence_header_obu(self):
+        assert parse_av1_resolution(AV1_SEQUENCE_HEADER) == (1280, 720)
+
+    def test_after_temporal_delimiter(self):
+        assert parse_av1_resolution(AV1_TEMPORAL_UNIT) == (1280, 720)
+
+    def test_av1c_prefixed(self):
+        assert AV1Codec().parse_resolution(AV1_AV1C) == (1280, 720)
+
+    def test_without_sequence_header(self):
+        assert parse_av1_resolution(bytes.fromhex("1200")) is None
+        assert parse_av1_resolution(b"") is None
+
+    def test_truncated(self):
+        for length in (1, 2, 6, len(AV1_SEQUENCE_HEADER) - 4):
+            assert parse_av1_resolution(AV1_SEQUENCE_HEADER[:length]) is None
+
+    def test_reduced_still_picture_header(self):
+        writer = BitWriter()
+        writer.write(0, 3)  # seq_profile
+        writer.write(1, 1)  # still_picture
+        writer.write(1, 1)  # reduced_still_picture_header
+        writer.write(8, 5)  # seq_level_idx[0]
+        writer.write(11, 4)  # frame_width_bits_minus_1
+        writer.write(10, 4)  # frame_height_bits_minus_1
+        writer.write(1080 - 1, 12)
+        writer.write(720 - 1, 11)
+
+        assert _parse_av1_sequence_header(writer.to_bytes()) == (1080, 720)
+
+    def test_timing_and_decoder_model_info(self):
+        writer = BitWriter()
+        writer.write(0, 3)  # seq_profile
+        writer.write(0, 1)  # still_picture
+        writer.write(0, 1)  # reduced_still_picture_header
+        writer.write(1, 1)  # timing_info_present_flag
+        writer.write(1, 32)  # num_units_in_display_tick
+        writer.write(60, 32)  # time_scale
+        writer.write(1, 1)  # equal_picture_interval
+        writer.write(0b00101, 5)  # uvlc：num_ticks_per_picture_minus_1 = 4
+        writer.write(1, 1)  # decoder_model_info_present_flag
+        writer.write(9, 5)  # buffer_delay_length_minus_1
+        writer.write(1, 32)  # num_units_in_decoding_tick
+        writer.write(0, 5)  # buffer_removal_time_length_minus_1
+        writer.write(0, 5)  # frame_presentation_time_length_minus_1
+        writer.write(1, 1)  # initial_display_delay_present_flag
+        writer.write(0, 5)  # operating_points_cnt_minus_1
+        writer.write(0, 12)  # operating_point_idc[0]
+        writer.write(9, 5)  # seq_level_idx[0] > 7
+        writer.write(0, 1)  # seq_tier[0]
+        writer.write(1, 1)  # decoder_model_present_for_this_op[0]
+        writer.write(0, 10)  # decoder_buffer_delay
+        writer.write(0, 10)  # encoder_buffer_delay
+        writer.write(0, 1)  # low_delay_mode_flag
+        writer.write(1, 1)  # initial_display_delay_present_for_this_op[0]
+        writer.write(0, 4)  # initial_display_delay_minus_1
+        writer.write(10, 4)  # frame_width_bits_minus_1
+        writer.write(10, 4)  # frame_height_bits_minus_1
+        writer.write(720 - 1, 11)
+        writer.write(1600 - 1, 11)
+
+        assert _parse_av1_sequence_header(writer.to_bytes()) == (720, 1600)
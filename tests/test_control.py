@@ -0,0 +1,231 @@
+"""
+scrcpy 控制消息单元测试
+
+消息按 scrcpy v3.3.3 的二进制格式逐字节比对；ScrcpyController 连接本地 socket 验证发送的内容。
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.scrcpy.control import (
+    KEY_ACTION_DOWN,
+    KEY_ACTION_UP,
+    MOTION_ACTION_DOWN,
+    MOTION_ACTION_MOVE,
+    MOTION_ACTION_UP,
+    POINTER_ID_MOUSE,
+    TEXT_MAX_LENGTH,
+    ScrcpyController,
+    encode_keycode,
+    encode_scroll,
+    encode_text,
+    encode_touch,
+    parse_keycode,
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def hex_bytes(text: str) -> bytes:
+    return bytes.fromhex(text.replace(" ", ""))
+
+
+@pytest.mark.unit
+class TestEncodeKeycode:
+    def test_layout(self):
+        message = encode_keycode(3, KEY_ACTION_DOWN)
+        assert len(message) == 14
+        assert message == hex_bytes("00 00 00000003 00000000 00000000")
+
+    def test_repeat_and_metastate(self):
+        message = encode_keycode(66, KEY_ACTION_UP, repeat=2, metastate=0x1001)
+        assert message == hex_bytes("00 01 00000042 00000002 00001001")
+
+
+@pytest.mark.unit
+class TestEncodeTouch:
+    def test_layout(self):
+        message = encode_touch(MOTION_ACTION_DOWN, 540, 1200, 576, 1280)
+        assert len(message) == 32
+        assert message == hex_bytes(
+            "02 00 fffffffffffffffe 0000021c 000004b0 0240 0500 ffff 00000000 00000000"
+        )
+
+    def test_pointer_id(self):
+        message = encode_touch(MOTION_ACTION_MOVE, 1, 2, 3, 4, pointer_id=POINTER_ID_MOUSE)
+        assert message[1] == MOTION_ACTION_MOVE
+        assert message[2:10] == hex_bytes("ffffffffffffffff")
+
+        message = encode_touch(MOTION_ACTION_MOVE, 1, 2, 3, 4, pointer_id=5)
+        assert message[2:10] == hex_bytes("0000000000000005")
+
+    def test_pressure_fixed_point(self):
+        def pressure(value):
+            return encode_touch(MOTION_ACTION_UP, 0, 0, 1, 1, pressure=value)[22:24]
+
+        # u16 定点数：1.0 取最大值 0xffff，其余为 value * 2^16
+        assert pressure(1.0) == hex_bytes("ffff")
+        assert pressure(0.5) == hex_bytes("8000")
+        assert pressure(0.25) == hex_bytes("4000")
+        assert pressure(0.0) == hex_bytes("0000")
+        assert pressure(2.0) == hex_bytes("ffff")
+        assert pressure(-1.0) == hex_bytes("0000")
+
+
+@pytest.mark.unit
+class TestEncodeScroll:
+    def test_layout(self):
+        message = encode_scroll(100, 200, 576, 1280, 0.0, 1.0)
+        assert len(message) == 21
+        assert message == hex_bytes("03 00000064 000000c8 0240 0500 0000 7fff 00000000")
+
+    def test_fixed_point_and_clamping(self):
+        def amounts(hscroll, vscroll):
+            return encode_scroll(0, 0, 1, 1, hscroll, vscroll)[13:17]
+
+        # i16 定点数：1.0 取最大值 0x7fff，其余为 value * 2^15
+        assert amounts(0.5, -0.5) == hex_bytes("4000 c000")
+        assert amounts(-1.0, 1.0) == hex_bytes("8000 7fff")
+        assert amounts(-3.0, 16.0) == hex_bytes("8000 7fff")
+
+
+@pytest.mark.unit
+class TestEncodeText:
+    def test_length_prefix(self):
+        assert encode_text("hi") == hex_bytes("01 00000002 6869")
+        assert encode_text("中") == hex_bytes("01 00000003 e4b8ad")
+        assert encode_text("") == hex_bytes("01 00000000")
+
+    def test_truncated_to_max_length(self):
+        message = encode_text("a" * 400)
+        assert message[:5] == hex_bytes("01 0000012c")
+        assert message[5:] == b"a" * TEXT_MAX_LENGTH
+
+    def test_truncated_at_character_boundary(self):
+        # 301 字节，第 300 字节落在最后一个汉字中间：整个字符被丢弃
+        message = encode_text("a" + "中" * 100)
+        assert message[:5] == hex_bytes("01 0000012a")
+        assert message[5:].decode("utf-8") == "a" + "中" * 99
+
+
+class ControlServer:
+    """记录收到的控制消息的本地 socket"""
+
+    def __init__(self):
+        self.received = bytearray()
+        self.server = None
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                break
+            self.received += data
+        writer.close()
+
+    async def wait_for(self, length: int) -> bytes:
+        for _ in range(200):
+            if len(self.received) >= length:
+                break
+            await asyncio.sleep(0.005)
+        return bytes(self.received)
+
+
+async def with_controller(test):
+    async with ControlServer() as server:
+        controller = await ScrcpyController.connect(server.port)
+        try:
+            return await test(server, controller)
+        finally:
+            controller.close()
+
+
+@pytest.mark.unit
+class TestScrcpyController:
+    def test_tap_scales_device_coordinates(self):
+        async def test(server, controller):
+            controller.set_screen_size(576, 1280)
+            controller.set_device_size(1080, 2400)
+
+            await controller.tap(540, 1200)
+
+            received = await server.wait_for(64)
+            assert received == (
+                encode_touch(MOTION_ACTION_DOWN, 288, 640, 576, 1280)
+                + encode_touch(MOTION_ACTION_UP, 288, 640, 576, 1280, pressure=0.0)
+            )
+
+        run(with_controller(test))
+
+    def test_to_screen_rotated_and_clamped(self):
+        async def test(server, controller):
+            # wm size 为竖屏，视频已旋转为横屏
+            controller.set_screen_size(1280, 576)
+            controller.set_device_size(1080, 2400)
+
+            assert controller.to_screen(1200, 540) == (640, 288)
+            assert controller.to_screen(-10, 5000) == (0, 575)
+
+        run(with_controller(test))
+
+    def test_press_key(self):
+        async def test(server, controller):
+            await controller.press_key(parse_keycode("home"))
+
+            received = await server.wait_for(28)
+            assert received == encode_keycode(3, KEY_ACTION_DOWN) + encode_keycode(3, KEY_ACTION_UP)
+
+        run(with_controller(test))
+
+    def test_long_text_split_at_character_boundaries(self):
+        async def test(server, controller):
+            text = "a" + "中" * 200
+            await controller.text(text)
+
+            received = await server.wait_for(len(text.encode("utf-8")) + 15)
+            assert received == (
+                encode_text("a" + "中" * 99)
+                + encode_text("中" * 100)
+                + encode_text("中")
+            )
+
+        run(with_controller(test))
+
+    def test_unknown_touch_action(self):
+        async def test(server, controller):
+            with pytest.raises(ValueError):
+                await controller.touch("press", 0, 0)
+
+        run(with_controller(test))
+
+    def test_send_after_close(self):
+        async def test(server, controller):
+            controller.close()
+            with pytest.raises(ConnectionError):
+                await controller.tap(0, 0)
+
+        run(with_controller(test))
+
+
+@pytest.mark.unit
+class TestParseKeycode:
+    def test_names(self):
+        assert parse_keycode("HOME") == 3
+        assert parse_keycode(" keycode_back ") == 4
+        assert parse_keycode("66") == 66
+        assert parse_keycode("UNKNOWN") is None
@@ -0,0 +1,264 @@
+"""
+输入事件分发单元测试（InputDispatcher / parse_input_event）
+
+使用假的控制通道和 AdbClient，不需要真机。
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.adb import AdbError
+from autolife.scrcpy import input as input_module
+from autolife.scrcpy.input import InputDispatcher, parse_input_event
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def touch(action, x, y, pointer_id=-2):
+    return parse_input_event({"type": "touch", "action": action, "x": x, "y": y, "pointer_id": pointer_id})
+
+
+class FakeController:
+    """记录收到的调用的控制通道"""
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def touch(self, action, x, y, pointer_id):
+        if self.fail:
+            raise ConnectionError("control socket closed")
+        self.calls.append(("touch", action, x, y, pointer_id))
+
+    async def press_key(self, keycode):
+        self.calls.append(("key", keycode))
+
+    async def text(self, text):
+        self.calls.append(("text", text))
+
+    async def scroll(self, x, y, hscroll, vscroll):
+        self.calls.append(("scroll", x, y, hscroll, vscroll))
+
+
+class FakeAdb:
+    def __init__(self, fail_on=None):
+        self.commands = []
+        self.fail_on = fail_on
+
+    async def shell(self, serial, command):
+        self.commands.append((serial, command))
+        if command == self.fail_on:
+            raise AdbError("device offline")
+        return ""
+
+
+async def dispatch_all(dispatcher, events):
+    """提交事件，等待 worker 全部发送"""
+    dispatcher.attach()
+    for event in events:
+        dispatcher.submit(event)
+    assert await dispatcher.detach()
+
+
+@pytest.mark.unit
+class TestParseInputEvent:
+    def test_dict(self):
+        event = parse_input_event({"type": "touch", "action": "down", "x": "10", "y": 20})
+        assert event == {"type": "touch", "action": "down", "x": 10.0, "y": 20.0, "pointer_id": -2}
+
+    def test_compact(self):
+        assert parse_input_event(["m", 1, 2, 3]) == {
+            "type": "touch", "action": "move", "x": 1.0, "y": 2.0, "pointer_id": 3,
+        }
+        assert parse_input_event(["k", "HOME"]) == {"type": "key", "key": "HOME", "keycode": 3}
+        assert parse_input_event(["t", 42]) == {"type": "text", "text": "42"}
+        assert parse_input_event(["s", 1, 2, 0, -1]) == {
+            "type": "scroll", "x": 1.0, "y": 2.0, "hscroll": 0.0, "vscroll": -1.0,
+        }
+
+    @pytest.mark.parametrize("message", [
+        None,
+        [],
+        ["x", 1, 2],
+        ["d", 1],
+        {"type": "touch", "action": "press", "x": 1, "y": 2},
+        {"type": "touch", "action": "down", "x": "left", "y": 2},
+        {"type": "key", "key": "NOT_A_KEY"},
+        {"type": "swipe"},
+    ])
+    def test_invalid(self, message):
+        with pytest.raises(ValueError):
+            parse_input_event(message)
+
+
+@pytest.mark.unit
+class TestSubmit:
+    def make(self, **kwargs):
+        return InputDispatcher("d1", lambda: None, FakeAdb(), **kwargs)
+
+    def test_consecutive_moves_collapse(self):
+        dispatcher = self.make()
+        dispatcher.submit(touch("down", 0, 0))
+        for x in range(1, 6):
+            dispatcher.submit(touch("move", x, x))
+
+        assert list(dispatcher._queue) == [touch("down", 0, 0), touch("move", 5, 5)]
+        assert dispatcher.received == 6
+        assert dispatcher.coalesced == 4
+
+    def test_moves_from_different_pointers_kept(self):
+        dispatcher = self.make()
+        dispatcher.submit(touch("move", 1, 1, pointer_id=0))
+        dispatcher.submit(touch("move", 2, 2, pointer_id=1))
+        dispatcher.submit(touch("move", 3, 3, pointer_id=0))
+
+        assert [event["pointer_id"] for event in dispatcher._queue] == [0, 1, 0]
+        assert dispatcher.coalesced == 0
+
+    def test_moves_not_merged_across_other_events(self):
+        dispatcher = self.make()
+        dispatcher.submit(touch("move", 1, 1))
+        dispatcher.submit(touch("up", 1, 1))
+        dispatcher.submit(touch("move", 2, 2))
+
+        assert dispatcher.pending == 3
+
+    def test_cap_drops_oldest_move(self):
+        dispatcher = self.make(max_pending=3)
+        dispatcher.submit(touch("down", 0, 0))
+        dispatcher.submit(touch("move", 1, 1, pointer_id=0))
+        dispatcher.submit(touch("move", 2, 2, pointer_id=1))
+        dispatcher.submit(touch("up", 3, 3))
+
+        assert list(dispatcher._queue) == [
+            touch("down", 0, 0),
+            touch("move", 2, 2, pointer_id=1),
+            touch("up", 3, 3),
+        ]
+        assert dispatcher.coalesced == 1
+
+    def test_cap_keeps_non_move_events(self):
+        dispatcher = self.make(max_pending=2)
+        dispatcher.submit(touch("down", 0, 0))
+        dispatcher.submit(touch("up", 0, 0))
+        dispatcher.submit(parse_input_event(["k", "HOME"]))
+
+        # 没有可丢弃的 move 时不丢弃按下 / 抬起 / 按键
+        assert dispatcher.pending == 3
+
+
+@pytest.mark.unit
+class TestControlChannel:
+    def test_events_in_order(self):
+        controller = FakeController()
+        dispatcher = InputDispatcher("d1", lambda: controller, FakeAdb(), move_rate=0)
+
+        run(dispatch_all(dispatcher, [
+            touch("down", 1, 2),
+            touch("move", 3, 4),
+            touch("up", 3, 4),
+            parse_input_event(["k", "BACK"]),
+            parse_input_event(["t", "hi"]),
+            parse_input_event(["s", 5, 6, 0, 1]),
+        ]))
+
+        assert controller.calls == [
+            ("touch", "down", 1.0, 2.0, -2),
+            ("touch", "move", 3.0, 4.0, -2),
+            ("touch", "up", 3.0, 4.0, -2),
+            ("key", 4),
+            ("text", "hi"),
+            ("scroll", 5.0, 6.0, 0.0, 1.0),
+        ]
+        assert dispatcher.dispatched == 6
+        assert dispatcher.channel == "control"
+
+    def test_falls_back_to_adb_when_control_fails(self):
+        adb = FakeAdb()
+        dispatcher = InputDispatcher("d1", lambda: FakeController(fail=True), adb)
+
+        run(dispatch_all(dispatcher, [touch("down", 10, 20), touch("up", 10, 20)]))
+
+        assert adb.commands == [("d1", "input tap 10 20")]
+
+
+@pytest.mark.unit
+class TestAdbFallback:
+    def test_down_up_becomes_tap(self):
+        adb = FakeAdb()
+        dispatcher = InputDispatcher("d1", lambda: None, adb)
+
+        run(dispatch_all(dispatcher, [touch("down", 100, 200), touch("up", 104, 195)]))
+
+        assert adb.commands == [("d1", "input tap 100 200")]
+        assert dispatcher.channel == "adb"
+
+    def test_down_move_up_becomes_swipe(self):
+        adb = FakeAdb()
+        dispatcher = InputDispatcher("d1", lambda: None, adb, move_rate=0)
+
+        run(dispatch_all(dispatcher, [
+            touch("down", 100, 1000),
+            touch("move", 100, 800),
+            touch("move", 100, 600),
+            touch("up", 100, 400),
+        ]))
+
+        # move 不单独发送；持续时间很短时至少 50ms
+        assert adb.commands == [("d1", "input swipe 100 1000 100 400 50")]
+
+    def test_long_press_becomes_swipe(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(input_module.time, "monotonic", lambda: now[0])
+        dispatcher = InputDispatcher("d1", lambda: None, FakeAdb())
+
+        assert dispatcher._gesture_command(touch("down", 50, 60)) is None
+        now[0] += 0.5
+        assert dispatcher._gesture_command(touch("up", 52, 61)) == "input swipe 50 60 52 61 500"
+
+    def test_gestures_tracked_per_pointer(self):
+        dispatcher = InputDispatcher("d1", lambda: None, FakeAdb())
+
+        assert dispatcher._gesture_command(touch("down", 10, 10, pointer_id=0)) is None
+        assert dispatcher._gesture_command(touch("down", 500, 500, pointer_id=1)) is None
+        assert dispatcher._gesture_command(touch("up", 500, 500, pointer_id=1)) == "input tap 500 500"
+        assert dispatcher._gesture_command(touch("up", 10, 10, pointer_id=0)) == "input tap 10 10"
+
+    def test_up_without_down_ignored(self):
+        adb = FakeAdb()
+        dispatcher = InputDispatcher("d1", lambda: None, adb)
+
+        run(dispatch_all(dispatcher, [touch("move", 1, 1), touch("up", 1, 1)]))
+
+        assert adb.commands == []
+
+    def test_key_text_and_scroll(self):
+        adb = FakeAdb()
+        dispatcher = InputDispatcher("d1", lambda: None, adb)
+
+        run(dispatch_all(dispatcher, [
+            parse_input_event(["k", "HOME"]),
+            parse_input_event(["t", "hello world"]),
+            parse_input_event(["s", 1, 2, 0, -1]),
+        ]))
+
+        # adb shell input 没有滚轮事件
+        assert adb.commands == [
+            ("d1", "input keyevent 3"),
+            ("d1", "input text hello%sworld"),
+        ]
+
+    def test_failed_command_does_not_stop_worker(self):
+        adb = FakeAdb(fail_on="input keyevent 3")
+        dispatcher = InputDispatcher("d1", lambda: None, adb)
+
+        run(dispatch_all(dispatcher, [
+            parse_input_event(["k", "HOME"]),
+            parse_input_event(["k", "BACK"]),
+        ]))
+
+        assert [command for _, command in adb.commands] == ["input keyevent 3", "input keyevent 4"]
+        assert dispatcher.dispatched == 1
@@ -0,0 +1,136 @@
+"""
+PacketBuffer / SocketPacketReader 单元测试
+"""
+
+import socket
+import struct
+
+import pytest
+
+from autolife.scrcpy.packet_reader import (
+    METADATA_HEADER_SIZE,
+    PACKET_FLAG_CONFIG,
+    PACKET_FLAG_KEY_FRAME,
+    PacketBuffer,
+    PacketTooLargeError,
+    SocketPacketReader,
+    pts_from_flags,
+)
+
+
+def packet(data: bytes, pts_flags: int = 0) -> bytes:
+    return struct.pack(">QI", pts_flags, len(data)) + data
+
+
+def write(buffer: PacketBuffer, data: bytes) -> bytes:
+    """写入缓冲区能容纳的部分，返回剩余数据"""
+    writable = buffer.writable()
+    size = min(len(writable), len(data))
+    writable[:size] = data[:size]
+    buffer.commit(size)
+    return data[size:]
+
+
+def feed(buffer: PacketBuffer, data: bytes, chunk_size: int):
+    """按 chunk_size 分段写入，返回解析出的 (packet, pts_flags)"""
+    packets = []
+    for offset in range(0, len(data), chunk_size):
+        chunk = data[offset:offset + chunk_size]
+        while chunk:
+            chunk = write(buffer, chunk)
+
+            while (item := buffer.next_packet()) is not None:
+                packets.append((item, buffer.last_pts_flags))
+    return packets
+
+
+@pytest.mark.unit
+class TestPacketBuffer:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 4096])
+    def test_split_reads(self, chunk_size):
+        """packet 被任意切分也能完整解析（不失步）"""
+        stream = (
+            packet(b"sps", PACKET_FLAG_CONFIG)
+            + packet(b"idr" * 1000, PACKET_FLAG_KEY_FRAME | 1000)
+            + packet(b"p", 2000)
+        )
+
+        packets = feed(PacketBuffer(capacity=64), stream, chunk_size)
+
+        assert packets == [
+            (b"sps", PACKET_FLAG_CONFIG),
+            (b"idr" * 1000, PACKET_FLAG_KEY_FRAME | 1000),
+            (b"p", 2000),
+        ]
+
+    def test_grows_for_large_packet(self):
+        buffer = PacketBuffer(capacity=16)
+        data = bytes(range(256)) * 40
+
+        assert feed(buffer, packet(data), 1000) == [(data, 0)]
+        assert buffer.capacity >= len(data)
+
+    def test_zero_size_packet_is_skipped(self):
+        buffer = PacketBuffer(capacity=64)
+        assert feed(buffer, packet(b"") + packet(b"x", 5), 64) == [(b"x", 5)]
+
+    def test_too_large(self):
+        buffer = PacketBuffer(capacity=64, max_packet_size=100)
+        view = buffer.writable()
+        header = struct.pack(">QI", 0, 101)
+        view[:len(header)] = header
+        buffer.commit(len(header))
+
+        with pytest.raises(PacketTooLargeError):
+            buffer.next_packet()
+
+    def test_read_exact_header(self):
+        buffer = PacketBuffer(capacity=32)
+        header = bytes(range(METADATA_HEADER_SIZE))
+
+        write(buffer, header[:10])
+        # 数据不足：返回 None，并预留整个元数据头的空间
+        assert buffer.read_exact(METADATA_HEADER_SIZE) is None
+
+        rest = header[10:] + packet(b"nal")
+        while rest:
+            rest = write(buffer, rest)
+        assert buffer.read_exact(METADATA_HEADER_SIZE) == header
+        assert buffer.next_packet() == b"nal"
+
+    def test_borrowed_view(self):
+        buffer = PacketBuffer(capacity=64)
+        write(buffer, packet(b"abc"))
+
+        borrowed = buffer.next_packet(copy=False)
+        assert isinstance(borrowed, memoryview)
+        assert bytes(borrowed) == b"abc"
+
+    def test_pts_from_flags(self):
+        assert pts_from_flags(PACKET_FLAG_CONFIG) is None
+        assert pts_from_flags(PACKET_FLAG_KEY_FRAME | 123) == 123
+
+
+@pytest.mark.unit
+class TestSocketPacketReader:
+    def test_timeout_keeps_partial_packet(self):
+        left, right = socket.socketpair()
+        try:
+            left.settimeout(0.05)
+            reader = SocketPacketReader(left, capacity=64)
+            data = packet(b"x" * 100, 42)
+
+            right.sendall(data[:50])
+            # 超时返回 None，已读到的半个 packet 保留
+            assert reader.read_packet() is None
+
+            right.sendall(data[50:])
+            assert reader.read_packet() == b"x" * 100
+            assert reader.buffer.last_pts_flags == 42
+
+            right.close()
+            assert reader.read_packet() is None
+            assert reader.eof
+        finally:
+            left.close()
+            right.close()
@@ -0,0 +1,301 @@
+"""
+StreamerPool 单元测试
+
+使用假的 streamer 工厂，不启动 scrcpy-server。
+"""
+
+import asyncio
+import socket
+
+import pytest
+
+from autolife.scrcpy import StreamerPool, StreamerPoolFull
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def free_port_range(count: int) -> int:
+    """找一段可以绑定的连续本地端口，返回起点"""
+    for _ in range(50):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            base = sock.getsockname()[1]
+        if base + count > 65535:
+            continue
+
+        sockets = []
+        try:
+            for port in range(base, base + count):
+                sock = socket.socket()
+                sockets.append(sock)
+                sock.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+
+    pytest.skip("no free local port range")
+
+
+class StubStreamer:
+    """记录启动参数的假 streamer"""
+
+    # 启动失败的编码格式（模拟设备编码器不支持）
+    unsupported_codecs = set()
+
+    def __init__(self, device_id, port, scid, video_codec="h264", **kwargs):
+        self.device_id = device_id
+        self.port = port
+        self.scid = scid
+        self.video_codec = video_codec
+        self.kwargs = kwargs
+        self.is_running = False
+        self.controller = None
+        self.stop_count = 0
+
+    async def start(self):
+        if self.video_codec in self.unsupported_codecs:
+            raise RuntimeError(f"{self.video_codec} encoder not found")
+        self.is_running = True
+
+    async def stop(self):
+        self.is_running = False
+        self.stop_count += 1
+
+
+def make_pool(**kwargs):
+    kwargs.setdefault("base_port", free_port_range(8))
+    kwargs.setdefault("max_devices", 2)
+    kwargs.setdefault("idle_grace", 0.05)
+    return StreamerPool(streamer_factory=StubStreamer, **kwargs)
+
+
+@pytest.mark.unit
+class TestPorts:
+    def test_port_and_scid_per_device(self):
+        async def test():
+            pool = make_pool()
+            first = await pool.get_or_start("d1")
+            second = await pool.get_or_start("d2")
+
+            assert first.port == pool.base_port
+            assert second.port == pool.base_port + 1
+            assert first.scid == f"{first.port:08x}"
+            assert second.scid != first.scid
+            assert await pool.get_or_start("d1") is first
+
+            await pool.stop_all()
+
+        run(test())
+
+    def test_port_freed_on_stop(self):
+        async def test():
+            pool = make_pool()
+            first = await pool.get_or_start("d1")
+            await pool.get_or_start("d2")
+
+            assert await pool.stop("d1")
+            assert first.stop_count == 1
+            assert "d1" not in pool
+
+            third = await pool.get_or_start("d3")
+            assert third.port == first.port
+
+            await pool.stop_all()
+            assert len(pool) == 0
+
+        run(test())
+
+    def test_max_devices(self):
+        async def test():
+            pool = make_pool(max_devices=1)
+            await pool.get_or_start("d1")
+
+            with pytest.raises(StreamerPoolFull):
+                await pool.get_or_start("d2")
+
+            # 同一设备的其他 profile 不占用设备名额
+            await pool.get_or_start("d1", "thumbnail")
+            assert len(pool) == 2
+
+            await pool.stop_all()
+
+        run(test())
+
+    def test_skips_port_in_use(self):
+        async def test():
+            pool = make_pool()
+
+            with socket.socket() as occupied:
+                occupied.bind(("127.0.0.1", pool.base_port))
+                streamer = await pool.get_or_start("d1")
+
+            assert streamer.port == pool.base_port + 1
+            await pool.stop_all()
+
+        run(test())
+
+    def test_failed_start_releases_port(self):
+        async def test():
+            pool = make_pool()
+            StubStreamer.unsupported_codecs = {"h264"}
+            try:
+                with pytest.raises(RuntimeError):
+                    await pool.get_or_start("d1")
+            finally:
+                StubStreamer.unsupported_codecs = set()
+
+            assert pool._starting == {}
+            assert (await pool.get_or_start("d1")).port == pool.base_port
+            await pool.stop_all()
+
+        run(test())
+
+    def test_codec_fallback_remembered(self):
+        async def test():
+            pool = make_pool()
+            StubStreamer.unsupported_codecs = {"h265"}
+            try:
+                streamer = await pool.get_or_start("d1", "hifi")
+            finally:
+                StubStreamer.unsupported_codecs = set()
+
+            assert streamer.video_codec == "h264"
+            assert pool.resolve_profile("d1", "hifi").codec == "h264"
+            assert pool.resolve_profile("d2", "hifi").codec == "h265"
+            assert await pool.get_or_start("d1", "hifi") is streamer
+
+            await pool.stop_all()
+
+        run(test())
+
+
+@pytest.mark.unit
+class TestRefcount:
+    def test_stopped_after_idle_grace(self):
+        async def test():
+            pool = make_pool()
+            streamer = await pool.acquire("d1")
+            assert pool.refcount("d1") == 1
+
+            pool.release("d1")
+            assert pool.refcount("d1") == 0
+            assert "d1" in pool
+
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert "d1" not in pool
+            assert streamer.stop_count == 1
+
+        run(test())
+
+    def test_reacquire_during_grace_cancels_stop(self):
+        async def test():
+            pool = make_pool()
+            streamer = await pool.acquire("d1")
+            pool.release("d1")
+
+            await asyncio.sleep(pool.idle_grace / 2)
+            assert await pool.acquire("d1") is streamer
+
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert pool.get("d1") is streamer
+            assert streamer.stop_count == 0
+            assert not pool._idle_tasks
+
+            pool.release("d1")
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert streamer.stop_count == 1
+
+        run(test())
+
+    def test_multiple_subscribers(self):
+        async def test():
+            pool = make_pool()
+            streamer = await pool.acquire("d1")
+            assert await pool.acquire("d1") is streamer
+            assert pool.refcount("d1") == 2
+
+            pool.release("d1")
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert streamer.is_running
+
+            pool.release("d1")
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert not streamer.is_running
+
+        run(test())
+
+    def test_refcount_never_negative(self):
+        async def test():
+            pool = make_pool()
+            await pool.acquire("d1")
+
+            pool.release("d1")
+            pool.release("d1")
+            pool.release("d2")
+            assert pool.refcount("d1") == 0
+            assert pool.refcount("d2") == 0
+
+            # 多余的 release 之后，一次 acquire 仍然持有 streamer
+            streamer = await pool.acquire("d1")
+            assert pool.refcount("d1") == 1
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert streamer.is_running
+
+            pool.release("d1")
+            await pool.stop_all()
+
+        run(test())
+
+    def test_failed_acquire_releases_reference(self):
+        async def test():
+            pool = make_pool(max_devices=1)
+            await pool.get_or_start("d1")
+
+            with pytest.raises(StreamerPoolFull):
+                await pool.acquire("d2")
+            assert pool.refcount("d2") == 0
+
+            await pool.stop_all()
+
+        run(test())
+
+    def test_fallback_moves_reference(self):
+        async def test():
+            pool = make_pool()
+            StubStreamer.unsupported_codecs = {"h265"}
+            try:
+                streamer = await pool.acquire("d1", "hifi")
+            finally:
+                StubStreamer.unsupported_codecs = set()
+
+            # 引用计数记在实际使用的 H.264 streamer 上
+            assert pool.refcount("d1", "hifi") == 1
+            assert pool._refcounts == {("d1", pool.resolve_profile("d1", "hifi").encoder_id): 1}
+
+            pool.release("d1", "hifi")
+            await asyncio.sleep(pool.idle_grace * 3)
+            assert streamer.stop_count == 1
+
+        run(test())
+
+    def test_prewarmed_streamer_stops_when_unused(self):
+        async def test():
+            pool = make_pool()
+            results = await pool.start_many(["d1", "d2", "d1"], profile="thumbnail")
+            assert list(results) == ["d1", "d2"]
+
+            streamer = await pool.acquire("d1", "thumbnail")
+            await asyncio.sleep(pool.idle_grace * 3)
+
+            assert pool.streamers_for("d1") == [streamer]
+            assert "d2" not in pool
+
+            pool.release("d1", "thumbnail")
+            await pool.stop_all()
+
+        run(test())
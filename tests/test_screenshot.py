@@ -0,0 +1,117 @@
+"""
+ScreenshotProvider 单元测试
+
+使用假的 streamer / 解码器，不需要真机或 PyAV。
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.adb import AdbError, DisplayMetricsCache
+from autolife.scrcpy import Frame, ScreenshotProvider
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeAdb:
+    def __init__(self, output="Physical size: 1080x2400\nPhysical density: 440\n"):
+        self.output = output
+        self.commands = []
+
+    async def shell(self, serial, command):
+        self.commands.append((serial, command))
+        if self.output is None:
+            raise AdbError("device offline")
+        return self.output
+
+
+class FakeDecoder:
+    is_running = True
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    async def snapshot(self, format=None, newer_than=None, timeout=None):
+        return self.frame
+
+
+class FakeStreamer:
+    """未开启控制的流：不查询物理分辨率"""
+
+    is_running = True
+    device_width = 1280
+    device_height = 576
+
+    def __init__(self, adb, frame, physical_size=(0, 0)):
+        self.displays = DisplayMetricsCache(adb)
+        self.physical_width, self.physical_height = physical_size
+        self.decoder = FakeDecoder(frame)
+
+    def acquire_decoder(self, **kwargs):
+        return self.decoder
+
+    async def release_decoder(self, decoder):
+        pass
+
+
+class FakePool:
+    def __init__(self, streamer):
+        self.streamer = streamer
+        self.streamers = {("d1", "default"): streamer}
+
+    def streamers_for(self, device_id):
+        return [self.streamer]
+
+
+def landscape_frame():
+    return Frame(device_id="d1", format="png", data=b"png", width=1280, height=576)
+
+
+async def capture_size(streamer):
+    provider = ScreenshotProvider(FakePool(streamer), idle_timeout=60)
+    try:
+        frame = await provider.capture("d1")
+        return provider._screen_size(frame)
+    finally:
+        await provider.stop()
+
+
+@pytest.mark.unit
+class TestScreenSize:
+    def test_control_off_uses_display_cache(self):
+        """没有开启控制时按 wm size 换算，并按画面方向旋转"""
+        adb = FakeAdb()
+        streamer = FakeStreamer(adb, landscape_frame())
+
+        assert run(capture_size(streamer)) == (2400, 1080)
+        assert adb.commands == [("d1", "wm size; wm density")]
+
+    def test_display_cache_queried_once(self):
+        async def test():
+            adb = FakeAdb()
+            provider = ScreenshotProvider(FakePool(FakeStreamer(adb, landscape_frame())))
+            try:
+                for _ in range(3):
+                    frame = await provider.capture("d1")
+                    assert provider._screen_size(frame) == (2400, 1080)
+            finally:
+                await provider.stop()
+
+            assert len(adb.commands) == 1
+
+        run(test())
+
+    def test_control_on_uses_streamer_size(self):
+        adb = FakeAdb()
+        streamer = FakeStreamer(adb, landscape_frame(), physical_size=(1080, 2400))
+
+        assert run(capture_size(streamer)) == (2400, 1080)
+        assert adb.commands == []
+
+    def test_unknown_size_uses_video_size(self):
+        streamer = FakeStreamer(FakeAdb(output=None), landscape_frame())
+
+        assert run(capture_size(streamer)) == (1280, 576)
@@ -0,0 +1,55 @@
+"""
+ScrcpyStreamer 启动流程单元测试
+
+在 FakeAdbServer 上运行，不需要真机或 scrcpy-server。
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.adb import AdbClient, FakeAdbServer
+from autolife.scrcpy import ScrcpyStreamer
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def server_path(tmp_path, monkeypatch):
+    path = tmp_path / "scrcpy-server"
+    path.write_bytes(b"fake scrcpy-server")
+    monkeypatch.setenv("SCRCPY_SERVER_PATH", str(path))
+    return path
+
+
+@pytest.mark.unit
+class TestLaunchCleanup:
+    def test_failed_preparation_removes_forward(self, server_path):
+        """准备步骤之一失败时，已建立的端口转发被移除"""
+        async def test():
+            async with FakeAdbServer(devices={"emu-1": "device"}) as server:
+                adb = AdbClient(port=server.port, timeout=2.0)
+                streamer = ScrcpyStreamer(
+                    device_id="emu-1", port=27999, adb=adb, control=False, reconnect=False,
+                )
+
+                async def failing_push():
+                    raise RuntimeError("push failed")
+
+                streamer._push_server = failing_push
+
+                try:
+                    with pytest.raises(RuntimeError, match="push failed"):
+                        await streamer.start()
+
+                    assert not streamer.is_running
+
+                    # 失败时仍在进行的端口转发完成后也不能残留
+                    await asyncio.sleep(0.1)
+                    assert server.forwards == {}
+                finally:
+                    adb.close_sessions()
+
+        run(test())
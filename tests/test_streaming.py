@@ -0,0 +1,107 @@
+"""
+模型流式输出处理单元测试（ActionStreamParser / ActionStream）
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from autolife.streaming import ActionStream, ActionStreamParser, find_call_end
+
+
+def chunk(text):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeStream:
+    """模型流式响应：记录读到了第几个 chunk、是否被关闭"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.read += 1
+            yield chunk(piece)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.unit
+class TestActionStreamParser:
+    def test_thinking_deltas_strip_tags(self):
+        parser = ActionStreamParser()
+        pieces = ["<thi", "nk>打开", "设置</th", "ink><ans", 'wer>do(action="Back")', "</answer>"]
+
+        deltas = [parser.feed(piece) for piece in pieces]
+
+        # 可能被截断的标签暂不返回，标签本身被去掉
+        assert deltas == ["", "打开", "设置", "", "", ""]
+        assert parser.closed
+        assert parser.action == '<answer>do(action="Back")'
+
+    def test_partial_marker_held_back(self):
+        parser = ActionStreamParser()
+        assert parser.feed("返回上一页 do(act") == "返回上一页 "
+        assert parser.feed('ion="Back")') == ""
+        assert parser.action == 'do(action="Back")'
+
+    def test_parentheses_in_strings(self):
+        parser = ActionStreamParser()
+        parser.feed('输入文字。do(action="Type", text="a ) (b')
+        assert not parser.closed
+
+        parser.feed('")')
+        assert parser.action == 'do(action="Type", text="a ) (b")'
+
+    def test_finish(self):
+        parser = ActionStreamParser()
+        assert parser.feed('已完成。finish(message="完成(好)")') == "已完成。"
+        assert parser.action == 'finish(message="完成(好)")'
+
+    def test_finish_returns_held_back_text(self):
+        parser = ActionStreamParser()
+        assert parser.feed("只有思考 d") == "只有思考 "
+        assert parser.finish() == "d"
+        assert not parser.closed
+
+    def test_find_call_end(self):
+        text = 'do(action="Tap", element=[1, 2]) trailing'
+        assert text[:find_call_end(text, 0)] == 'do(action="Tap", element=[1, 2])'
+        assert find_call_end('do(action="Tap"', 0) == -1
+
+
+@pytest.mark.unit
+class TestActionStream:
+    def test_stops_after_action_closes(self):
+        stream = FakeStream(["思考", 'do(action="Tap", ', "element=[1,2])", "\n", "\n", "\n"])
+        thinking = []
+
+        content = "".join(
+            c.choices[0].delta.content
+            for c in ActionStream(stream, on_thinking=thinking.append, early_action=True)
+        )
+
+        # 动作块闭合后不再读取剩余的 token，并关闭响应
+        assert content == '思考do(action="Tap", element=[1,2])'
+        assert stream.read == 3
+        assert stream.closed
+        assert thinking == ["思考"]
+
+    def test_reads_everything_when_disabled(self):
+        stream = FakeStream(["思考", 'do(action="Back")', "\n"])
+
+        chunks = list(ActionStream(stream, early_action=False))
+
+        assert len(chunks) == 3
+        assert not stream.closed
+
+    def test_callback_errors_do_not_break_stream(self):
+        def fail(delta):
+            raise RuntimeError("boom")
+
+        stream = FakeStream(["思考", 'finish(message="ok")'])
+        assert len(list(ActionStream(stream, on_thinking=fail, early_action=True))) == 2
@@ -0,0 +1,87 @@
+"""
+TaskEventLog 单元测试（事件 ID、断点续读、文件恢复）
+"""
+
+import asyncio
+
+import pytest
+
+from autolife.tasks import TaskEventLog
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def collect(log, after_id=0):
+    return [(event.id, event.event) for event in [e async for e in log.follow(after_id)]]
+
+
+@pytest.mark.unit
+class TestTaskEventLog:
+    def test_follow_after_id(self):
+        async def test():
+            log = TaskEventLog("t1")
+            for name in ("task_start", "step_start", "step_complete"):
+                log.append(name, {"taskId": "t1"})
+            log.close()
+
+            assert await collect(log) == [(1, "task_start"), (2, "step_start"), (3, "step_complete")]
+            assert await collect(log, after_id=2) == [(3, "step_complete")]
+            assert await collect(log, after_id=3) == []
+
+        run(test())
+
+    def test_follow_waits_for_new_events(self):
+        async def test():
+            log = TaskEventLog("t1")
+            log.append("task_start", {})
+            reader = asyncio.ensure_future(collect(log, after_id=1))
+
+            await asyncio.sleep(0.01)
+            assert not reader.done()
+
+            log.append("task_complete", {})
+            log.close()
+            assert await asyncio.wait_for(reader, 1.0) == [(2, "task_complete")]
+
+        run(test())
+
+    def test_evicted_events_read_from_file(self, tmp_path):
+        async def test():
+            log = TaskEventLog("t1", path=tmp_path / "t1.jsonl", capacity=3)
+            for i in range(10):
+                log.append("thinking_delta", {"i": i})
+            log.close()
+
+            # 缓冲区只保留最近 3 个事件，更早的从文件读取
+            assert log.first_id == 8
+            assert [event_id for event_id, _ in await collect(log, after_id=4)] == [5, 6, 7, 8, 9, 10]
+
+        run(test())
+
+    def test_load_continues_ids(self, tmp_path):
+        async def test():
+            path = tmp_path / "t1.jsonl"
+            log = TaskEventLog("t1", path=path)
+            log.append("task_start", {})
+            log.append("step_start", {})
+
+            # 服务重启：从文件恢复，事件 ID 继续递增
+            restored = TaskEventLog.load("t1", path)
+            assert restored.last_id == 2
+            assert not restored.closed
+
+            event = restored.append("step_complete", {})
+            assert event.id == 3
+            restored.close()
+
+            assert TaskEventLog.load("t1", path).closed
+            assert await collect(restored, after_id=1) == [(2, "step_start"), (3, "step_complete")]
+
+        run(test())
+
+    def test_to_sse_has_id(self):
+        log = TaskEventLog("t1")
+        event = log.append("task_start", {"taskId": "t1"})
+        assert event.to_sse().startswith("id: 1\nevent: task_start\ndata: ")
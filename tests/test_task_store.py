@@ -0,0 +1,81 @@
+"""
+TaskStore 单元测试（SQLite 任务表）
+"""
+
+import time
+
+import pytest
+
+from autolife.agent_pool import TASK_COMPLETED, TASK_QUEUED, TASK_RUNNING
+from autolife.tasks import TaskRecord, TaskStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TaskStore(tmp_path / "tasks.db")
+    yield store
+    store.close()
+
+
+@pytest.mark.unit
+class TestTaskStore:
+    def test_add_and_get(self, store):
+        store.add(TaskRecord(task_id="t1", text="打开设置", options={"record": True}))
+
+        record = store.get("t1")
+        assert record.text == "打开设置"
+        assert record.status == TASK_QUEUED
+        assert record.options == {"record": True}
+        assert record.seq > 0
+
+    def test_duplicate_id(self, store):
+        store.add(TaskRecord(task_id="t1", text="a"))
+        with pytest.raises(ValueError):
+            store.add(TaskRecord(task_id="t1", text="b"))
+
+    def test_queued_order(self, store):
+        store.add(TaskRecord(task_id="low", text="a"))
+        store.add(TaskRecord(task_id="high", text="b", priority=5))
+        store.add(TaskRecord(task_id="low2", text="c"))
+
+        # 优先级高的在前，相同优先级按提交顺序
+        assert [r.task_id for r in store.queued()] == ["high", "low", "low2"]
+
+    def test_recover_requeues_running(self, tmp_path):
+        path = tmp_path / "tasks.db"
+        store = TaskStore(path)
+        running = store.add(TaskRecord(task_id="running", text="a"))
+        running.status = TASK_RUNNING
+        running.started_at = time.time()
+        store.save(running)
+
+        done = store.add(TaskRecord(task_id="done", text="b"))
+        done.status = TASK_COMPLETED
+        store.save(done)
+        store.close()
+
+        # 模拟服务重启
+        store = TaskStore(path)
+        try:
+            assert store.recover() == 1
+
+            record = store.get("running")
+            assert record.status == TASK_QUEUED
+            assert record.started_at is None
+            assert store.get("done").status == TASK_COMPLETED
+            assert [r.task_id for r in store.queued()] == ["running"]
+        finally:
+            store.close()
+
+    def test_purge_finished(self, store):
+        old = store.add(TaskRecord(task_id="old", text="a"))
+        old.status = TASK_COMPLETED
+        old.ended_at = 100.0
+        store.save(old)
+
+        store.add(TaskRecord(task_id="queued", text="b"))
+
+        assert store.purge(before=200.0) == ["old"]
+        assert store.get("old") is None
+        assert store.get("queued") is not None
+        assert store.counts() == {TASK_QUEUED: 1}